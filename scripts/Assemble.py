@@ -20,7 +20,9 @@ a.accessMarkerGraphEdges()
 a.accessAssemblyGraphEdges()
 a.accessAssemblyGraphEdgeLists()
 a.accessMarkerGraphConsensus()
-a.assemble()
+a.assemble(
+    markerGraphEdgeLengthThresholdForConsensus =
+    int(config['Assembly']['markerGraphEdgeLengthThresholdForConsensus']))
 
 
 
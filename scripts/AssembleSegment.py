@@ -27,7 +27,10 @@ a.accessMarkerGraphEdges()
 a.accessAssemblyGraphEdgeLists()
 a.accessMarkerGraphConsensus()
 a.accessMarkerGraphCoverageData()
-assembledSegment = a.assembleAssemblyGraphEdge(edgeId)
+assembledSegment = a.assembleAssemblyGraphEdge(
+    edgeId,
+    markerGraphEdgeLengthThresholdForConsensus =
+    int(config['Assembly']['markerGraphEdgeLengthThresholdForConsensus']))
 
 csv = open(str(edgeId) + '.csv', 'w')
 for position in range(assembledSegment.size()):
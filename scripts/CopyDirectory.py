@@ -1,6 +1,5 @@
 #!/usr/bin/python3
 
-import glob
 import shasta
 import sys
 
@@ -30,11 +29,7 @@ if not len(sys.argv) == 3:
 inputName = sys.argv[1]
 outputName = sys.argv[2]
 
-inputFileNames = glob.glob(inputName + '/*')
-
-for inputFileName in inputFileNames:
-    lastSlashPosition = inputFileName.rfind('/')
-    outputFileName = outputName + '/' + inputFileName[lastSlashPosition+1:]
-    shasta.mappedCopy(inputFileName, outputFileName)
+# Files are copied concurrently, using one thread per virtual processor.
+shasta.mappedCopyDirectory(inputName, outputName)
 
 
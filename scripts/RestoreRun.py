@@ -18,15 +18,16 @@ if not os.path.lexists('Data'):
 if not os.path.lexists('DataOnDisk'):
     raise Exception('Missing: DataOnDisk.')
     
+if os.path.lexists('DataOnDisk/Manifest.csv'):
+    raise Exception('DataOnDisk was created by "shasta --command saveBinaryData". '
+        'Use "shasta --command restoreBinaryData" to restore it.')
+
 if glob.glob('Data/*'):
     raise Exception('The Data directory is not empty. Nothing was restored.')
 
 # Copy the Data directory.
 # We cannot use regular copy commands because
 # this is on the huge page filesystem.
-inputFileNames = glob.glob('DataOnDisk/*')
-for inputFileName in inputFileNames:
-    lastSlashPosition = inputFileName.rfind('/')
-    outputFileName = 'Data/' + inputFileName[lastSlashPosition+1:]
-    shasta.mappedCopy(inputFileName, outputFileName)
+# Files are copied concurrently, using one thread per virtual processor.
+shasta.mappedCopyDirectory('DataOnDisk', 'Data')
 
@@ -1,13 +1,16 @@
 #!/usr/bin/python3
 
 import os
-import shutil
 import sys
+import shasta
 
 
 def parseArguments():
     # Get from the arguments the list of input fasta files and check that they all exist.
-    helpMessage = "This script copies a run to directory DataOnDisk."
+    helpMessage = "This script copies a run to directory DataOnDisk. " \
+        "Files are copied concurrently, using one thread per virtual processor. " \
+        "To also compress the copy and verify it when restoring, " \
+        "use \"shasta --command saveBinaryData\" instead."
     if not len(sys.argv)==1:
         print(helpMessage)
         exit(1)
@@ -23,7 +26,10 @@ def saveRun(parentDirectory=""):
     if os.path.lexists(dataOnDiskPath):
         raise Exception('DataOnDisk already exists. Remove before running this script.')
         
-    shutil.copytree('Data', 'DataOnDisk')
+    # Copy the Data directory.
+    # Files are copied concurrently, using one thread per virtual processor.
+    os.mkdir(dataOnDiskPath)
+    shasta.mappedCopyDirectory(dataPath, dataOnDiskPath)
 
 
 def main():
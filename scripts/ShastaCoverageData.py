@@ -0,0 +1,181 @@
+#!/usr/bin/python3
+
+"""
+Reader for coverage data written in binary format by the assembly step
+(Assembly.storeCoverageDataFormat = binary).
+See src/CoverageDataWriter.hpp for a description of the format.
+
+Usage as a module:
+
+    import ShastaCoverageData
+    coverageData = ShastaCoverageData.CoverageData('Coverage')
+    c = coverageData.getCoverage(segmentId, begin, end)
+
+getCoverage returns a dictionary of NumPy arrays for
+run-length positions in [begin, end) of the segment:
+- 'consensusBase', 'consensusRepeatCount': one entry per position.
+- 'entryBegin': one entry per position plus one. The coverage entries
+  for position begin+i are entryBegin[i]:entryBegin[i+1].
+- 'base', 'strand', 'repeatCount', 'frequency': one entry per coverage entry.
+Bases are coded 0=A, 1=C, 2=G, 3=T, 4=gap.
+
+Usage from the command line, to write coverage data for a range
+of positions of a segment in csv format to standard output:
+
+    ShastaCoverageData.py segmentId [begin [end]]
+
+"""
+
+import numpy
+import sys
+import zlib
+
+headerDtype = numpy.dtype([
+    ('magicNumber', '<u8'),
+    ('version', '<u8'),
+    ('segmentCount', '<u8'),
+    ('chunkCount', '<u8')])
+
+segmentDtype = numpy.dtype([
+    ('segmentId', '<u8'),
+    ('positionCount', '<u8'),
+    ('firstChunk', '<u8'),
+    ('chunkCount', '<u8')])
+
+chunkDtype = numpy.dtype([
+    ('offset', '<u8'),
+    ('compressedSize', '<u8'),
+    ('firstPosition', '<u8'),
+    ('positionCount', '<u8'),
+    ('entryCount', '<u8')])
+
+magicNumber = 0x5643415453414853
+version = 1
+
+
+
+class CoverageData:
+
+    def __init__(self, directoryName = 'Coverage'):
+        index = numpy.fromfile(directoryName + '/CoverageData.index', dtype = numpy.uint8)
+        header = index[:headerDtype.itemsize].view(headerDtype)[0]
+        if header['magicNumber'] != magicNumber:
+            raise Exception('Not a Shasta coverage data index.')
+        if header['version'] != version:
+            raise Exception('Unsupported coverage data version %i.' % header['version'])
+        segmentCount = int(header['segmentCount'])
+        chunkCount = int(header['chunkCount'])
+        begin = headerDtype.itemsize
+        end = begin + segmentCount * segmentDtype.itemsize
+        self.segments = index[begin:end].view(segmentDtype)
+        begin = end
+        end = begin + chunkCount * chunkDtype.itemsize
+        self.chunks = index[begin:end].view(chunkDtype)
+        self.dataFile = open(directoryName + '/CoverageData.bin', 'rb')
+
+
+    # Return the segment ids for which coverage data is available.
+    def getSegmentIds(self):
+        return self.segments['segmentId']
+
+
+    # Return the SegmentIndexEntry for a segment.
+    def getSegment(self, segmentId):
+        i = numpy.searchsorted(self.segments['segmentId'], segmentId)
+        if i == len(self.segments) or self.segments[i]['segmentId'] != segmentId:
+            raise Exception('No coverage data stored for segment %i.' % segmentId)
+        return self.segments[i]
+
+
+    # Return the number of run-length positions of a segment.
+    def getPositionCount(self, segmentId):
+        return int(self.getSegment(segmentId)['positionCount'])
+
+
+    # Decompress a chunk and return its arrays.
+    def readChunk(self, chunkId):
+        chunk = self.chunks[chunkId]
+        self.dataFile.seek(int(chunk['offset']))
+        data = numpy.frombuffer(
+            zlib.decompress(self.dataFile.read(int(chunk['compressedSize']))),
+            dtype = numpy.uint8)
+        n = int(chunk['positionCount'])
+        m = int(chunk['entryCount'])
+        arrays = {}
+        arrays['consensusBase'] = data[0 : n]
+        arrays['consensusRepeatCount'] = data[n : 2*n]
+        arrays['entryCount'] = data[2*n : 6*n].view('<u4')
+        begin = 6 * n
+        for name in ('base', 'strand', 'repeatCount', 'frequency'):
+            arrays[name] = data[begin : begin + m]
+            begin += m
+        return arrays
+
+
+    # Return coverage data for run-length positions [begin, end) of a segment.
+    # Only the chunks that overlap the requested range are decompressed.
+    def getCoverage(self, segmentId, begin = 0, end = None):
+        segment = self.getSegment(segmentId)
+        positionCount = int(segment['positionCount'])
+        if end is None or end > positionCount:
+            end = positionCount
+        if begin < 0 or begin > end:
+            raise Exception('Invalid position range.')
+
+        perPosition = {'consensusBase': [], 'consensusRepeatCount': [], 'entryCount': []}
+        perEntry = {'base': [], 'strand': [], 'repeatCount': [], 'frequency': []}
+        firstChunk = int(segment['firstChunk'])
+        for chunkId in range(firstChunk, firstChunk + int(segment['chunkCount'])):
+            chunk = self.chunks[chunkId]
+            chunkBegin = int(chunk['firstPosition'])
+            chunkEnd = chunkBegin + int(chunk['positionCount'])
+            if chunkEnd <= begin or chunkBegin >= end:
+                continue
+            arrays = self.readChunk(chunkId)
+            i0 = max(begin, chunkBegin) - chunkBegin
+            i1 = min(end, chunkEnd) - chunkBegin
+            entryBegin = numpy.concatenate((numpy.zeros(1, numpy.uint64), numpy.cumsum(arrays['entryCount'], dtype = numpy.uint64)))
+            j0 = int(entryBegin[i0])
+            j1 = int(entryBegin[i1])
+            for name in perPosition:
+                perPosition[name].append(arrays[name][i0:i1])
+            for name in perEntry:
+                perEntry[name].append(arrays[name][j0:j1])
+
+        result = {}
+        result['consensusBase'] = numpy.concatenate(perPosition['consensusBase'] or [numpy.zeros(0, numpy.uint8)])
+        result['consensusRepeatCount'] = numpy.concatenate(perPosition['consensusRepeatCount'] or [numpy.zeros(0, numpy.uint8)])
+        entryCount = numpy.concatenate(perPosition['entryCount'] or [numpy.zeros(0, numpy.uint32)])
+        result['entryBegin'] = numpy.concatenate((numpy.zeros(1, numpy.uint64), numpy.cumsum(entryCount, dtype = numpy.uint64)))
+        for name in perEntry:
+            result[name] = numpy.concatenate(perEntry[name] or [numpy.zeros(0, numpy.uint8)])
+        return result
+
+
+
+def main(argv):
+    if len(argv) < 2 or len(argv) > 4:
+        print('Usage: ShastaCoverageData.py segmentId [begin [end]]')
+        return 1
+    segmentId = int(argv[1])
+    begin = int(argv[2]) if len(argv) > 2 else 0
+    end = int(argv[3]) if len(argv) > 3 else None
+
+    coverageData = CoverageData('Coverage')
+    c = coverageData.getCoverage(segmentId, begin, end)
+    bases = 'ACGT_'
+    strands = '+-'
+    entryBegin = c['entryBegin']
+    for i in range(len(c['consensusBase'])):
+        line = '%i,%s,%i,' % (begin + i, bases[c['consensusBase'][i]], c['consensusRepeatCount'][i])
+        for j in range(int(entryBegin[i]), int(entryBegin[i+1])):
+            line += '%s%i%s %i,' % (
+                bases[c['base'][j]], c['repeatCount'][j],
+                strands[c['strand'][j]], c['frequency'][j])
+        print(line)
+    return 0
+
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -3,8 +3,18 @@
 #include "SimpleConsensusCaller.hpp"
 #include "SimpleBayesianConsensusCaller.hpp"
 #include "MedianConsensusCaller.hpp"
+#include "Numa.hpp"
 using namespace shasta;
 
+// Boost libraries.
+#include <boost/algorithm/string.hpp>
+
+// Linux.
+#include <unistd.h>
+
+// Standard library.
+#include "chrono.hpp"
+
 
 
 // Constructor to be called one to create a new run.
@@ -163,3 +173,135 @@ void Assembler::storePeakMemoryUsage(uint64_t peakMemoryUsage) {
     assemblerInfo->peakMemoryUsage = peakMemoryUsage;
 }
 
+
+
+
+template<class F> void Assembler::forEachMemoryMappedData(
+    const string& dataNames,
+    const string& purpose,
+    const F& f) const
+{
+    vector<string> names;
+    boost::algorithm::split(names, dataNames, boost::algorithm::is_any_of(","));
+    bool doReads = false;
+    bool doMarkers = false;
+    bool doMarkerGraph = false;
+    bool doAssemblyGraph = false;
+    for(const string& name: names) {
+        if(name == "reads") {
+            doReads = true;
+        } else if(name == "markers") {
+            doMarkers = true;
+        } else if(name == "markerGraph") {
+            doMarkerGraph = true;
+        } else if(name == "assemblyGraph") {
+            doAssemblyGraph = true;
+        } else if(name == "all") {
+            doReads = true;
+            doMarkers = true;
+            doMarkerGraph = true;
+            doAssemblyGraph = true;
+        } else {
+            throw runtime_error("Invalid data name " + name + " specified for " + purpose + ". "
+                "Valid names are reads, markers, markerGraph, assemblyGraph, all.");
+        }
+    }
+
+    if(doReads and reads) {
+        reads->forEachMemoryMappedVector(f);
+    }
+    if(doMarkers) {
+        f(markers);
+    }
+    if(doMarkerGraph) {
+        if(markerGraph.verticesPointer) {
+            f(markerGraph.vertices());
+        }
+        f(markerGraph.vertexTable);
+        f(markerGraph.edges);
+        f(markerGraph.edgeMarkerIntervals);
+        f(markerGraph.edgesBySource);
+        f(markerGraph.edgesByTarget);
+    }
+    if(doAssemblyGraph and assemblyGraphPointer) {
+        const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+        f(assemblyGraph.vertices);
+        f(assemblyGraph.edges);
+        f(assemblyGraph.edgesBySource);
+        f(assemblyGraph.edgesByTarget);
+        f(assemblyGraph.edgeLists);
+        f(assemblyGraph.markerToAssemblyTable);
+    }
+}
+
+
+
+// Load memory mapped data in a background thread.
+void Assembler::startPrefetching(const string& dataNames)
+{
+    cancelPrefetching();
+
+    prefetcher = make_shared<Prefetcher>();
+    forEachMemoryMappedData(dataNames, "prefetching",
+        [this](const auto& v) {prefetcher->add(v);});
+
+    // If the data don't fit comfortably in memory, prefetching
+    // would just evict other useful pages.
+    const uint64_t physicalMemory = uint64_t(::sysconf(_SC_PHYS_PAGES)) * uint64_t(::sysconf(_SC_PAGESIZE));
+    const uint64_t byteCount = prefetcher->totalByteCount();
+    if(byteCount > physicalMemory / 2) {
+        cout << "Skipped prefetching " << byteCount << " bytes of " << dataNames <<
+            " data because they don't fit comfortably in memory." << endl;
+        prefetcher = 0;
+        return;
+    }
+    cout << timestamp << "Prefetching " << byteCount << " bytes of " <<
+        dataNames << " data in the background." << endl;
+    prefetcher->start();
+}
+
+
+
+void Assembler::waitForPrefetching()
+{
+    if(prefetcher) {
+        prefetcher->wait();
+        prefetcher = 0;
+    }
+}
+
+
+
+void Assembler::cancelPrefetching()
+{
+    if(prefetcher) {
+        prefetcher->cancel();
+        prefetcher = 0;
+    }
+}
+
+
+
+void Assembler::distributeNumaMemory(const string& dataNames)
+{
+    if(not Numa::isPartitioned()) {
+        return;
+    }
+
+    const auto t0 = steady_clock::now();
+    forEachMemoryMappedData(dataNames, "NUMA distribution",
+        [](const auto& v) {Numa::distribute(v);});
+    const auto t1 = steady_clock::now();
+    cout << timestamp << "Distributed " << dataNames << " data across " <<
+        Numa::nodeCount() << " NUMA nodes in " << seconds(t1 - t0) << " s." << endl;
+}
+
+
+
+void Assembler::adviseMemoryMappedData(const string& dataNames, MemoryMapped::Advice advice)
+{
+    forEachMemoryMappedData(dataNames, "memory advice",
+        [advice](const auto& v) {v.advise(advice);});
+    cout << "Memory access advice for " << dataNames << " data set to " <<
+        MemoryMapped::adviceName(advice) << "." << endl;
+}
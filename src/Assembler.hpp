@@ -16,7 +16,10 @@
 #include "Marker.hpp"
 #include "MarkerGraph.hpp"
 #include "MemoryMappedObject.hpp"
+#include "MemoryMappedVectorOfVectorsBuilder.hpp"
 #include "MultithreadedObject.hpp"
+#include "OrderedOutputFile.hpp"
+#include "Prefetcher.hpp"
 #include "OrientedReadPair.hpp"
 #include "ReadGraph.hpp"
 #include "ReadFlags.hpp"
@@ -24,9 +27,12 @@
 #include "Reads.hpp"
 
 // Standard library.
+#include <map>
 #include "memory.hpp"
+#include <queue>
 #include "string.hpp"
 #include "tuple.hpp"
+#include <unordered_map>
 
 // Spoa.
 #include "spoa/spoa.hpp"
@@ -43,6 +49,7 @@ namespace shasta {
     class AssembledSegment;
     class CompressedAssemblyGraph;
     class ConsensusCaller;
+    class CoverageDataWriter;
     class LocalAssemblyGraph;
     class LocalAlignmentGraph;
     class LocalReadGraph;
@@ -404,11 +411,16 @@ public:
     // strand symmetric when this ends.
     // To achieve this, we always process the two edges
     // in a reverse complemented pair together.
+    // The BFSs for edges of each coverage are done in parallel
+    // (see transitiveReductionProcessEdges), and the
+    // set of removed edges is the same as
+    // obtained by processing the edges sequentially.
     void transitiveReduction(
         size_t lowCoverageThreshold,
         size_t highCoverageThreshold,
         size_t maxDistance,
-        size_t edgeMarkerSkipThreshold);
+        size_t edgeMarkerSkipThreshold,
+        size_t threadCount = 0);
 
 
 
@@ -429,11 +441,75 @@ public:
     void reverseTransitiveReduction(
         size_t lowCoverageThreshold,
         size_t highCoverageThreshold,
-        size_t maxDistance);
+        size_t maxDistance,
+        size_t threadCount = 0);
+private:
+
+
+
+    // Functions and data used by transitiveReduction
+    // and reverseTransitiveReduction to process in parallel
+    // the edges with a given coverage.
+    // The edges are processed in batches.
+    // For all edges of a batch, the BFS is done speculatively in parallel,
+    // using the edges flags as they were at the beginning of the batch.
+    // The results are then applied sequentially, in the same order
+    // used by the sequential algorithm.
+    // Removing edges can never create a new path,
+    // so a speculative BFS that did not find a path is always valid.
+    // A speculative BFS that found a path is valid if none of the edges
+    // on the path was removed earlier in the same batch.
+    // Otherwise, a conflict occurred and the BFS is redone sequentially.
+    // This guarantees that the removed edges are the same
+    // as with sequential processing.
+    // Returns the number of edges removed, counting both edges
+    // in each reverse complemented pair.
+    uint64_t transitiveReductionProcessEdges(
+        const span<MarkerGraph::EdgeId>& edgeIds,
+        bool isReverse,
+        size_t maxDistance,
+        size_t threadCount);
+    void transitiveReductionThreadFunction(size_t threadId);
+    class TransitiveReductionBfsWorkArea {
+    public:
+        std::queue<MarkerGraph::VertexId> q;
+
+        // For each vertex encountered by the BFS, store its distance
+        // from the start vertex and the edge used to reach it.
+        std::unordered_map<MarkerGraph::VertexId, pair<uint64_t, MarkerGraph::EdgeId> > vertexTable;
+    };
+
+    // Look for a path of length at most maxDistance that
+    // does not use edgeId and does not use any edges
+    // currently marked wasRemovedByTransitiveReduction.
+    // For transitive reduction the path goes from the source of edgeId
+    // to its target. For reverse transitive reduction it goes
+    // from the target of edgeId to its source.
+    // If such a path is found, its edges are stored in the path vector.
+    bool transitiveReductionBfs(
+        MarkerGraph::EdgeId,
+        bool isReverse,
+        size_t maxDistance,
+        TransitiveReductionBfsWorkArea&,
+        vector<MarkerGraph::EdgeId>& path) const;
+
+    class TransitiveReductionData {
+    public:
+        bool isReverse;
+        size_t maxDistance;
+
+        // The edges of the batch being processed.
+        span<MarkerGraph::EdgeId> edgeIds;
+
+        // The results of the speculative BFS for each edge of the batch.
+        // Use uint8_t instead of bool to allow concurrent writes.
+        vector<uint8_t> found;
+        vector< vector<MarkerGraph::EdgeId> > paths;
+    };
+    TransitiveReductionData transitiveReductionData;
 
 
 
-private:
 
     // Data filled in by the constructor.
     string largeDataFileNamePrefix;
@@ -1203,7 +1279,33 @@ private:
 public:
 
     // Prune leaves from the strong subgraph of the global marker graph.
-    void pruneMarkerGraphStrongSubgraph(size_t iterationCount);
+    // The first iteration examines all edges. Each following iteration
+    // only examines the edges incident to the vertices
+    // touched by edges pruned at the previous iteration (the frontier).
+    void pruneMarkerGraphStrongSubgraph(
+        size_t iterationCount,
+        size_t threadCount = 0);
+private:
+    void pruneMarkerGraphStrongSubgraphThreadFunction(size_t threadId);
+    bool pruneMarkerGraphStrongSubgraphCheckEdge(MarkerGraph::EdgeId, size_t threadId);
+    class PruneMarkerGraphStrongSubgraphData {
+    public:
+
+        // If true, examine all edges. Otherwise, only examine
+        // the edges incident to vertices in the frontier.
+        bool examineAllEdges;
+        vector<MarkerGraph::VertexId> frontier;
+
+        // Flags used to make sure each edge is only stored once.
+        // Once an edge is flagged, it is pruned, so it will never
+        // be examined again and the flag never needs to be cleared.
+        MemoryMapped::Vector<uint8_t> isFlagged;
+
+        // The edges to be pruned found by each thread at this iteration.
+        vector< vector<MarkerGraph::EdgeId> > threadEdgesToBePruned;
+    };
+    PruneMarkerGraphStrongSubgraphData pruneMarkerGraphStrongSubgraphData;
+public:
 
     // Refine the marker graph by removing vertices in tangle regions,
     // then recreating edges. This must be called after
@@ -1400,6 +1502,11 @@ private:
         // Assembly mode: 1=overlapping bases, 2=intervening bases.
         int assemblyMode;   // 1 or 2.
 
+        // Set if spoa was used to compute the alignment.
+        // In assembly mode 2, spoa is not used if all of the
+        // marker intervals have the same sequence.
+        bool usedSpoa;
+
         // Data stored when hasLongMarkerInterval is set.
         size_t iShortest;
 
@@ -1450,16 +1557,46 @@ private:
 public:
     void simplifyMarkerGraph(
         const vector<size_t>& maxLength, // One value for each iteration.
-        bool debug);
+        bool debug,
+        size_t threadCount = 0);
 private:
-    void simplifyMarkerGraphIterationPart1(
+
+    // Each of these works on the assembly graph currently stored
+    // in assemblyGraphPointer and returns the number of marker graph edges
+    // it flagged as isSuperBubbleEdge. If that number is zero,
+    // the assembly graph is still current and does not need to be recreated.
+    uint64_t simplifyMarkerGraphIterationPart1(
         size_t iteration,
         size_t maxLength,
-        bool debug);
-    void simplifyMarkerGraphIterationPart2(
+        bool debug,
+        size_t threadCount);
+    uint64_t simplifyMarkerGraphIterationPart2(
         size_t iteration,
         size_t maxLength,
-        bool debug);
+        bool debug,
+        size_t threadCount);
+    void simplifyMarkerGraphIterationPart1ThreadFunction(size_t threadId);
+    void simplifyMarkerGraphIterationPart2ThreadFunction(size_t threadId);
+    void simplifyMarkerGraphIterationPart2ProcessComponent(AssemblyGraph::VertexId componentId);
+    uint64_t simplifyMarkerGraphFlagEdges(bool alsoFlagReverseComplement);
+    class SimplifyMarkerGraphData {
+    public:
+        size_t maxLength;
+        bool debug;
+        ofstream debugOut;
+
+        // Flags for assembly graph edges to be kept.
+        // Use uint8_t instead of bool to allow concurrent writes.
+        vector<uint8_t> keepAssemblyGraphEdge;
+
+        // Connected components used in part 2.
+        vector<AssemblyGraph::VertexId> vertexComponent;
+        vector< vector<AssemblyGraph::VertexId> > componentTable;
+        vector<AssemblyGraph::VertexId> rcComponentTable;
+        vector<bool> isEntry;
+        vector<bool> isExit;
+    };
+    SimplifyMarkerGraphData simplifyMarkerGraphData;
 
 
 
@@ -1493,9 +1630,12 @@ public:
     void gatherOrientedReadsByAssemblyGraphEdge(size_t threadCount);
     void writeOrientedReadsByAssemblyGraphEdge();
 private:
-    void gatherOrientedReadsByAssemblyGraphEdgePass1(size_t threadId);
-    void gatherOrientedReadsByAssemblyGraphEdgePass2(size_t threadId);
-    void gatherOrientedReadsByAssemblyGraphEdgePass(int);
+    void gatherOrientedReadsByAssemblyGraphEdgeThreadFunction(size_t threadId);
+    class GatherOrientedReadsByAssemblyGraphEdgeData {
+    public:
+        shared_ptr< MemoryMapped::VectorOfVectorsBuilder<AssemblyGraph::OrientedReadInfo, uint64_t> > builder;
+    };
+    GatherOrientedReadsByAssemblyGraphEdgeData gatherOrientedReadsByAssemblyGraphEdgeData;
 
     // Extract a local assembly graph from the global assembly graph.
     // This returns false if the timeout was exceeded.
@@ -1513,21 +1653,39 @@ public:
 
 
     // Compute consensus repeat counts for each vertex of the marker graph.
-    void assembleMarkerGraphVertices(size_t threadCount);
+    // If strandSymmetric is true, the computation is only done for one vertex
+    // in each reverse complemented pair, and the repeat counts for the
+    // other vertex are obtained by reversing.
+    // This requires the reverse complement vertices to be available.
+    void assembleMarkerGraphVertices(
+        size_t threadCount,
+        bool strandSymmetric = false);
     void accessMarkerGraphVertexRepeatCounts();
 private:
     void assembleMarkerGraphVerticesThreadFunction(size_t threadId);
+    class AssembleMarkerGraphVerticesData {
+    public:
+        bool strandSymmetric;
+    };
+    AssembleMarkerGraphVerticesData assembleMarkerGraphVerticesData;
 public:
 
 
 
     // Optional computation of coverage data for marker graph vertices.
     // This is only called if Assembly.storeCoverageData in shasta.conf is True.
-    void computeMarkerGraphVerticesCoverageData(size_t threadCount);
+    // If strandSymmetric is true, the computation is only done for one vertex
+    // in each reverse complemented pair, and the coverage data for the
+    // other vertex are obtained by reverse complementing.
+    // This gives the same results as computing coverage data for all vertices.
+    void computeMarkerGraphVerticesCoverageData(
+        size_t threadCount,
+        bool strandSymmetric = false);
 private:
     void computeMarkerGraphVerticesCoverageDataThreadFunction(size_t threadId);
     class ComputeMarkerGraphVerticesCoverageDataData {
     public:
+        bool strandSymmetric;
 
         // The results computed by each thread.
         // For each threadId:
@@ -1628,7 +1786,13 @@ public:
 
 
 
-    // Assemble consensus sequence and repeat counts for each marker graph edge.
+    // Assemble consensus sequence and repeat counts for marker graph edges.
+    // Consensus is only computed for marker graph edges
+    // on assembled edges of the assembly graph.
+    // The parallel computation is driven by AssemblyGraph::edgeLists,
+    // so the threads never see edges that don't need to be assembled.
+    // Consensus for other edges is left empty and can be computed
+    // on demand using getMarkerGraphEdgeConsensus.
     void assembleMarkerGraphEdges(
         size_t threadCount,
 
@@ -1648,6 +1812,18 @@ private:
         uint32_t markerGraphEdgeLengthThresholdForConsensus;
         bool storeCoverageData;
 
+        // The number of edges that took each of the code paths
+        // in computeMarkerGraphEdgeConsensusSequenceUsingSpoa.
+        uint64_t longMarkerIntervalEdgeCount;
+        uint64_t mode1EdgeCount;
+        uint64_t mode2SingleSequenceEdgeCount;
+        uint64_t mode2SpoaEdgeCount;
+
+        // The marker graph edges that need to be assembled,
+        // in the order in which they appear in AssemblyGraph::edgeLists.
+        // The threads use load balancing over this vector.
+        MemoryMapped::Vector<MarkerGraph::EdgeId> edgesToBeAssembled;
+
         // The results computed by each thread.
         // For each threadId:
         // threadEdgeIds[threadId] contains the edge ids processed by each thread.
@@ -1668,6 +1844,41 @@ private:
     };
     AssembleMarkerGraphEdgesData assembleMarkerGraphEdgesData;
 
+
+
+    // Get consensus sequence for a marker graph edge.
+    // If the edge was assembled by assembleMarkerGraphEdges,
+    // the stored consensus is returned.
+    // Otherwise, consensus is computed on demand using spoa
+    // and memoized, so repeated requests for the same edge
+    // (for example from the http server) don't redo the computation.
+    // The ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail is only
+    // filled in when the consensus is computed or found in the cache.
+    // Returns true if the detail was filled in.
+public:
+    bool getMarkerGraphEdgeConsensus(
+        MarkerGraph::EdgeId,
+        uint32_t markerGraphEdgeLengthThresholdForConsensus,
+        vector<Base>& sequence,
+        vector<uint32_t>& repeatCounts,
+        uint8_t& overlappingBaseCount,
+        ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail&,
+        bool useStoredConsensus = true);
+private:
+    class MarkerGraphEdgeConsensusCacheEntry {
+    public:
+        uint32_t markerGraphEdgeLengthThresholdForConsensus;
+        vector<Base> sequence;
+        vector<uint32_t> repeatCounts;
+        uint8_t overlappingBaseCount;
+        ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail detail;
+    };
+    std::map<MarkerGraph::EdgeId, MarkerGraphEdgeConsensusCacheEntry> markerGraphEdgeConsensusCache;
+    std::mutex markerGraphEdgeConsensusCacheMutex;
+
+    // The cache is cleared when it reaches this many entries.
+    static const uint64_t markerGraphEdgeConsensusCacheMaxSize = 10000;
+
     // Access coverage data for vertices and edges of the marker graph.
     // This is only available if the run had Assembly.storeCoverageData set to True
     // in shasta.conf.
@@ -1679,27 +1890,56 @@ private:
     // Assemble sequence for an edge of the assembly graph.
     // Optionally outputs detailed assembly information
     // in html (skipped if the html pointer is 0).
+    // Consensus for marker graph edges that were not assembled
+    // by assembleMarkerGraphEdges is computed on demand using
+    // markerGraphEdgeLengthThresholdForConsensus, which should be
+    // the same value that was passed to assembleMarkerGraphEdges.
     void assembleAssemblyGraphEdge(
         AssemblyGraph::EdgeId,
         bool storeCoverageData,
+        uint32_t markerGraphEdgeLengthThresholdForConsensus,
         AssembledSegment&);
 public:
     AssembledSegment assembleAssemblyGraphEdge(
         AssemblyGraph::EdgeId,
-        bool storeCoverageData);
+        bool storeCoverageData,
+        uint32_t markerGraphEdgeLengthThresholdForConsensus);
 
 
     // Assemble sequence for all edges of the assembly graph.
+    // If storeCoverageDataCsvLengthThreshold is not zero,
+    // coverage data for segments longer than that are written
+    // in directory Coverage, using the specified format
+    // (binary or csv, see class CoverageDataWriter for the binary format).
+    // If streamGfaFileName or streamFastaFileName are not empty,
+    // assembled segments are written to those files in GFA or FASTA format
+    // as they are assembled. The output is the same that would be created
+    // by writeGfa1 and writeFasta.
     void assemble(
         size_t threadCount,
-        uint32_t storeCoverageDataCsvLengthThreshold);
+        uint32_t markerGraphEdgeLengthThresholdForConsensus,
+        uint32_t storeCoverageDataCsvLengthThreshold,
+        const string& storeCoverageDataFormat = "csv",
+        const string& streamGfaFileName = "",
+        const string& streamFastaFileName = "");
     void accessAssemblyGraphSequences();
     void computeAssemblyStatistics();
 private:
     class AssembleData {
     public:
+        uint32_t markerGraphEdgeLengthThresholdForConsensus;
         uint32_t storeCoverageDataCsvLengthThreshold;
 
+        // Used to write coverage data in binary format.
+        // Only allocated if storeCoverageDataCsvLengthThreshold is not zero
+        // and the binary format was requested.
+        shared_ptr<CoverageDataWriter> coverageDataWriter;
+
+        // Used to stream assembled segments to GFA and FASTA output.
+        // Only allocated if requested.
+        shared_ptr<OrderedOutputFile> gfa;
+        shared_ptr<OrderedOutputFile> fasta;
+
         // The results created by each thread.
         // All indexed by threadId.
         vector< vector<AssemblyGraph::EdgeId> > edges;
@@ -1710,14 +1950,17 @@ private:
     };
     AssembleData assembleData;
     void assembleThreadFunction(size_t threadId);
+    void cancelStreamedOutput();
 
 
 
     // Write the assembly graph in GFA 1.0 format defined here:
     // https://github.com/GFA-spec/GFA-spec/blob/master/GFA1.md
+    // The output is formatted in parallel and, if the file name
+    // ends in ".gz", bgzip compressed (see class OrderedOutputFile).
 public:
-    void writeGfa1(const string& fileName);
-    void writeGfa1BothStrands(const string& fileName);
+    void writeGfa1(const string& fileName, size_t threadCount = 0);
+    void writeGfa1BothStrands(const string& fileName, size_t threadCount = 0);
 private:
     // Construct the CIGAR string given two vectors of repeat counts.
     // Used by writeGfa1.
@@ -1730,7 +1973,45 @@ private:
 public:
 
     // Write assembled sequences in FASTA format.
-    void writeFasta(const string& fileName);
+    // If the file name ends in ".gz", the output is bgzip compressed.
+    // A .fai index is also written.
+    void writeFasta(const string& fileName, size_t threadCount = 0);
+private:
+
+    // Functions and data used to format GFA and FASTA output in parallel.
+    void writeAssemblyOutput(
+        const string& fileName,
+        bool fasta,
+        bool bothStrands,
+        size_t threadCount);
+    void writeAssemblyOutputThreadFunction(size_t threadId);
+    class WriteAssemblyOutputData {
+    public:
+        OrderedOutputFile* file = 0;
+        bool fasta;
+        bool bothStrands;
+        bool writeLinks;
+        uint64_t firstItem;
+    };
+    WriteAssemblyOutputData writeAssemblyOutputData;
+    uint64_t appendAssembledSequence(
+        AssemblyGraph::EdgeId,
+        bool reverseComplement,
+        string&) const;
+    void appendGfa1Segment(
+        AssemblyGraph::EdgeId,
+        bool bothStrands,
+        string&) const;
+    void appendGfa1Links(
+        AssemblyGraph::VertexId,
+        bool bothStrands,
+        string&,
+        string& cigarString) const;
+    void appendFastaSequence(
+        AssemblyGraph::EdgeId,
+        string&,
+        vector<OrderedOutputFile::FastaIndexEntry>&) const;
+public:
 
 
 
@@ -1962,6 +2243,41 @@ public:
 
     void storePeakMemoryUsage(uint64_t peakMemoryUsage);
 
+    // Load memory mapped data in a background thread,
+    // while other work is going on. See Prefetcher.hpp.
+    // The argument is a comma separated list of data names,
+    // see forEachMemoryMappedData.
+    // Nothing is done if the data don't fit comfortably in physical memory.
+    // The data being prefetched must not be resized or removed until
+    // waitForPrefetching or cancelPrefetching is called.
+    void startPrefetching(const string& dataNames);
+    void waitForPrefetching();
+    void cancelPrefetching();
+
+    // Distribute memory mapped data across NUMA nodes
+    // according to the NUMA policy. See Numa.hpp.
+    // The argument is a comma separated list of data names,
+    // see forEachMemoryMappedData.
+    // This does nothing unless the NUMA policy is firstTouch.
+    void distributeNumaMemory(const string& dataNames);
+
+    // Give the kernel a hint about how memory mapped data will be accessed.
+    // See MemoryMapped::Vector::advise.
+    // The first argument is a comma separated list of data names,
+    // see forEachMemoryMappedData.
+    void adviseMemoryMappedData(const string& dataNames, MemoryMapped::Advice);
+private:
+    shared_ptr<Prefetcher> prefetcher;
+
+    // Call f for each memory mapped vector or vector of vectors
+    // of the data specified by a comma separated list containing any of
+    // reads, markers, markerGraph, assemblyGraph, all.
+    template<class F> void forEachMemoryMappedData(
+        const string& dataNames,
+        const string& purpose,
+        const F& f) const;
+public:
+
     // Functions and data used by the http server
     // for display of the local assembly graph.
 private:
@@ -5,7 +5,9 @@
 #include "Assembler.hpp"
 #include "AlignmentGraph.hpp"
 #include "compressAlignment.hpp"
+#include "PerformanceProfile.hpp"
 #include "timestamp.hpp"
+#include "Tracing.hpp"
 using namespace shasta;
 
 // Standard libraries.
@@ -297,12 +299,15 @@ void Assembler::computeAlignments(
     data.threadCompressedAlignments.resize(threadCount);
     
     cout << timestamp << "Alignment computation begins." << endl;
+    PerformanceProfile& performanceProfile = PerformanceProfile::instance();
+    performanceProfile.begin("computeAlignments: alignment computation");
     setupLoadBalancing(alignmentCandidates.candidates.size(), batchSize);
     runThreads(&Assembler::computeAlignmentsThreadFunction, threadCount);
     cout << timestamp << "Alignment computation completed." << endl;
 
     // Store alignmentInfos found by each thread in the global alignmentInfos.
     cout << timestamp << "Storing the alignment info objects." << endl;
+    performanceProfile.next("computeAlignments: storing alignments");
     alignmentData.createNew(largeDataName("AlignmentData"), largeDataPageSize);
     
     if (data.storeAlignments) {
@@ -336,7 +341,9 @@ void Assembler::computeAlignments(
 
     cout << "Found and stored " << alignmentData.size() << " good alignments." << endl;
     cout << timestamp << "Creating alignment table." << endl;
+    performanceProfile.next("computeAlignments: creating the alignment table");
     computeAlignmentTable();
+    performanceProfile.end();
 
     const auto tEnd = steady_clock::now();
     const double tTotal = seconds(tEnd - tBegin);
@@ -401,9 +408,11 @@ void Assembler::computeAlignmentsThreadFunction(size_t threadId)
             cout << timestamp << "Working on alignment " << begin;
             cout << " of " << alignmentCandidates.candidates.size() << endl;
         }
+        SHASTA_TRACE_SPAN("computeAlignments batch");
 
         for(size_t i=begin; i!=end; i++) {
             const OrientedReadPair& candidate = alignmentCandidates.candidates[i];
+            SHASTA_TRACE_COUNT(alignmentCandidates, 1);
             SHASTA_ASSERT(candidate.readIds[0] < candidate.readIds[1]);
 
             // Get the oriented read ids, with the first one on strand 0.
@@ -445,6 +454,7 @@ void Assembler::computeAlignmentsThreadFunction(size_t threadId)
                     " of oriented reads " << orientedReadIds[0] << " and " << orientedReadIds[1] <<
                     ". This alignment candidate will be skipped. Error description is: " <<
                     e.what() << endl;
+                SHASTA_TRACE_COUNT(alignmentsRejectedError, 1);
                 continue;
             } catch(...) {
                 std::lock_guard<std::mutex> lock(mutex);
@@ -452,6 +462,7 @@ void Assembler::computeAlignmentsThreadFunction(size_t threadId)
                     "An error occurred while computing a marker alignment "
                     " of oriented reads " << orientedReadIds[0] << " and " << orientedReadIds[1] <<
                     ". This alignment candidate will be skipped. " << endl;
+                SHASTA_TRACE_COUNT(alignmentsRejectedError, 1);
                 continue;
             }
 
@@ -460,11 +471,13 @@ void Assembler::computeAlignmentsThreadFunction(size_t threadId)
             // If the alignment has too few markers, skip it.
             if(alignment.ordinals.size() < minAlignedMarkerCount) {
                 // cout << orientedReadIds[0] << " " << orientedReadIds[1] << " too few markers." << endl;
+                SHASTA_TRACE_COUNT(alignmentsRejectedMinAlignedMarkerCount, 1);
                 continue;
             }
 
             // If the aligned fraction is too small, skip it.
             if(min(alignmentInfo.alignedFraction(0), alignmentInfo.alignedFraction(1)) < minAlignedFraction) {
+                SHASTA_TRACE_COUNT(alignmentsRejectedMinAlignedFraction, 1);
                 continue;
             }
 
@@ -474,6 +487,7 @@ void Assembler::computeAlignmentsThreadFunction(size_t threadId)
             tie(leftTrim, rightTrim) = alignmentInfo.computeTrim();
             if(leftTrim>maxTrim || rightTrim>maxTrim) {
                 // cout << orientedReadIds[0] << " " << orientedReadIds[1] << " too much trim." << endl;
+                SHASTA_TRACE_COUNT(alignmentsRejectedMaxTrim, 1);
                 continue;
             }
 
@@ -481,21 +495,25 @@ void Assembler::computeAlignmentsThreadFunction(size_t threadId)
             // maxSip and maxDrift. Method 0 does that automatically.
             if(alignmentMethod != 0) {
                 if(alignment.maxSkip() > maxSkip) {
+                    SHASTA_TRACE_COUNT(alignmentsRejectedMaxSkip, 1);
                     continue;
                 }
                 if(alignment.maxDrift() > maxDrift) {
+                    SHASTA_TRACE_COUNT(alignmentsRejectedMaxDrift, 1);
                     continue;
                 }
             }
 
             // Skip containing alignments, if so requested.
             if(suppressContainments and alignmentInfo.isContaining(uint32_t(maxTrim))) {
+                SHASTA_TRACE_COUNT(alignmentsRejectedContainment, 1);
                 continue;
             }
 
             // If getting here, this is a good alignment.
             // cout << orientedReadIds[0] << " " << orientedReadIds[1] << " good." << endl;
             threadAlignmentData.push_back(AlignmentData(candidate, alignmentInfo));
+            SHASTA_TRACE_COUNT(alignmentsGood, 1);
 
             // Store the compressed alignment if so configured.
             if (storeAlignments) {
@@ -1,8 +1,10 @@
 // Shasta.
 #include "Assembler.hpp"
 #include "AssembledSegment.hpp"
+#include "CoverageDataWriter.hpp"
 #include "deduplicate.hpp"
 #include "LocalAssemblyGraph.hpp"
+#include "OrderedOutputFile.hpp"
 #include "orderPairs.hpp"
 #include "timestamp.hpp"
 using namespace shasta;
@@ -628,7 +630,11 @@ void Assembler::writeAssemblyGraph(const string& fileName) const
 // Assemble sequence for all edges of the assembly graph.
 void Assembler::assemble(
     size_t threadCount,
-    uint32_t storeCoverageDataCsvLengthThreshold)
+    uint32_t markerGraphEdgeLengthThresholdForConsensus,
+    uint32_t storeCoverageDataCsvLengthThreshold,
+    const string& storeCoverageDataFormat,
+    const string& streamGfaFileName,
+    const string& streamFastaFileName)
 {
     AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
 
@@ -643,6 +649,10 @@ void Assembler::assemble(
          SHASTA_ASSERT(markerGraph.vertexCoverageData.isOpen());
          SHASTA_ASSERT(markerGraph.edgeCoverageData.isOpen());
     }
+    if(storeCoverageDataFormat!="binary" and storeCoverageDataFormat!="csv") {
+        throw runtime_error("Invalid coverage data format " + storeCoverageDataFormat +
+            ". Must be binary or csv.");
+    }
 
     // Adjust the numbers of threads, if necessary.
     if(threadCount == 0) {
@@ -652,11 +662,37 @@ void Assembler::assemble(
 
     // Allocate data structures to store assembly results for each thread.
     assembleData.allocate(threadCount);
+    assembleData.markerGraphEdgeLengthThresholdForConsensus = markerGraphEdgeLengthThresholdForConsensus;
     assembleData.storeCoverageDataCsvLengthThreshold = storeCoverageDataCsvLengthThreshold;
 
     // Create the Coverage directory, if necessary.
     if(assembleData.storeCoverageDataCsvLengthThreshold > 0) {
         filesystem::createDirectory("Coverage");
+        if(storeCoverageDataFormat == "binary") {
+            assembleData.coverageDataWriter = make_shared<CoverageDataWriter>("Coverage");
+        }
+    }
+
+    // If requested, open the GFA and FASTA files that
+    // assembled segments will be streamed to as they are assembled.
+    // The GFA header line is item 0 of the GFA file,
+    // and the segment record for edge i is item i+1.
+    // The bound on pending data limits the memory used to
+    // reorder segments that complete out of order.
+    const uint64_t streamMaxPendingBytes = 1ULL << 30;
+    if(not streamGfaFileName.empty()) {
+        assembleData.gfa = make_shared<OrderedOutputFile>(
+            streamGfaFileName, false, streamMaxPendingBytes);
+        string header = "H\tVN:Z:1.0\n";
+        assembleData.gfa->write(0, 1, header);
+        cout << "Assembled segments will be written to " << streamGfaFileName <<
+            " as they are assembled." << endl;
+    }
+    if(not streamFastaFileName.empty()) {
+        assembleData.fasta = make_shared<OrderedOutputFile>(
+            streamFastaFileName, true, streamMaxPendingBytes);
+        cout << "Assembled segments will be written to " << streamFastaFileName <<
+            " as they are assembled." << endl;
     }
 
     // Attempt to reduce memory fragmentation.
@@ -667,8 +703,19 @@ void Assembler::assemble(
     // Do all the assemblies.
     cout << "Assembly begins for " << assemblyGraph.edgeLists.size() <<
         " edges of the assembly graph." << endl;
-    setupLoadBalancing(assemblyGraph.edgeLists.size(), 1);
+    // When streaming, each batch is one write to each output file
+    // (and one BGZF block if compressed), so use larger batches,
+    // and hand them out in order, so few of them wait to be written.
+    const bool isStreaming = assembleData.gfa or assembleData.fasta;
+    const uint64_t batchSize = isStreaming ? 128 : 1;
+    setupLoadBalancing(assemblyGraph.edgeLists.size(), batchSize, not isStreaming);
     runThreads(&Assembler::assembleThreadFunction, threadCount);
+    if(assembleData.coverageDataWriter) {
+        assembleData.coverageDataWriter->close();
+        assembleData.coverageDataWriter = 0;
+        cout << timestamp << "Coverage data was written to "
+            "Coverage/CoverageData.bin and Coverage/CoverageData.index." << endl;
+    }
 
     // Find the pair(thread, index in thread) that the assembly for each edge is stored in.
     const auto uninitializedPair = make_pair(
@@ -691,7 +738,7 @@ void Assembler::assemble(
         if(assemblyGraph.edges[edgeId].wasRemoved() ||
             !assemblyGraph.isAssembledEdge(edgeId)) {
             assemblyGraph.sequences.append(0);
-            assemblyGraph.repeatCounts.appendVector();
+            assemblyGraph.repeatCounts.append(vector<uint8_t>());
             continue;
         }
         ++assembledEdgeCount;
@@ -710,20 +757,43 @@ void Assembler::assemble(
         MemoryMapped::VectorOfVectors<uint8_t, uint64_t>& threadRepeatCounts =
             *(assembleData.repeatCounts[threadId]);
         const span<uint8_t> vertexRepeatCounts = threadRepeatCounts[i];
-        assemblyGraph.repeatCounts.appendVector();
-        for(uint8_t r: vertexRepeatCounts) {
-            assemblyGraph.repeatCounts.append(r);
-        }
+        assemblyGraph.repeatCounts.append(vertexRepeatCounts.begin(), vertexRepeatCounts.end());
     }
 
 
+    assemblyGraph.repeatCounts.unreserve();
+    cout << "Repeat counts of assembled segments are stored using " <<
+        assemblyGraph.repeatCounts.byteCount() << " bytes." << endl;
+
     // Clean up the results stored by each thread.
     assembleData.free();
 
+    // Finish streamed output. The GFA links can only
+    // be written now, because they require the repeat counts
+    // at the ends of adjacent segments.
+    if(assembleData.fasta) {
+        assembleData.fasta->close();
+        assembleData.fasta = 0;
+        cout << timestamp << "Done writing " << streamFastaFileName << endl;
+    }
+    if(assembleData.gfa) {
+        writeAssemblyOutputData.file = assembleData.gfa.get();
+        writeAssemblyOutputData.fasta = false;
+        writeAssemblyOutputData.bothStrands = false;
+        writeAssemblyOutputData.writeLinks = true;
+        writeAssemblyOutputData.firstItem = 1 + assemblyGraph.edgeLists.size();
+        setupLoadBalancing(assemblyGraph.vertices.size(), 1000);
+        runThreads(&Assembler::writeAssemblyOutputThreadFunction, threadCount);
+        writeAssemblyOutputData.file = 0;
+        assembleData.gfa->close();
+        assembleData.gfa = 0;
+        cout << timestamp << "Done writing " << streamGfaFileName << endl;
+    }
+
     // Compute the total number of bases assembled.
     size_t totalBaseCount = 0;
-    for(size_t i=0; i<assemblyGraph.repeatCounts.totalSize(); i++) {
-        totalBaseCount += assemblyGraph.repeatCounts.begin()[i];
+    for(size_t i=0; i<assemblyGraph.repeatCounts.size(); i++) {
+        totalBaseCount += assemblyGraph.repeatCounts.totalSize(i);
     }
     cout << timestamp << "Assembled a total " << totalBaseCount <<
         " bases for " << assemblyGraph.edgeLists.size() << " assembly graph edges of which " <<
@@ -750,6 +820,12 @@ void Assembler::assembleThreadFunction(size_t threadId)
 
     AssembledSegment assembledSegment;
 
+    // Work areas used for streamed output.
+    string rawSequence;
+    string gfaBuffer;
+    string fastaBuffer;
+    vector<OrderedOutputFile::FastaIndexEntry> fastaIndexEntries;
+
     // Loop over batches allocated to this thread.
     uint64_t begin, end;
     while(getNextBatch(begin, end)) {
@@ -763,14 +839,17 @@ void Assembler::assembleThreadFunction(size_t threadId)
             try {
                 assembleAssemblyGraphEdge(edgeId,
                     assembleData.storeCoverageDataCsvLengthThreshold > 0,
+                    assembleData.markerGraphEdgeLengthThresholdForConsensus,
                     assembledSegment);
             } catch(const std::exception& e) {
+                cancelStreamedOutput();
                 std::lock_guard<std::mutex> lock(mutex);
                 cout << timestamp << "Thread " << threadId <<
                     " threw a standard exception while processing assembly graph edge " << edgeId << ":" << endl;
                 cout << e.what() << endl;
                 throw;
             } catch(...) {
+                cancelStreamedOutput();
                 std::lock_guard<std::mutex> lock(mutex);
                 cout << timestamp << "Thread " << threadId <<
                     " threw a non-standard exception while processing assembly graph edge " << edgeId << endl;
@@ -790,13 +869,68 @@ void Assembler::assembleThreadFunction(size_t threadId)
             }
 
             // If requested and the assembled segment is sufficiently long,
-            // write coverage information in csv format.
+            // write coverage information in binary or csv format.
             if(
                 (assembleData.storeCoverageDataCsvLengthThreshold > 0)
                 and
                 (assembledSegment.rawSequence.size() > assembleData.storeCoverageDataCsvLengthThreshold)) {
-                assembledSegment.writeCoverageDataCsv();
+                if(assembleData.coverageDataWriter) {
+                    assembleData.coverageDataWriter->write(assembledSegment);
+                } else {
+                    assembledSegment.writeCoverageDataCsv();
+                }
             }
+
+            // If requested, format the GFA and FASTA records for this segment,
+            // in the same way as writeGfa1 and writeFasta do
+            // (using repeat counts clipped at 255, as stored).
+            if(assembleData.gfa or assembleData.fasta) {
+                rawSequence.clear();
+                for(uint64_t i=0; i<assembledSegment.runLengthSequence.size(); i++) {
+                    rawSequence.append(
+                        min(uint32_t(255), assembledSegment.repeatCounts[i]),
+                        assembledSegment.runLengthSequence[i].character());
+                }
+                if(assembleData.gfa) {
+                    const uint64_t averageEdgeCoverage =
+                        assemblyGraph.edges[edgeId].averageEdgeCoverage;
+                    gfaBuffer += "S\t";
+                    gfaBuffer += to_string(edgeId);
+                    gfaBuffer += "\t";
+                    gfaBuffer += rawSequence;
+                    gfaBuffer += "\tRC:i:";
+                    gfaBuffer += to_string(averageEdgeCoverage * assembledSegment.runLengthSequence.size());
+                    gfaBuffer += "\n";
+                }
+                if(assembleData.fasta) {
+                    const string name = to_string(edgeId);
+                    fastaBuffer += ">";
+                    fastaBuffer += name;
+                    fastaBuffer += " length ";
+                    fastaBuffer += to_string(rawSequence.size());
+                    fastaBuffer += "\n";
+                    OrderedOutputFile::FastaIndexEntry fastaIndexEntry;
+                    fastaIndexEntry.name = name;
+                    fastaIndexEntry.length = rawSequence.size();
+                    fastaIndexEntry.offset = fastaBuffer.size();
+                    fastaIndexEntries.push_back(fastaIndexEntry);
+                    fastaBuffer += rawSequence;
+                    fastaBuffer += "\n";
+                }
+            }
+        }
+
+        // Pass streamed output for this batch to the output files.
+        // This must be done even if no segments were assembled in this batch,
+        // so the output files know that this batch is done.
+        if(assembleData.gfa) {
+            assembleData.gfa->write(begin + 1, end + 1, gfaBuffer);
+            gfaBuffer.clear();
+        }
+        if(assembleData.fasta) {
+            assembleData.fasta->write(begin, end, fastaBuffer, fastaIndexEntries);
+            fastaBuffer.clear();
+            fastaIndexEntries.clear();
         }
     }
 
@@ -806,6 +940,21 @@ void Assembler::assembleThreadFunction(size_t threadId)
 
 
 
+// If assembly of a segment fails, the batch containing it will never
+// be passed to the streamed output files. Cancel them, so other threads
+// don't wait for it.
+void Assembler::cancelStreamedOutput()
+{
+    if(assembleData.gfa) {
+        assembleData.gfa->cancel();
+    }
+    if(assembleData.fasta) {
+        assembleData.fasta->cancel();
+    }
+}
+
+
+
 void Assembler::AssembleData::allocate(size_t threadCount)
 {
     edges.resize(threadCount);
@@ -896,11 +1045,7 @@ void Assembler::computeAssemblyStatistics()
             continue;
         }
         assembledEdgeCount++;
-        const span<uint8_t> repeatCounts = assemblyGraph.repeatCounts[edgeId];
-        size_t length = 0;
-        for(uint8_t repeatCount: repeatCounts) {
-            length += repeatCount;
-        }
+        const size_t length = assemblyGraph.repeatCounts.totalSize(edgeId);
         edgeTable.push_back(make_pair(edgeId, length));
         totalLength += length;
     }
@@ -948,362 +1093,341 @@ void Assembler::computeAssemblyStatistics()
 
 // Write the assembly graph in GFA 1.0 format defined here:
 // https://github.com/GFA-spec/GFA-spec/blob/master/GFA1.md
-void Assembler::writeGfa1(const string& fileName)
+// Only one of each pair of reverse complemented edges is written.
+void Assembler::writeGfa1(const string& fileName, size_t threadCount)
 {
-    AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
-    using VertexId = AssemblyGraph::VertexId;
-    using EdgeId = AssemblyGraph::EdgeId;
-
     cout << timestamp << "writeGfa1 begins" << endl;
+    writeAssemblyOutput(fileName, false, false, threadCount);
+    cout << timestamp << "writeGfa1 ends" << endl;
+}
 
-    ofstream gfa(fileName);
 
-    // Write the header line.
-    gfa << "H\tVN:Z:1.0\n";
 
-    // Write a segment record for each edge.
-    for(EdgeId edgeId=0; edgeId<assemblyGraph.sequences.size(); edgeId++) {
-        if(assemblyGraph.edges[edgeId].wasRemoved()) {
-            continue;
-        }
+// Write the assembly graph in GFA 1.0 format defined here:
+// https://github.com/GFA-spec/GFA-spec/blob/master/GFA1.md
+// This version writes a GFA file containing both strands.
+void Assembler::writeGfa1BothStrands(const string& fileName, size_t threadCount)
+{
+    cout << timestamp << "writeGfa1BothStrands begins" << endl;
+    writeAssemblyOutput(fileName, false, true, threadCount);
+    cout << timestamp << "writeGfa1BothStrands ends" << endl;
+}
 
-        // Only output one of each pair of reverse complemented edges.
-        if(!assemblyGraph.isAssembledEdge(edgeId)) {
-            continue;
-        }
 
-        const auto sequence = assemblyGraph.sequences[edgeId];
-        const auto repeatCounts = assemblyGraph.repeatCounts[edgeId];
-        SHASTA_ASSERT(sequence.baseCount == repeatCounts.size());
-        gfa << "S\t" << edgeId << "\t";
 
-        // Write the sequence.
-        for(size_t i=0; i<sequence.baseCount; i++) {
-            const Base b = sequence[i];
-            const uint8_t repeatCount = repeatCounts[i];
-            for(size_t k=0; k<repeatCount; k++) {
-                gfa << b;
-            }
-        }
+// Write assembled sequences in FASTA format.
+void Assembler::writeFasta(const string& fileName, size_t threadCount)
+{
+    cout << timestamp << "writeFasta begins" << endl;
+    writeAssemblyOutput(fileName, true, false, threadCount);
+    cout << timestamp << "writeFasta ends" << endl;
+}
 
-        // Write "number of reads" as average edge coverage
-        // times number of bases.
-        const uint32_t averageEdgeCoverage =
-            assemblyGraph.edges[edgeId].averageEdgeCoverage;
-        gfa << "\tRC:i:" << averageEdgeCoverage * sequence.baseCount;
 
-        gfa << "\n";
+
+// Write GFA or FASTA output.
+// The text is formatted in parallel in batches,
+// and the batches are written in order by class OrderedOutputFile.
+// If the file name ends in ".gz", the output is bgzip compressed.
+// For FASTA output, a .fai index is also written.
+void Assembler::writeAssemblyOutput(
+    const string& fileName,
+    bool fasta,
+    bool bothStrands,
+    size_t threadCount)
+{
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+
+    // Adjust the numbers of threads, if necessary.
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
     }
 
+    OrderedOutputFile file(fileName, fasta);
+    writeAssemblyOutputData.file = &file;
+    writeAssemblyOutputData.fasta = fasta;
+    writeAssemblyOutputData.bothStrands = bothStrands;
+    writeAssemblyOutputData.firstItem = 0;
+
+    // The GFA header line is item 0.
+    if(not fasta) {
+        string header = "H\tVN:Z:1.0\n";
+        file.write(0, 1, header);
+        writeAssemblyOutputData.firstItem = 1;
+    }
 
-    // Write GFA links.
-    // For each vertex in the assembly graph there is a link for
-    // each combination of in-edges and out-edges.
-    // Therefore each assembly graph vertex generates a number of
-    // links equal to the product of its in-degree and out-degree.
-    const size_t k = assemblerInfo->k;
-    string cigarString;
-    for(VertexId vertexId=0; vertexId<assemblyGraph.vertices.size(); vertexId++) {
+    // Write a segment record or sequence for each edge.
+    const uint64_t batchSize = 1000;
+    writeAssemblyOutputData.writeLinks = false;
+    setupLoadBalancing(assemblyGraph.sequences.size(), batchSize);
+    runThreads(&Assembler::writeAssemblyOutputThreadFunction, threadCount);
+
+    // For GFA, write the links generated by each vertex.
+    if(not fasta) {
+        writeAssemblyOutputData.firstItem += assemblyGraph.sequences.size();
+        writeAssemblyOutputData.writeLinks = true;
+        setupLoadBalancing(assemblyGraph.vertices.size(), batchSize);
+        runThreads(&Assembler::writeAssemblyOutputThreadFunction, threadCount);
+    }
 
-        // In-edges.
-        const span<EdgeId> edges0 = assemblyGraph.edgesByTarget[vertexId];
+    file.close();
+    writeAssemblyOutputData.file = 0;
+}
 
-        // Out-edges.
-        const span<EdgeId> edges1 = assemblyGraph.edgesBySource[vertexId];
 
-        // Loop over combinations of in-edges and out-edges.
-        for(const EdgeId edge0: edges0) {
-            if(assemblyGraph.edges[edge0].wasRemoved()) {
-                continue;
-            }
-            const EdgeId edge0Rc = assemblyGraph.reverseComplementEdge[edge0];
-
-            // Get the last k repeat counts of edge0.
-            vector<uint8_t> lastRepeatCounts0(k);
-            if(assemblyGraph.isAssembledEdge(edge0)) {
-                const span<uint8_t> storedRepeatCounts0 = assemblyGraph.repeatCounts[edge0];
-                const auto end0 = storedRepeatCounts0.end();
-                copy(end0-k, end0, lastRepeatCounts0.begin());
+
+void Assembler::writeAssemblyOutputThreadFunction(size_t threadId)
+{
+    const WriteAssemblyOutputData& data = writeAssemblyOutputData;
+
+    string buffer;
+    string cigarString;
+    vector<OrderedOutputFile::FastaIndexEntry> fastaIndexEntries;
+
+    // Loop over batches allocated to this thread.
+    uint64_t begin, end;
+    while(getNextBatch(begin, end)) {
+        buffer.clear();
+        fastaIndexEntries.clear();
+        for(uint64_t i=begin; i!=end; i++) {
+            if(data.fasta) {
+                appendFastaSequence(i, buffer, fastaIndexEntries);
+            } else if(data.writeLinks) {
+                appendGfa1Links(i, data.bothStrands, buffer, cigarString);
             } else {
-                SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edge0Rc));
-                const span<uint8_t> storedRepeatCounts0Rc = assemblyGraph.repeatCounts[edge0Rc];
-                const auto begin0Rc = storedRepeatCounts0Rc.begin();
-                copy(begin0Rc, begin0Rc+k, lastRepeatCounts0.begin());
-                std::reverse(lastRepeatCounts0.begin(), lastRepeatCounts0.end());
+                appendGfa1Segment(i, data.bothStrands, buffer);
             }
+        }
+        data.file->write(data.firstItem + begin, data.firstItem + end, buffer, fastaIndexEntries);
+    }
+}
 
-            for(const EdgeId edge1: edges1) {
-                if(assemblyGraph.edges[edge1].wasRemoved()) {
-                    continue;
-                }
-                const EdgeId edge1Rc = assemblyGraph.reverseComplementEdge[edge1];
-
-                // Get the first k repeat counts of edge1.
-                vector<uint8_t> firstRepeatCounts1(k);
-                if(assemblyGraph.isAssembledEdge(edge1)) {
-                    const span<uint8_t> storedRepeatCounts1 = assemblyGraph.repeatCounts[edge1];
-                    const auto begin1 = storedRepeatCounts1.begin();
-                    copy(begin1, begin1+k, firstRepeatCounts1.begin());
-                } else {
-                    SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edge1Rc));
-                    const span<uint8_t> storedRepeatCounts1Rc = assemblyGraph.repeatCounts[edge1Rc];
-                    const auto end1Rc = storedRepeatCounts1Rc.end();
-                    copy(end1Rc-k, end1Rc, firstRepeatCounts1.begin());
-                    std::reverse(firstRepeatCounts1.begin(), firstRepeatCounts1.end());
-                }
 
-                // Construct the cigar string.
-                constructCigarString(
-                    span<uint8_t>(
-                        lastRepeatCounts0.data(),
-                        lastRepeatCounts0.data() + lastRepeatCounts0.size()),
-                    span<uint8_t>(
-                        firstRepeatCounts1.data(),
-                        firstRepeatCounts1.data() + firstRepeatCounts1.size()),
-                    cigarString);
 
-                // Keep track of which edges are actually assembled and output.
-                EdgeId edge0Out = edge0;
-                EdgeId edge1Out = edge1;
-                bool reverse0 = false;
-                bool reverse1 = false;
-                if(!assemblyGraph.isAssembledEdge(edge0Out)) {
-                    edge0Out = assemblyGraph.reverseComplementEdge[edge0Out];
-                    reverse0 = true;
-                }
-                if(!assemblyGraph.isAssembledEdge(edge1Out)) {
-                    edge1Out = assemblyGraph.reverseComplementEdge[edge1Out];
-                    reverse1 = true;
-                }
+// Append to a string the raw sequence of an assembled edge,
+// reverse complemented if requested.
+// Returns the number of bases appended.
+uint64_t Assembler::appendAssembledSequence(
+    AssemblyGraph::EdgeId edgeId,
+    bool reverseComplement,
+    string& s) const
+{
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edgeId));
+    const auto sequence = assemblyGraph.sequences[edgeId];
+    const PackedRepeatCounts& repeatCounts = assemblyGraph.repeatCounts;
+    SHASTA_ASSERT(sequence.baseCount == repeatCounts.size(edgeId));
 
-                // Avoid writing links twice.
-                if(edge0Out > edge1Out) {
-                    continue;
-                }
-                if(edge0Out == edge1Out && reverse0) {
-                    continue;
-                }
+    const uint64_t length = repeatCounts.totalSize(edgeId);
+    s.reserve(s.size() + length);
 
-                // Write out the link record for this edge.
-                gfa << "L\t" <<
-                    edge0Out << "\t" <<
-                    (reverse0 ? "-" : "+") << "\t" <<
-                    edge1Out << "\t" <<
-                    (reverse1 ? "-" : "+") << "\t" <<
-                    cigarString << "\n";
-            }
+    if(reverseComplement) {
+        for(size_t i=0; i<sequence.baseCount; i++) {
+            const size_t j = sequence.baseCount - 1 - i;
+            s.append(repeatCounts.get(edgeId, j), sequence[j].complement().character());
         }
+    } else {
+        for(size_t i=0; i<sequence.baseCount; i++) {
+            s.append(repeatCounts.get(edgeId, i), sequence[i].character());
+        }
+    }
+    return length;
+}
 
+
+
+// Append the GFA segment record for an assembly graph edge.
+// If bothStrands is false, only one of each pair
+// of reverse complemented edges is written.
+void Assembler::appendGfa1Segment(
+    AssemblyGraph::EdgeId edgeId,
+    bool bothStrands,
+    string& s) const
+{
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    if(assemblyGraph.edges[edgeId].wasRemoved()) {
+        return;
     }
-    cout << timestamp << "writeGfa1 ends" << endl;
+
+    // Figure out which stored sequence to write.
+    // If writing both strands and this edge was not assembled,
+    // we write out the reverse complemented sequence of the
+    // reverse complemented edge.
+    AssemblyGraph::EdgeId storedEdgeId = edgeId;
+    bool reverseComplement = false;
+    if(!assemblyGraph.isAssembledEdge(edgeId)) {
+        if(!bothStrands) {
+            return;
+        }
+        storedEdgeId = assemblyGraph.reverseComplementEdge[edgeId];
+        reverseComplement = true;
+    }
+
+    s += "S\t";
+    s += to_string(edgeId);
+    s += "\t";
+    appendAssembledSequence(storedEdgeId, reverseComplement, s);
+
+    // Write "number of reads" as average edge coverage
+    // times number of bases.
+    const uint64_t averageEdgeCoverage =
+        assemblyGraph.edges[edgeId].averageEdgeCoverage;
+    s += "\tRC:i:";
+    s += to_string(averageEdgeCoverage * assemblyGraph.sequences[storedEdgeId].baseCount);
+    s += "\n";
 }
 
 
 
-// Write the assembly graph in GFA 1.0 format defined here:
-// https://github.com/GFA-spec/GFA-spec/blob/master/GFA1.md
-// This version writes a GFA file containing both strands.
-void Assembler::writeGfa1BothStrands(const string& fileName)
+// Append the GFA link records generated by an assembly graph vertex.
+// There is a link for each combination of in-edges and out-edges.
+// Therefore each assembly graph vertex generates a number of
+// links equal to the product of its in-degree and out-degree.
+void Assembler::appendGfa1Links(
+    AssemblyGraph::VertexId vertexId,
+    bool bothStrands,
+    string& s,
+    string& cigarString) const
 {
-    AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
-    using VertexId = AssemblyGraph::VertexId;
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
     using EdgeId = AssemblyGraph::EdgeId;
+    const size_t k = assemblerInfo->k;
 
-    cout << timestamp << "writeGfa1BothStrands begins" << endl;
-
-    ofstream gfa(fileName);
+    // In-edges.
+    const span<const EdgeId> edges0 = assemblyGraph.edgesByTarget[vertexId];
 
-    // Write the header line.
-    gfa << "H\tVN:Z:1.0\n";
+    // Out-edges.
+    const span<const EdgeId> edges1 = assemblyGraph.edgesBySource[vertexId];
 
-    // Write a segment record for each edge.
-    for(EdgeId edgeId=0; edgeId<assemblyGraph.sequences.size(); edgeId++) {
-        if(assemblyGraph.edges[edgeId].wasRemoved()) {
+    // Loop over combinations of in-edges and out-edges.
+    const PackedRepeatCounts& repeatCounts = assemblyGraph.repeatCounts;
+    vector<uint8_t> lastRepeatCounts0(k);
+    vector<uint8_t> firstRepeatCounts1(k);
+    for(const EdgeId edge0: edges0) {
+        if(assemblyGraph.edges[edge0].wasRemoved()) {
             continue;
         }
+        const EdgeId edge0Rc = assemblyGraph.reverseComplementEdge[edge0];
 
-        // Get the id of the reverse complemented edge.
-        const EdgeId edgeIdRc = assemblyGraph.reverseComplementEdge[edgeId];
-
-        // Write the name to make it easy to keep track of reverse
-        // complemented edges.
-        gfa << "S\t" << edgeId << "\t";
-
-        // Write the sequence.
-        size_t sequenceLength;
-        if(assemblyGraph.isAssembledEdge(edgeId)) {
-
-            // This edge was assembled. We can just write the stored sequence.
-            const auto sequence = assemblyGraph.sequences[edgeId];
-            const auto repeatCounts = assemblyGraph.repeatCounts[edgeId];
-            SHASTA_ASSERT(sequence.baseCount == repeatCounts.size());
-            sequenceLength = sequence.baseCount;
-            for(size_t i=0; i<sequence.baseCount; i++) {
-                const Base b = sequence[i];
-                const uint8_t repeatCount = repeatCounts[i];
-                for(size_t k=0; k<repeatCount; k++) {
-                    gfa << b;
-                }
-            }
+        // Get the last k repeat counts of edge0.
+        if(assemblyGraph.isAssembledEdge(edge0)) {
+            const uint64_t n0 = repeatCounts.size(edge0);
+            repeatCounts.get(edge0, n0-k, n0, lastRepeatCounts0);
         } else {
+            SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edge0Rc));
+            repeatCounts.get(edge0Rc, 0, k, lastRepeatCounts0);
+            std::reverse(lastRepeatCounts0.begin(), lastRepeatCounts0.end());
+        }
 
-            // This edge was not assembled. We write out the reverse
-            // complemented sequence of the reverse complemented edge.
-            SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edgeIdRc));
-            const auto sequence = assemblyGraph.sequences[edgeIdRc];
-            const auto repeatCounts = assemblyGraph.repeatCounts[edgeIdRc];
-            SHASTA_ASSERT(sequence.baseCount == repeatCounts.size());
-            sequenceLength = sequence.baseCount;
-            for(size_t i=0; i<sequence.baseCount; i++) {
-                const size_t j = sequence.baseCount - 1 - i;
-                const Base b = sequence[j].complement();
-                const uint8_t repeatCount = repeatCounts[j];
-                for(size_t k=0; k<repeatCount; k++) {
-                    gfa << b;
-                }
+        for(const EdgeId edge1: edges1) {
+            if(assemblyGraph.edges[edge1].wasRemoved()) {
+                continue;
             }
+            const EdgeId edge1Rc = assemblyGraph.reverseComplementEdge[edge1];
 
+            // Get the first k repeat counts of edge1.
+            if(assemblyGraph.isAssembledEdge(edge1)) {
+                repeatCounts.get(edge1, 0, k, firstRepeatCounts1);
+            } else {
+                SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edge1Rc));
+                const uint64_t n1Rc = repeatCounts.size(edge1Rc);
+                repeatCounts.get(edge1Rc, n1Rc-k, n1Rc, firstRepeatCounts1);
+                std::reverse(firstRepeatCounts1.begin(), firstRepeatCounts1.end());
+            }
 
-        }
-
-        // Write "number of reads" as average edge coverage
-        // times number of bases.
-        const uint32_t averageEdgeCoverage =
-            assemblyGraph.edges[edgeId].averageEdgeCoverage;
-        gfa << "\tRC:i:" << averageEdgeCoverage * sequenceLength;
-;
-        gfa << "\n";
-    }
-
-  
-    // Write GFA links.
-    // For each vertex in the assembly graph there is a link for
-    // each combination of in-edges and out-edges.
-    // Therefore each assembly graph vertex generates a number of
-    // links equal to the product of its in-degree and out-degree.
-    const size_t k = assemblerInfo->k;
-    string cigarString;
-    for(VertexId vertexId=0; vertexId<assemblyGraph.vertices.size(); vertexId++) {
+            // Construct the cigar string.
+            constructCigarString(
+                span<uint8_t>(
+                    lastRepeatCounts0.data(),
+                    lastRepeatCounts0.data() + lastRepeatCounts0.size()),
+                span<uint8_t>(
+                    firstRepeatCounts1.data(),
+                    firstRepeatCounts1.data() + firstRepeatCounts1.size()),
+                cigarString);
 
-        // In-edges.
-        const span<EdgeId> edges0 = assemblyGraph.edgesByTarget[vertexId];
+            if(bothStrands) {
 
-        // Out-edges.
-        const span<EdgeId> edges1 = assemblyGraph.edgesBySource[vertexId];
+                // Write out the link record for this edge.
+                // Note that in the double stranded version of GFA
+                // output all links are written with orientation ++.
+                s += "L\t";
+                s += to_string(edge0);
+                s += "\t+\t";
+                s += to_string(edge1);
+                s += "\t+\t";
+                s += cigarString;
+                s += "\n";
 
-        // Loop over in-edges.
-        for(const EdgeId edge0: edges0) {
-            if(assemblyGraph.edges[edge0].wasRemoved()) {
-                continue;
-            }
-            const EdgeId edge0Rc = assemblyGraph.reverseComplementEdge[edge0];
-
-            // Get the last k repeat counts of edge0.
-            vector<uint8_t> lastRepeatCounts0(k);
-            if(assemblyGraph.isAssembledEdge(edge0)) {
-                const span<uint8_t> storedRepeatCounts0 = assemblyGraph.repeatCounts[edge0];
-                const auto end0 = storedRepeatCounts0.end();
-                copy(end0-k, end0, lastRepeatCounts0.begin());
             } else {
-                SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edge0Rc));
-                const span<uint8_t> storedRepeatCounts0Rc = assemblyGraph.repeatCounts[edge0Rc];
-                const auto begin0Rc = storedRepeatCounts0Rc.begin();
-                copy(begin0Rc, begin0Rc+k, lastRepeatCounts0.begin());
-                std::reverse(lastRepeatCounts0.begin(), lastRepeatCounts0.end());
-            }
 
-            // Loop over in-edges.
-            for(const EdgeId edge1: edges1) {
-                if(assemblyGraph.edges[edge1].wasRemoved()) {
-                    continue;
+                // Keep track of which edges are actually assembled and output.
+                EdgeId edge0Out = edge0;
+                EdgeId edge1Out = edge1;
+                bool reverse0 = false;
+                bool reverse1 = false;
+                if(!assemblyGraph.isAssembledEdge(edge0Out)) {
+                    edge0Out = edge0Rc;
+                    reverse0 = true;
                 }
-                const EdgeId edge1Rc = assemblyGraph.reverseComplementEdge[edge1];
-
-                // Get the first k repeat counts of edge1.
-                vector<uint8_t> firstRepeatCounts1(k);
-                if(assemblyGraph.isAssembledEdge(edge1)) {
-                    const span<uint8_t> storedRepeatCounts1 = assemblyGraph.repeatCounts[edge1];
-                    const auto begin1 = storedRepeatCounts1.begin();
-                    copy(begin1, begin1+k, firstRepeatCounts1.begin());
-                } else {
-                    SHASTA_ASSERT(assemblyGraph.isAssembledEdge(edge1Rc));
-                    const span<uint8_t> storedRepeatCounts1Rc = assemblyGraph.repeatCounts[edge1Rc];
-                    const auto end1Rc = storedRepeatCounts1Rc.end();
-                    copy(end1Rc-k, end1Rc, firstRepeatCounts1.begin());
-                    std::reverse(firstRepeatCounts1.begin(), firstRepeatCounts1.end());
+                if(!assemblyGraph.isAssembledEdge(edge1Out)) {
+                    edge1Out = edge1Rc;
+                    reverse1 = true;
                 }
 
-
-                // Construct the cigar string.
-                constructCigarString(
-                    span<uint8_t>(
-                        lastRepeatCounts0.data(),
-                        lastRepeatCounts0.data() + lastRepeatCounts0.size()),
-                    span<uint8_t>(
-                        firstRepeatCounts1.data(),
-                        firstRepeatCounts1.data() + firstRepeatCounts1.size()),
-                    cigarString);
-
+                // Avoid writing links twice.
+                if(edge0Out > edge1Out) {
+                    continue;
+                }
+                if(edge0Out == edge1Out && reverse0) {
+                    continue;
+                }
 
                 // Write out the link record for this edge.
-                // Note that in the double stranded version of GFA
-                // output all links are written with orientation ++.
-                gfa << "L\t" <<
-                    edge0 << "\t+\t" <<
-                    edge1 << "\t+\t" <<
-                    cigarString << "\n";
+                s += "L\t";
+                s += to_string(edge0Out);
+                s += (reverse0 ? "\t-\t" : "\t+\t");
+                s += to_string(edge1Out);
+                s += (reverse1 ? "\t-\t" : "\t+\t");
+                s += cigarString;
+                s += "\n";
             }
         }
     }
-
-    cout << timestamp << "writeGfa1BothStrands ends" << endl;
-
 }
 
 
-// Write assembled sequences in FASTA format.
-void Assembler::writeFasta(const string& fileName)
-{
-    AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
-    using EdgeId = AssemblyGraph::EdgeId;
-
-    cout << timestamp << "writeFasta begins" << endl;
-
-    ofstream fasta(fileName);
 
-    // Write a sequence for each edge of the assembly graph.
-    for(EdgeId edgeId=0; edgeId<assemblyGraph.sequences.size(); edgeId++) {
-        if(assemblyGraph.edges[edgeId].wasRemoved()) {
-            continue;
-        }
-
-        // Only output one of each pair of reverse complemented edges.
-        if(!assemblyGraph.isAssembledEdge(edgeId)) {
-            continue;
-        }
-
-        const auto sequence = assemblyGraph.sequences[edgeId];
-        const auto repeatCounts = assemblyGraph.repeatCounts[edgeId];
-        SHASTA_ASSERT(sequence.baseCount == repeatCounts.size());
-
-        // Compute the length so we can write it in the header.
-        size_t length = 0;
-        for(const uint8_t repeatCount: repeatCounts) {
-            length += repeatCount;
-        }
-
-        fasta << ">" << edgeId << " length " << length << "\n";
-        for(size_t i=0; i<sequence.baseCount; i++) {
-            const Base b = sequence[i];
-            const uint8_t repeatCount = repeatCounts[i];
-            for(size_t k=0; k<repeatCount; k++) {
-                fasta << b;
-            }
-        }
-        fasta << "\n";
+// Append the FASTA record for an assembly graph edge.
+// Only one of each pair of reverse complemented edges is written.
+void Assembler::appendFastaSequence(
+    AssemblyGraph::EdgeId edgeId,
+    string& s,
+    vector<OrderedOutputFile::FastaIndexEntry>& fastaIndexEntries) const
+{
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    if(assemblyGraph.edges[edgeId].wasRemoved()) {
+        return;
+    }
+    if(!assemblyGraph.isAssembledEdge(edgeId)) {
+        return;
     }
-    cout << timestamp << "writeFasta ends" << endl;
 
+    // Get the length so we can write it in the header.
+    const uint64_t length = assemblyGraph.repeatCounts.totalSize(edgeId);
+
+    const string name = to_string(edgeId);
+    s += ">";
+    s += name;
+    s += " length ";
+    s += to_string(length);
+    s += "\n";
+    OrderedOutputFile::FastaIndexEntry fastaIndexEntry;
+    fastaIndexEntry.name = name;
+    fastaIndexEntry.length = length;
+    fastaIndexEntry.offset = s.size();
+    fastaIndexEntries.push_back(fastaIndexEntry);
+    appendAssembledSequence(edgeId, false, s);
+    s += "\n";
 }
 
 
@@ -1756,10 +1880,12 @@ bool Assembler::extractLocalAssemblyGraph(
 // Python-callable.
 AssembledSegment Assembler::assembleAssemblyGraphEdge(
     AssemblyGraph::EdgeId edgeId,
-    bool storeCoverageData)
+    bool storeCoverageData,
+    uint32_t markerGraphEdgeLengthThresholdForConsensus)
 {
     AssembledSegment assembledSegment;
-    assembleAssemblyGraphEdge(edgeId, storeCoverageData, assembledSegment);
+    assembleAssemblyGraphEdge(edgeId, storeCoverageData,
+        markerGraphEdgeLengthThresholdForConsensus, assembledSegment);
     return assembledSegment;
 }
 
@@ -1771,6 +1897,7 @@ AssembledSegment Assembler::assembleAssemblyGraphEdge(
 void Assembler::assembleAssemblyGraphEdge(
     AssemblyGraph::EdgeId edgeId,
     bool storeCoverageData,
+    uint32_t markerGraphEdgeLengthThresholdForConsensus,
     AssembledSegment& assembledSegment)
 {
     AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
@@ -1844,6 +1971,22 @@ void Assembler::assembleAssemblyGraphEdge(
     assembledSegment.edgeOverlappingBaseCounts.resize(assembledSegment.edgeCount);
     for(size_t i=0; i<assembledSegment.edgeCount; i++) {
 
+        // If this marker graph edge was not assembled by assembleMarkerGraphEdges,
+        // compute its consensus on demand.
+        if(not markerGraph.edges[assembledSegment.edgeIds[i]].wasAssembled) {
+            uint8_t overlappingBaseCount;
+            ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail detail;
+            getMarkerGraphEdgeConsensus(
+                assembledSegment.edgeIds[i],
+                markerGraphEdgeLengthThresholdForConsensus,
+                assembledSegment.edgeSequences[i],
+                assembledSegment.edgeRepeatCounts[i],
+                overlappingBaseCount,
+                detail);
+            assembledSegment.edgeOverlappingBaseCounts[i] = overlappingBaseCount;
+            continue;
+        }
+
         const auto& storedConsensus = markerGraph.edgeConsensus[assembledSegment.edgeIds[i]];
         assembledSegment.edgeSequences[i].resize(storedConsensus.size());
         assembledSegment.edgeRepeatCounts[i].resize(storedConsensus.size());
@@ -1952,6 +2095,8 @@ void Assembler::colorGfaBySimilarityToSegment(
 
 // Gather all oriented reads used to assembly each edge of the
 // assembly graph.
+// This is done in a single pass over the assembly graph edges,
+// using a VectorOfVectorsBuilder.
 void Assembler::gatherOrientedReadsByAssemblyGraphEdge(size_t threadCount)
 {
     AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
@@ -1961,31 +2106,28 @@ void Assembler::gatherOrientedReadsByAssemblyGraphEdge(size_t threadCount)
         threadCount = std::thread::hardware_concurrency();
     }
 
+    const uint64_t edgeCount = assemblyGraph.edgeLists.size();
+    gatherOrientedReadsByAssemblyGraphEdgeData.builder =
+        make_shared< MemoryMapped::VectorOfVectorsBuilder<AssemblyGraph::OrientedReadInfo, uint64_t> >
+        (edgeCount, threadCount);
+    setupLoadBalancing(edgeCount, 1);
+    runThreads(&Assembler::gatherOrientedReadsByAssemblyGraphEdgeThreadFunction, threadCount);
+
     assemblyGraph.orientedReadsByEdge.createNew(
         largeDataName("PhasingGraphOrientedReads"), largeDataPageSize);
-    assemblyGraph.orientedReadsByEdge.beginPass1(assemblyGraph.edgeLists.size());
-    setupLoadBalancing(assemblyGraph.edgeLists.size(), 1);
-    runThreads(&Assembler::gatherOrientedReadsByAssemblyGraphEdgePass1, threadCount);
-    assemblyGraph.orientedReadsByEdge.beginPass2();
-    setupLoadBalancing(assemblyGraph.edgeLists.size(), 1);
-    runThreads(&Assembler::gatherOrientedReadsByAssemblyGraphEdgePass2, threadCount);
-    assemblyGraph.orientedReadsByEdge.endPass2();
+    gatherOrientedReadsByAssemblyGraphEdgeData.builder->write(
+        assemblyGraph.orientedReadsByEdge, threadCount);
+    gatherOrientedReadsByAssemblyGraphEdgeData.builder = 0;
 }
 
 
 
-void Assembler::gatherOrientedReadsByAssemblyGraphEdgePass1(size_t threadId)
-{
-    gatherOrientedReadsByAssemblyGraphEdgePass(1);
-}
-void Assembler::gatherOrientedReadsByAssemblyGraphEdgePass2(size_t threadId)
-{
-    gatherOrientedReadsByAssemblyGraphEdgePass(2);
-}
-void Assembler::gatherOrientedReadsByAssemblyGraphEdgePass(int pass)
+void Assembler::gatherOrientedReadsByAssemblyGraphEdgeThreadFunction(size_t threadId)
 {
     AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
-
+    MemoryMapped::VectorOfVectorsBuilder<AssemblyGraph::OrientedReadInfo, uint64_t>& builder =
+        *gatherOrientedReadsByAssemblyGraphEdgeData.builder;
+    vector<AssemblyGraph::OrientedReadInfo> infos;
 
     // Loop over batches assigned to this thread.
     uint64_t begin, end;
@@ -2046,25 +2188,13 @@ void Assembler::gatherOrientedReadsByAssemblyGraphEdgePass(int pass)
 
 
 
-            // Store what we found in the assembly graph.
-            // We don't need to use multithreaded versions of these functions
-            // as each threads works on a different assembly graph edge.
-            if (pass == 1) {
-                assemblyGraph.orientedReadsByEdge.incrementCount(assemblyGraphEdgeId,
-                    data.size());
-            } else {
-                for (const auto& p: data) {
-                    const AssemblyGraph::OrientedReadInfo info(
-                        p.first, p.second.first, p.second.second);
-                    assemblyGraph.orientedReadsByEdge.store(assemblyGraphEdgeId, info);
-                }
-
-                // Reverse, because the above stores them in reverse order.
-                span<AssemblyGraph::OrientedReadInfo> v =
-                    assemblyGraph.orientedReadsByEdge[assemblyGraphEdgeId];
-                std::reverse(v.begin(), v.end());
+            // Store what we found, sorted by oriented read.
+            infos.clear();
+            for (const auto& p: data) {
+                infos.push_back(AssemblyGraph::OrientedReadInfo(
+                    p.first, p.second.first, p.second.second));
             }
-
+            builder.storeVector(threadId, assemblyGraphEdgeId, infos);
         }
 
     }
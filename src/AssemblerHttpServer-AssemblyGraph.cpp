@@ -3,6 +3,7 @@
 // Shasta.
 #include "Assembler.hpp"
 #include "AssembledSegment.hpp"
+#include "AssemblerOptions.hpp"
 #include "LocalAssemblyGraph.hpp"
 #include "platformDependent.hpp"
 using namespace shasta;
@@ -348,7 +349,9 @@ void Assembler::exploreAssemblyGraphEdge(const vector<string>& request, ostream&
 
     // Assemble the sequence and output the requested information to html.
     AssembledSegment assembledSegment;
-    assembleAssemblyGraphEdge(edgeId, false, assembledSegment);
+    assembleAssemblyGraphEdge(edgeId, false,
+        uint32_t(httpServerData.assemblerOptions->assemblyOptions.markerGraphEdgeLengthThresholdForConsensus),
+        assembledSegment);
     assembledSegment.writeHtml(html, showSequence, showDetails, begin, end);
 }
 
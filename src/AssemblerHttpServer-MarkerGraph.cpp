@@ -850,29 +850,20 @@ void Assembler::exploreMarkerGraphEdge(const vector<string>& request, ostream& h
 
 
     // To compute consensus, use the same code used during assembly.
+    // The results are memoized, so viewing the same edge again is fast.
     const uint32_t markerGraphEdgeLengthThresholdForConsensus = 1000;
     vector<Base> spoaSequence;
     vector<uint32_t> spoaRepeatCounts;
     uint8_t spoaOverlappingBaseCount;
     ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail spoaDetail;
-    
-    const spoa::AlignmentType alignmentType = spoa::AlignmentType::kNW;
-    const int8_t match = 1;
-    const int8_t mismatch = -1;
-    const int8_t gap = -1;
-    auto spoaAlignmentEngine = spoa::createAlignmentEngine(alignmentType, match, mismatch, gap);
-    auto spoaAlignmentGraph = spoa::createGraph();
-    
-    computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
+    getMarkerGraphEdgeConsensus(
         edgeId,
         markerGraphEdgeLengthThresholdForConsensus,
-        spoaAlignmentEngine,
-        spoaAlignmentGraph,
         spoaSequence,
         spoaRepeatCounts,
         spoaOverlappingBaseCount,
         spoaDetail,
-        0);
+        false);
 
 
 
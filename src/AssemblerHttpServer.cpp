@@ -2,6 +2,7 @@
 // Shasta.
 #include "Assembler.hpp"
 #include "buildId.hpp"
+#include "PerformanceProfile.hpp"
 #include "platformDependent.hpp"
 using namespace shasta;
 
@@ -865,6 +866,7 @@ void Assembler::writeAssemblySummaryBody(ostream& html)
 	assemblerInfo->peakMemoryUsageForSummaryStats() <<
         "</table>"
         ;
+    PerformanceProfile::instance().writeHtml(html);
 }
 
 
@@ -1068,7 +1070,14 @@ void Assembler::writeAssemblySummaryJson(ostream& json)
         "    \"Elapsed time (hours)\": " << assemblerInfo->assemblyElapsedTimeSeconds/3600. << ",\n"
         "    \"Average CPU utilization\": " << assemblerInfo->averageCpuUtilization << ",\n"
         "    \"Peak Memory utilization (bytes)\": " <<
-	assemblerInfo->peakMemoryUsageForSummaryStats() <<
+	assemblerInfo->peakMemoryUsageForSummaryStats();
+    const PerformanceProfile& performanceProfile = PerformanceProfile::instance();
+    if(not performanceProfile.empty()) {
+        json << ",\n"
+            "    \"Steps\": ";
+        performanceProfile.writeJson(json, "    ");
+    }
+    json <<
 	"\n"
         "  }\n"
 
@@ -3,11 +3,14 @@
 #include "AlignmentGraph.hpp"
 #include "ConsensusCaller.hpp"
 #include "compressAlignment.hpp"
+#include "deduplicate.hpp"
 #include "PeakFinder.hpp"
+#include "PerformanceProfile.hpp"
 #ifdef SHASTA_HTTP_SERVER
 #include "LocalMarkerGraph.hpp"
 #endif
 #include "timestamp.hpp"
+#include "Tracing.hpp"
 using namespace shasta;
 
 // Spoa.
@@ -144,6 +147,8 @@ void Assembler::createMarkerGraphVertices(
     // Update the disjoint set data structure for each alignment
     // in the read graph.
     cout << timestamp << "Disjoint set computation begins." << endl;
+    PerformanceProfile& performanceProfile = PerformanceProfile::instance();
+    performanceProfile.begin("createMarkerGraphVertices: disjoint set computation");
     size_t batchSize = 10000;
     setupLoadBalancing(readGraph.edges.size(), batchSize);
     runThreads(&Assembler::createMarkerGraphVerticesThreadFunction1, threadCount);
@@ -154,6 +159,7 @@ void Assembler::createMarkerGraphVertices(
     // Find the disjoint set that each oriented marker was assigned to.
     // Iterate till each marker has its set representative populated in the parent (lower 64 bits)
     cout << timestamp << "Finding the disjoint set that each oriented marker was assigned to." << endl;
+    performanceProfile.next("createMarkerGraphVertices: finding disjoint set representatives");
     uint64_t pass = 1;
     do {
         (data.disjointSetsPointer)->parentUpdated = 0;
@@ -213,6 +219,7 @@ void Assembler::createMarkerGraphVertices(
     // This way, we allocate data.workArea only after compacting 
     // data.disjointSetTable.
     cout << timestamp << "Counting the number of markers in each disjoint set." << endl;
+    performanceProfile.next("createMarkerGraphVertices: counting markers in disjoint sets");
     data.workArea.createNew(
         largeDataName("tmp-WorkArea"),
         largeDataPageSize);
@@ -356,6 +363,7 @@ void Assembler::createMarkerGraphVertices(
         largeDataName("tmp-DisjointSetMarkers"),
         largeDataPageSize);
     cout << timestamp << "Gathering markers in disjoint sets, pass1." << endl;
+    performanceProfile.next("createMarkerGraphVertices: gathering markers in disjoint sets");
     data.disjointSetMarkers.beginPass1(disjointSetCount);
     cout << timestamp << "Processing " << data.orientedMarkerCount << " oriented markers." << endl;
     setupLoadBalancing(data.orientedMarkerCount, batchSize);
@@ -371,6 +379,7 @@ void Assembler::createMarkerGraphVertices(
 
     // Sort the markers in each disjoint set.
     cout << timestamp << "Sorting the markers in each disjoint set." << endl;
+    performanceProfile.next("createMarkerGraphVertices: sorting and flagging disjoint sets");
     setupLoadBalancing(disjointSetCount, batchSize);
     runThreads(&Assembler::createMarkerGraphVerticesThreadFunction6, threadCount);
 
@@ -400,6 +409,7 @@ void Assembler::createMarkerGraphVertices(
 
     // Renumber the disjoint sets again, this time without counting the ones marked as bad.
     cout << timestamp << "Renumbering disjoint sets to remove the bad ones." << endl;
+    performanceProfile.next("createMarkerGraphVertices: creating vertices");
     data.workArea.createNew(
         largeDataName("tmp-WorkArea"),
         largeDataPageSize);
@@ -479,6 +489,7 @@ void Assembler::createMarkerGraphVertices(
     // This could be expensive. Remove when we know this code works.
     // cout << timestamp << "Checking marker graph vertices." << endl;
     // checkMarkerGraphVertices(minCoverage, maxCoverage);
+    performanceProfile.end();
 
 
 
@@ -2282,13 +2293,12 @@ void Assembler::transitiveReduction(
     size_t lowCoverageThreshold,
     size_t highCoverageThreshold,
     size_t maxDistance,
-    size_t edgeMarkerSkipThreshold)
+    size_t edgeMarkerSkipThreshold,
+    size_t threadCount)
 {
     // Some shorthands for readability.
     auto& edges = markerGraph.edges;
-    using VertexId = MarkerGraph::VertexId;
     using EdgeId = MarkerGraph::EdgeId;
-    using Edge = MarkerGraph::Edge;
 
     // Initial message.
     cout << timestamp << "Transitive reduction of the marker graph begins." << endl;
@@ -2335,20 +2345,10 @@ void Assembler::transitiveReduction(
     // Check that there are no edges with coverage 0.
     SHASTA_ASSERT(edgesByCoverage[0].size() == 0);
 
-    // Vector to contain vertex distances during each BFS.
-    // Is is set to -1 for vertices not reached by the BFS.
-    MemoryMapped::Vector<int> vertexDistances;
-    vertexDistances.createNew(
-        largeDataName("tmp-flagMarkerGraphWeakEdges-vertexDistances"),
-        largeDataPageSize);
-    vertexDistances.resize(markerGraph.vertexCount());
-    fill(vertexDistances.begin(), vertexDistances.end(), -1);
-
-    // Queue to be used for all BFSs.
-    std::queue<VertexId> q;
-
-    // Vector to store vertices encountered during a BFS.
-    vector<VertexId> bfsVertices;
+    // Adjust the numbers of threads, if necessary.
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
 
 
 
@@ -2400,74 +2400,8 @@ void Assembler::transitiveReduction(
         if(edgesWithThisCoverage.size() == 0) {
             continue;
         }
-        size_t count = 0;
-
-        // Loop over edges with this coverage.
-        for(const EdgeId edgeId: edgesWithThisCoverage) {
-            const Edge& edge = edges[edgeId];
-            if(edge.wasRemovedByTransitiveReduction) {
-                continue;
-            }
-            const VertexId u0 = edge.source;
-            const VertexId u1 = edge.target;
-
-            // Do a forward BFS starting at u0, up to distance maxDistance,
-            // using only edges currently marked as strong
-            // and without using this edge.
-            // If we encounter u1, u1 is reachable from v0 without
-            // using this edge, and so we can mark this edge as weak.
-            q.push(u0);
-            vertexDistances[u0] = 0;
-            bfsVertices.push_back(u0);
-            bool found = false;
-            while(!q.empty()) {
-                const VertexId v0 = q.front();
-                q.pop();
-                const int distance0 = vertexDistances[v0];
-                const int distance1 = distance0 + 1;
-                for(const auto edgeId01: markerGraph.edgesBySource[v0]) {
-                    if(edgeId01 == edgeId) {
-                        continue;
-                    }
-                    const Edge& edge01 = markerGraph.edges[edgeId01];
-                    if(edge01.wasRemovedByTransitiveReduction) {
-                        continue;
-                    }
-                    const VertexId v1 = edge01.target;
-                    if(vertexDistances[v1] >= 0) {
-                        continue;   // We already encountered this vertex.
-                    }
-                    if(v1 == u1) {
-                        // We found it!
-                        found = true;
-                        break;
-                    }
-                    vertexDistances[v1] = distance1;
-                    bfsVertices.push_back(v1);
-                    if(distance1 < int(maxDistance)) {
-                        q.push(v1);
-                    }
-                }
-                if(found) {
-                    break;
-                }
-            }
-
-            if(found) {
-                edges[edgeId].wasRemovedByTransitiveReduction = 1;
-                edges[markerGraph.reverseComplementEdge[edgeId]].wasRemovedByTransitiveReduction = 1;
-                count += 2;
-            }
-
-            // Clean up to be ready to process the next edge.
-            while(!q.empty()) {
-                q.pop();
-            }
-            for(const VertexId v: bfsVertices) {
-                vertexDistances[v] = -1;
-            }
-            bfsVertices.clear();
-        }
+        const uint64_t count = transitiveReductionProcessEdges(
+            edgesWithThisCoverage, false, maxDistance, threadCount);
 
         if(count) {
             cout << timestamp << "Flagged as weak " << count <<
@@ -2479,8 +2413,6 @@ void Assembler::transitiveReduction(
 
     // Clean up our work areas.
     edgesByCoverage.remove();
-    // edgeFlags.remove();
-    vertexDistances.remove();
 
 
 
@@ -2519,13 +2451,12 @@ void Assembler::transitiveReduction(
 void Assembler::reverseTransitiveReduction(
     size_t lowCoverageThreshold,
     size_t highCoverageThreshold,
-    size_t maxDistance)
+    size_t maxDistance,
+    size_t threadCount)
 {
     // Some shorthands for readability.
     auto& edges = markerGraph.edges;
-    using VertexId = MarkerGraph::VertexId;
     using EdgeId = MarkerGraph::EdgeId;
-    using Edge = MarkerGraph::Edge;
 
     // Initial message.
     cout << timestamp << "Reverse transitive reduction of the marker graph begins." << endl;
@@ -2560,20 +2491,10 @@ void Assembler::reverseTransitiveReduction(
     }
     edgesByCoverage.endPass2();
 
-    // Vector to contain vertex distances during each BFS.
-    // Is is set to -1 for vertices not reached by the BFS.
-    MemoryMapped::Vector<int> vertexDistances;
-    vertexDistances.createNew(
-        largeDataName("tmp-flagMarkerGraphWeakEdges-vertexDistances"),
-        largeDataPageSize);
-    vertexDistances.resize(markerGraph.vertexCount());
-    fill(vertexDistances.begin(), vertexDistances.end(), -1);
-
-    // Queue to be used for all BFSs.
-    std::queue<VertexId> q;
-
-    // Vector to store vertices encountered during a BFS.
-    vector<VertexId> bfsVertices;
+    // Adjust the numbers of threads, if necessary.
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
 
 
 
@@ -2585,56 +2506,84 @@ void Assembler::reverseTransitiveReduction(
         if(edgesWithThisCoverage.size() == 0) {
             continue;
         }
-        size_t count = 0;
+        const uint64_t count = transitiveReductionProcessEdges(
+            edgesWithThisCoverage, true, maxDistance, threadCount);
 
-        // Loop over edges with this coverage.
-        for(const EdgeId edgeId: edgesWithThisCoverage) {
-            const Edge& edge = edges[edgeId];
-            if(edge.wasRemovedByTransitiveReduction) {
+        if(count) {
+            cout << timestamp << "Reverse transitive reduction removed " << count <<
+                " edges with coverage " << coverage <<
+                " out of "<< 2*edgesWithThisCoverage.size() << " total." << endl;
+        }
+        removedCount += count;
+    }
+    cout << timestamp << "Reverse transitive reduction removed " << removedCount <<" edges." << endl;
+
+
+    // Clean up our work areas.
+    edgesByCoverage.remove();
+
+    cout << timestamp << "Reverse transitive reduction of the marker graph ends." << endl;
+
+}
+
+
+
+// Process edges with a given coverage for transitive reduction
+// (isReverse=false) or reverse transitive reduction (isReverse=true).
+// See the comments in Assembler.hpp for details.
+uint64_t Assembler::transitiveReductionProcessEdges(
+    const span<MarkerGraph::EdgeId>& edgeIds,
+    bool isReverse,
+    size_t maxDistance,
+    size_t threadCount)
+{
+    auto& edges = markerGraph.edges;
+    using EdgeId = MarkerGraph::EdgeId;
+
+    // The batch size is a compromise between parallelism
+    // and the number of conflicts that have to be resolved sequentially.
+    const uint64_t batchSize = 1000 * threadCount;
+
+    auto& data = transitiveReductionData;
+    data.isReverse = isReverse;
+    data.maxDistance = maxDistance;
+
+    // Work area for BFSs that need to be redone sequentially.
+    TransitiveReductionBfsWorkArea workArea;
+    vector<EdgeId> path;
+
+    uint64_t count = 0;
+    uint64_t conflictCount = 0;
+    for(uint64_t batchBegin=0; batchBegin<edgeIds.size(); batchBegin+=batchSize) {
+        const uint64_t batchEnd = min(uint64_t(edgeIds.size()), batchBegin + batchSize);
+        const uint64_t n = batchEnd - batchBegin;
+
+        // Do the BFSs for this batch speculatively, in parallel.
+        data.edgeIds = span<EdgeId>(edgeIds.begin() + batchBegin, edgeIds.begin() + batchEnd);
+        data.found.resize(n);
+        data.paths.resize(n);
+        setupLoadBalancing(n, 100);
+        runThreads(&Assembler::transitiveReductionThreadFunction, threadCount);
+
+        // Apply the results sequentially, in the same order
+        // used by the sequential algorithm.
+        for(uint64_t i=0; i<n; i++) {
+            const EdgeId edgeId = data.edgeIds[i];
+            if(edges[edgeId].wasRemovedByTransitiveReduction) {
                 continue;
             }
-            const VertexId u0 = edge.target;
-            const VertexId u1 = edge.source;
-
-            // Do a forward BFS starting at u0, up to distance maxDistance,
-            // using only edges currently marked as strong
-            // and without using this edge.
-            // If we encounter u1, u1 is reachable from u0 without
-            // using this edge, and so we can mark this edge as weak.
-            q.push(u0);
-            vertexDistances[u0] = 0;
-            bfsVertices.push_back(u0);
-            bool found = false;
-            while(!q.empty()) {
-                const VertexId v0 = q.front();
-                q.pop();
-                const int distance0 = vertexDistances[v0];
-                const int distance1 = distance0 + 1;
-                for(const auto edgeId01: markerGraph.edgesBySource[v0]) {
-                    if(edgeId01 == edgeId) {
-                        continue;
-                    }
-                    const Edge& edge01 = markerGraph.edges[edgeId01];
-                    if(edge01.wasRemovedByTransitiveReduction) {
-                        continue;
-                    }
-                    const VertexId v1 = edge01.target;
-                    if(vertexDistances[v1] >= 0) {
-                        continue;   // We already encountered this vertex.
-                    }
-                    if(v1 == u1) {
-                        // We found it!
-                        found = true;
+
+            // Check that the path found by the speculative BFS
+            // does not use any edges that were removed earlier in this batch.
+            // If it does, redo the BFS using the current edge flags.
+            bool found = (data.found[i] == 1);
+            if(found) {
+                for(const EdgeId pathEdgeId: data.paths[i]) {
+                    if(edges[pathEdgeId].wasRemovedByTransitiveReduction) {
+                        ++conflictCount;
+                        found = transitiveReductionBfs(edgeId, isReverse, maxDistance, workArea, path);
                         break;
                     }
-                    vertexDistances[v1] = distance1;
-                    bfsVertices.push_back(v1);
-                    if(distance1 < int(maxDistance)) {
-                        q.push(v1);
-                    }
-                }
-                if(found) {
-                    break;
                 }
             }
 
@@ -2643,34 +2592,133 @@ void Assembler::reverseTransitiveReduction(
                 edges[markerGraph.reverseComplementEdge[edgeId]].wasRemovedByTransitiveReduction = 1;
                 count += 2;
             }
+        }
+    }
+
+    if(conflictCount) {
+        cout << "Redid " << conflictCount << " BFSs out of " << edgeIds.size() <<
+            " because of conflicts." << endl;
+    }
+
+    // Release the memory used by the paths.
+    data.edgeIds = span<EdgeId>();
+    data.found.clear();
+    data.found.shrink_to_fit();
+    data.paths.clear();
+    data.paths.shrink_to_fit();
+
+    return count;
+}
+
+
+
+void Assembler::transitiveReductionThreadFunction(size_t threadId)
+{
+    auto& data = transitiveReductionData;
+    TransitiveReductionBfsWorkArea workArea;
+
+    uint64_t begin, end;
+    while(getNextBatch(begin, end)) {
+        SHASTA_TRACE_SPAN("transitiveReduction batch");
+        for(uint64_t i=begin; i!=end; i++) {
+            const bool found = transitiveReductionBfs(
+                data.edgeIds[i], data.isReverse, data.maxDistance,
+                workArea, data.paths[i]);
+            data.found[i] = found ? 1 : 0;
+        }
+    }
+}
+
+
+
+bool Assembler::transitiveReductionBfs(
+    MarkerGraph::EdgeId edgeId,
+    bool isReverse,
+    size_t maxDistance,
+    TransitiveReductionBfsWorkArea& workArea,
+    vector<MarkerGraph::EdgeId>& path) const
+{
+    using VertexId = MarkerGraph::VertexId;
+    using EdgeId = MarkerGraph::EdgeId;
+    using Edge = MarkerGraph::Edge;
 
-            // Clean up to be ready to process the next edge.
-            while(!q.empty()) {
-                q.pop();
+    path.clear();
+    const Edge& edge = markerGraph.edges[edgeId];
+    if(edge.wasRemovedByTransitiveReduction) {
+        return false;
+    }
+    const VertexId u0 = isReverse ? edge.target : edge.source;
+    const VertexId u1 = isReverse ? edge.source : edge.target;
+
+    auto& q = workArea.q;
+    auto& vertexTable = workArea.vertexTable;
+    SHASTA_ASSERT(q.empty());
+    vertexTable.clear();
+
+    // Do a forward BFS starting at u0, up to distance maxDistance,
+    // using only edges currently marked as strong
+    // and without using this edge.
+    // If we encounter u1, u1 is reachable from u0 without
+    // using this edge, and so we can mark this edge as weak.
+    const EdgeId invalidEdgeId = std::numeric_limits<EdgeId>::max();
+    q.push(u0);
+    vertexTable.insert(make_pair(u0, make_pair(0, invalidEdgeId)));
+    bool found = false;
+    VertexId v0Found = std::numeric_limits<VertexId>::max();
+    EdgeId edgeIdFound = invalidEdgeId;
+    SHASTA_TRACE_COUNT(transitiveReductionBfsCount, 1);
+    while(!q.empty()) {
+        const VertexId v0 = q.front();
+        q.pop();
+        SHASTA_TRACE_COUNT(transitiveReductionBfsVertexVisits, 1);
+        const uint64_t distance0 = vertexTable[v0].first;
+        const uint64_t distance1 = distance0 + 1;
+        for(const auto edgeId01: markerGraph.edgesBySource[v0]) {
+            if(edgeId01 == edgeId) {
+                continue;
             }
-            for(const VertexId v: bfsVertices) {
-                vertexDistances[v] = -1;
+            const Edge& edge01 = markerGraph.edges[edgeId01];
+            if(edge01.wasRemovedByTransitiveReduction) {
+                continue;
+            }
+            const VertexId v1 = edge01.target;
+            if(vertexTable.find(v1) != vertexTable.end()) {
+                continue;   // We already encountered this vertex.
+            }
+            if(v1 == u1) {
+                // We found it!
+                found = true;
+                v0Found = v0;
+                edgeIdFound = edgeId01;
+                break;
+            }
+            vertexTable.insert(make_pair(v1, make_pair(distance1, edgeId01)));
+            if(distance1 < maxDistance) {
+                q.push(v1);
             }
-            bfsVertices.clear();
         }
-
-        if(count) {
-            cout << timestamp << "Reverse transitive reduction removed " << count <<
-                " edges with coverage " << coverage <<
-                " out of "<< 2*edgesWithThisCoverage.size() << " total." << endl;
+        if(found) {
+            break;
         }
-        removedCount += count;
     }
-    cout << timestamp << "Reverse transitive reduction removed " << removedCount <<" edges." << endl;
-
 
-    // Clean up our work areas.
-    edgesByCoverage.remove();
-    // edgeFlags.remove();
-    vertexDistances.remove();
+    // Clean up to be ready to process the next edge.
+    while(!q.empty()) {
+        q.pop();
+    }
 
-    cout << timestamp << "Reverse transitive reduction of the marker graph ends." << endl;
+    // If we found a path, store its edges (in reverse order).
+    if(found) {
+        SHASTA_TRACE_COUNT(transitiveReductionBfsFound, 1);
+        path.push_back(edgeIdFound);
+        for(VertexId v=v0Found; v!=u0; ) {
+            const EdgeId e = vertexTable[v].second;
+            path.push_back(e);
+            v = markerGraph.edges[e].source;
+        }
+    }
 
+    return found;
 }
 
 
@@ -2842,27 +2890,34 @@ bool Assembler::markerGraphEdgeDisconnectsLocalStrongSubgraph(
 
 
 // Prune leaves from the strong subgraph of the global marker graph.
-void Assembler::pruneMarkerGraphStrongSubgraph(size_t iterationCount)
+void Assembler::pruneMarkerGraphStrongSubgraph(
+    size_t iterationCount,
+    size_t threadCount)
 {
     // Some shorthands.
     using VertexId = MarkerGraph::VertexId;
     using EdgeId = VertexId;
+    auto& data = pruneMarkerGraphStrongSubgraphData;
 
     // Check that we have what we need.
     checkMarkerGraphVerticesAreAvailable();
     checkMarkerGraphEdgesIsOpen();
 
+    // Adjust the numbers of threads, if necessary.
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
+
     // Get the number of edges.
     auto& edges = markerGraph.edges;
     const EdgeId edgeCount = edges.size();
 
-    // Flags to mark edges to prune at each iteration.
-    MemoryMapped::Vector<bool> edgesToBePruned;
-    edgesToBePruned.createNew(
-        largeDataName("tmp-PruneMarkerGraphStrogngSubgraph"),
+    // Flags to make sure each edge is only stored once.
+    data.isFlagged.createNew(
+        largeDataName("tmp-PruneMarkerGraphStrongSubgraph"),
         largeDataPageSize);
-    edgesToBePruned.resize(edgeCount);
-    fill(edgesToBePruned.begin(), edgesToBePruned.end(), false);
+    data.isFlagged.resize(edgeCount);
+    fill(data.isFlagged.begin(), data.isFlagged.end(), uint8_t(0));
 
     // Clear the wasPruned flag of all edges.
     for(MarkerGraph::Edge& edge: edges) {
@@ -2872,42 +2927,57 @@ void Assembler::pruneMarkerGraphStrongSubgraph(size_t iterationCount)
 
 
     // At each prune iteration we prune one layer of leaves.
+    // An edge can only become prunable if an edge incident
+    // to its source or target was pruned at the previous iteration.
+    // So, after the first iteration, we only need to examine
+    // the edges incident to the vertices of those pruned edges.
+    data.threadEdgesToBePruned.resize(threadCount);
+    vector<EdgeId> edgesToBePruned;
     for(size_t iteration=0; iteration!=iterationCount; iteration++) {
         cout << timestamp << "Begin prune iteration " << iteration << endl;
 
-        // Find the edges to be pruned at each iteration.
-        for(EdgeId edgeId=0; edgeId<edgeCount; edgeId++) {
-            MarkerGraph::Edge& edge = edges[edgeId];
-            if(edge.wasRemovedByTransitiveReduction) {
-                continue;
-            }
-            if(edge.wasPruned) {
-                continue;
-            }
-            if(
-                isForwardLeafOfMarkerGraphPrunedStrongSubgraph(edge.target) ||
-                isBackwardLeafOfMarkerGraphPrunedStrongSubgraph(edge.source)
-                ) {
-                edgesToBePruned[edgeId] = true;
-            }
+        // Find the edges to be pruned at this iteration.
+        // This does not modify any edges, so all threads
+        // see the marker graph as it was at the end of the previous iteration.
+        data.examineAllEdges = (iteration == 0);
+        if(data.examineAllEdges) {
+            cout << "Examining all " << edgeCount << " edges." << endl;
+            setupLoadBalancing(edgeCount, 100000);
+        } else {
+            cout << "The frontier has " << data.frontier.size() << " vertices." << endl;
+            setupLoadBalancing(data.frontier.size(), 1000);
         }
+        runThreads(&Assembler::pruneMarkerGraphStrongSubgraphThreadFunction, threadCount);
 
+        // Gather the edges found by all threads.
+        edgesToBePruned.clear();
+        for(vector<EdgeId>& threadEdges: data.threadEdgesToBePruned) {
+            edgesToBePruned.insert(edgesToBePruned.end(), threadEdges.begin(), threadEdges.end());
+            threadEdges.clear();
+        }
 
+        // Flag the edges we found at this iteration,
+        // and create the frontier for the next iteration.
+        data.frontier.clear();
+        for(const EdgeId edgeId: edgesToBePruned) {
+            MarkerGraph::Edge& edge = edges[edgeId];
+            edge.wasPruned = 1;
+            data.frontier.push_back(edge.source);
+            data.frontier.push_back(edge.target);
+        }
+        deduplicate(data.frontier);
+        cout << "Pruned " << edgesToBePruned.size() << " edges at prune iteration " << iteration << "." << endl;
 
-        // Flag the edges we found at this iteration.
-        EdgeId count = 0;
-        for(EdgeId edgeId=0; edgeId<edgeCount; edgeId++) {
-            if(edgesToBePruned[edgeId]) {
-                edges[edgeId].wasPruned = 1;
-                ++count;
-                edgesToBePruned[edgeId] = false;    // For next iteration.
-            }
+        if(edgesToBePruned.empty()) {
+            break;
         }
-        cout << "Pruned " << count << " edges at prune iteration " << iteration << "." << endl;
     }
 
 
-    edgesToBePruned.remove();
+    data.isFlagged.remove();
+    data.frontier.clear();
+    data.frontier.shrink_to_fit();
+    data.threadEdgesToBePruned.clear();
 
 
     // Count the number of surviving edges in the pruned strong subgraph.
@@ -2923,6 +2993,69 @@ void Assembler::pruneMarkerGraphStrongSubgraph(size_t iterationCount)
 }
 
 
+
+void Assembler::pruneMarkerGraphStrongSubgraphThreadFunction(size_t threadId)
+{
+    using VertexId = MarkerGraph::VertexId;
+    using EdgeId = MarkerGraph::EdgeId;
+    auto& data = pruneMarkerGraphStrongSubgraphData;
+
+    uint64_t begin, end;
+    while(getNextBatch(begin, end)) {
+        if(data.examineAllEdges) {
+            for(EdgeId edgeId=begin; edgeId!=end; edgeId++) {
+                pruneMarkerGraphStrongSubgraphCheckEdge(edgeId, threadId);
+            }
+        } else {
+            for(uint64_t i=begin; i!=end; i++) {
+                const VertexId vertexId = data.frontier[i];
+                for(const EdgeId edgeId: markerGraph.edgesBySource[vertexId]) {
+                    pruneMarkerGraphStrongSubgraphCheckEdge(edgeId, threadId);
+                }
+                for(const EdgeId edgeId: markerGraph.edgesByTarget[vertexId]) {
+                    pruneMarkerGraphStrongSubgraphCheckEdge(edgeId, threadId);
+                }
+            }
+        }
+    }
+}
+
+
+
+// Check if an edge should be pruned at the current iteration
+// of pruneMarkerGraphStrongSubgraph and, if so, store it
+// in the edges to be pruned by this thread.
+// Returns true if the edge is to be pruned.
+bool Assembler::pruneMarkerGraphStrongSubgraphCheckEdge(
+    MarkerGraph::EdgeId edgeId,
+    size_t threadId)
+{
+    auto& data = pruneMarkerGraphStrongSubgraphData;
+
+    const MarkerGraph::Edge& edge = markerGraph.edges[edgeId];
+    if(edge.wasRemovedByTransitiveReduction) {
+        return false;
+    }
+    if(edge.wasPruned) {
+        return false;
+    }
+    if(
+        isForwardLeafOfMarkerGraphPrunedStrongSubgraph(edge.target) ||
+        isBackwardLeafOfMarkerGraphPrunedStrongSubgraph(edge.source)
+        ) {
+
+        // The same edge can be found more than once
+        // when examining the frontier.
+        // Make sure we only store it once.
+        if(__sync_bool_compare_and_swap(&data.isFlagged[edgeId], uint8_t(0), uint8_t(1))) {
+            data.threadEdgesToBePruned[threadId].push_back(edgeId);
+        }
+        return true;
+    }
+    return false;
+}
+
+
 // Find out if a vertex is a forward or backward leaf of the pruned
 // strong subgraph of the marker graph.
 // A forward leaf is a vertex with out-degree 0.
@@ -3130,15 +3263,12 @@ void Assembler::computeMarkerGraphVertexConsensusSequence(
     }
 
 
-    // Loop over all base positions of this marker.
+    // Gather base and repeat count information for all
+    // base positions of this marker, one column for each position.
     const size_t k = assemblerInfo->k;
-    sequence.resize(k);
-    repeatCounts.resize(k);
+    CoverageBatch coverageBatch;
     for(uint32_t position=0; position<uint32_t(k); position++) {
-
-        // Object to store base and repeat count information
-        // at this position.
-        Coverage coverage;
+        coverageBatch.addColumn();
 
         // Loop over markers.
         for(size_t i=0; i<markerCount; i++) {
@@ -3150,22 +3280,27 @@ void Assembler::computeMarkerGraphVertexConsensusSequence(
             uint8_t repeatCount;
             tie(base, repeatCount) = reads->getOrientedReadBaseAndRepeatCount(orientedReadId, markerPosition + position);
 
-            // Add it to the Coverage object.
-            coverage.addRead(AlignedBase(base), orientedReadId.getStrand(), size_t(repeatCount));
+            // Add it to the CoverageBatch.
+            coverageBatch.addRead(AlignedBase(base), orientedReadId.getStrand(), repeatCount);
         }
 
         // Sanity check that all the bases are the same.
-        const vector<CoverageData>& coverageData = coverage.getReadCoverageData();
-        SHASTA_ASSERT(coverageData.size() == markerCount);
-        const Base firstBase = Base(coverageData.front().base);
-        for(const CoverageData& c: coverageData) {
-            SHASTA_ASSERT(Base(c.base) == firstBase);
+        const uint64_t begin = coverageBatch.columnBegin(position);
+        const uint64_t end = coverageBatch.columnEnd(position);
+        SHASTA_ASSERT(end - begin == markerCount);
+        for(uint64_t i=begin; i!=end; i++) {
+            SHASTA_ASSERT(coverageBatch.bases[i] == coverageBatch.bases[begin]);
         }
+    }
 
-        // Compute the consensus.
-        const Consensus consensus = (*consensusCaller)(coverage);
-        sequence[position] = Base(consensus.base);
-        repeatCounts[position] = uint32_t(consensus.repeatCount);
+    // Compute the consensus for all positions.
+    vector<Consensus> consensus;
+    consensusCaller->computeConsensus(coverageBatch, consensus);
+    sequence.resize(k);
+    repeatCounts.resize(k);
+    for(uint32_t position=0; position<uint32_t(k); position++) {
+        sequence[position] = Base(consensus[position].base);
+        repeatCounts[position] = uint32_t(consensus[position].repeatCount);
     }
 }
 
@@ -3202,11 +3337,14 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
         markerGraph.edgeMarkerIntervals[edgeId];
     const size_t markerCount = markerIntervals.size();
     SHASTA_ASSERT(markerCount > 0);
+    SHASTA_TRACE_COUNT(edgeConsensusEdges, 1);
+    SHASTA_TRACE_COUNT(edgeConsensusMarkerIntervals, markerCount);
 
 
 
     // Find out if very long marker intervals are present.
     detail.hasLongMarkerInterval = false;
+    detail.usedSpoa = false;
     for(size_t i=0; i!=markerCount; i++) {
         const MarkerInterval& markerInterval = markerIntervals[i];
         const auto length = markerInterval.ordinals[1] - markerInterval.ordinals[0]; // Number of markers.
@@ -3398,7 +3536,10 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
     // Gather all of the intervening sequences and repeatCounts, keeping track of distinct
     // sequences. For each sequence we store a vector of i values
     // where each sequence appear.
+    // The map is used to find the index of each distinct sequence
+    // in distinctSequences.
     vector< vector<Base> > distinctSequences;
+    std::map<vector<Base>, size_t> distinctSequencesMap;
     vector< vector<size_t> >& distinctSequenceOccurrences = detail.distinctSequenceOccurrences;
     distinctSequenceOccurrences.clear();
     vector<bool> isUsed(markerCount);
@@ -3432,7 +3573,7 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
             Base base;
             uint8_t repeatCount;
             tie(base, repeatCount) = reads->getOrientedReadBaseAndRepeatCount(orientedReadId, position);
-            interveningSequence.push_back(reads->getOrientedReadBase(orientedReadId, position));
+            interveningSequence.push_back(base);
             interveningRepeatCounts[i].push_back(repeatCount);
         }
 
@@ -3453,15 +3594,16 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
         }
 
         // Store, making sure to check if we already encountered this sequence.
-        const auto it = find(distinctSequences.begin(), distinctSequences.end(), interveningSequence);
-        if(it == distinctSequences.end()) {
+        const auto it = distinctSequencesMap.find(interveningSequence);
+        if(it == distinctSequencesMap.end()) {
             // We did not already encountered this sequence.
+            distinctSequencesMap.insert(make_pair(interveningSequence, distinctSequences.size()));
             distinctSequences.push_back(interveningSequence);
             distinctSequenceOccurrences.resize(distinctSequenceOccurrences.size() + 1);
             distinctSequenceOccurrences.back().push_back(i);
         } else {
             // We already encountered this sequence,
-            distinctSequenceOccurrences[it - distinctSequences.begin()].push_back(i);
+            distinctSequenceOccurrences[it->second].push_back(i);
         }
     }
 
@@ -3516,28 +3658,43 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
     }
 
 
-    // We are now ready to compute the spoa alignment for the distinct sequences.
-
-    spoaAlignmentGraph->clear();
-    // Add the sequences to the alignment, in order of decreasing frequency.
+    // We are now ready to compute the alignment for the distinct sequences.
+    vector<string>& msa = detail.msa;
+    msa.clear();
     string sequenceString;
-    for(const auto& p: distinctSequenceTable) {
-        const vector<Base>& distinctSequence = distinctSequences[p.first];
+    if(distinctSequences.size() == 1) {
 
-        // Add it to the alignment.
-        sequenceString.clear();
+        // All the marker intervals we are using have the same sequence.
+        // The alignment is trivial and we don't need spoa.
+        // This gives the same results as using spoa.
+        const vector<Base>& distinctSequence = distinctSequences.front();
         for(const Base base: distinctSequence) {
             sequenceString += base.character();
         }
-        auto alignment = spoaAlignmentEngine->align(sequenceString, spoaAlignmentGraph);
-        spoaAlignmentGraph->add_alignment(alignment, sequenceString);
-    }
-
+        msa.push_back(sequenceString);
 
+    } else {
 
-    // Use spoa to compute the multiple sequence alignment.
-    vector<string>& msa = detail.msa;
-    spoaAlignmentGraph->generate_multiple_sequence_alignment(msa);
+        // Use spoa to compute the multiple sequence alignment.
+        // Add the sequences to the alignment, in order of decreasing frequency,
+        // and with weight equal to their frequency.
+        detail.usedSpoa = true;
+        SHASTA_TRACE_COUNT(edgeConsensusSpoaCalls, 1);
+        SHASTA_TRACE_COUNT(edgeConsensusSpoaSequences, distinctSequenceTable.size());
+        spoaAlignmentGraph->clear();
+        for(const auto& p: distinctSequenceTable) {
+            const vector<Base>& distinctSequence = distinctSequences[p.first];
+
+            // Add it to the alignment.
+            sequenceString.clear();
+            for(const Base base: distinctSequence) {
+                sequenceString += base.character();
+            }
+            auto alignment = spoaAlignmentEngine->align(sequenceString, spoaAlignmentGraph);
+            spoaAlignmentGraph->add_alignment(alignment, sequenceString, p.second);
+        }
+        spoaAlignmentGraph->generate_multiple_sequence_alignment(msa);
+    }
 
     // The length of the alignment.
     // This includes alignment gaps.
@@ -3570,22 +3727,23 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
     // We loop over all positions in the alignment.
     // At each position we compute a consensus base and repeat count.
     // If the consensus bases is not '-', we store the base and repeat count.
+    // First, gather coverage information for all positions in a CoverageBatch.
     vector<uint32_t> positions(markerCount, 0);
+    CoverageBatch coverageBatch;
     for(size_t position=0; position<alignmentLength; position++) {
 
         if(debug) {
-            cout << "Computing consensus repeat count at alignment position " << position << endl;
+            cout << "Gathering coverage at alignment position " << position << endl;
         }
 
-        // Create a Coverage object for this position.
-        Coverage coverage;
+        // Add a column for this position.
+        coverageBatch.addColumn();
 
         // Loop over distinct sequences, in the same order in
         // which we presented them to spoa.
         for(size_t j=0; j<distinctSequenceTable.size(); j++) {
             const auto& p = distinctSequenceTable[j];
             const size_t index = p.first;
-            // const vector<Base>& distinctSequence = distinctSequences[index];
             const vector<size_t>& occurrences = distinctSequenceOccurrences[index];
 
             // Loop over the marker intervals that have this sequence.
@@ -3594,12 +3752,12 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
                 const OrientedReadId orientedReadId = markerInterval.orientedReadId;
                 const AlignedBase base = AlignedBase::fromCharacter(msa[j][position]);
                 if(base.isGap()) {
-                    coverage.addRead(base, orientedReadId.getStrand(), 0);
+                    coverageBatch.addRead(base, orientedReadId.getStrand(), 0);
                     if(debug) {
                         cout << base << " " << 0 << " " << orientedReadId.getStrand() << endl;
                     }
                 } else {
-                    coverage.addRead(
+                    coverageBatch.addRead(
                         base,
                         orientedReadId.getStrand(),
                         interveningRepeatCounts[i][positions[i]]);
@@ -3610,9 +3768,16 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
                 }
             }
         }
+    }
 
-        // Compute the consensus at this position.
-        const Consensus consensus = (*consensusCaller)(coverage);
+    // Compute the consensus at all positions.
+    vector<Consensus> alignedConsensus;
+    consensusCaller->computeConsensus(coverageBatch, alignedConsensus);
+
+    // Store the results.
+    vector<CompressedCoverageData> c;
+    for(size_t position=0; position<alignmentLength; position++) {
+        const Consensus& consensus = alignedConsensus[position];
 
         // If not a gap, store the base and repeat count.
         if(!consensus.base.isGap()) {
@@ -3622,8 +3787,7 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
 
             // Also store detailed coverage data, if requested.
             if(coverageData) {
-                vector<CompressedCoverageData> c;
-                coverage.count(c);
+                coverageBatch.count(position, c);
                 for(const CompressedCoverageData& cd: c) {
                     coverageData->push_back(make_pair(sequence.size()-1, cd));
                 }
@@ -3673,8 +3837,19 @@ void Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
 // to generate alternative assembled sequence.
 void Assembler::simplifyMarkerGraph(
     const vector<size_t>& maxLengthVector, // One value for each iteration.
-    bool debug)
+    bool debug,
+    size_t threadCount)
 {
+    // Adjust the numbers of threads, if necessary.
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
+
+    // Debug output is written sequentially.
+    if(debug) {
+        threadCount = 1;
+    }
+
     // Clear the superbubble flag for all edges.
     for(MarkerGraph::Edge& edge: markerGraph.edges) {
         edge.isSuperBubbleEdge = 0;
@@ -3683,16 +3858,50 @@ void Assembler::simplifyMarkerGraph(
 
 
     // At each iteration we use a different maxLength value.
+    // Each part of each iteration works on a temporary assembly graph.
+    // The assembly graph only depends on which marker graph edges
+    // were removed, so we only recreate it if the previous part
+    // removed any marker graph edges.
+    bool assemblyGraphIsCurrent = false;
     for(size_t iteration=0; iteration<maxLengthVector.size(); iteration++) {
         const size_t maxLength = maxLengthVector[iteration];
         cout << timestamp << "Begin simplifyMarkerGraph iteration " << iteration <<
             " with maxLength = " << maxLength << endl;
-        checkMarkerGraphIsStrandSymmetric();
-        simplifyMarkerGraphIterationPart1(iteration, maxLength, debug);
-        checkMarkerGraphIsStrandSymmetric();
-        simplifyMarkerGraphIterationPart2(iteration, maxLength, debug);
+
+        // Part 1.
+        checkMarkerGraphIsStrandSymmetric(threadCount);
+        if(!assemblyGraphIsCurrent) {
+            createAssemblyGraphEdges();
+            createAssemblyGraphVertices();
+        } else {
+            cout << "Reusing the assembly graph, which was not changed by the previous step." << endl;
+        }
+        const uint64_t part1RemovedCount =
+            simplifyMarkerGraphIterationPart1(iteration, maxLength, debug, threadCount);
+        if(part1RemovedCount > 0) {
+            assemblyGraphPointer->remove();
+        }
+        assemblyGraphIsCurrent = (part1RemovedCount == 0);
+
+        // Part 2.
+        checkMarkerGraphIsStrandSymmetric(threadCount);
+        if(!assemblyGraphIsCurrent) {
+            createAssemblyGraphEdges();
+            createAssemblyGraphVertices();
+        } else {
+            cout << "Reusing the assembly graph, which was not changed by the previous step." << endl;
+        }
+        const uint64_t part2RemovedCount =
+            simplifyMarkerGraphIterationPart2(iteration, maxLength, debug, threadCount);
+        if(part2RemovedCount > 0) {
+            assemblyGraphPointer->remove();
+        }
+        assemblyGraphIsCurrent = (part2RemovedCount == 0);
     }
-    checkMarkerGraphIsStrandSymmetric();
+    if(assemblyGraphIsCurrent) {
+        assemblyGraphPointer->remove();
+    }
+    checkMarkerGraphIsStrandSymmetric(threadCount);
 
 
 
@@ -3740,21 +3949,25 @@ void Assembler::simplifyMarkerGraph(
 // Part 1 of each iteration: handle bubbles.
 // For each set of parallel edges in the assembly graph in which all edges
 // have at most maxLength markers, keep only the one with the highest average coverage.
-void Assembler::simplifyMarkerGraphIterationPart1(
+// This uses the assembly graph currently stored in assemblyGraphPointer
+// and returns the number of marker graph edges that were flagged as
+// isSuperBubbleEdge.
+uint64_t Assembler::simplifyMarkerGraphIterationPart1(
     size_t iteration,
     size_t maxLength,
-    bool debug)
+    bool debug,
+    size_t threadCount)
 {
+    auto& data = simplifyMarkerGraphData;
+    data.maxLength = maxLength;
+    data.debug = debug;
+
     // Setup debug output for this iteration, if requested.
-    ofstream debugOut;
     if(debug) {
-        debugOut.open("simplifyMarkerGraphIterationPart1-" + to_string(iteration) + ".debugLog");
+        data.debugOut.open("simplifyMarkerGraphIterationPart1-" + to_string(iteration) + ".debugLog");
     }
 
-    // Create a temporary assembly graph.
-    createAssemblyGraphEdges();
-    createAssemblyGraphVertices();
-    AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
     if(debug) {
         assemblyGraph.writeGraphviz("AssemblyGraph-simplifyMarkerGraphIterationPart1-" + to_string(iteration) + ".dot");
     }
@@ -3764,101 +3977,158 @@ void Assembler::simplifyMarkerGraphIterationPart1(
 
 
 
-    // Loop over vertices in the assembly graph.
-    vector<bool> keepAssemblyGraphEdge(assemblyGraph.edges.size(), true);
-    for(AssemblyGraph::VertexId v0=0; v0<assemblyGraph.vertices.size(); v0++) {
-
-        // Get edges that have this vertex as the source.
-        const span<AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
-
-        // If any of these edges have more than maxLength markers, do nothing.
-        bool longEdgeExists = false;
-        for(AssemblyGraph::EdgeId edgeId: outEdges) {
-            if(assemblyGraph.edgeLists.size(edgeId) > maxLength) {
-                longEdgeExists = true;
-                break;
-            }
-        }
-        if(longEdgeExists) {
-            continue;
-        }
-
-        // Gather the out edges, for each target.
-        // Map key = target vertex id
-        // Map value: pairs(edgeId, average coverage).
-        std::map<AssemblyGraph::VertexId, vector< pair<AssemblyGraph::EdgeId, uint32_t> > > edgeTable;
-        for(AssemblyGraph::EdgeId edgeId: outEdges) {
-            const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
-            edgeTable[edge.target].push_back(make_pair(edgeId, edge.averageEdgeCoverage));
-        }
-
-        // For each set of parallel edges, only keep the one with the highest average coverage.
-        for (auto& p : edgeTable) {
-            const AssemblyGraph::VertexId v1 = p.first;
-            if (v1 == assemblyGraph.reverseComplementVertex[v0]) {
-                // v0 and v1 are reverse complement of each other: skip for now.
-                continue;
-            }
-            vector< pair<AssemblyGraph::EdgeId, uint32_t> >& v = p.second;
-            if(v.size() < 2) {
-                continue;
-            }
-            sort(v.begin(), v.end(), OrderPairsBySecondOnlyGreater<AssemblyGraph::EdgeId, uint32_t>());
-            for(auto it=v.begin()+1; it!=v.end(); ++it) {
-                keepAssemblyGraphEdge[it->first] = false;
-            }
-            if(debug) {
-                debugOut << "Parallel edges:\n";
-                for(const auto& p: v) {
-                    const AssemblyGraph::EdgeId edgeId = p.first;
-                    const uint32_t averageCoverage = p.second;
-                    debugOut << edgeId << " " << assemblyGraph.edgeLists.size(edgeId) <<
-                        " " << averageCoverage << "\n";
-                }
-            }
-        }
-    }
+    // Loop over vertices in the assembly graph, in parallel.
+    // Each thread only modifies keepAssemblyGraphEdge for
+    // out-edges of the vertices it processes.
+    data.keepAssemblyGraphEdge.assign(assemblyGraph.edges.size(), 1);
+    setupLoadBalancing(assemblyGraph.vertices.size(), 10000);
+    runThreads(&Assembler::simplifyMarkerGraphIterationPart1ThreadFunction, threadCount);
 
     // Mark as superbubble edges all marker graph edges that correspond
     // to assembly graph edges not marked to be kept.
     // Whenever marking an edge, always also mark the reverse complemented edge,
     // so we keep the marker graph strand-symmetric.
-    for(AssemblyGraph::EdgeId assemblyGraphEdgeId=0; assemblyGraphEdgeId<assemblyGraph.edges.size(); assemblyGraphEdgeId++) {
-        if(keepAssemblyGraphEdge[assemblyGraphEdgeId]) {
-            continue;
-        }
+    const uint64_t removedCount = simplifyMarkerGraphFlagEdges(true);
+    cout << "Iteration " << iteration << " part 1 removed " << removedCount <<
+        " marker graph edges." << endl;
 
-        const span<MarkerGraph::EdgeId> markerGraphEdges = assemblyGraph.edgeLists[assemblyGraphEdgeId];
-        for(const MarkerGraph::EdgeId markerGraphEdgeId: markerGraphEdges) {
-            markerGraph.edges[markerGraphEdgeId].isSuperBubbleEdge = 1;
-            markerGraph.edges[markerGraph.reverseComplementEdge[markerGraphEdgeId]].isSuperBubbleEdge = 1;
-        }
+    if(debug) {
+        data.debugOut.close();
     }
+    data.keepAssemblyGraphEdge.clear();
+    data.keepAssemblyGraphEdge.shrink_to_fit();
 
-    // Remove the assembly graph we created at this iteration.
-    assemblyGraph.remove();
-
-
+    return removedCount;
 }
 
 
 
-// Part 2 of each iteration: handle superbubbles.
-void Assembler::simplifyMarkerGraphIterationPart2(
-    size_t iteration,
-    size_t maxLength,
-    bool debug)
+void Assembler::simplifyMarkerGraphIterationPart1ThreadFunction(size_t threadId)
 {
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    auto& data = simplifyMarkerGraphData;
+    const size_t maxLength = data.maxLength;
+    const bool debug = data.debug;
+    ofstream& debugOut = data.debugOut;
+    vector<uint8_t>& keepAssemblyGraphEdge = data.keepAssemblyGraphEdge;
+
+    uint64_t begin, end;
+    while(getNextBatch(begin, end)) {
+        for(AssemblyGraph::VertexId v0=begin; v0!=end; v0++) {
+
+            // Get edges that have this vertex as the source.
+            const span<const AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
+
+            // If any of these edges have more than maxLength markers, do nothing.
+            bool longEdgeExists = false;
+            for(AssemblyGraph::EdgeId edgeId: outEdges) {
+                if(assemblyGraph.edgeLists.size(edgeId) > maxLength) {
+                    longEdgeExists = true;
+                    break;
+                }
+            }
+            if(longEdgeExists) {
+                continue;
+            }
+
+            // Gather the out edges, for each target.
+            // Map key = target vertex id
+            // Map value: pairs(edgeId, average coverage).
+            std::map<AssemblyGraph::VertexId, vector< pair<AssemblyGraph::EdgeId, uint32_t> > > edgeTable;
+            for(AssemblyGraph::EdgeId edgeId: outEdges) {
+                const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
+                edgeTable[edge.target].push_back(make_pair(edgeId, edge.averageEdgeCoverage));
+            }
+
+            // For each set of parallel edges, only keep the one with the highest average coverage.
+            for (auto& p : edgeTable) {
+                const AssemblyGraph::VertexId v1 = p.first;
+                if (v1 == assemblyGraph.reverseComplementVertex[v0]) {
+                    // v0 and v1 are reverse complement of each other: skip for now.
+                    continue;
+                }
+                vector< pair<AssemblyGraph::EdgeId, uint32_t> >& v = p.second;
+                if(v.size() < 2) {
+                    continue;
+                }
+                sort(v.begin(), v.end(), OrderPairsBySecondOnlyGreater<AssemblyGraph::EdgeId, uint32_t>());
+                for(auto it=v.begin()+1; it!=v.end(); ++it) {
+                    keepAssemblyGraphEdge[it->first] = 0;
+                }
+                if(debug) {
+                    debugOut << "Parallel edges:\n";
+                    for(const auto& p: v) {
+                        const AssemblyGraph::EdgeId edgeId = p.first;
+                        const uint32_t averageCoverage = p.second;
+                        debugOut << edgeId << " " << assemblyGraph.edgeLists.size(edgeId) <<
+                            " " << averageCoverage << "\n";
+                    }
+                }
+            }
+        }
+    }
+}
+
+
+
+// Mark as superbubble edges all marker graph edges that correspond
+// to assembly graph edges not marked to be kept in
+// simplifyMarkerGraphData.keepAssemblyGraphEdge.
+// Returns the number of marker graph edges that were not already marked.
+uint64_t Assembler::simplifyMarkerGraphFlagEdges(bool alsoFlagReverseComplement)
+{
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    const vector<uint8_t>& keepAssemblyGraphEdge = simplifyMarkerGraphData.keepAssemblyGraphEdge;
+
+    uint64_t count = 0;
+    for(AssemblyGraph::EdgeId assemblyGraphEdgeId=0; assemblyGraphEdgeId<assemblyGraph.edges.size(); assemblyGraphEdgeId++) {
+        if(keepAssemblyGraphEdge[assemblyGraphEdgeId]) {
+            continue;
+        }
+
+        const span<const MarkerGraph::EdgeId> markerGraphEdges = assemblyGraph.edgeLists[assemblyGraphEdgeId];
+        for(const MarkerGraph::EdgeId markerGraphEdgeId: markerGraphEdges) {
+            MarkerGraph::Edge& edge = markerGraph.edges[markerGraphEdgeId];
+            if(!edge.isSuperBubbleEdge) {
+                edge.isSuperBubbleEdge = 1;
+                ++count;
+            }
+            if(alsoFlagReverseComplement) {
+                MarkerGraph::Edge& edgeRc = markerGraph.edges[markerGraph.reverseComplementEdge[markerGraphEdgeId]];
+                if(!edgeRc.isSuperBubbleEdge) {
+                    edgeRc.isSuperBubbleEdge = 1;
+                    ++count;
+                }
+            }
+        }
+    }
+    return count;
+}
+
+
+
+// Part 2 of each iteration: handle superbubbles.
+// This uses the assembly graph currently stored in assemblyGraphPointer
+// and returns the number of marker graph edges that were flagged as
+// isSuperBubbleEdge.
+// The connected components are processed in parallel.
+uint64_t Assembler::simplifyMarkerGraphIterationPart2(
+    size_t iteration,
+    size_t maxLength,
+    bool debug,
+    size_t threadCount)
+{
+    auto& data = simplifyMarkerGraphData;
+    data.maxLength = maxLength;
+    data.debug = debug;
+
     // Setup debug output for this iteration, if requested.
-    ofstream debugOut;
+    ofstream& debugOut = data.debugOut;
     if(debug) {
         debugOut.open("simplifyMarkerGraphIterationPart2-" + to_string(iteration) + ".debugLog");
     }
 
-    // Create a temporary assembly graph.
-    createAssemblyGraphEdges();
-    createAssemblyGraphVertices();
-    AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
     if(debug) {
         assemblyGraph.writeGraphviz("AssemblyGraph-simplifyMarkerGraphIterationPart2-" + to_string(iteration) + ".dot");
     }
@@ -3891,24 +4161,37 @@ void Assembler::simplifyMarkerGraphIterationPart2(
 
     // Mark as to be kept all assembly graph edges in between components
     // or with length up to maxLength.
-    vector<bool> keepAssemblyGraphEdge(assemblyGraph.edges.size(), false);
+    vector<uint8_t>& keepAssemblyGraphEdge = data.keepAssemblyGraphEdge;
+    keepAssemblyGraphEdge.assign(assemblyGraph.edges.size(), 0);
     for(AssemblyGraph::EdgeId edgeId=0; edgeId<assemblyGraph.edges.size(); edgeId++) {
         const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
         const AssemblyGraph::VertexId v0 = edge.source;
         const AssemblyGraph::VertexId v1 = edge.target;
         if((disjointSets.find_set(v0) != disjointSets.find_set(v1)) or
             (assemblyGraph.edgeLists[edgeId].size() > maxLength)) {
-            keepAssemblyGraphEdge[edgeId] = true;
+            keepAssemblyGraphEdge[edgeId] = 1;
         }
     }
 
 
+    // Store the component each vertex belongs to.
+    // This is used below instead of disjointSets.find_set,
+    // which is not thread safe because it does path compression.
+    vector<AssemblyGraph::VertexId>& vertexComponent = data.vertexComponent;
+    vertexComponent.resize(n);
+    for(AssemblyGraph::VertexId vertexId=0; vertexId<n; vertexId++) {
+        vertexComponent[vertexId] = disjointSets.find_set(vertexId);
+    }
+
+
     // Gather the vertices in each connected component.
     // Note that, because of the way this is done, the vertex ids
     // in each component are sorted.
-    vector< vector<AssemblyGraph::VertexId> > componentTable(n);
+    vector< vector<AssemblyGraph::VertexId> >& componentTable = data.componentTable;
+    componentTable.clear();
+    componentTable.resize(n);
     for(AssemblyGraph::VertexId vertexId=0; vertexId<n; vertexId++) {
-        componentTable[disjointSets.find_set(vertexId)].push_back(vertexId);
+        componentTable[vertexComponent[vertexId]].push_back(vertexId);
     }
 
 
@@ -3917,7 +4200,8 @@ void Assembler::simplifyMarkerGraphIterationPart2(
     // most components come in reverse complemented pairs,
     // and some are self-complementary.
     // Find the pairs.
-    vector< AssemblyGraph::VertexId > rcComponentTable(n);
+    vector< AssemblyGraph::VertexId >& rcComponentTable = data.rcComponentTable;
+    rcComponentTable.resize(n);
     for(AssemblyGraph::VertexId componentId=0; componentId<n; componentId++) {
 
         // Get the assembly graph vertices in this connected component
@@ -3963,11 +4247,13 @@ void Assembler::simplifyMarkerGraphIterationPart2(
     // Find entries and exits.
     // An entry is a vertex with an in-edge from another component.
     // An exit is a vertex with an out-edge to another component.
-    vector<bool> isEntry(n, false);
-    vector<bool> isExit(n, false);
+    vector<bool>& isEntry = data.isEntry;
+    vector<bool>& isExit = data.isExit;
+    isEntry.assign(n, false);
+    isExit.assign(n, false);
     for(AssemblyGraph::VertexId v0=0; v0<n; v0++) {
         const AssemblyGraph::VertexId componentId0 = disjointSets.find_set(v0);
-        const span<AssemblyGraph::EdgeId> inEdges = assemblyGraph.edgesByTarget[v0];
+        const span<const AssemblyGraph::EdgeId> inEdges = assemblyGraph.edgesByTarget[v0];
         for(AssemblyGraph::EdgeId edgeId : inEdges) {
             const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
             SHASTA_ASSERT(edge.target == v0);
@@ -3977,7 +4263,7 @@ void Assembler::simplifyMarkerGraphIterationPart2(
                 break;
             }
         }
-        const span<AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
+        const span<const AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
         for(AssemblyGraph::EdgeId edgeId : outEdges) {
             const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
             SHASTA_ASSERT(edge.source == v0);
@@ -4001,402 +4287,446 @@ void Assembler::simplifyMarkerGraphIterationPart2(
 
 
 
-    // Process one connected component at a time.
-    for(AssemblyGraph::VertexId componentId=0; componentId<n; componentId++) {
+    // Process the connected components in parallel.
+    setupLoadBalancing(n, 1000);
+    runThreads(&Assembler::simplifyMarkerGraphIterationPart2ThreadFunction, threadCount);
 
-        // Get the assembly graph vertices in this connected component
-        // and skip it if it is empty.
-        const vector<AssemblyGraph::VertexId>& component = componentTable[componentId];
-        if(component.empty()) {
-            continue;
-        }
 
-        if(debug) {
-            debugOut << "\nProcessing connected component with " << component.size() <<
-                " assembly/marker graph vertices:" << "\n";
-            for(const AssemblyGraph::VertexId assemblyGraphVertexId: component) {
-                const MarkerGraph::VertexId markerGraphVertexId = assemblyGraph.vertices[assemblyGraphVertexId];
-                debugOut << assemblyGraphVertexId << "/" << markerGraphVertexId;
-                if(isEntry[assemblyGraphVertexId]) {
-                    debugOut << " entry";
-                }
-                if(isExit[assemblyGraphVertexId]) {
-                    debugOut << " exit";
-                }
-                debugOut << "\n";
-            }
-        }
 
+    // Mark as superbubble edges all marker graph edges that correspond
+    // to assembly graph edges not marked to be kept.
+    const uint64_t removedCount = simplifyMarkerGraphFlagEdges(false);
+    cout << "Iteration " << iteration << " part 2 removed " << removedCount <<
+        " marker graph edges." << endl;
 
+    // Clean up.
+    if(debug) {
+        debugOut.close();
+    }
+    keepAssemblyGraphEdge.clear();
+    keepAssemblyGraphEdge.shrink_to_fit();
+    vertexComponent.clear();
+    vertexComponent.shrink_to_fit();
+    componentTable.clear();
+    componentTable.shrink_to_fit();
+    rcComponentTable.clear();
+    rcComponentTable.shrink_to_fit();
+    isEntry.clear();
+    isEntry.shrink_to_fit();
+    isExit.clear();
+    isExit.shrink_to_fit();
+
+    return removedCount;
+}
 
-        // If this component is self-complementary, it requires special handling.
-        // Skip for now.
-        if(rcComponentTable[componentId] == componentId) {
-        	cout << "Skipped a self-complementary component with " <<
-        		component.size() << " vertices." << endl;
-            for(const AssemblyGraph::VertexId v0: component) {
-                const AssemblyGraph::VertexId componentId0 = disjointSets.find_set(v0);
-                const span<AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
-                for(AssemblyGraph::EdgeId edgeId : outEdges) {
-                    const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
-                    SHASTA_ASSERT(edge.source == v0);
-                    const AssemblyGraph::VertexId componentId1 = disjointSets.find_set(edge.target);
-                    if(componentId1 == componentId0) {
-                        keepAssemblyGraphEdge[edgeId] = true;
-                    }
-                }
-            }
-            continue;
-        }
 
-        // This component is not self complementary.
-        // We want to handle each pair of components in the same way.
-        // Only process one of the two in each pair.
-        if(rcComponentTable[componentId] < componentId) {
-            if(debug) {
-                debugOut << "Skipped - reverse complement component will be processed." << endl;
-            }
-            continue;
+
+void Assembler::simplifyMarkerGraphIterationPart2ThreadFunction(size_t threadId)
+{
+    uint64_t begin, end;
+    while(getNextBatch(begin, end)) {
+        for(AssemblyGraph::VertexId componentId=begin; componentId!=end; componentId++) {
+            simplifyMarkerGraphIterationPart2ProcessComponent(componentId);
         }
+    }
+}
+
 
 
+// Process a connected component for part 2 of
+// an iteration of simplifyMarkerGraph.
+void Assembler::simplifyMarkerGraphIterationPart2ProcessComponent(
+    AssemblyGraph::VertexId componentId)
+{
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    auto& data = simplifyMarkerGraphData;
+    const bool debug = data.debug;
+    ofstream& debugOut = data.debugOut;
+    vector<uint8_t>& keepAssemblyGraphEdge = data.keepAssemblyGraphEdge;
+    const vector<AssemblyGraph::VertexId>& vertexComponent = data.vertexComponent;
+    const vector< vector<AssemblyGraph::VertexId> >& componentTable = data.componentTable;
+    const vector<AssemblyGraph::VertexId>& rcComponentTable = data.rcComponentTable;
+    const vector<bool>& isEntry = data.isEntry;
+    const vector<bool>& isExit = data.isExit;
+
+    // Get the assembly graph vertices in this connected component
+    // and skip it if it is empty.
+    const vector<AssemblyGraph::VertexId>& component = componentTable[componentId];
+    if(component.empty()) {
+        return;
+    }
 
-        // Find out if this component has any entries/exits.
-        bool entriesExist = false;
+    if(debug) {
+        debugOut << "\nProcessing connected component with " << component.size() <<
+            " assembly/marker graph vertices:" << "\n";
         for(const AssemblyGraph::VertexId assemblyGraphVertexId: component) {
+            const MarkerGraph::VertexId markerGraphVertexId = assemblyGraph.vertices[assemblyGraphVertexId];
+            debugOut << assemblyGraphVertexId << "/" << markerGraphVertexId;
             if(isEntry[assemblyGraphVertexId]) {
-                entriesExist = true;
-                break;
+                debugOut << " entry";
             }
-        }
-        bool exitsExist = false;
-        for(const AssemblyGraph::VertexId assemblyGraphVertexId: component) {
             if(isExit[assemblyGraphVertexId]) {
-                exitsExist = true;
-                break;
+                debugOut << " exit";
             }
+            debugOut << "\n";
         }
+    }
 
 
 
-        // Handle the case where there are no entries or no exits.
-        // This means that this component is actually an entire connected component
-        // of the full assembly graph (counting all edges).
-        if(!(entriesExist && exitsExist)) {
-            if(debug) {
-                debugOut << "Component skipped because it has no entries or no exits.\n";
-                debugOut << "Due to this, the following edges will be kept:\n";
-            }
-            for(const AssemblyGraph::VertexId v0: component) {
-                const AssemblyGraph::VertexId componentId0 = disjointSets.find_set(v0);
-                const span<AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
-                for(AssemblyGraph::EdgeId edgeId : outEdges) {
-                    const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
-                    SHASTA_ASSERT(edge.source == v0);
-                    const AssemblyGraph::VertexId componentId1 = disjointSets.find_set(edge.target);
-                    if(componentId1 == componentId0) {
-                        keepAssemblyGraphEdge[edgeId] = true;
-                        keepAssemblyGraphEdge[assemblyGraph.reverseComplementEdge[edgeId]] = true;
-                        if(debug) {
-                            debugOut << edgeId << "\n";
-                        }
-                    }
+    // If this component is self-complementary, it requires special handling.
+    // Skip for now.
+    if(rcComponentTable[componentId] == componentId) {
+        {
+            std::lock_guard<std::mutex> lock(mutex);
+            cout << "Skipped a self-complementary component with " <<
+                component.size() << " vertices." << endl;
+        }
+        for(const AssemblyGraph::VertexId v0: component) {
+            const AssemblyGraph::VertexId componentId0 = vertexComponent[v0];
+            const span<const AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
+            for(AssemblyGraph::EdgeId edgeId : outEdges) {
+                const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
+                SHASTA_ASSERT(edge.source == v0);
+                const AssemblyGraph::VertexId componentId1 = vertexComponent[edge.target];
+                if(componentId1 == componentId0) {
+                    keepAssemblyGraphEdge[edgeId] = 1;
                 }
             }
-            continue;
         }
+        return;
+    }
 
+    // This component is not self complementary.
+    // We want to handle each pair of components in the same way.
+    // Only process one of the two in each pair.
+    if(rcComponentTable[componentId] < componentId) {
+        if(debug) {
+            debugOut << "Skipped - reverse complement component will be processed." << endl;
+        }
+        return;
+    }
 
-        // The code below relies on the vertex ids in the component vector to be sorted.
-        // Check for that.
-        SHASTA_ASSERT(std::is_sorted(component.begin(), component.end()));
 
 
+    // Find out if this component has any entries/exits.
+    bool entriesExist = false;
+    for(const AssemblyGraph::VertexId assemblyGraphVertexId: component) {
+        if(isEntry[assemblyGraphVertexId]) {
+            entriesExist = true;
+            break;
+        }
+    }
+    bool exitsExist = false;
+    for(const AssemblyGraph::VertexId assemblyGraphVertexId: component) {
+        if(isExit[assemblyGraphVertexId]) {
+            exitsExist = true;
+            break;
+        }
+    }
 
-        // Create a Boost graph to represent this component.
-        // Vertex descriptors of this graph are indexes into the component vector.
-        // This graph will be used below to compute shortest path,
-        // with edge length defined as the inverse of average edge coverage.
-        using boost::adjacency_list;
-        using boost::listS;
-        using boost::vecS;
-        using boost::directedS;
-        using boost::property;
-        using boost::no_property;
-        using boost::edge_weight_t;
 
-        using Graph = adjacency_list<listS, vecS, directedS, no_property, property<edge_weight_t, double> >;
-        using vertex_descriptor = Graph::vertex_descriptor;
-        using edge_descriptor = Graph::edge_descriptor;
 
-        Graph graph(component.size());
-        auto weightMap = boost::get(boost::edge_weight, graph);
-        for(uint64_t v0=0; v0<component.size(); v0++) {
-            const AssemblyGraph::VertexId vertexId0 = component[v0];
-            const span<AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[vertexId0];
-            for(const AssemblyGraph::EdgeId edgeId: outEdges) {
+    // Handle the case where there are no entries or no exits.
+    // This means that this component is actually an entire connected component
+    // of the full assembly graph (counting all edges).
+    if(!(entriesExist && exitsExist)) {
+        if(debug) {
+            debugOut << "Component skipped because it has no entries or no exits.\n";
+            debugOut << "Due to this, the following edges will be kept:\n";
+        }
+        for(const AssemblyGraph::VertexId v0: component) {
+            const AssemblyGraph::VertexId componentId0 = vertexComponent[v0];
+            const span<const AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
+            for(AssemblyGraph::EdgeId edgeId : outEdges) {
                 const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
-                if(edge.wasRemoved()) {
-                    continue;
+                SHASTA_ASSERT(edge.source == v0);
+                const AssemblyGraph::VertexId componentId1 = vertexComponent[edge.target];
+                if(componentId1 == componentId0) {
+                    keepAssemblyGraphEdge[edgeId] = 1;
+                    keepAssemblyGraphEdge[assemblyGraph.reverseComplementEdge[edgeId]] = 1;
+                    if(debug) {
+                        debugOut << edgeId << "\n";
+                    }
                 }
-                const AssemblyGraph::VertexId vertexId1 = edge.target;
+            }
+        }
+        return;
+    }
+
+
+    // The code below relies on the vertex ids in the component vector to be sorted.
+    // Check for that.
+    SHASTA_ASSERT(std::is_sorted(component.begin(), component.end()));
+
 
-                // Look up vertexId1 in the component vector.
-                // This gives us the vertex descriptor for the target vertex.
-                const auto it = std::lower_bound(component.begin(), component.end(), vertexId1);
-                if(*it != vertexId1) {
-                    // This edge goes outside this component.
-                    continue;
-                }
-                const vertex_descriptor v1 = it - component.begin();
 
-                // Add the edge and set its weight.
-                edge_descriptor e;
-                tie(e, ignore) = add_edge(v0, v1, graph);
-                weightMap[e] = 1. / double(edge.averageEdgeCoverage);
+    // Create a Boost graph to represent this component.
+    // Vertex descriptors of this graph are indexes into the component vector.
+    // This graph will be used below to compute shortest path,
+    // with edge length defined as the inverse of average edge coverage.
+    using boost::adjacency_list;
+    using boost::listS;
+    using boost::vecS;
+    using boost::directedS;
+    using boost::property;
+    using boost::no_property;
+    using boost::edge_weight_t;
+
+    using Graph = adjacency_list<listS, vecS, directedS, no_property, property<edge_weight_t, double> >;
+    using vertex_descriptor = Graph::vertex_descriptor;
+    using edge_descriptor = Graph::edge_descriptor;
+
+    Graph graph(component.size());
+    auto weightMap = boost::get(boost::edge_weight, graph);
+    for(uint64_t v0=0; v0<component.size(); v0++) {
+        const AssemblyGraph::VertexId vertexId0 = component[v0];
+        const span<const AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[vertexId0];
+        for(const AssemblyGraph::EdgeId edgeId: outEdges) {
+            const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
+            if(edge.wasRemoved()) {
+                continue;
             }
-        }
-        if(debug) {
-            BGL_FORALL_EDGES(e, graph, Graph) {
-                const auto v0 = source(e, graph);
-                const auto v1 = target(e, graph);
-                debugOut << v0 << "->" << v1 << " " <<
-                    component[v0] << "->" << component[v1] << " " <<
-                    weightMap[e] << endl;
+            const AssemblyGraph::VertexId vertexId1 = edge.target;
+
+            // Look up vertexId1 in the component vector.
+            // This gives us the vertex descriptor for the target vertex.
+            const auto it = std::lower_bound(component.begin(), component.end(), vertexId1);
+            if(*it != vertexId1) {
+                // This edge goes outside this component.
+                continue;
             }
+            const vertex_descriptor v1 = it - component.begin();
+
+            // Add the edge and set its weight.
+            edge_descriptor e;
+            tie(e, ignore) = add_edge(v0, v1, graph);
+            weightMap[e] = 1. / double(edge.averageEdgeCoverage);
         }
+    }
+    if(debug) {
+        BGL_FORALL_EDGES(e, graph, Graph) {
+            const auto v0 = source(e, graph);
+            const auto v1 = target(e, graph);
+            debugOut << v0 << "->" << v1 << " " <<
+                component[v0] << "->" << component[v1] << " " <<
+                weightMap[e] << endl;
+        }
+    }
 
 
 #if 0
-        // Work areas used for shortest path computation.
-        std::priority_queue<
-            pair<float, AssemblyGraph::VertexId>,
-            vector<pair<float, AssemblyGraph::VertexId> >,
-            OrderPairsByFirstOnlyGreater<size_t, AssemblyGraph::VertexId> > q;
-        vector< pair<float, AssemblyGraph::EdgeId> > sortedOutEdges;
+    // Work areas used for shortest path computation.
+    std::priority_queue<
+        pair<float, AssemblyGraph::VertexId>,
+        vector<pair<float, AssemblyGraph::VertexId> >,
+        OrderPairsByFirstOnlyGreater<size_t, AssemblyGraph::VertexId> > q;
+    vector< pair<float, AssemblyGraph::EdgeId> > sortedOutEdges;
 #endif
 
 
-        // Loop over entry/exit pairs.
-        // We already checked that there is at least one entry
-        // and one exit, so the inner body of this loop
-        // gets executed at least once.
-        for(uint64_t entryIndex=0; entryIndex<component.size(); entryIndex++) {
-            const AssemblyGraph::VertexId entryId = component[entryIndex];
-            if(!isEntry[entryId]) {
-                continue;
-            }
+    // Loop over entry/exit pairs.
+    // We already checked that there is at least one entry
+    // and one exit, so the inner body of this loop
+    // gets executed at least once.
+    for(uint64_t entryIndex=0; entryIndex<component.size(); entryIndex++) {
+        const AssemblyGraph::VertexId entryId = component[entryIndex];
+        if(!isEntry[entryId]) {
+            continue;
+        }
 
-            if(debug) {
-                debugOut << "Computing shortest paths starting at " <<
-                    entryId << "/" << assemblyGraph.vertices[entryId] << "\n";
+        if(debug) {
+            debugOut << "Computing shortest paths starting at " <<
+                entryId << "/" << assemblyGraph.vertices[entryId] << "\n";
+        }
+
+        // Compute shortest paths
+        // from this vertex to all other vertices in this component.
+        using boost::make_iterator_property_map;
+        using boost::get;
+        using boost::vertex_index;
+        using boost::dijkstra_shortest_paths_no_color_map;
+        using boost::predecessor_map;
+        vector< vertex_descriptor > predecessor(component.size());
+        auto predecessorMap = make_iterator_property_map(predecessor.begin(), get(vertex_index, graph));
+        dijkstra_shortest_paths_no_color_map(graph, entryIndex, predecessor_map(predecessorMap));
+        if(debug) {
+            debugOut << "Predecessor map:" << endl;
+            for(vertex_descriptor v=0; v<component.size(); v++) {
+                debugOut << component[v] << " predecessor is " <<
+                    component[predecessor[v]] << endl;
             }
+        }
+
+#if 0
 
-            // Compute shortest paths
-            // from this vertex to all other vertices in this component.
-            using boost::make_iterator_property_map;
-            using boost::get;
-            using boost::vertex_index;
-            using boost::dijkstra_shortest_paths_no_color_map;
-            using boost::predecessor_map;
-            vector< vertex_descriptor > predecessor(component.size());
-            auto predecessorMap = make_iterator_property_map(predecessor.begin(), get(vertex_index, graph));
-            dijkstra_shortest_paths_no_color_map(graph, entryIndex, predecessor_map(predecessorMap));
+        // Compute shortest paths
+        // from this vertex to all other vertices in this component.
+        // Use as edge weight the inverse of average coverage,
+        // so the path prefers high coverage.
+        SHASTA_ASSERT(q.empty());
+        q.push(make_pair(0., entryId));
+        for(const AssemblyGraph::VertexId v: component) {
+            color[v] = 0;
+            predecessorEdge[v] = AssemblyGraph::invalidEdgeId;
+        }
+        color[entryId] = 1;
+        const AssemblyGraph::VertexId entryComponentId = vertexComponent[entryId];
+        while(!q.empty()) {
+
+            // Dequeue.
+            const pair<float, AssemblyGraph::VertexId> p = q.top();
+            const float distance0 = p.first;
+            const AssemblyGraph::VertexId v0 = p.second;
+            q.pop();
             if(debug) {
-                debugOut << "Predecessor map:" << endl;
-                for(vertex_descriptor v=0; v<component.size(); v++) {
-                    debugOut << component[v] << " predecessor is " <<
-                        component[predecessor[v]] << endl;
-                }
+                debugOut << "Dequeued " << v0 << "/" << assemblyGraph.vertices[v0] <<
+                    " at distance " << distance0 << "\n";
             }
+            SHASTA_ASSERT(color[v0] == 1);
 
-#if 0
-
-            // Compute shortest paths
-            // from this vertex to all other vertices in this component.
-            // Use as edge weight the inverse of average coverage,
-            // so the path prefers high coverage.
-            SHASTA_ASSERT(q.empty());
-            q.push(make_pair(0., entryId));
-            for(const AssemblyGraph::VertexId v: component) {
-                color[v] = 0;
-                predecessorEdge[v] = AssemblyGraph::invalidEdgeId;
+            // Find the out edges and sort them.
+            const span<const AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
+            sortedOutEdges.clear();
+            for(const AssemblyGraph::EdgeId e01: outEdges) {
+                sortedOutEdges.push_back(make_pair(1./assemblyGraph.edges[e01].averageEdgeCoverage, e01));
             }
-            color[entryId] = 1;
-            const AssemblyGraph::VertexId entryComponentId = disjointSets.find_set(entryId);
-            while(!q.empty()) {
-
-                // Dequeue.
-                const pair<float, AssemblyGraph::VertexId> p = q.top();
-                const float distance0 = p.first;
-                const AssemblyGraph::VertexId v0 = p.second;
-                q.pop();
-                if(debug) {
-                    debugOut << "Dequeued " << v0 << "/" << assemblyGraph.vertices[v0] <<
-                        " at distance " << distance0 << "\n";
+            sort(sortedOutEdges.begin(), sortedOutEdges.end(),
+                OrderPairsByFirstOnly<double, AssemblyGraph::EdgeId>());
+
+            // Loop over out-edges internal to this component.
+            for(const pair<float, AssemblyGraph::EdgeId>& edgePair: sortedOutEdges) {
+                const AssemblyGraph::EdgeId e01 = edgePair.second;
+                const float length01 = edgePair.first;
+                const AssemblyGraph::VertexId v1 = assemblyGraph.edges[e01].target;
+                if(vertexComponent[v1] != entryComponentId) {
+                    continue;
                 }
-                SHASTA_ASSERT(color[v0] == 1);
-
-                // Find the out edges and sort them.
-                const span<AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[v0];
-                sortedOutEdges.clear();
-                for(const AssemblyGraph::EdgeId e01: outEdges) {
-                    sortedOutEdges.push_back(make_pair(1./assemblyGraph.edges[e01].averageEdgeCoverage, e01));
+                if(color[v1] == 1) {
+                    continue;
                 }
-                sort(sortedOutEdges.begin(), sortedOutEdges.end(),
-                    OrderPairsByFirstOnly<double, AssemblyGraph::EdgeId>());
-
-                // Loop over out-edges internal to this component.
-                for(const pair<float, AssemblyGraph::EdgeId>& edgePair: sortedOutEdges) {
-                    const AssemblyGraph::EdgeId e01 = edgePair.second;
-                    const float length01 = edgePair.first;
-                    const AssemblyGraph::VertexId v1 = assemblyGraph.edges[e01].target;
-                    if(disjointSets.find_set(v1) != entryComponentId) {
-                        continue;
-                    }
-                    if(color[v1] == 1) {
-                        continue;
-                    }
-                    color[v1] = 1;
-                    predecessorEdge[v1] = e01;
-                    const float distance1 = distance0 + length01;
-                    q.push(make_pair(distance1, v1));
-                    if(debug) {
-                        debugOut << "Enqueued " << v1 << "/" << assemblyGraph.vertices[v1] <<
-                            " at distance " << distance1 << "\n";
-                    }
+                color[v1] = 1;
+                predecessorEdge[v1] = e01;
+                const float distance1 = distance0 + length01;
+                q.push(make_pair(distance1, v1));
+                if(debug) {
+                    debugOut << "Enqueued " << v1 << "/" << assemblyGraph.vertices[v1] <<
+                        " at distance " << distance1 << "\n";
                 }
             }
+        }
 #endif
 
 
-            // Loop over all exits.
-            for(uint64_t exitIndex=0; exitIndex<component.size(); exitIndex++) {
-                const AssemblyGraph::VertexId exitId = component[exitIndex];
-                if(!isExit[exitId]) {
-                    continue;
-                }
-                if(exitId == entryId) {
-                    continue;
-                }
+        // Loop over all exits.
+        for(uint64_t exitIndex=0; exitIndex<component.size(); exitIndex++) {
+            const AssemblyGraph::VertexId exitId = component[exitIndex];
+            if(!isExit[exitId]) {
+                continue;
+            }
+            if(exitId == entryId) {
+                continue;
+            }
 
-                if(predecessor[exitIndex] == exitIndex) {
-                    continue;   // This exit is not reachable from this entry.
-                }
+            if(predecessor[exitIndex] == exitIndex) {
+                continue;   // This exit is not reachable from this entry.
+            }
 
-                if(debug) {
-                    debugOut << "The following assembly graph edges will be kept because they are "
-                        "on the shortest path between entry " << entryId << "/" <<
-                        assemblyGraph.vertices[entryId] <<
-                        " and exit " << exitId << "/" << assemblyGraph.vertices[exitId] << "\n";
-                }
+            if(debug) {
+                debugOut << "The following assembly graph edges will be kept because they are "
+                    "on the shortest path between entry " << entryId << "/" <<
+                    assemblyGraph.vertices[entryId] <<
+                    " and exit " << exitId << "/" << assemblyGraph.vertices[exitId] << "\n";
+            }
 
 
 
-                // Mark all the edges on the shortest path from this entry to this exit.
-                // Walk the path backward using the predecessor tree.
-                Graph::vertex_descriptor v1 = exitIndex;
-                while(true) {
-                    const Graph::vertex_descriptor v0 = predecessor[v1];
+            // Mark all the edges on the shortest path from this entry to this exit.
+            // Walk the path backward using the predecessor tree.
+            Graph::vertex_descriptor v1 = exitIndex;
+            while(true) {
+                const Graph::vertex_descriptor v0 = predecessor[v1];
 
-                    // Find the shortest edge v0->v1.
-                    if(debug) {
-                        debugOut << "Looking for best edge " << component[v0] << "->" << component[v1] << endl;
-                    }
-                    double bestCoverage = 0.;
-                    AssemblyGraph::EdgeId bestEdgeId = std::numeric_limits<AssemblyGraph::EdgeId>::max();
-                    const AssemblyGraph::VertexId vertexId0 = component[v0];
-                    const span<AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[vertexId0];
-                    for(const AssemblyGraph::EdgeId edgeId: outEdges) {
-                        const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
-                        if(edge.wasRemoved()) {
-                            continue;
-                        }
-                        const AssemblyGraph::VertexId vertexId1 = edge.target;
-                        if(vertexId1 != component[v1]) {
-                            continue;
-                        }
-
-                        if(edge.averageEdgeCoverage > bestCoverage) {
-                            bestCoverage = edge.averageEdgeCoverage;
-                            bestEdgeId = edgeId;
-                        }
+                // Find the shortest edge v0->v1.
+                if(debug) {
+                    debugOut << "Looking for best edge " << component[v0] << "->" << component[v1] << endl;
+                }
+                double bestCoverage = 0.;
+                AssemblyGraph::EdgeId bestEdgeId = std::numeric_limits<AssemblyGraph::EdgeId>::max();
+                const AssemblyGraph::VertexId vertexId0 = component[v0];
+                const span<const AssemblyGraph::EdgeId> outEdges = assemblyGraph.edgesBySource[vertexId0];
+                for(const AssemblyGraph::EdgeId edgeId: outEdges) {
+                    const AssemblyGraph::Edge& edge = assemblyGraph.edges[edgeId];
+                    if(edge.wasRemoved()) {
+                        continue;
                     }
-                    SHASTA_ASSERT(bestCoverage != 0);
-                    if(debug) {
-                        const AssemblyGraph::Edge& bestEdge = assemblyGraph.edges[bestEdgeId];
-                        debugOut << "Best edge found " << bestEdge.source << "->" << bestEdge.target << endl;
+                    const AssemblyGraph::VertexId vertexId1 = edge.target;
+                    if(vertexId1 != component[v1]) {
+                        continue;
                     }
 
-                    // Mark the best edge and its reverse complement.
-                    keepAssemblyGraphEdge[bestEdgeId] = true;
-                    const AssemblyGraph::EdgeId bestEdgeIdReverseComplement =
-                        assemblyGraph.reverseComplementEdge[bestEdgeId];
-                    keepAssemblyGraphEdge[bestEdgeIdReverseComplement] = true;
-                    if(debug) {
-                        const AssemblyGraph::Edge& bestEdge = assemblyGraph.edges[bestEdgeId];
-                        const AssemblyGraph::Edge& bestEdgeReverseComplement = assemblyGraph.edges[bestEdgeIdReverseComplement];
-                        debugOut << "Marking " << bestEdge.source << "->" << bestEdge.target << " and ";
-                        debugOut << bestEdgeReverseComplement.source << "->" << bestEdgeReverseComplement.target << endl;
+                    if(edge.averageEdgeCoverage > bestCoverage) {
+                        bestCoverage = edge.averageEdgeCoverage;
+                        bestEdgeId = edgeId;
                     }
+                }
+                SHASTA_ASSERT(bestCoverage != 0);
+                if(debug) {
+                    const AssemblyGraph::Edge& bestEdge = assemblyGraph.edges[bestEdgeId];
+                    debugOut << "Best edge found " << bestEdge.source << "->" << bestEdge.target << endl;
+                }
 
-                    // See if we reached the entry.
-                    if(component[v0] == entryId) {
-                        break;
-                    }
+                // Mark the best edge and its reverse complement.
+                keepAssemblyGraphEdge[bestEdgeId] = 1;
+                const AssemblyGraph::EdgeId bestEdgeIdReverseComplement =
+                    assemblyGraph.reverseComplementEdge[bestEdgeId];
+                keepAssemblyGraphEdge[bestEdgeIdReverseComplement] = 1;
+                if(debug) {
+                    const AssemblyGraph::Edge& bestEdge = assemblyGraph.edges[bestEdgeId];
+                    const AssemblyGraph::Edge& bestEdgeReverseComplement = assemblyGraph.edges[bestEdgeIdReverseComplement];
+                    debugOut << "Marking " << bestEdge.source << "->" << bestEdge.target << " and ";
+                    debugOut << bestEdgeReverseComplement.source << "->" << bestEdgeReverseComplement.target << endl;
+                }
 
-                    // Go one edge back in the path.
-                    v1 = v0;
+                // See if we reached the entry.
+                if(component[v0] == entryId) {
+                    break;
                 }
 
+                // Go one edge back in the path.
+                v1 = v0;
+            }
+
 #if 0
-                AssemblyGraph::VertexId v = exitId;
-                while(true) {
-                    AssemblyGraph::EdgeId e = predecessorEdge[v];
-                    keepAssemblyGraphEdge[e] = true;
-                    // Also keep the reverse complement. This keeps the assembly and marker graph symmetric.
-                    keepAssemblyGraphEdge[assemblyGraph.reverseComplementEdge[e]] = true;
-                    if(debug) {
-                        debugOut << e << endl;
-                    }
-                    SHASTA_ASSERT(e != AssemblyGraph::invalidEdgeId);
-                    v = assemblyGraph.edges[e].source;
-                    if(v == entryId) {
-                        break;
-                    }
-                }
+            AssemblyGraph::VertexId v = exitId;
+            while(true) {
+                AssemblyGraph::EdgeId e = predecessorEdge[v];
+                keepAssemblyGraphEdge[e] = true;
+                // Also keep the reverse complement. This keeps the assembly and marker graph symmetric.
+                keepAssemblyGraphEdge[assemblyGraph.reverseComplementEdge[e]] = true;
                 if(debug) {
-                    debugOut << "\n";
+                    debugOut << e << endl;
+                }
+                SHASTA_ASSERT(e != AssemblyGraph::invalidEdgeId);
+                v = assemblyGraph.edges[e].source;
+                if(v == entryId) {
+                    break;
                 }
-#endif
             }
+            if(debug) {
+                debugOut << "\n";
+            }
+#endif
         }
     }
-
-
-
-    // Mark as superbubble edges all marker graph edges that correspond
-    // to assembly graph edges not marked to be kept.
-    for(AssemblyGraph::EdgeId assemblyGraphEdgeId=0; assemblyGraphEdgeId<assemblyGraph.edges.size(); assemblyGraphEdgeId++) {
-        if(keepAssemblyGraphEdge[assemblyGraphEdgeId]) {
-            continue;
-        }
-
-        const span<MarkerGraph::EdgeId> markerGraphEdges = assemblyGraph.edgeLists[assemblyGraphEdgeId];
-        for(const MarkerGraph::EdgeId markerGraphEdgeId: markerGraphEdges) {
-            markerGraph.edges[markerGraphEdgeId].isSuperBubbleEdge = 1;
-        }
-    }
-
-    // Remove the assembly graph we created at this iteration.
-    assemblyGraph.remove();
-
 }
 
 
 
 // Compute consensus repeat counts for each vertex of the marker graph.
-void Assembler::assembleMarkerGraphVertices(size_t threadCount)
+void Assembler::assembleMarkerGraphVertices(
+    size_t threadCount,
+    bool strandSymmetric)
 {
     cout << timestamp << "assembleMarkerGraphVertices begins." << endl;
 
@@ -4405,6 +4735,11 @@ void Assembler::assembleMarkerGraphVertices(size_t threadCount)
     reads->checkReadsAreOpen();
     checkMarkersAreOpen();
     checkMarkerGraphVerticesAreAvailable();
+    if(strandSymmetric) {
+        SHASTA_ASSERT(markerGraph.reverseComplementVertex.isOpen);
+        SHASTA_ASSERT(markerGraph.reverseComplementVertex.size() == markerGraph.vertexCount());
+    }
+    assembleMarkerGraphVerticesData.strandSymmetric = strandSymmetric;
 
     // Adjust the numbers of threads, if necessary.
     if(threadCount == 0) {
@@ -4422,6 +4757,7 @@ void Assembler::assembleMarkerGraphVertices(size_t threadCount)
     setupLoadBalancing(markerGraph.vertexCount(), batchSize);
     runThreads(&Assembler::assembleMarkerGraphVerticesThreadFunction, threadCount);
 
+    consensusCaller->writeStatistics(cout);
     cout << timestamp << "assembleMarkerGraphVertices ends." << endl;
 }
 
@@ -4432,6 +4768,7 @@ void Assembler::assembleMarkerGraphVerticesThreadFunction(size_t threadId)
     vector<Base> sequence;
     vector<uint32_t> repeatCounts;
     const size_t k = assemblerInfo->k;
+    const bool strandSymmetric = assembleMarkerGraphVerticesData.strandSymmetric;
 
     // Loop over batches assigned to this thread.
     uint64_t begin, end;
@@ -4440,6 +4777,16 @@ void Assembler::assembleMarkerGraphVerticesThreadFunction(size_t threadId)
         // Loop over marker graph vertices assigned to this batch.
         for(MarkerGraph::VertexId vertexId=begin; vertexId!=end; vertexId++) {
 
+            // In strand symmetric mode, the vertex with the lowest id
+            // in each reverse complemented pair is responsible for both.
+            MarkerGraph::VertexId vertexIdRc = vertexId;
+            if(strandSymmetric) {
+                vertexIdRc = markerGraph.reverseComplementVertex[vertexId];
+                if(vertexIdRc < vertexId) {
+                    continue;
+                }
+            }
+
             // Compute the optimal repeat counts for this vertex.
             computeMarkerGraphVertexConsensusSequence(vertexId, sequence, repeatCounts);
 
@@ -4447,6 +4794,12 @@ void Assembler::assembleMarkerGraphVerticesThreadFunction(size_t threadId)
             SHASTA_ASSERT(repeatCounts.size() == k);
             copy(repeatCounts.begin(), repeatCounts.end(),
                 markerGraph.vertexRepeatCounts.begin() + vertexId * k);
+
+            // Store them in reverse order for the reverse complement vertex.
+            if(vertexIdRc != vertexId) {
+                copy(repeatCounts.rbegin(), repeatCounts.rend(),
+                    markerGraph.vertexRepeatCounts.begin() + vertexIdRc * k);
+            }
         }
     }
 }
@@ -4464,7 +4817,9 @@ void Assembler::accessMarkerGraphVertexRepeatCounts()
 
 // Optional computation of coverage data for marker graph vertices.
 // This is only called if Assembly.storeCoverageData in shasta.conf is True.
-void Assembler::computeMarkerGraphVerticesCoverageData(size_t threadCount)
+void Assembler::computeMarkerGraphVerticesCoverageData(
+    size_t threadCount,
+    bool strandSymmetric)
 {
     cout << timestamp<< "computeMarkerGraphVerticesCoverageData begins." << endl;
 
@@ -4473,6 +4828,11 @@ void Assembler::computeMarkerGraphVerticesCoverageData(size_t threadCount)
     reads->checkReadsAreOpen();
     checkMarkersAreOpen();
     checkMarkerGraphVerticesAreAvailable();
+    if(strandSymmetric) {
+        SHASTA_ASSERT(markerGraph.reverseComplementVertex.isOpen);
+        SHASTA_ASSERT(markerGraph.reverseComplementVertex.size() == markerGraph.vertexCount());
+    }
+    computeMarkerGraphVerticesCoverageDataData.strandSymmetric = strandSymmetric;
 
     // Adjust the numbers of threads, if necessary.
     if(threadCount == 0) {
@@ -4505,16 +4865,32 @@ void Assembler::computeMarkerGraphVerticesCoverageData(size_t threadCount)
 
 
     // Gather the results computed by all the threads.
+    // In strand symmetric mode, the coverage data for vertices
+    // that were not computed are obtained by reverse complementing
+    // the coverage data of their reverse complement vertex.
     markerGraph.vertexCoverageData.createNew(
         largeDataName("MarkerGraphVerticesCoverageData"), largeDataPageSize);
+    vector< pair<uint32_t, CompressedCoverageData> > reverseComplementedCoverageData;
     for(MarkerGraph::VertexId vertexId=0; vertexId!=markerGraph.vertexCount(); vertexId++) {
-        const auto& p = vertexTable[vertexId];
+        MarkerGraph::VertexId vertexIdRc = vertexId;
+        if(strandSymmetric) {
+            vertexIdRc = markerGraph.reverseComplementVertex[vertexId];
+        }
+        const bool useReverseComplement = (vertexIdRc < vertexId);
+        const auto& p = vertexTable[useReverseComplement ? vertexIdRc : vertexId];
         const size_t threadId = p.first;
         const size_t i = p.second;
         SHASTA_ASSERT(threadId != invalidValue);
         SHASTA_ASSERT(i != invalidValue);
         const auto v = (*computeMarkerGraphVerticesCoverageDataData.threadVertexCoverageData[threadId])[i];
-        markerGraph.vertexCoverageData.appendVector(v.begin(), v.end());
+        if(useReverseComplement) {
+            reverseComplementedCoverageData.assign(v.begin(), v.end());
+            reverseComplementCoverageData(reverseComplementedCoverageData, uint32_t(assemblerInfo->k));
+            markerGraph.vertexCoverageData.appendVector(
+                reverseComplementedCoverageData.begin(), reverseComplementedCoverageData.end());
+        } else {
+            markerGraph.vertexCoverageData.appendVector(v.begin(), v.end());
+        }
     }
 
     markerGraph.vertexCoverageData.unreserve();
@@ -4562,6 +4938,13 @@ void Assembler::computeMarkerGraphVerticesCoverageDataThreadFunction(size_t thre
         // Loop over all vertices of this batch.
         for(MarkerGraph::VertexId vertexId=begin; vertexId!=end; vertexId++) {
 
+            // In strand symmetric mode, skip the vertex if its
+            // reverse complement has a lower id. Its coverage data
+            // will be obtained from those of the reverse complement vertex.
+            if(data.strandSymmetric and markerGraph.reverseComplementVertex[vertexId] < vertexId) {
+                continue;
+            }
+
             // Access the markers of this vertex.
             const span<MarkerId> markerIds = markerGraph.getVertexMarkerIds(vertexId);
             const size_t markerCount = markerIds.size();
@@ -4643,14 +5026,53 @@ void Assembler::assembleMarkerGraphEdges(
     checkMarkerGraphVerticesAreAvailable();
     checkMarkerGraphEdgesIsOpen();
 
+    SHASTA_ASSERT(assemblyGraphPointer);
+    const AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+
     // Adjust the numbers of threads, if necessary.
     if(threadCount == 0) {
         threadCount = std::thread::hardware_concurrency();
     }
 
+
+
+    // Use the assembly graph to find the marker graph edges that
+    // need to be assembled. These are the marker graph
+    // edges on the chains of assembled edges of the assembly graph.
+    // The wasAssembled flag is used to avoid duplicates.
+    for(MarkerGraph::Edge& edge: markerGraph.edges) {
+        edge.wasAssembled = 0;
+    }
+    MemoryMapped::Vector<MarkerGraph::EdgeId>& edgesToBeAssembled =
+        assembleMarkerGraphEdgesData.edgesToBeAssembled;
+    edgesToBeAssembled.createNew(
+        largeDataName("tmp-assembleMarkerGraphEdges-edgesToBeAssembled"), largeDataPageSize);
+    for(AssemblyGraph::EdgeId assemblyGraphEdgeId=0;
+        assemblyGraphEdgeId<assemblyGraph.edgeLists.size(); assemblyGraphEdgeId++) {
+        if(not assemblyGraph.isAssembledEdge(assemblyGraphEdgeId)) {
+            continue;
+        }
+        for(const MarkerGraph::EdgeId edgeId: assemblyGraph.edgeLists[assemblyGraphEdgeId]) {
+            MarkerGraph::Edge& edge = markerGraph.edges[edgeId];
+            SHASTA_ASSERT(not edge.wasRemoved());
+            if(not edge.wasAssembled) {
+                edge.wasAssembled = 1;
+                edgesToBeAssembled.push_back(edgeId);
+            }
+        }
+    }
+    cout << "Consensus will be computed for " << edgesToBeAssembled.size() <<
+        " marker graph edges out of " << markerGraph.edges.size() << endl;
+
+
+
     // Do the computation in parallel.
     assembleMarkerGraphEdgesData.markerGraphEdgeLengthThresholdForConsensus = markerGraphEdgeLengthThresholdForConsensus;
     assembleMarkerGraphEdgesData.storeCoverageData = storeCoverageData;
+    assembleMarkerGraphEdgesData.longMarkerIntervalEdgeCount = 0;
+    assembleMarkerGraphEdgesData.mode1EdgeCount = 0;
+    assembleMarkerGraphEdgesData.mode2SingleSequenceEdgeCount = 0;
+    assembleMarkerGraphEdgesData.mode2SpoaEdgeCount = 0;
     assembleMarkerGraphEdgesData.threadEdgeIds.resize(threadCount);
     assembleMarkerGraphEdgesData.threadEdgeConsensus.resize(threadCount);
     assembleMarkerGraphEdgesData.threadEdgeConsensusOverlappingBaseCount.resize(threadCount);
@@ -4660,8 +5082,18 @@ void Assembler::assembleMarkerGraphEdges(
     // The batch size should not be too big, to avoid loss of parallelism
     // in small assemblies with high coverage (see discussion in issue #70).
     const size_t batchSize = 10;
-    setupLoadBalancing(markerGraph.edges.size(), batchSize);
+    setupLoadBalancing(edgesToBeAssembled.size(), batchSize);
     runThreads(&Assembler::assembleMarkerGraphEdgesThreadFunction, threadCount);
+    edgesToBeAssembled.remove();
+    cout << "Number of marker graph edges assembled using each method:" << endl;
+    cout << "Very long marker intervals, shortest sequence used: " <<
+        assembleMarkerGraphEdgesData.longMarkerIntervalEdgeCount << endl;
+    cout << "Adjacent or overlapping markers: " <<
+        assembleMarkerGraphEdgesData.mode1EdgeCount << endl;
+    cout << "Intervening sequence, all identical, no alignment needed: " <<
+        assembleMarkerGraphEdgesData.mode2SingleSequenceEdgeCount << endl;
+    cout << "Intervening sequence, aligned using spoa: " <<
+        assembleMarkerGraphEdgesData.mode2SpoaEdgeCount << endl;
 
 
     // Figure out where the results for each edge are.
@@ -4691,7 +5123,17 @@ void Assembler::assembleMarkerGraphEdges(
         const auto& p = edgeTable[edgeId];
         const size_t threadId = p.first;
         const size_t i = p.second;
-        SHASTA_ASSERT(threadId != invalidValue);
+
+        // If this edge was not assembled, store empty consensus.
+        if(threadId == invalidValue) {
+            SHASTA_ASSERT(not markerGraph.edges[edgeId].wasAssembled);
+            markerGraph.edgeConsensus.appendVector();
+            markerGraph.edgeConsensusOverlappingBaseCount[edgeId] = 0;
+            if(storeCoverageData) {
+                markerGraph.edgeCoverageData.appendVector();
+            }
+            continue;
+        }
         SHASTA_ASSERT(i != invalidValue);
         const auto& results = (*assembleMarkerGraphEdgesData.threadEdgeConsensus[threadId])[i];
         markerGraph.edgeConsensus.appendVector();
@@ -4724,6 +5166,7 @@ void Assembler::assembleMarkerGraphEdges(
         assembleMarkerGraphEdgesData.threadEdgeCoverageData.clear();
     }
 
+    consensusCaller->writeStatistics(cout);
     cout << timestamp << "assembleMarkerGraphEdges ends." << endl;
 }
 
@@ -4750,7 +5193,8 @@ void Assembler::accessMarkerGraphCoverageData()
 
 void Assembler::assembleMarkerGraphEdgesThreadFunction(size_t threadId)
 {
-    AssemblyGraph& assemblyGraph = *assemblyGraphPointer;
+    const MemoryMapped::Vector<MarkerGraph::EdgeId>& edgesToBeAssembled =
+        assembleMarkerGraphEdgesData.edgesToBeAssembled;
     const uint32_t markerGraphEdgeLengthThresholdForConsensus = assembleMarkerGraphEdgesData.markerGraphEdgeLengthThresholdForConsensus;
     const bool storeCoverageData = assembleMarkerGraphEdgesData.storeCoverageData;
 
@@ -4794,66 +5238,55 @@ void Assembler::assembleMarkerGraphEdgesThreadFunction(size_t threadId)
     auto spoaAlignmentEngine = spoa::createAlignmentEngine(alignmentType, match, mismatch, gap);
     auto spoaAlignmentGraph = spoa::createGraph();
     
+    // Counters for the code paths taken by each edge.
+    uint64_t longMarkerIntervalEdgeCount = 0;
+    uint64_t mode1EdgeCount = 0;
+    uint64_t mode2SingleSequenceEdgeCount = 0;
+    uint64_t mode2SpoaEdgeCount = 0;
+
     // Loop over batches assigned to this thread.
     uint64_t begin, end;
     while(getNextBatch(begin, end)) {
         if((begin % 10000000) == 0){
             std::lock_guard<std::mutex> lock(mutex);
-            cout << timestamp << begin << "/" << markerGraph.edges.size() << endl;
+            cout << timestamp << begin << "/" << edgesToBeAssembled.size() << endl;
         }
+        SHASTA_TRACE_SPAN("assembleMarkerGraphEdges batch");
 
-        // Loop over marker graph vertices assigned to this batch.
-        for(MarkerGraph::EdgeId edgeId=begin; edgeId!=end; edgeId++) {
-
-            // Figure out if we need to assemble this edge.
-            bool shouldAssemble = true;
-            if(markerGraph.edges[edgeId].wasRemoved()) {
-                // The marker graph edge was removed.
-                shouldAssemble = false;
-            } else {
-                // This marker graph edge was not removed.
-                // Check its assembly graph locations to see if it
-                // should be assembled.
-                shouldAssemble = false;
-                for(const auto& location: assemblyGraph.markerToAssemblyTable[edgeId]) {
-                    const AssemblyGraph::EdgeId assemblyGraphEdgeId =
-                        location.first;
-                    if(assemblyGraph.isAssembledEdge(assemblyGraphEdgeId)) {
-                        shouldAssemble = true;
-                        break;
-                    }
-                }
-            }
+        // Loop over marker graph edges assigned to this batch.
+        for(uint64_t j=begin; j!=end; j++) {
+            const MarkerGraph::EdgeId edgeId = edgesToBeAssembled[j];
 
-            // Compute the consensus, if necessary.
-            if(!shouldAssemble) {
-                markerGraph.edges[edgeId].wasAssembled = 0;
-                sequence.clear();
-                repeatCounts.clear();
-                overlappingBaseCount = 0;
-            } else {
-                markerGraph.edges[edgeId].wasAssembled = 1;
-                try {
-                    ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail detail;
-                    computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
-                        edgeId, markerGraphEdgeLengthThresholdForConsensus,
-                        spoaAlignmentEngine, spoaAlignmentGraph,
-                        sequence, repeatCounts, overlappingBaseCount,
-                        detail,
-                        storeCoverageData ? &coverageData : 0
-                        );
-                } catch(const std::exception& e) {
-                    std::lock_guard<std::mutex> lock(mutex);
-                    cout << "A standard exception was thrown while assembling "
-                        "marker graph edge " << edgeId << ":" << endl;
-                    cout << e.what() << endl;
-                    throw;
-                } catch(...) {
-                    std::lock_guard<std::mutex> lock(mutex);
-                    cout << "A non-standard exception was thrown while assembling "
-                        "marker graph edge " << edgeId << ":" << endl;
-                    throw;
+            // Compute the consensus.
+            try {
+                ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail detail;
+                computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
+                    edgeId, markerGraphEdgeLengthThresholdForConsensus,
+                    spoaAlignmentEngine, spoaAlignmentGraph,
+                    sequence, repeatCounts, overlappingBaseCount,
+                    detail,
+                    storeCoverageData ? &coverageData : 0
+                    );
+                if(detail.hasLongMarkerInterval) {
+                    ++longMarkerIntervalEdgeCount;
+                } else if(detail.assemblyMode == 1) {
+                    ++mode1EdgeCount;
+                } else if(detail.usedSpoa) {
+                    ++mode2SpoaEdgeCount;
+                } else {
+                    ++mode2SingleSequenceEdgeCount;
                 }
+            } catch(const std::exception& e) {
+                std::lock_guard<std::mutex> lock(mutex);
+                cout << "A standard exception was thrown while assembling "
+                    "marker graph edge " << edgeId << ":" << endl;
+                cout << e.what() << endl;
+                throw;
+            } catch(...) {
+                std::lock_guard<std::mutex> lock(mutex);
+                cout << "A non-standard exception was thrown while assembling "
+                    "marker graph edge " << edgeId << ":" << endl;
+                throw;
             }
 
             // Store the results.
@@ -4871,7 +5304,16 @@ void Assembler::assembleMarkerGraphEdgesThreadFunction(size_t threadId)
 
         }
     }
-    
+
+    // Update the global counters.
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        assembleMarkerGraphEdgesData.longMarkerIntervalEdgeCount += longMarkerIntervalEdgeCount;
+        assembleMarkerGraphEdgesData.mode1EdgeCount += mode1EdgeCount;
+        assembleMarkerGraphEdgesData.mode2SingleSequenceEdgeCount += mode2SingleSequenceEdgeCount;
+        assembleMarkerGraphEdgesData.mode2SpoaEdgeCount += mode2SpoaEdgeCount;
+    }
+
     edgeIds.unreserve();
     consensus.unreserve();
     overlappingBaseCountVector.unreserve();
@@ -4879,6 +5321,86 @@ void Assembler::assembleMarkerGraphEdgesThreadFunction(size_t threadId)
 
 
 
+// Get consensus sequence for a marker graph edge,
+// using stored consensus if available, and otherwise
+// computing it on demand and memoizing it.
+bool Assembler::getMarkerGraphEdgeConsensus(
+    MarkerGraph::EdgeId edgeId,
+    uint32_t markerGraphEdgeLengthThresholdForConsensus,
+    vector<Base>& sequence,
+    vector<uint32_t>& repeatCounts,
+    uint8_t& overlappingBaseCount,
+    ComputeMarkerGraphEdgeConsensusSequenceUsingSpoaDetail& detail,
+    bool useStoredConsensus)
+{
+    // If stored consensus is available, use it.
+    if( useStoredConsensus and
+        markerGraph.edges[edgeId].wasAssembled and
+        markerGraph.edgeConsensus.isOpen() and
+        markerGraph.edgeConsensusOverlappingBaseCount.isOpen) {
+        const auto storedConsensus = markerGraph.edgeConsensus[edgeId];
+        sequence.clear();
+        repeatCounts.clear();
+        for(const auto& p: storedConsensus) {
+            sequence.push_back(p.first);
+            repeatCounts.push_back(p.second);
+        }
+        overlappingBaseCount = markerGraph.edgeConsensusOverlappingBaseCount[edgeId];
+        return false;
+    }
+
+    // Look it up in the cache.
+    {
+        std::lock_guard<std::mutex> lock(markerGraphEdgeConsensusCacheMutex);
+        const auto it = markerGraphEdgeConsensusCache.find(edgeId);
+        if(it != markerGraphEdgeConsensusCache.end()) {
+            const MarkerGraphEdgeConsensusCacheEntry& entry = it->second;
+            if(entry.markerGraphEdgeLengthThresholdForConsensus ==
+                markerGraphEdgeLengthThresholdForConsensus) {
+                sequence = entry.sequence;
+                repeatCounts = entry.repeatCounts;
+                overlappingBaseCount = entry.overlappingBaseCount;
+                detail = entry.detail;
+                return true;
+            }
+        }
+    }
+
+    // Not found in the cache. Compute it.
+    // This is done without holding the mutex.
+    const spoa::AlignmentType alignmentType = spoa::AlignmentType::kNW;
+    const int8_t match = 1;
+    const int8_t mismatch = -1;
+    const int8_t gap = -1;
+    auto spoaAlignmentEngine = spoa::createAlignmentEngine(alignmentType, match, mismatch, gap);
+    auto spoaAlignmentGraph = spoa::createGraph();
+    computeMarkerGraphEdgeConsensusSequenceUsingSpoa(
+        edgeId,
+        markerGraphEdgeLengthThresholdForConsensus,
+        spoaAlignmentEngine,
+        spoaAlignmentGraph,
+        sequence,
+        repeatCounts,
+        overlappingBaseCount,
+        detail,
+        0);
+
+    // Store it in the cache.
+    std::lock_guard<std::mutex> lock(markerGraphEdgeConsensusCacheMutex);
+    if(markerGraphEdgeConsensusCache.size() >= markerGraphEdgeConsensusCacheMaxSize) {
+        markerGraphEdgeConsensusCache.clear();
+    }
+    MarkerGraphEdgeConsensusCacheEntry& entry = markerGraphEdgeConsensusCache[edgeId];
+    entry.markerGraphEdgeLengthThresholdForConsensus = markerGraphEdgeLengthThresholdForConsensus;
+    entry.sequence = sequence;
+    entry.repeatCounts = repeatCounts;
+    entry.overlappingBaseCount = overlappingBaseCount;
+    entry.detail = detail;
+    return true;
+}
+
+
+
 void Assembler::accessMarkerGraphConsensus()
 {
     markerGraph.vertexRepeatCounts.accessExistingReadOnly(
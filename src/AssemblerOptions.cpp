@@ -136,7 +136,15 @@ void AssemblerOptions::addCommandLineOnlyOptions()
         value<string>(&commandLineOnlyOptions.command)->
         default_value("assemble"),
         "Command to run. Must be one of: "
-        "assemble, saveBinaryData, cleanupBinaryData, explore, createBashCompletionScript")
+        "assemble, plan, saveBinaryData, restoreBinaryData, cleanupBinaryData, explore, createBashCompletionScript")
+
+        ("resume",
+        bool_switch(&commandLineOnlyOptions.resume)->
+        default_value(false),
+        "For --command assemble, resume an assembly that did not complete, "
+        "in the existing assembly directory. Phases that completed "
+        "using the same options are not repeated. "
+        "Requires --memoryMode filesystem.")
 
 #ifdef __linux__
         ("memoryMode",
@@ -149,17 +157,46 @@ void AssemblerOptions::addCommandLineOnlyOptions()
         value<string>(&commandLineOnlyOptions.memoryBacking)->
         default_value("4K"),
         "Specify the type of pages used to back memory.\n"
-        "Allowed values: disk, 4K , 2M (for best performance). "
+        "Allowed values: disk, 4K , 2M (for best performance), "
+        "THP (transparent huge pages, does not require root privilege). "
         "All combinations (memoryMode, memoryBacking) are allowed "
-        "except for (anonymous, disk).\n"
+        "except for (anonymous, disk) and (filesystem, THP).\n"
         "Some combinations require root privilege, which is obtained using sudo "
         "and may result in a password prompting depending on your sudo set up.")
+
+        ("numaPolicy",
+        value<string>(&commandLineOnlyOptions.numaPolicy)->
+        default_value("none"),
+        "Specify how threads and memory are placed on machines with "
+        "more than one NUMA node. Allowed values: none, pin, interleave, firstTouch. "
+        "All values other than none pin worker threads to NUMA nodes. "
+        "interleave also interleaves all memory across nodes, and firstTouch also "
+        "partitions the reads, markers, and marker graph across nodes.")
 #endif
 
         ("threads",
         value<uint32_t>(&commandLineOnlyOptions.threadCount)->
         default_value(0),
         "Number of threads, or 0 to use one thread per virtual processor.")
+
+        ("binaryDataCompression",
+        value<string>(&commandLineOnlyOptions.binaryDataCompression)->
+        default_value("none"),
+        "For --command saveBinaryData, compression of the saved binary data. "
+        "Allowed values: none, zlib.")
+
+        ("lazyRestore",
+        bool_switch(&commandLineOnlyOptions.lazyRestore)->
+        default_value(false),
+        "For --command restoreBinaryData, do not copy the saved binary data. "
+        "Instead, make Data a symbolic link to DataOnDisk, so the saved binary data "
+        "are used directly. Only allowed if the binary data were saved without compression.")
+
+        ("planCalibration",
+        value<string>(&commandLineOnlyOptions.planCalibration)->
+        default_value(""),
+        "For --command plan, the assembly directory of an earlier completed run "
+        "of a similar assembly, used to calibrate the forecast.")
         
 #ifdef SHASTA_HTTP_SERVER
         ("exploreAccess",
@@ -187,6 +224,7 @@ void AssemblerOptions::addCommandLineOnlyOptions()
 #ifndef __linux__
     commandLineOnlyOptions.memoryMode = "filesystem";
     commandLineOnlyOptions.memoryBacking = "disk";
+    commandLineOnlyOptions.numaPolicy = "none";
 #endif
 }
 
@@ -614,14 +652,37 @@ void AssemblerOptions::addConfigurableOptions()
         value<int>(&assemblyOptions.storeCoverageDataCsvLengthThreshold)->
         default_value(0),
         "Used to specify the minimum length of an assembled segment "
-        "for which coverage data in csv format should be stored. "
-        "If 0, no coverage data in csv format is stored.")
+        "for which coverage data should be stored. "
+        "If 0, no coverage data is stored. "
+        "The format is controlled by Assembly.storeCoverageDataFormat.")
+
+        ("Assembly.storeCoverageDataFormat",
+        value<string>(&assemblyOptions.storeCoverageDataFormat)->
+        default_value("csv"),
+        "Format of the coverage data stored for assembled segments "
+        "longer than Assembly.storeCoverageDataCsvLengthThreshold. "
+        "Can be csv (one file per segment) or binary (compressed, "
+        "with an index, stored in Coverage/CoverageData.bin and "
+        "Coverage/CoverageData.index).")
 
         ("Assembly.writeReadsByAssembledSegment",
         bool_switch(&assemblyOptions.writeReadsByAssembledSegment)->
         default_value(false),
         "Used to request writing the reads that contributed to assembling each segment.")
 
+        ("Assembly.bgzipOutput",
+        bool_switch(&assemblyOptions.bgzipOutput)->
+        default_value(false),
+        "Used to request writing the assembly in GFA and FASTA format "
+        "compressed with bgzip, with .gzi indexes. "
+        "A .fai index is written for the FASTA output in all cases.")
+
+        ("Assembly.streamOutput",
+        bool_switch(&assemblyOptions.streamOutput)->
+        default_value(false),
+        "Used to request writing assembled segments to Assembly.gfa and Assembly.fasta "
+        "as they are assembled, rather than after assembly completes.")
+
         ("Assembly.pruneLength",
         value<uint64_t>(&assemblyOptions.pruneLength)->
         default_value(0),
@@ -630,6 +691,14 @@ void AssemblerOptions::addConfigurableOptions()
         "Set to zero to suppress pruning of the assembly graph. "
         "Assembly graph pruning takes place separately and in addition to marker graph pruning.")
 
+        ("Assembly.strandSymmetric",
+        bool_switch(&assemblyOptions.strandSymmetric)->
+        default_value(false),
+        "Used to request computing consensus repeat counts and coverage data "
+        "for only one vertex in each reverse complemented pair of the marker graph. "
+        "The results for the other vertex are obtained by reverse complementing. "
+        "This roughly halves the time spent on marker graph vertices.")
+
         ("Assembly.detangleMethod",
         value<int>(&assemblyOptions.detangleMethod)->
         default_value(0),
@@ -842,8 +911,16 @@ void AssemblerOptions::AssemblyOptions::write(ostream& s) const
         convertBoolToPythonString(storeCoverageData) << "\n";
     s << "storeCoverageDataCsvLengthThreshold = " <<
         storeCoverageDataCsvLengthThreshold << "\n";
+    s << "storeCoverageDataFormat = " <<
+        storeCoverageDataFormat << "\n";
     s << "writeReadsByAssembledSegment = " <<
         convertBoolToPythonString(writeReadsByAssembledSegment) << "\n";
+    s << "bgzipOutput = " <<
+        convertBoolToPythonString(bgzipOutput) << "\n";
+    s << "streamOutput = " <<
+        convertBoolToPythonString(streamOutput) << "\n";
+    s << "strandSymmetric = " <<
+        convertBoolToPythonString(strandSymmetric) << "\n";
     s << "detangleMethod = " << detangleMethod << "\n";
     s << "detangle.diagonalReadCountMin = " << detangleDiagonalReadCountMin << "\n";
     s << "detangle.offDiagonalReadCountMax = " << detangleOffDiagonalReadCountMax << "\n";
@@ -87,9 +87,14 @@ public:
         vector <string> inputFileNames;
         string assemblyDirectory;
         string command;
+        bool resume;
         string memoryMode;
         string memoryBacking;
+        string numaPolicy;
         uint32_t threadCount;
+        string binaryDataCompression;
+        bool lazyRestore;
+        string planCalibration;
 #ifdef SHASTA_HTTP_SERVER
         string exploreAccess;
         uint16_t port;
@@ -253,8 +258,12 @@ public:
         string consensusCaller;
         bool storeCoverageData;
         int storeCoverageDataCsvLengthThreshold;
+        string storeCoverageDataFormat;
         bool writeReadsByAssembledSegment;
+        bool bgzipOutput;
+        bool streamOutput;
         uint64_t pruneLength;
+        bool strandSymmetric;
 
         // Options that control detangling.
         int detangleMethod;
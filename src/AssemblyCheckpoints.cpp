@@ -0,0 +1,267 @@
+// Shasta.
+#include "AssemblyCheckpoints.hpp"
+#include "AssemblerOptions.hpp"
+#include "filesystem.hpp"
+#include "MurmurHash2.hpp"
+#include "SHASTA_ASSERT.hpp"
+using namespace shasta;
+
+// Linux.
+#include <errno.h>
+#include <string.h>
+#include <unistd.h>
+
+// Standard library.
+#include "algorithm.hpp"
+#include <cstdio>
+#include <cstdlib>
+#include "fstream.hpp"
+#include "iostream.hpp"
+#include <iomanip>
+#include <sstream>
+#include "stdexcept.hpp"
+
+
+
+const vector<string> AssemblyCheckpoints::phaseNames = {
+    "reads",
+    "markers",
+    "alignments",
+    "readGraph",
+    "markerGraph",
+    "assembly"};
+
+const string AssemblyCheckpoints::fileName = "Checkpoints.csv";
+
+
+
+AssemblyCheckpoints::AssemblyCheckpoints(
+    const AssemblerOptions& assemblerOptions,
+    const vector<string>& inputFileNames,
+    bool resume)
+{
+
+    // Write out, for each phase, the options it uses.
+    vector<std::ostringstream> options(phaseNames.size());
+    std::ostringstream& readsOptions = options[phaseId("reads")];
+    for(const string& inputFileName: inputFileNames) {
+        readsOptions << inputFileName << " " << filesystem::fileSize(inputFileName) << "\n";
+    }
+    assemblerOptions.readsOptions.write(readsOptions);
+    assemblerOptions.kmersOptions.write(options[phaseId("markers")]);
+    assemblerOptions.minHashOptions.write(options[phaseId("alignments")]);
+    assemblerOptions.alignOptions.write(options[phaseId("alignments")]);
+    assemblerOptions.readGraphOptions.write(options[phaseId("readGraph")]);
+
+    // Only include the Assembly options actually used by the readGraph
+    // and markerGraph phases, so changing options used only
+    // when assembling sequence does not invalidate them.
+    const AssemblerOptions::AssemblyOptions& assemblyOptions = assemblerOptions.assemblyOptions;
+    std::ostringstream& readGraphOptions = options[phaseId("readGraph")];
+    readGraphOptions << "[Assembly]\n";
+    readGraphOptions << "iterative = " << int(assemblyOptions.iterative) << "\n";
+    if(assemblyOptions.iterative) {
+        // Iterative assembly creates temporary marker graphs and assembly graphs.
+        readGraphOptions <<
+            "iterative.iterationCount = " << assemblyOptions.iterativeIterationCount << "\n" <<
+            "iterative.pseudoPathAlignMatchScore = " << assemblyOptions.iterativePseudoPathAlignMatchScore << "\n" <<
+            "iterative.pseudoPathAlignMismatchScore = " << assemblyOptions.iterativePseudoPathAlignMismatchScore << "\n" <<
+            "iterative.pseudoPathAlignGapScore = " << assemblyOptions.iterativePseudoPathAlignGapScore << "\n" <<
+            "iterative.mismatchSquareFactor = " << assemblyOptions.iterativeMismatchSquareFactor << "\n" <<
+            "iterative.minScore = " << assemblyOptions.iterativeMinScore << "\n" <<
+            "iterative.maxAlignmentCount = " << assemblyOptions.iterativeMaxAlignmentCount << "\n" <<
+            "iterative.bridgeRemovalIterationCount = " << assemblyOptions.iterativeBridgeRemovalIterationCount << "\n" <<
+            "iterative.bridgeRemovalMaxDistance = " << assemblyOptions.iterativeBridgeRemovalMaxDistance << "\n";
+        assemblerOptions.markerGraphOptions.write(readGraphOptions);
+    }
+    std::ostringstream& markerGraphOptions = options[phaseId("markerGraph")];
+    assemblerOptions.markerGraphOptions.write(markerGraphOptions);
+    markerGraphOptions <<
+        "[Assembly]\n"
+        "pruneLength = " << assemblyOptions.pruneLength << "\n" <<
+        "detangleMethod = " << assemblyOptions.detangleMethod << "\n" <<
+        "detangle.diagonalReadCountMin = " << assemblyOptions.detangleDiagonalReadCountMin << "\n" <<
+        "detangle.offDiagonalReadCountMax = " << assemblyOptions.detangleOffDiagonalReadCountMax << "\n" <<
+        "detangle.offDiagonalRatio = " << assemblyOptions.detangleOffDiagonalRatio << "\n";
+    assemblyOptions.write(options[phaseId("assembly")]);
+
+    // Compute the fingerprints.
+    // Each fingerprint also depends on the fingerprint of the previous phase,
+    // so changing the options of a phase invalidates all downstream phases.
+    uint64_t fingerprint = 0;
+    for(uint64_t i=0; i<phaseNames.size(); i++) {
+        const string s = phaseNames[i] + "\n" + options[i].str();
+        fingerprint = MurmurHash64A(s.data(), int(s.size()), fingerprint);
+        fingerprints.push_back(fingerprint);
+    }
+
+    if(not resume) {
+        firstPhaseToRun = 0;
+        if(filesystem::exists(fileName)) {
+            filesystem::remove(fileName);
+        }
+        return;
+    }
+
+
+
+    // Read the checkpoint file, if present, and find the
+    // first phase without a matching checkpoint.
+    firstPhaseToRun = 0;
+    ifstream file(fileName);
+    string line;
+    while(std::getline(file, line) and firstPhaseToRun < phaseNames.size()) {
+        const size_t commaPosition = line.find(',');
+        if(commaPosition == string::npos) {
+            break;
+        }
+        const string phaseName = line.substr(0, commaPosition);
+        const string fingerprintString = line.substr(commaPosition + 1);
+        if(phaseName != phaseNames[firstPhaseToRun]) {
+            break;
+        }
+        std::ostringstream expectedFingerprintString;
+        expectedFingerprintString << std::hex << std::setw(16) << std::setfill('0') <<
+            fingerprints[firstPhaseToRun];
+        if(fingerprintString != expectedFingerprintString.str()) {
+            cout << "Options used by phase " << phaseName <<
+                " changed since it completed, so it will run again." << endl;
+            break;
+        }
+        ++firstPhaseToRun;
+    }
+
+    if(firstPhaseToRun == phaseNames.size()) {
+        cout << "All assembly phases already completed." << endl;
+    } else {
+        cout << "Resuming the assembly at phase " << phaseNames[firstPhaseToRun] << "." << endl;
+    }
+}
+
+
+
+bool AssemblyCheckpoints::mustRun(const string& phaseName) const
+{
+    return phaseId(phaseName) >= firstPhaseToRun;
+}
+
+
+
+void AssemblyCheckpoints::markComplete(const string& phaseName)
+{
+    const uint64_t id = phaseId(phaseName);
+    SHASTA_ASSERT(id == firstPhaseToRun);
+    firstPhaseToRun = id + 1;
+
+    // Rewrite the checkpoint file, then rename it,
+    // so it is never left incomplete.
+    const string temporaryFileName = fileName + ".tmp";
+    {
+        ofstream file(temporaryFileName);
+        for(uint64_t i=0; i<=id; i++) {
+            file << phaseNames[i] << "," << std::hex << std::setw(16) <<
+                std::setfill('0') << fingerprints[i] << std::dec << "\n";
+        }
+        if(not file) {
+            throw runtime_error("Error writing " + temporaryFileName);
+        }
+    }
+    if(::rename(temporaryFileName.c_str(), fileName.c_str()) != 0) {
+        throw runtime_error("Error renaming " + temporaryFileName + " to " + fileName);
+    }
+}
+
+
+
+uint64_t AssemblyCheckpoints::phaseId(const string& phaseName) const
+{
+    const auto it = std::find(phaseNames.begin(), phaseNames.end(), phaseName);
+    SHASTA_ASSERT(it != phaseNames.end());
+    return uint64_t(it - phaseNames.begin());
+}
+
+
+
+// Check that changing options only used by a phase
+// does not invalidate the upstream phases.
+// This runs in a temporary directory, so it does not touch
+// the Checkpoints.csv of an assembly in the current directory.
+void shasta::testAssemblyCheckpoints()
+{
+    // Go to a temporary directory. The destructor goes back
+    // and removes it, also if an assertion fails.
+    class TemporaryDirectory {
+    public:
+        string directory;
+        string previousDirectory;
+        TemporaryDirectory()
+        {
+            char directoryTemplate[] = "/tmp/testAssemblyCheckpoints-XXXXXX";
+            if(::mkdtemp(directoryTemplate) == 0) {
+                throw runtime_error(string("Error creating temporary directory: ") + strerror(errno));
+            }
+            directory = directoryTemplate;
+            previousDirectory = filesystem::getCurrentDirectory();
+            filesystem::changeDirectory(directory);
+        }
+        ~TemporaryDirectory()
+        {
+            if(::chdir(previousDirectory.c_str()) == 0) {
+                ::system(("rm -rf " + directory).c_str());
+            }
+        }
+    };
+    const TemporaryDirectory temporaryDirectory;
+
+    const char* arguments[] = {"shasta"};
+    AssemblerOptions assemblerOptions(1, arguments);
+    const vector<string> inputFileNames;
+
+    // Record all phases except assembly as completed.
+    {
+        AssemblyCheckpoints checkpoints(assemblerOptions, inputFileNames, false);
+        for(const string& phaseName: AssemblyCheckpoints::phaseNames) {
+            if(phaseName != "assembly") {
+                checkpoints.markComplete(phaseName);
+            }
+        }
+    }
+
+    // Changing options used only when assembling sequence
+    // must keep the markerGraph phase complete.
+    assemblerOptions.assemblyOptions.consensusCaller = "Modal";
+    assemblerOptions.assemblyOptions.bgzipOutput = not assemblerOptions.assemblyOptions.bgzipOutput;
+    assemblerOptions.assemblyOptions.streamOutput = not assemblerOptions.assemblyOptions.streamOutput;
+    assemblerOptions.assemblyOptions.storeCoverageData = not assemblerOptions.assemblyOptions.storeCoverageData;
+    assemblerOptions.assemblyOptions.storeCoverageDataCsvLengthThreshold += 1;
+    assemblerOptions.assemblyOptions.markerGraphEdgeLengthThresholdForConsensus += 1;
+    assemblerOptions.assemblyOptions.writeReadsByAssembledSegment =
+        not assemblerOptions.assemblyOptions.writeReadsByAssembledSegment;
+    {
+        const AssemblyCheckpoints checkpoints(assemblerOptions, inputFileNames, true);
+        SHASTA_ASSERT(not checkpoints.mustRun("markerGraph"));
+        SHASTA_ASSERT(checkpoints.mustRun("assembly"));
+    }
+
+    // Changing a detangling option must rerun the markerGraph phase,
+    // but not the readGraph phase.
+    assemblerOptions.assemblyOptions.detangleMethod =
+        (assemblerOptions.assemblyOptions.detangleMethod == 2) ? 1 : 2;
+    {
+        const AssemblyCheckpoints checkpoints(assemblerOptions, inputFileNames, true);
+        SHASTA_ASSERT(not checkpoints.mustRun("readGraph"));
+        SHASTA_ASSERT(checkpoints.mustRun("markerGraph"));
+    }
+
+    // Changing a MarkerGraph option must also rerun the markerGraph phase.
+    assemblerOptions.assemblyOptions.detangleMethod =
+        (assemblerOptions.assemblyOptions.detangleMethod == 2) ? 1 : 2;
+    assemblerOptions.markerGraphOptions.pruneIterationCount += 1;
+    {
+        const AssemblyCheckpoints checkpoints(assemblerOptions, inputFileNames, true);
+        SHASTA_ASSERT(not checkpoints.mustRun("readGraph"));
+        SHASTA_ASSERT(checkpoints.mustRun("markerGraph"));
+    }
+
+    cout << "AssemblyCheckpoints test passed." << endl;
+}
@@ -0,0 +1,96 @@
+#ifndef SHASTA_ASSEMBLY_CHECKPOINTS_HPP
+#define SHASTA_ASSEMBLY_CHECKPOINTS_HPP
+
+/*******************************************************************************
+
+Class AssemblyCheckpoints keeps track of the assembly phases
+that completed, so an assembly that did not complete can be resumed
+(--resume) from the first phase that did not complete,
+without recomputing the earlier phases.
+
+The assembly is divided into the following phases, in this order:
+- reads: load the reads.
+- markers: select k-mers, find markers, flag palindromic reads.
+- alignments: find alignment candidates, compute alignments.
+- readGraph: create the read graph, including iterative assembly, if requested.
+- markerGraph: create, clean up, and simplify the marker graph,
+  create and detangle the assembly graph.
+  The marker graph is modified in place during this phase,
+  so it cannot be split further.
+- assembly: assemble sequence and write the assembly output.
+
+When a phase completes, a line containing its name and
+a fingerprint of the options it used is written to
+file Checkpoints.csv in the run directory.
+The fingerprint of a phase is a hash of the options in the sections
+of the configuration used by the phase and of the fingerprint
+of the previous phase. For the reads phase, the names and sizes
+of the input files are also included. Of the Assembly options,
+the readGraph phase only uses the iterative assembly options,
+and the markerGraph phase only uses pruneLength and the
+detangling options. All others are only used by the assembly phase.
+
+When resuming, the first phase to run is the first one for which
+no checkpoint was recorded or the recorded fingerprint differs from
+the one computed from the current options.
+This way, changing only options used by downstream phases
+reuses the upstream phases.
+
+The binary data of the completed phases must still be available,
+so resuming requires --memoryMode filesystem.
+Binary data on disk are always available, but binary data
+on tmpfs or hugetlbfs filesystems do not survive a reboot.
+
+*******************************************************************************/
+
+// Standard library.
+#include "cstdint.hpp"
+#include "string.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    class AssemblyCheckpoints;
+    class AssemblerOptions;
+    void testAssemblyCheckpoints();
+}
+
+
+
+class shasta::AssemblyCheckpoints {
+public:
+
+    // Compute the fingerprint of each phase.
+    // If resume is true, also read the checkpoint file
+    // to find the first phase that must run.
+    // Otherwise, all phases must run.
+    AssemblyCheckpoints(
+        const AssemblerOptions&,
+        const vector<string>& inputFileNames,
+        bool resume);
+
+    // Return true if the specified phase must run.
+    bool mustRun(const string& phaseName) const;
+
+    // Return true if all phases completed.
+    bool allPhasesCompleted() const
+    {
+        return firstPhaseToRun == phaseNames.size();
+    }
+
+    // Record in the checkpoint file that the specified phase completed.
+    // Phases must complete in order.
+    void markComplete(const string& phaseName);
+
+    // The assembly phases, in the order in which they run.
+    static const vector<string> phaseNames;
+
+    // The name of the checkpoint file in the run directory.
+    static const string fileName;
+
+private:
+    vector<uint64_t> fingerprints;
+    uint64_t firstPhaseToRun = 0;
+    uint64_t phaseId(const string& phaseName) const;
+};
+
+#endif
@@ -19,6 +19,7 @@ vertex in the assembly graph.
 #include "LongBaseSequence.hpp"
 #include "MarkerGraph.hpp"
 #include "MemoryMappedVectorOfVectors.hpp"
+#include "PackedRepeatCounts.hpp"
 
 // Standard library.
 #include <limits>
@@ -189,8 +190,10 @@ public:
     // The assembled sequenced and repeat counts for each edge of the
     // assembly graph.
     // Indexed edge id in the assembly graph.
+    // The repeat counts are stored using 4 bits per base
+    // (see class PackedRepeatCounts).
     LongBaseSequences sequences;
-    MemoryMapped::VectorOfVectors<uint8_t, uint64_t> repeatCounts;
+    PackedRepeatCounts repeatCounts;
 
 
 
@@ -2,6 +2,7 @@
 #include "AssemblyPathGraph2.hpp"
 #include "deduplicate.hpp"
 #include "html.hpp"
+#include "timestamp.hpp"
 using namespace shasta;
 
 // Boost libraries.
@@ -9,6 +10,7 @@ using namespace shasta;
 #include <boost/graph/iteration_macros.hpp>
 
 // Standard library.
+#include "chrono.hpp"
 #include "fstream.hpp"
 #include <set>
 
@@ -203,13 +205,15 @@ void AssemblyPathGraph2::createTangles()
         graph[e].clearTangles();
     }
     tangles.clear();
+    tangleQueue.clear();
     nextTangleId = 0;
 
     // Create the tangles.
     BGL_FORALL_EDGES(e, graph, AssemblyPathGraph2) {
         createTangleAtEdge(e);
     }
-    cout << "Found " << tangles.size() << " tangles." << endl;
+    cout << "Found " << tangles.size() << " tangles, of which " <<
+        tangleQueue.size() << " are solvable." << endl;
 }
 
 
@@ -299,6 +303,7 @@ bool AssemblyPathGraph2::createTangleAtEdge(edge_descriptor e01)
     tangle.computePriority();
 
     tangle.tangleId = nextTangleId;
+    addToTangleQueue(tangle);
     tangles.insert(make_pair(nextTangleId++, tangle));
     cout << "Created tangle " << tangle.tangleId << " at " << graph[e01] << endl;
 
@@ -382,13 +387,28 @@ void AssemblyPathGraph2::detangle(
     AssemblyPathGraph2& graph = *this;
     const bool debug = false;
 
+    // Only the tangles involving edges created by each
+    // detangling step are created or removed. All other tangles are unaffected.
+    // The solvable tangles are kept in the tangleQueue, ordered by priority,
+    // so each iteration only does work proportional to the size
+    // of the portion of the graph that changed.
+    const auto tBegin = steady_clock::now();
+    uint64_t iterationCount = 0;
+    double findTime = 0.;
+    double detangleTime = 0.;
+    double updateTime = 0.;
+
     // Detangle iteration.
     for(int iteration=0; ; ++iteration) {
 
+        const auto t0 = steady_clock::now();
         const Tangle2Id tangleId = findNextTangle();
+        const auto t1 = steady_clock::now();
+        findTime += seconds(t1 - t0);
         if(tangleId == invalidTangle2Id) {
             break;
         }
+        ++iterationCount;
 
         if(debug) {
             cout << "Detangle iteration " << iteration <<
@@ -404,8 +424,12 @@ void AssemblyPathGraph2::detangle(
         }
 
         // Detangle this tangle and its reverse complement.
+        const uint64_t tangleCountBefore = tangles.size();
+        const uint64_t tangleQueueSizeBefore = tangleQueue.size();
         vector<edge_descriptor> newEdges;
         detangleComplementaryPair(tangleId, newEdges);
+        const auto t2 = steady_clock::now();
+        detangleTime += seconds(t2 - t1);
 
         // Fill in the reverseComplementEdge for the edges we just created.
         fillReverseComplementNewEdges(newEdges, assemblyGraph);
@@ -417,7 +441,25 @@ void AssemblyPathGraph2::detangle(
 
         // Remove any vertices that were left isolated.
         removeIsolatedVertices();
-    }
+        const auto t3 = steady_clock::now();
+        updateTime += seconds(t3 - t2);
+
+        cout << "Detangle iteration " << iteration <<
+            ": tangle " << tangleId <<
+            ", " << newEdges.size() << " new edges" <<
+            ", tangles " << tangleCountBefore << " -> " << tangles.size() <<
+            ", solvable tangles " << tangleQueueSizeBefore << " -> " << tangleQueue.size() <<
+            ", time " << seconds(t3 - t0) << " s." << endl;
+    }
+
+    const auto tEnd = steady_clock::now();
+    cout << timestamp << "Detangling completed in " << iterationCount <<
+        " iterations and " << seconds(tEnd - tBegin) << " s." << endl;
+    cout << "Time spent finding tangles " << findTime <<
+        " s, detangling " << detangleTime <<
+        " s, updating tangles " << updateTime << " s." << endl;
+    cout << "There are " << tangles.size() << " tangles left, of which " <<
+        tangleQueue.size() << " are solvable." << endl;
 
     graph.writeGraphviz("AssemblyPathGraph2-Final.dot");
     graph.writeHtml("AssemblyPathGraph2-Final.html");
@@ -564,7 +606,7 @@ void AssemblyPathGraph2::detangle(
     remove_vertex(v1, graph);
 
     // Finally we can remove this tangle.
-    tangles.erase(tangleId);
+    eraseTangle(tangleId);
 
 }
 
@@ -637,6 +679,8 @@ void AssemblyPathGraph2::detangleCollidingComplementaryPair(
         // but it can actually happen in tangles with in-degree/out-degree
         // greater than 2.
         // Just mark both of them as unsolvable.
+        removeFromTangleQueue(tangleA);
+        removeFromTangleQueue(tangleB);
         tangleA.isSolvable = false;
         tangleB.isSolvable = false;
         tangleA.priority = 0;
@@ -649,6 +693,8 @@ void AssemblyPathGraph2::detangleCollidingComplementaryPair(
     if(BFollowsA and AFollowsB) {
         // This is a horrible mess where the two tangles follow each other.
         // Just mark both of them as unsolvable.
+        removeFromTangleQueue(tangleA);
+        removeFromTangleQueue(tangleB);
         tangleA.isSolvable = false;
         tangleB.isSolvable = false;
         tangleA.priority = 0;
@@ -819,8 +865,8 @@ void AssemblyPathGraph2::detangleCollidingComplementaryPair(
 
 
     // Finally we can remove these two tangles.
-    tangles.erase(tangleId0);
-    tangles.erase(tangleId1);
+    eraseTangle(tangleId0);
+    eraseTangle(tangleId1);
 }
 
 
@@ -848,11 +894,42 @@ void AssemblyPathGraph2::removeTangle(Tangle2Id tangleId)
     }
 
     // Now we can remove the tangle.
+    eraseTangle(tangleId);
+}
+
+
+
+// Remove a tangle from the tangles map and from the tangle queue.
+void AssemblyPathGraph2::eraseTangle(Tangle2Id tangleId)
+{
+    removeFromTangleQueue(getTangle(tangleId));
     tangles.erase(tangleId);
 }
 
 
 
+void AssemblyPathGraph2::addToTangleQueue(const Tangle2& tangle)
+{
+    if(tangle.isSolvable) {
+        const bool wasInserted =
+            tangleQueue.insert(make_pair(tangle.priority, tangle.tangleId)).second;
+        SHASTA_ASSERT(wasInserted);
+    }
+}
+
+
+
+void AssemblyPathGraph2::removeFromTangleQueue(const Tangle2& tangle)
+{
+    if(tangle.isSolvable) {
+        const uint64_t erasedCount =
+            tangleQueue.erase(make_pair(tangle.priority, tangle.tangleId));
+        SHASTA_ASSERT(erasedCount == 1);
+    }
+}
+
+
+
 void AssemblyPathGraph2Edge::mergeOrientedReadIds(
     const vector<OrientedReadId>& r0,
     const vector<OrientedReadId>& r1
@@ -1118,26 +1195,21 @@ void Tangle2::computePriority()
 
 
 // Return the next tangle to work on.
-// This does a linear search, which could be eliminated
-// with appropriated data structures if it becomes a
-// performance problem.
-
+// This is the solvable tangle with the highest priority.
+// In case of ties, the one with the lowest id is returned.
+// Tangles with priority 0 are never returned.
 Tangle2Id AssemblyPathGraph2::findNextTangle() const
 {
-
-    Tangle2Id bestTangleId = invalidTangle2Id;
-    uint64_t bestPriority = 0;
-    for(const auto& p: tangles) {
-        const Tangle2& tangle = p.second;
-        if(not tangle.isSolvable) {
-            continue;
-        }
-        if(tangle.priority > bestPriority) {
-            bestPriority = tangle.priority;
-            bestTangleId = tangle.tangleId;
-        }
+    if(tangleQueue.empty()) {
+        return invalidTangle2Id;
+    }
+    const uint64_t bestPriority = tangleQueue.rbegin()->first;
+    if(bestPriority == 0) {
+        return invalidTangle2Id;
     }
-    return bestTangleId;
+    const auto it = tangleQueue.lower_bound(make_pair(bestPriority, Tangle2Id(0)));
+    SHASTA_ASSERT(it != tangleQueue.end());
+    return it->second;
 }
 
 
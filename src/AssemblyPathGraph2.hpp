@@ -108,7 +108,9 @@ there is no such tangle.
 #include "algorithm.hpp"
 #include "iosfwd.hpp"
 #include <map>
+#include <set>
 #include "string.hpp"
+#include "utility.hpp"
 #include "vector.hpp"
 
 
@@ -295,6 +297,16 @@ public:
     // The tangles currently present in the graph, keyed by their ids.
     Tangle2Id nextTangleId = 0;
     std::map<Tangle2Id, Tangle2> tangles;
+
+    // The solvable tangles, keyed by (priority, tangleId).
+    // This is kept up to date as tangles are created, removed,
+    // or marked as unsolvable, so findNextTangle does not have to
+    // look at all tangles.
+    std::set< pair<uint64_t, Tangle2Id> > tangleQueue;
+    void addToTangleQueue(const Tangle2&);
+    void removeFromTangleQueue(const Tangle2&);
+    void eraseTangle(Tangle2Id);
+
     Tangle2& getTangle(Tangle2Id);
     const Tangle2& getTangle(Tangle2Id) const;
     Tangle2Id getReverseComplementTangle(Tangle2Id) const;
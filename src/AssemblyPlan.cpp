@@ -0,0 +1,712 @@
+// Shasta.
+#include "AssemblyPlan.hpp"
+#include "Alignment.hpp"
+#include "AssemblerOptions.hpp"
+#include "Base.hpp"
+#include "filesystem.hpp"
+#include "Kmer.hpp"
+#include "Marker.hpp"
+#include "MarkerGraph.hpp"
+#include "OrientedReadPair.hpp"
+#include "ReadFlags.hpp"
+#include "ReadGraph.hpp"
+#include "SHASTA_ASSERT.hpp"
+using namespace shasta;
+
+// Boost libraries.
+#include <boost/property_tree/json_parser.hpp>
+#include <boost/property_tree/ptree.hpp>
+
+// Linux.
+#include <unistd.h>
+
+// Standard library.
+#include "algorithm.hpp"
+#include "array.hpp"
+#include <cmath>
+#include <cstring>
+#include "fstream.hpp"
+#include <iomanip>
+#include <sstream>
+#include "stdexcept.hpp"
+
+
+
+// Rough defaults used when no calibration run is available.
+namespace shasta {
+    namespace AssemblyPlanDefaults {
+
+        // Defaults for the Ratios.
+        const double goodAlignmentFraction = 0.5;
+        const double markersPerVertex = 30.;
+        const double edgesPerVertex = 1.2;
+
+        // Average size in bytes of a compressed alignment.
+        const double compressedAlignmentBytes = 32.;
+
+        // Processing rates, per thread.
+        const double readBytesPerSecond = 500.e6;    // Not per thread.
+        const double rawBasesParsedPerSecond = 100.e6;
+        const double rleBasesPerSecondForMarkers = 50.e6;
+        const double lowHashMarkersPerSecond = 10.e6;
+        const double commonFeaturesPerSecond = 10.e6;
+        const double alignedMarkersPerSecond = 5.e6;
+        const double readGraphAlignmentsPerSecond = 5.e6;    // Not per thread.
+        const double markerGraphMarkersPerSecond = 2.e6;
+        const double simplifyEdgesPerSecond = 2.e6;            // Not per thread.
+        const double assemblyMarkersPerSecond = 2.e6;
+    }
+}
+
+
+
+const uint64_t AssemblyPlan::sampleByteCount;
+
+
+
+AssemblyPlan::AssemblyPlan(
+    const AssemblerOptions& assemblerOptions,
+    const vector<string>& inputFileNames,
+    uint64_t threadCount,
+    const string& calibrationDirectory) :
+    assemblerOptions(assemblerOptions),
+    threadCount(threadCount),
+    calibrationDirectory(calibrationDirectory)
+{
+    if(not calibrationDirectory.empty() and
+        not filesystem::exists(calibrationDirectory + "/AssemblySummary.json")) {
+        throw runtime_error("Calibration run summary " + calibrationDirectory +
+            "/AssemblySummary.json not found.");
+    }
+
+    // Scan the input files.
+    for(const string& inputFileName: inputFileNames) {
+        scanInputFile(inputFileName);
+    }
+    if(counts.readCount == 0.) {
+        throw runtime_error("No usable reads were found in the input files.");
+    }
+
+    // Get the Ratios from the calibration run, if available.
+    if(calibrationDirectory.empty()) {
+        ratios.alignmentCandidatesPerRead = assemblerOptions.minHashOptions.alignmentCandidatesPerRead;
+        ratios.goodAlignmentFraction = AssemblyPlanDefaults::goodAlignmentFraction;
+        ratios.markersPerVertex = AssemblyPlanDefaults::markersPerVertex;
+        ratios.edgesPerVertex = AssemblyPlanDefaults::edgesPerVertex;
+    } else {
+        readCalibrationRun();
+    }
+
+    // Estimate the remaining counts and create the forecast for each phase.
+    estimateCounts(counts);
+    phases = modelPhases(counts);
+    if(not calibrationDirectory.empty()) {
+        calibrate();
+    }
+}
+
+
+
+void AssemblyPlan::scanInputFile(const string& fileName)
+{
+    // Check the file format, as done by ReadLoader.
+    const string extension = filesystem::extension(fileName);
+    bool isFasta = false;
+    if(extension=="fasta" || extension=="fa" || extension=="FASTA" || extension=="FA") {
+        isFasta = true;
+    } else if(extension=="fastq" || extension=="fq" || extension=="FASTQ" || extension=="FQ") {
+        isFasta = false;
+    } else {
+        throw runtime_error("File extension " + extension + " is not supported. "
+            "Supported file extensions are .fasta, .fa, .FASTA, .FA, .fastq, .fq, .FASTQ, .FQ.");
+    }
+
+    // Read the beginning of the file.
+    const uint64_t fileSize = filesystem::fileSize(fileName);
+    const uint64_t n = min(fileSize, sampleByteCount);
+    const bool isCompleteFile = (n == fileSize);
+    vector<char> buffer(n);
+    ifstream file(fileName, std::ios::binary);
+    file.read(buffer.data(), std::streamsize(n));
+    if(not file) {
+        throw runtime_error("Error reading " + fileName);
+    }
+
+    // Counts for the complete reads in the sample.
+    const uint64_t minReadLength = uint64_t(assemblerOptions.readsOptions.minReadLength);
+    const double k = double(assemblerOptions.kmersOptions.k);
+    const double markerProbability = assemblerOptions.kmersOptions.probability;
+    Counts sample;
+
+    // Process a read, discarding it if ReadLoader would discard it.
+    auto processRead = [&](uint64_t headerLength, const string& sequence) {
+        uint64_t readLength = 0;
+        uint64_t rleLength = 0;
+        uint64_t repeatCount = 0;
+        uint64_t maxRepeatCount = 0;
+        char previousCharacter = 0;
+        for(const char c: sequence) {
+            if(c==' ' || c=='\t' || c=='\r') {
+                continue;
+            }
+            if(not Base::fromCharacterNoException(c).isValid()) {
+                return;
+            }
+            ++readLength;
+            const char upperCaseCharacter = char(::toupper(c));
+            if(upperCaseCharacter == previousCharacter) {
+                ++repeatCount;
+            } else {
+                ++rleLength;
+                repeatCount = 1;
+                previousCharacter = upperCaseCharacter;
+            }
+            maxRepeatCount = max(maxRepeatCount, repeatCount);
+        }
+        if(readLength < minReadLength or maxRepeatCount > 255) {
+            return;
+        }
+        sample.readCount += 1.;
+        sample.rawBaseCount += double(readLength);
+        sample.rleBaseCount += double(rleLength);
+        sample.headerByteCount += double(headerLength);
+        sample.markerCount += 2. * markerProbability * max(0., double(rleLength) - k + 1.);
+    };
+
+    // Get the line that begins at the given position.
+    // Return false if the line is not complete.
+    auto getLine = [&](uint64_t position, uint64_t& lineEnd) {
+        const void* newLine = ::memchr(buffer.data() + position, '\n', n - position);
+        if(newLine) {
+            lineEnd = uint64_t(static_cast<const char*>(newLine) - buffer.data());
+            return true;
+        } else {
+            lineEnd = n;
+            return isCompleteFile and position < n;
+        }
+    };
+
+    // Scan the complete reads in the sample.
+    // scannedByteCount is the number of bytes up to the end of the last complete read.
+    uint64_t scannedByteCount = 0;
+    uint64_t position = 0;
+    uint64_t lineEnd = 0;
+    string sequence;
+    if(isFasta) {
+        bool isInRead = false;
+        uint64_t headerLength = 0;
+        while(position < n and getLine(position, lineEnd)) {
+            if(buffer[position] == '>') {
+                if(isInRead) {
+                    processRead(headerLength, sequence);
+                    scannedByteCount = position;
+                }
+                isInRead = true;
+                headerLength = lineEnd - position - 1;
+                sequence.clear();
+            } else if(isInRead) {
+                sequence.append(buffer.data() + position, buffer.data() + lineEnd);
+            }
+            position = lineEnd + 1;
+        }
+        if(isCompleteFile and isInRead) {
+            processRead(headerLength, sequence);
+            scannedByteCount = fileSize;
+        }
+    } else {
+        while(position < n) {
+            array<uint64_t, 4> lineBegins;
+            array<uint64_t, 4> lineEnds;
+            bool isComplete = true;
+            for(uint64_t i=0; i<4; i++) {
+                lineBegins[i] = position;
+                if(not getLine(position, lineEnds[i])) {
+                    isComplete = false;
+                    break;
+                }
+                position = lineEnds[i] + 1;
+            }
+            if(not isComplete) {
+                break;
+            }
+            if(buffer[lineBegins[0]] != '@') {
+                throw runtime_error("Invalid fastq file " + fileName + ". "
+                    "Only fastq files with each read on exactly 4 lines are supported.");
+            }
+            sequence.assign(buffer.data() + lineBegins[1], buffer.data() + lineEnds[1]);
+            processRead(lineEnds[0] - lineBegins[0] - 1, sequence);
+            scannedByteCount = min(position, fileSize);
+        }
+    }
+
+    if(scannedByteCount == 0) {
+        if(fileSize == 0) {
+            return;
+        }
+        throw runtime_error("No complete reads were found in the first " +
+            to_string(n) + " bytes of " + fileName);
+    }
+
+    // Extrapolate to the entire file.
+    const double scale = double(fileSize) / double(scannedByteCount);
+    counts.inputByteCount += double(fileSize);
+    counts.maxInputFileByteCount = max(counts.maxInputFileByteCount, double(fileSize));
+    counts.readCount += scale * sample.readCount;
+    counts.rawBaseCount += scale * sample.rawBaseCount;
+    counts.rleBaseCount += scale * sample.rleBaseCount;
+    counts.headerByteCount += scale * sample.headerByteCount;
+    counts.markerCount += scale * sample.markerCount;
+
+    cout << fileName << ": " << fileSize << " bytes, " <<
+        (isCompleteFile ? "scanned entirely" : "scanned the first " + to_string(scannedByteCount) + " bytes") <<
+        ", estimated " << uint64_t(scale * sample.readCount) << " usable reads with " <<
+        uint64_t(scale * sample.rawBaseCount) << " bases." << endl;
+}
+
+
+
+void AssemblyPlan::estimateCounts(Counts& c) const
+{
+    if(assemblerOptions.minHashOptions.allPairs) {
+        c.alignmentCandidateCount = c.readCount * (c.readCount - 1.) / 2.;
+    } else {
+        c.alignmentCandidateCount = c.readCount * ratios.alignmentCandidatesPerRead / 2.;
+    }
+    c.goodAlignmentCount = c.alignmentCandidateCount * ratios.goodAlignmentFraction;
+    c.markerGraphVertexCount = c.markerCount / ratios.markersPerVertex;
+    c.markerGraphEdgeCount = c.markerGraphVertexCount * ratios.edgesPerVertex;
+}
+
+
+
+vector<AssemblyPlan::Phase> AssemblyPlan::modelPhases(const Counts& c) const
+{
+    using namespace AssemblyPlanDefaults;
+    const double threads = double(threadCount);
+    const double orientedReadCount = 2. * c.readCount;
+    const double k = double(assemblerOptions.kmersOptions.k);
+    const double markersPerOrientedRead = c.markerCount / orientedReadCount;
+    const double coverage = c.markerCount / max(1., c.markerGraphVertexCount);
+    const double uint40Bytes = 5.;
+    const double tocBytes = 8.;
+    vector<Phase> v;
+
+
+
+    // Loading reads. The entire input file being processed
+    // is read in memory, and each thread stores the reads it finds
+    // before they are copied to the global data structures.
+    {
+        Phase phase("loading reads");
+        const double readBytes =
+            c.rleBaseCount / 4. + 2. * tocBytes * c.readCount +     // Bases, 2 bits each.
+            c.rleBaseCount + tocBytes * c.readCount +               // Repeat counts.
+            c.headerByteCount + 2. * tocBytes * c.readCount;        // Names and meta data.
+        phase.persistentData.push_back(make_pair("reads", readBytes));
+        phase.persistentData.push_back(make_pair("read flags", c.readCount * double(sizeof(ReadFlags))));
+        phase.temporaryData.push_back(make_pair("input file buffer", c.maxInputFileByteCount));
+        phase.temporaryData.push_back(make_pair("reads found by each thread",
+            readBytes * c.maxInputFileByteCount / c.inputByteCount));
+        phase.cpuSeconds =
+            threads * c.inputByteCount / readBytesPerSecond +
+            c.rawBaseCount / rawBasesParsedPerSecond;
+        v.push_back(phase);
+    }
+
+
+
+    // Finding markers.
+    {
+        Phase phase("finding markers");
+        phase.persistentData.push_back(make_pair("k-mer table",
+            std::pow(4., k) * double(sizeof(KmerInfo))));
+        phase.persistentData.push_back(make_pair("markers",
+            c.markerCount * double(sizeof(CompressedMarker)) + tocBytes * orientedReadCount));
+        phase.cpuSeconds = c.rleBaseCount / rleBasesPerSecondForMarkers;
+        v.push_back(phase);
+    }
+
+
+
+    // Finding alignment candidates, modeled after LowHash1,
+    // or LowHash0 if MinHash.version is 0.
+    // Each marker generates a feature, and each feature generates
+    // a low hash with probability hashFraction.
+    // Each low hash goes to a bucket that contains about coverage features,
+    // which generate coverage/2 common features (LowHash1)
+    // or candidate pairs (LowHash0) each.
+    // The number of buckets is the one chosen automatically,
+    // which is what the assembly uses.
+    // MinHash.allPairs is not modeled (see write).
+    {
+        Phase phase("finding alignment candidates");
+        const double hashFraction = assemblerOptions.minHashOptions.hashFraction;
+        const double iterationCount = double(assemblerOptions.minHashOptions.minHashIterationCount);
+        const double lowHashCount = max(1., hashFraction * c.markerCount);
+        const double bucketCount = std::pow(2., 5. + std::floor(std::log2(lowHashCount)) + 1.);
+        const double commonFeatureCount = iterationCount * lowHashCount * coverage / 2.;
+        const double bucketEntryBytes = 8.;     // LowHash0::BucketEntry, LowHash1::BucketEntry
+        phase.temporaryData.push_back(make_pair("k-mer ids",
+            c.markerCount * double(sizeof(KmerId)) + tocBytes * orientedReadCount));
+        if(assemblerOptions.minHashOptions.version == 0) {
+            const double candidateBytes = 8.;   // LowHash0::Candidate
+            phase.temporaryData.push_back(make_pair("LowHash buckets",
+                tocBytes * bucketCount + bucketEntryBytes * lowHashCount));
+            phase.temporaryData.push_back(make_pair("LowHash low hashes", 8. * lowHashCount));
+            phase.temporaryData.push_back(make_pair("LowHash candidates",
+                commonFeatureCount * candidateBytes));
+        } else {
+            const double commonFeatureBytes = double(sizeof(OrientedReadPair)) + 8.;    // LowHash1::CommonFeature
+            const double commonFeatureInfoBytes = 16.; // LowHash1::CommonFeatureInfo
+            phase.temporaryData.push_back(make_pair("LowHash buckets",
+                tocBytes * bucketCount + 2. * bucketEntryBytes * lowHashCount));
+            phase.temporaryData.push_back(make_pair("LowHash common features",
+                commonFeatureCount * (commonFeatureBytes + commonFeatureInfoBytes)));
+        }
+        phase.persistentData.push_back(make_pair("alignment candidates",
+            c.alignmentCandidateCount * (double(sizeof(OrientedReadPair)) + tocBytes +
+            double(assemblerOptions.minHashOptions.minFrequency) * 8.)));
+        phase.cpuSeconds =
+            iterationCount * c.markerCount / lowHashMarkersPerSecond +
+            commonFeatureCount / commonFeaturesPerSecond;
+        v.push_back(phase);
+    }
+
+
+
+    // Computing alignments.
+    {
+        Phase phase("computing alignments");
+        const double alignmentDataBytes = c.goodAlignmentCount * double(sizeof(AlignmentData));
+        const double compressedAlignmentsBytes = c.goodAlignmentCount * (compressedAlignmentBytes + tocBytes);
+        phase.persistentData.push_back(make_pair("alignment data", alignmentDataBytes));
+        phase.persistentData.push_back(make_pair("compressed alignments", compressedAlignmentsBytes));
+        phase.persistentData.push_back(make_pair("alignment table",
+            4. * c.goodAlignmentCount * double(sizeof(uint32_t)) + tocBytes * orientedReadCount));
+        phase.temporaryData.push_back(make_pair("alignments found by each thread",
+            alignmentDataBytes + compressedAlignmentsBytes));
+        phase.cpuSeconds = c.alignmentCandidateCount * markersPerOrientedRead / alignedMarkersPerSecond;
+        v.push_back(phase);
+    }
+
+
+
+    // Creating the read graph.
+    const double readGraphEdgeCount = 2. * min(c.goodAlignmentCount,
+        c.readCount * double(assemblerOptions.readGraphOptions.maxAlignmentCount));
+    {
+        Phase phase("creating the read graph");
+        phase.persistentData.push_back(make_pair("read graph",
+            readGraphEdgeCount * (double(sizeof(ReadGraphEdge)) + 2. * double(sizeof(uint32_t))) +
+            orientedReadCount * double(sizeof(uint32_t))));
+        phase.cpuSeconds = threads * c.goodAlignmentCount / readGraphAlignmentsPerSecond;
+        v.push_back(phase);
+    }
+
+
+
+    // The marker graph. This is also used by iterative assembly.
+    const double V = c.markerGraphVertexCount;
+    const double E = c.markerGraphEdgeCount;
+    const double markerGraphVertexBytes =
+        c.markerCount * (uint40Bytes + double(sizeof(MarkerId))) +   // vertexTable, vertices
+        V * (uint40Bytes + double(sizeof(MarkerGraph::VertexId)));                // vertices toc, reverse complement
+    const double markerGraphEdgeBytes =
+        E * double(sizeof(MarkerGraph::Edge)) +
+        c.markerCount * double(sizeof(MarkerInterval)) + E * tocBytes +          // edgeMarkerIntervals
+        2. * (E * uint40Bytes + V * tocBytes) +                                  // edgesBySource, edgesByTarget
+        E * double(sizeof(MarkerGraph::EdgeId));                                 // reverseComplementEdge
+    const double createMarkerGraphVerticesBytes =
+        c.markerCount * 3. * double(sizeof(MarkerGraph::VertexId));
+    const double markerGraphCpuSeconds = c.markerCount / markerGraphMarkersPerSecond;
+    const double simplifyCpuSeconds = threads * E / simplifyEdgesPerSecond;
+
+    if(assemblerOptions.assemblyOptions.iterative) {
+        Phase phase("iterative assembly");
+        phase.temporaryData.push_back(make_pair("marker graph vertices", markerGraphVertexBytes));
+        phase.temporaryData.push_back(make_pair("marker graph edges", markerGraphEdgeBytes));
+        phase.temporaryData.push_back(make_pair("disjoint sets", createMarkerGraphVerticesBytes));
+        phase.cpuSeconds = double(assemblerOptions.assemblyOptions.iterativeIterationCount) *
+            (markerGraphCpuSeconds + simplifyCpuSeconds);
+        v.push_back(phase);
+    }
+
+
+
+    // Creating the marker graph.
+    {
+        Phase phase("creating the marker graph");
+        phase.persistentData.push_back(make_pair("marker graph vertices", markerGraphVertexBytes));
+        phase.persistentData.push_back(make_pair("marker graph edges", markerGraphEdgeBytes));
+        phase.temporaryData.push_back(make_pair("disjoint sets", createMarkerGraphVerticesBytes));
+        phase.cpuSeconds = markerGraphCpuSeconds;
+        v.push_back(phase);
+    }
+
+
+
+    // Simplifying the marker graph and creating the assembly graph.
+    {
+        Phase phase("simplifying the marker graph and creating the assembly graph");
+        phase.persistentData.push_back(make_pair("assembly graph",
+            2. * E * double(sizeof(MarkerGraph::EdgeId))));
+        phase.temporaryData.push_back(make_pair("simplification work areas",
+            (E + V) * double(sizeof(MarkerGraph::EdgeId))));
+        phase.cpuSeconds = simplifyCpuSeconds;
+        v.push_back(phase);
+    }
+
+
+
+    // Sequence assembly.
+    {
+        Phase phase("sequence assembly");
+        const double edgeConsensusBaseCount = E * max(1., c.rleBaseCount / (c.markerCount / 2.) - k);
+        phase.persistentData.push_back(make_pair("vertex consensus", V * k));
+        phase.persistentData.push_back(make_pair("edge consensus",
+            edgeConsensusBaseCount * 2. + E * (tocBytes + 1.)));
+        phase.cpuSeconds = c.markerCount / assemblyMarkersPerSecond;
+        v.push_back(phase);
+    }
+
+
+
+    // Compute peak memory and elapsed time.
+    double persistentBytes = 0.;
+    for(Phase& phase: v) {
+        double phaseBytes = 0.;
+        for(const auto& p: phase.persistentData) {
+            phaseBytes += p.second;
+        }
+        for(const auto& p: phase.temporaryData) {
+            phaseBytes += p.second;
+        }
+        phase.peakBytes = persistentBytes + phaseBytes;
+        for(const auto& p: phase.persistentData) {
+            persistentBytes += p.second;
+        }
+        phase.elapsedSeconds = phase.cpuSeconds / threads;
+    }
+
+    return v;
+}
+
+
+
+pair<string, double> AssemblyPlan::Phase::largestData() const
+{
+    pair<string, double> largest("", 0.);
+    for(const auto& p: persistentData) {
+        if(p.second > largest.second) {
+            largest = p;
+        }
+    }
+    for(const auto& p: temporaryData) {
+        if(p.second > largest.second) {
+            largest = p;
+        }
+    }
+    return largest;
+}
+
+
+
+void AssemblyPlan::readCalibrationRun()
+{
+    const string fileName = calibrationDirectory + "/AssemblySummary.json";
+    using boost::property_tree::ptree;
+    ptree summary;
+    try {
+        boost::property_tree::read_json(fileName, summary);
+
+        Counts& c = calibrationCounts;
+        c.readCount = summary.get<double>("Reads used in this assembly.Number of reads");
+        c.rawBaseCount = summary.get<double>("Reads used in this assembly.Number of raw sequence bases");
+        c.rleBaseCount = summary.get<double>("Reads used in this assembly.Number of run-length encoded bases");
+        c.markerCount = summary.get<double>("Markers.Total number of markers on all reads, both strands");
+        c.alignmentCandidateCount = summary.get<double>(
+            "Alignments.Number of alignment candidates found by the LowHash algorithm");
+        c.goodAlignmentCount = summary.get<double>("Alignments.Number of good alignments");
+        c.markerGraphVertexCount = summary.get<double>("Marker graph.Total number of vertices");
+        c.markerGraphEdgeCount = summary.get<double>("Marker graph.Total number of edges");
+
+        // The input size is not in the summary.
+        // Assume the same number of input bytes per base as the current input.
+        c.inputByteCount = c.rawBaseCount * counts.inputByteCount / counts.rawBaseCount;
+        c.maxInputFileByteCount = c.inputByteCount * counts.maxInputFileByteCount / counts.inputByteCount;
+        c.headerByteCount = c.readCount * counts.headerByteCount / counts.readCount;
+
+        // The measured peak memory and time of each phase.
+        const auto steps = summary.get_child_optional("Performance.Steps");
+        if(steps) {
+            for(const auto& p: *steps) {
+                const ptree& step = p.second;
+                MeasuredPhase measuredPhase;
+                measuredPhase.name = step.get<string>("Step");
+                measuredPhase.peakBytes =
+                    step.get<double>("Peak memory including huge pages (bytes)", 0.);
+                measuredPhase.elapsedSeconds = step.get<double>("Elapsed time (seconds)");
+                measuredPhase.cpuSeconds =
+                    step.get<double>("User CPU time (seconds)") +
+                    step.get<double>("System CPU time (seconds)");
+                measuredPhases.push_back(measuredPhase);
+            }
+        }
+    } catch(const boost::property_tree::ptree_error& e) {
+        throw runtime_error("Error reading calibration run summary " + fileName + ": " + e.what());
+    }
+
+    if(measuredPhases.empty()) {
+        cout << fileName << " does not contain a performance profile. "
+            "Only the counts of the calibration run will be used." << endl;
+    } else if(measuredPhases.front().peakBytes == 0.) {
+        cout << "The performance profile in " << fileName << " does not include "
+            "huge page memory, so it will not be used to calibrate memory." << endl;
+    }
+
+    // Compute the Ratios.
+    const Counts& c = calibrationCounts;
+    if(c.readCount == 0. or c.alignmentCandidateCount == 0. or c.markerGraphVertexCount == 0.) {
+        throw runtime_error("Calibration run " + calibrationDirectory + " is not usable.");
+    }
+    ratios.alignmentCandidatesPerRead = 2. * c.alignmentCandidateCount / c.readCount;
+    ratios.goodAlignmentFraction = c.goodAlignmentCount / c.alignmentCandidateCount;
+    ratios.markersPerVertex = c.markerCount / c.markerGraphVertexCount;
+    ratios.edgesPerVertex = c.markerGraphEdgeCount / c.markerGraphVertexCount;
+}
+
+
+
+// For each phase measured in the calibration run, scale the
+// forecast by the ratio between measured and modeled values
+// for the calibration run.
+// The elapsed time is scaled using the CPU time, so it
+// does not depend on the number of threads used by the calibration run.
+void AssemblyPlan::calibrate()
+{
+    const vector<Phase> calibrationPhases = modelPhases(calibrationCounts);
+    SHASTA_ASSERT(calibrationPhases.size() == phases.size());
+
+    for(uint64_t i=0; i<phases.size(); i++) {
+        Phase& phase = phases[i];
+        const Phase& calibrationPhase = calibrationPhases[i];
+        for(const MeasuredPhase& measuredPhase: measuredPhases) {
+            if(measuredPhase.name != phase.name) {
+                continue;
+            }
+            if(measuredPhase.peakBytes > 0. and calibrationPhase.peakBytes > 0.) {
+                phase.peakBytes *= measuredPhase.peakBytes / calibrationPhase.peakBytes;
+                phase.isMemoryCalibrated = true;
+            }
+            if(measuredPhase.cpuSeconds > 0. and calibrationPhase.cpuSeconds > 0.) {
+                phase.cpuSeconds *= measuredPhase.cpuSeconds / calibrationPhase.cpuSeconds;
+                phase.elapsedSeconds = phase.cpuSeconds / double(threadCount);
+                phase.isTimeCalibrated = true;
+            }
+        }
+    }
+}
+
+
+
+void AssemblyPlan::write(ostream& s) const
+{
+    const double GB = 1024. * 1024. * 1024.;
+    const auto oldFlags = s.flags();
+    const auto oldPrecision = s.precision();
+    s << std::fixed << std::setprecision(2);
+
+    s << "\nEstimated counts:\n"
+        "Reads: " << uint64_t(counts.readCount) << "\n"
+        "Raw bases: " << uint64_t(counts.rawBaseCount) << "\n"
+        "Run-length encoded bases: " << uint64_t(counts.rleBaseCount) << "\n"
+        "Markers, both strands: " << uint64_t(counts.markerCount) << "\n"
+        "Alignment candidates: " << uint64_t(counts.alignmentCandidateCount) << "\n"
+        "Good alignments: " << uint64_t(counts.goodAlignmentCount) << "\n"
+        "Marker graph vertices: " << uint64_t(counts.markerGraphVertexCount) << "\n"
+        "Marker graph edges: " << uint64_t(counts.markerGraphEdgeCount) << "\n";
+    if(calibrationDirectory.empty()) {
+        s << "No calibration run was specified (--planCalibration). "
+            "The following default assumptions were used:\n"
+            "Alignment candidates per read: " << ratios.alignmentCandidatesPerRead << "\n"
+            "Fraction of good alignments: " << ratios.goodAlignmentFraction << "\n"
+            "Coverage (markers per marker graph vertex): " << ratios.markersPerVertex << "\n"
+            "Marker graph edges per vertex: " << ratios.edgesPerVertex << "\n";
+    } else {
+        s << "Alignment candidates, good alignments, and marker graph vertices and edges "
+            "were estimated using calibration run " << calibrationDirectory << ".\n";
+    }
+
+    s << "\nForecast for each phase using " << threadCount << " threads:\n";
+    s << std::left << std::setw(66) << "Phase" << std::right <<
+        std::setw(18) << "Peak memory (GB)" <<
+        std::setw(18) << "Time (minutes)" <<
+        "  Largest data structure\n";
+    double peakBytes = 0.;
+    string peakPhaseName;
+    double totalSeconds = 0.;
+    bool allCalibrated = true;
+    vector<string> phasesNotInProfile;
+    for(const Phase& phase: phases) {
+        const auto largest = phase.largestData();
+
+        // Values that are not calibrated are followed by "*".
+        std::ostringstream peakMemoryString;
+        peakMemoryString << std::fixed << std::setprecision(2) << phase.peakBytes / GB <<
+            (phase.isMemoryCalibrated ? " " : "*");
+        std::ostringstream timeString;
+        timeString << std::fixed << std::setprecision(2) << phase.elapsedSeconds / 60. <<
+            (phase.isTimeCalibrated ? " " : "*");
+
+        s << std::left << std::setw(66) << phase.name << std::right <<
+            std::setw(18) << peakMemoryString.str() <<
+            std::setw(18) << timeString.str() << "  " <<
+            largest.first << " (" << largest.second / GB << " GB)\n";
+        if(phase.peakBytes > peakBytes) {
+            peakBytes = phase.peakBytes;
+            peakPhaseName = phase.name;
+        }
+        totalSeconds += phase.elapsedSeconds;
+        allCalibrated = allCalibrated and phase.isMemoryCalibrated and phase.isTimeCalibrated;
+
+        if(not measuredPhases.empty() and
+            std::find_if(measuredPhases.begin(), measuredPhases.end(),
+            [&phase](const MeasuredPhase& measuredPhase)
+            {
+                return measuredPhase.name == phase.name;
+            }) == measuredPhases.end()) {
+            phasesNotInProfile.push_back(phase.name);
+        }
+    }
+    if(not allCalibrated) {
+        s << "* Not calibrated. This value uses rough built-in defaults "
+            "and can be off by a large factor.\n";
+    }
+    if(not phasesNotInProfile.empty()) {
+        s << "The performance profile of the calibration run does not include the following phases, "
+            "for example because that run was resumed with --resume, "
+            "so they were not calibrated:\n";
+        for(const string& phaseName: phasesNotInProfile) {
+            s << "    " << phaseName << "\n";
+        }
+    }
+    if(assemblerOptions.minHashOptions.allPairs) {
+        s << "MinHash.allPairs is not modeled. The forecast for finding alignment candidates "
+            "and later phases assumes that alignment candidates are found by the LowHash algorithm.\n";
+    } else if(assemblerOptions.minHashOptions.version == 0) {
+        s << "Finding alignment candidates was modeled after MinHash.version 0, "
+            "but its time uses the built-in rates of MinHash.version 1.\n";
+    }
+    s << "\nEstimated peak memory: " << peakBytes / GB << " GB, during phase " << peakPhaseName << ".\n";
+    s << "Estimated total time: " << totalSeconds / 3600. << " hours.\n";
+
+    const double physicalMemory = double(::sysconf(_SC_PHYS_PAGES)) * double(::sysconf(_SC_PAGESIZE));
+    s << "This machine has " << physicalMemory / GB << " GB of memory.\n";
+    if(peakBytes > 0.9 * physicalMemory) {
+        s << "WARNING: this assembly is likely to run out of memory on this machine.\n";
+    }
+    s << endl;
+
+    s.flags(oldFlags);
+    s.precision(oldPrecision);
+}
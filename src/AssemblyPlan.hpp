@@ -0,0 +1,170 @@
+#ifndef SHASTA_ASSEMBLY_PLAN_HPP
+#define SHASTA_ASSEMBLY_PLAN_HPP
+
+/*******************************************************************************
+
+Class AssemblyPlan, used by --command plan, forecasts the peak memory
+and elapsed time of each phase of an assembly before running it.
+
+The input files are scanned to estimate the number of reads
+and bases that will be used, after discarding reads as done
+when loading them (reads shorter than Reads.minReadLength,
+reads containing invalid bases, and reads containing
+repeat counts greater than 255). For large files, only the
+first sampleByteCount bytes are scanned, and the results are
+extrapolated using the file size.
+
+From these, and from the assembly options, the planner estimates
+the number of markers, alignment candidates, good alignments,
+and marker graph vertices and edges, and the size of the major
+data structures used by each phase. The peak memory of a phase
+is estimated as the size of the data structures that persist
+from earlier phases, plus the data structures
+created by the phase (including temporary ones).
+
+Some of these estimates depend on properties of the genome and
+reads that cannot be obtained from the input files, such as coverage.
+If the assembly directory of an earlier run of a similar assembly
+is available, its AssemblySummary.json is used to calibrate these
+estimates, as well as the memory and time forecast for each phase,
+using the per-phase profile recorded by class PerformanceProfile.
+The calibration uses the peak memory including huge pages,
+because the peak resident memory alone does not include them.
+Phases not in the profile of the calibration run are not calibrated.
+Without calibration, the forecast uses built-in rough defaults,
+and can be off by a large factor. Values that are not calibrated
+are flagged in the output.
+
+*******************************************************************************/
+
+// Standard library.
+#include "cstdint.hpp"
+#include "iostream.hpp"
+#include "string.hpp"
+#include "utility.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    class AssemblyPlan;
+    class AssemblerOptions;
+}
+
+
+
+class shasta::AssemblyPlan {
+public:
+
+    AssemblyPlan(
+        const AssemblerOptions&,
+        const vector<string>& inputFileNames,
+        uint64_t threadCount,
+
+        // The assembly directory of an earlier run used for calibration,
+        // or empty for no calibration.
+        const string& calibrationDirectory);
+
+    // Write the estimates and the forecast for each phase.
+    void write(ostream&) const;
+
+    // For large input files, only this number of bytes at
+    // the beginning of the file is scanned.
+    static const uint64_t sampleByteCount = 64 * 1024 * 1024;
+
+private:
+
+    const AssemblerOptions& assemblerOptions;
+    uint64_t threadCount;
+
+    // The counts that determine the size of data structures
+    // and the amount of work done by each phase.
+    // These are estimates, so they are stored as double.
+    class Counts {
+    public:
+        double inputByteCount = 0.;
+        double maxInputFileByteCount = 0.;
+        double readCount = 0.;
+        double rawBaseCount = 0.;
+        double rleBaseCount = 0.;
+        double headerByteCount = 0.;        // Read names and meta data.
+        double markerCount = 0.;            // Both strands.
+        double alignmentCandidateCount = 0.;
+        double goodAlignmentCount = 0.;
+        double markerGraphVertexCount = 0.;
+        double markerGraphEdgeCount = 0.;
+    };
+    Counts counts;
+
+    // Ratios used to estimate counts that depend on properties
+    // of the genome and reads. They are obtained from the calibration run,
+    // if one is available, and otherwise set to rough defaults.
+    class Ratios {
+    public:
+        double alignmentCandidatesPerRead;
+        double goodAlignmentFraction;
+        double markersPerVertex;
+        double edgesPerVertex;
+    };
+    Ratios ratios;
+
+    // Scan an input file and update the read and base counts.
+    void scanInputFile(const string& fileName);
+
+    // Estimate the markers, alignments, and marker graph counts
+    // from the read counts, using the current Ratios.
+    void estimateCounts(Counts&) const;
+
+    // The forecast for a phase.
+    class Phase {
+    public:
+        string name;
+
+        // The data structures created by this phase,
+        // with their estimated size in bytes.
+        // Persistent data structures remain in memory
+        // after the phase ends.
+        vector< pair<string, double> > persistentData;
+        vector< pair<string, double> > temporaryData;
+
+        // The estimated CPU time, using built-in rates.
+        double cpuSeconds = 0.;
+
+        // Peak memory and elapsed time forecast.
+        double peakBytes = 0.;
+        double elapsedSeconds = 0.;
+        bool isMemoryCalibrated = false;
+        bool isTimeCalibrated = false;
+
+        Phase(const string& name) : name(name) {}
+        pair<string, double> largestData() const;
+    };
+    vector<Phase> phases;
+
+    // Create the Phases for the given counts.
+    vector<Phase> modelPhases(const Counts&) const;
+
+    // Read the AssemblySummary.json of the calibration run.
+    // This computes the Ratios, and the measured peak memory,
+    // elapsed time, and CPU time of each phase.
+    string calibrationDirectory;
+    Counts calibrationCounts;
+    class MeasuredPhase {
+    public:
+        string name;
+
+        // The peak memory including huge pages, or 0 if not available.
+        // The peak resident memory alone is not used,
+        // because it does not include huge pages (hugetlbfs).
+        double peakBytes;
+        double elapsedSeconds;
+        double cpuSeconds;
+    };
+    vector<MeasuredPhase> measuredPhases;
+    void readCalibrationRun();
+
+    // Use the calibration run to scale the forecast of each phase.
+    // Phases not in the profile of the calibration run
+    // (for example, because it was resumed with --resume) are not calibrated.
+    void calibrate();
+};
+
+#endif
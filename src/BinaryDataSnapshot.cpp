@@ -0,0 +1,740 @@
+// Shasta.
+#include "BinaryDataSnapshot.hpp"
+#include "filesystem.hpp"
+#include "mappedCopy.hpp"
+#include "MurmurHash2.hpp"
+#include "SHASTA_ASSERT.hpp"
+#include "ThreadPool.hpp"
+#include "timestamp.hpp"
+using namespace shasta;
+
+// Zlib.
+#include <zlib.h>
+
+// Linux.
+#include <errno.h>
+#include <fcntl.h>
+#include <string.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+
+// Standard library.
+#include "algorithm.hpp"
+#include <atomic>
+#include <chrono>
+#include <cstdio>
+#include "fstream.hpp"
+#include "iostream.hpp"
+#include <iomanip>
+#include <sstream>
+#include "stdexcept.hpp"
+#include "utility.hpp"
+#include "vector.hpp"
+
+
+
+const string BinaryDataSnapshot::manifestFileName = "Manifest.csv";
+
+
+
+namespace shasta {
+    namespace BinaryDataSnapshot {
+
+        // The size of the chunks processed by each thread.
+        const uint64_t chunkSize = mappedCopyChunkSize;
+
+        // Information about one binary data file.
+        class File {
+        public:
+
+            // The file name, without the directory.
+            string name;
+
+            // The uncompressed size.
+            uint64_t size = 0;
+
+            bool isCompressed = false;
+
+            // A checksum of the uncompressed content,
+            // computed from the checksums of the chunks.
+            uint64_t checksum = 0;
+
+            uint64_t chunkCount() const
+            {
+                return (size + chunkSize - 1) / chunkSize;
+            }
+
+            // Work areas used during save and restore.
+            vector<uint64_t> chunkChecksums;
+            vector<uint64_t> compressedChunkSizes;
+            vector<uint64_t> compressedChunkOffsets;
+            char* data = 0;
+            int fileDescriptor = -1;
+        };
+
+        vector<File> readManifest(const string& snapshotDirectory);
+        void writeManifest(const string& snapshotDirectory, const vector<File>&);
+
+        uint64_t chunkChecksum(const char* begin, uint64_t size);
+        uint64_t fileChecksum(const vector<uint64_t>& chunkChecksums);
+
+        // Low level I/O. These throw an exception in case of error.
+        int openFile(const string& path, int flags);
+        char* mapFile(const string& path, int fileDescriptor, uint64_t size, bool write);
+        void unmapFile(const string& path, char* data, uint64_t size);
+        void readAt(int fileDescriptor, char* buffer, uint64_t size, uint64_t offset, const string& path);
+        void writeAt(int fileDescriptor, const char* buffer, uint64_t size, uint64_t offset, const string& path);
+
+        void writeThroughput(uint64_t byteCount, std::chrono::steady_clock::time_point tBegin);
+
+        // Create dataDirectory as a symbolic link to snapshotDirectory.
+        void createLink(const string& snapshotDirectory, const string& dataDirectory);
+    }
+}
+
+
+
+void BinaryDataSnapshot::save(
+    const string& dataDirectory,
+    const string& snapshotDirectory,
+    const string& compression,
+    uint64_t threadCount)
+{
+    if(compression != "none" and compression != "zlib") {
+        throw runtime_error("Invalid binary data compression " + compression +
+            ". Valid values are none, zlib.");
+    }
+    const bool compress = (compression == "zlib");
+    if(filesystem::exists(snapshotDirectory)) {
+        throw runtime_error(snapshotDirectory + " already exists.");
+    }
+    const auto tBegin = std::chrono::steady_clock::now();
+
+    // Gather the binary data files.
+    vector<File> files;
+    for(const string& path: filesystem::directoryContents(dataDirectory)) {
+        if(not filesystem::isRegularFile(path)) {
+            continue;
+        }
+        File file;
+        file.name = path.substr(path.find_last_of('/') + 1);
+        file.size = filesystem::fileSize(path);
+        file.isCompressed = compress;
+        files.push_back(file);
+    }
+    sort(files.begin(), files.end(),
+        [](const File& x, const File& y) {return x.name < y.name;});
+    uint64_t totalSize = 0;
+    for(const File& file: files) {
+        totalSize += file.size;
+    }
+    cout << timestamp << "Saving " << files.size() << " binary data files (" <<
+        totalSize << " bytes) from " << dataDirectory << " to " << snapshotDirectory <<
+        " using " << threadCount << " threads";
+    if(compress) {
+        cout << " with zlib compression";
+    }
+    cout << "." << endl;
+
+    filesystem::createDirectory(snapshotDirectory);
+    for(File& file: files) {
+        file.chunkChecksums.resize(file.chunkCount());
+    }
+    uint64_t outputSize = 0;
+    if(not compress) {
+
+        // All chunks of all files are copied in parallel.
+        vector<string> fileNames;
+        for(const File& file: files) {
+            fileNames.push_back(file.name);
+        }
+        mappedCopyFiles(dataDirectory, snapshotDirectory, fileNames, threadCount,
+            [&files](uint64_t fileId, uint64_t chunkId, const char* begin, uint64_t size)
+            {
+                files[fileId].chunkChecksums[chunkId] = chunkChecksum(begin, size);
+            });
+        outputSize = totalSize;
+
+    } else {
+
+        // Map the input files and create the output files.
+        for(File& file: files) {
+            const string inputPath = dataDirectory + "/" + file.name;
+            const string outputPath = snapshotDirectory + "/" + file.name;
+            const int inputFileDescriptor = openFile(inputPath, O_RDONLY);
+            file.data = mapFile(inputPath, inputFileDescriptor, file.size, false);
+            ::close(inputFileDescriptor);
+            file.fileDescriptor = openFile(outputPath, O_CREAT | O_TRUNC | O_WRONLY);
+#ifdef __linux__
+            if(file.data) {
+                ::madvise(file.data, file.size, MADV_SEQUENTIAL);
+            }
+#endif
+        }
+
+        // Chunks are compressed in parallel, one group of threadCount chunks
+        // of a file at a time, and then written in parallel.
+        // This way memory for the compressed chunks is bounded.
+        ThreadPool& threadPool = ThreadPool::instance();
+        const uint64_t bufferSize = compressBound(uLong(chunkSize));
+        vector< vector<char> > buffers(threadCount, vector<char>(bufferSize));
+        for(File& file: files) {
+            const string outputPath = snapshotDirectory + "/" + file.name;
+            const uint64_t chunkCount = file.chunkCount();
+            file.compressedChunkSizes.resize(chunkCount);
+            uint64_t outputOffset = 0;
+            for(uint64_t firstChunkId=0; firstChunkId<chunkCount; firstChunkId+=threadCount) {
+                const uint64_t groupSize = min(threadCount, chunkCount - firstChunkId);
+
+                // Compress the chunks of this group.
+                threadPool.run([&](uint64_t i) {
+                    const uint64_t chunkId = firstChunkId + i;
+                    const uint64_t begin = chunkId * chunkSize;
+                    const uint64_t size = min(chunkSize, file.size - begin);
+                    uLongf compressedSize = uLongf(bufferSize);
+                    const int status = compress2(
+                        reinterpret_cast<Bytef*>(buffers[i].data()), &compressedSize,
+                        reinterpret_cast<const Bytef*>(file.data + begin), uLong(size),
+                        Z_BEST_SPEED);
+                    if(status != Z_OK) {
+                        throw runtime_error("Error " + to_string(status) +
+                            " compressing " + file.name);
+                    }
+                    file.compressedChunkSizes[chunkId] = compressedSize;
+                    file.chunkChecksums[chunkId] = chunkChecksum(file.data + begin, size);
+                }, groupSize);
+
+                // Write them.
+                vector<uint64_t> offsets(groupSize);
+                for(uint64_t i=0; i<groupSize; i++) {
+                    offsets[i] = outputOffset;
+                    outputOffset += file.compressedChunkSizes[firstChunkId + i];
+                }
+                threadPool.run([&](uint64_t i) {
+                    writeAt(file.fileDescriptor, buffers[i].data(),
+                        file.compressedChunkSizes[firstChunkId + i], offsets[i], outputPath);
+                }, groupSize);
+            }
+
+            // Write the compressed chunk sizes at the end of the file.
+            writeAt(file.fileDescriptor,
+                reinterpret_cast<const char*>(file.compressedChunkSizes.data()),
+                chunkCount * sizeof(uint64_t), outputOffset, outputPath);
+            outputSize += outputOffset + chunkCount * sizeof(uint64_t);
+        }
+
+        // Clean up.
+        for(File& file: files) {
+            unmapFile(dataDirectory + "/" + file.name, file.data, file.size);
+            if(::close(file.fileDescriptor) == -1) {
+                throw runtime_error("Error closing " + snapshotDirectory + "/" + file.name +
+                    ": " + strerror(errno));
+            }
+        }
+    }
+    for(File& file: files) {
+        file.checksum = fileChecksum(file.chunkChecksums);
+    }
+
+    // The manifest is written last, so its presence indicates
+    // that the snapshot is complete.
+    writeManifest(snapshotDirectory, files);
+
+    if(compress) {
+        cout << "Snapshot size is " << outputSize << " bytes, compression ratio " <<
+            double(totalSize) / double(max(outputSize, uint64_t(1))) << "." << endl;
+    }
+    writeThroughput(totalSize, tBegin);
+}
+
+
+
+void BinaryDataSnapshot::restore(
+    const string& snapshotDirectory,
+    const string& dataDirectory,
+    uint64_t threadCount)
+{
+    const auto tBegin = std::chrono::steady_clock::now();
+    vector<File> files = readManifest(snapshotDirectory);
+    uint64_t totalSize = 0;
+    for(const File& file: files) {
+        totalSize += file.size;
+    }
+    cout << timestamp << "Restoring " << files.size() << " binary data files (" <<
+        totalSize << " bytes) from " << snapshotDirectory << " to " << dataDirectory <<
+        " using " << threadCount << " threads." << endl;
+
+    // Uncompressed files are copied directly.
+    vector<string> uncompressedFileNames;
+    vector<uint64_t> uncompressedFileIds;
+    for(uint64_t fileId=0; fileId<files.size(); fileId++) {
+        File& file = files[fileId];
+        file.chunkChecksums.resize(file.chunkCount());
+        if(not file.isCompressed) {
+            uncompressedFileNames.push_back(file.name);
+            uncompressedFileIds.push_back(fileId);
+        }
+    }
+    mappedCopyFiles(snapshotDirectory, dataDirectory, uncompressedFileNames, threadCount,
+        [&](uint64_t i, uint64_t chunkId, const char* begin, uint64_t size)
+        {
+            files[uncompressedFileIds[i]].chunkChecksums[chunkId] = chunkChecksum(begin, size);
+        });
+
+    // For compressed files, open the input files and map the output files.
+    // The output files are written via mmap, which is
+    // the only way to write to the hugetlbfs filesystem.
+    for(File& file: files) {
+        if(not file.isCompressed) {
+            continue;
+        }
+        const string inputPath = snapshotDirectory + "/" + file.name;
+        const string outputPath = dataDirectory + "/" + file.name;
+        file.fileDescriptor = openFile(inputPath, O_RDONLY);
+#ifdef __linux__
+        ::posix_fadvise(file.fileDescriptor, 0, 0, POSIX_FADV_SEQUENTIAL);
+#endif
+        const int outputFileDescriptor = openFile(outputPath, O_CREAT | O_TRUNC | O_RDWR);
+        if(::ftruncate(outputFileDescriptor, off_t(file.size)) == -1) {
+            ::close(outputFileDescriptor);
+            throw runtime_error("Error setting file size for " + outputPath +
+                ". Must be a multiple of page size on the target filesystem.");
+        }
+        file.data = mapFile(outputPath, outputFileDescriptor, file.size, true);
+        ::close(outputFileDescriptor);
+
+        // Read the compressed chunk sizes and compute the chunk offsets.
+        const uint64_t chunkCount = file.chunkCount();
+        const uint64_t inputSize = filesystem::fileSize(inputPath);
+        if(inputSize < chunkCount * sizeof(uint64_t)) {
+            throw runtime_error("Snapshot file " + inputPath + " is truncated.");
+        }
+        file.compressedChunkSizes.resize(chunkCount);
+        readAt(file.fileDescriptor,
+            reinterpret_cast<char*>(file.compressedChunkSizes.data()),
+            chunkCount * sizeof(uint64_t), inputSize - chunkCount * sizeof(uint64_t),
+            inputPath);
+        file.compressedChunkOffsets.resize(chunkCount);
+        uint64_t offset = 0;
+        for(uint64_t chunkId=0; chunkId<chunkCount; chunkId++) {
+            file.compressedChunkOffsets[chunkId] = offset;
+            offset += file.compressedChunkSizes[chunkId];
+        }
+        if(offset + chunkCount * sizeof(uint64_t) != inputSize) {
+            throw runtime_error("Snapshot file " + inputPath + " is corrupted.");
+        }
+    }
+
+    // All chunks of all compressed files are decompressed in parallel.
+    vector< pair<uint64_t, uint64_t> > chunks;
+    for(uint64_t fileId=0; fileId<files.size(); fileId++) {
+        if(files[fileId].isCompressed) {
+            for(uint64_t chunkId=0; chunkId<files[fileId].chunkCount(); chunkId++) {
+                chunks.push_back(make_pair(fileId, chunkId));
+            }
+        }
+    }
+    std::atomic<uint64_t> nextChunk(0);
+    ThreadPool::instance().run([&](uint64_t) {
+        vector<char> buffer;
+        while(true) {
+            const uint64_t i = nextChunk++;
+            if(i >= chunks.size()) {
+                break;
+            }
+            File& file = files[chunks[i].first];
+            const string inputPath = snapshotDirectory + "/" + file.name;
+            const uint64_t chunkId = chunks[i].second;
+            const uint64_t begin = chunkId * chunkSize;
+            const uint64_t size = min(chunkSize, file.size - begin);
+            const uint64_t compressedSize = file.compressedChunkSizes[chunkId];
+            buffer.resize(compressedSize);
+            readAt(file.fileDescriptor, buffer.data(), compressedSize,
+                file.compressedChunkOffsets[chunkId], inputPath);
+            uLongf uncompressedSize = uLongf(size);
+            const int status = uncompress(
+                reinterpret_cast<Bytef*>(file.data + begin), &uncompressedSize,
+                reinterpret_cast<const Bytef*>(buffer.data()), uLong(compressedSize));
+            if(status != Z_OK or uncompressedSize != size) {
+                throw runtime_error("Error " + to_string(status) +
+                    " decompressing " + inputPath);
+            }
+            file.chunkChecksums[chunkId] = chunkChecksum(file.data + begin, size);
+        }
+    }, threadCount);
+
+    // Verify the checksums and clean up.
+    for(File& file: files) {
+        if(file.isCompressed) {
+            ::close(file.fileDescriptor);
+            unmapFile(dataDirectory + "/" + file.name, file.data, file.size);
+        }
+        if(fileChecksum(file.chunkChecksums) != file.checksum) {
+            throw runtime_error("Checksum mismatch for " + file.name +
+                ". The snapshot in " + snapshotDirectory + " is corrupted.");
+        }
+    }
+    writeThroughput(totalSize, tBegin);
+}
+
+
+
+void BinaryDataSnapshot::link(
+    const string& snapshotDirectory,
+    const string& dataDirectory)
+{
+    if(filesystem::exists(dataDirectory)) {
+        throw runtime_error(dataDirectory + " already exists.");
+    }
+
+    // Check that the snapshot is complete and uncompressed.
+    const vector<File> files = readManifest(snapshotDirectory);
+    for(const File& file: files) {
+        if(file.isCompressed) {
+            throw runtime_error("The snapshot in " + snapshotDirectory +
+                " is compressed and cannot be used without restoring it.");
+        }
+        const string path = snapshotDirectory + "/" + file.name;
+        if(filesystem::fileSize(path) != file.size) {
+            throw runtime_error("Snapshot file " + path + " has an unexpected size.");
+        }
+    }
+
+    createLink(snapshotDirectory, dataDirectory);
+}
+
+
+
+bool BinaryDataSnapshot::linkIfUncompressed(
+    const string& snapshotDirectory,
+    const string& dataDirectory)
+{
+    if(not filesystem::exists(snapshotDirectory + "/" + manifestFileName)) {
+        createLink(snapshotDirectory, dataDirectory);
+        return true;
+    }
+
+    for(const File& file: readManifest(snapshotDirectory)) {
+        if(file.isCompressed) {
+            cout << "The snapshot in " << snapshotDirectory << " is compressed, so " <<
+                dataDirectory << " was not linked to it. "
+                "Use --command restoreBinaryData to restore it." << endl;
+            return false;
+        }
+    }
+    link(snapshotDirectory, dataDirectory);
+    return true;
+}
+
+
+
+bool BinaryDataSnapshot::removeLink(
+    const string& snapshotDirectory,
+    const string& dataDirectory)
+{
+    struct ::stat info;
+    if(::lstat(dataDirectory.c_str(), &info) == -1 or not S_ISLNK(info.st_mode)) {
+        return false;
+    }
+    if(not filesystem::exists(snapshotDirectory) or
+        filesystem::getAbsolutePath(dataDirectory) != filesystem::getAbsolutePath(snapshotDirectory)) {
+        return false;
+    }
+    if(::unlink(dataDirectory.c_str()) == -1) {
+        throw runtime_error("Error removing symbolic link " + dataDirectory + ": " + strerror(errno));
+    }
+    cout << "Removed symbolic link " << dataDirectory << " to " << snapshotDirectory << "." << endl;
+    return true;
+}
+
+
+
+void BinaryDataSnapshot::createLink(
+    const string& snapshotDirectory,
+    const string& dataDirectory)
+{
+    const string target = filesystem::getAbsolutePath(snapshotDirectory);
+    if(::symlink(target.c_str(), dataDirectory.c_str()) == -1) {
+        throw runtime_error("Error creating symbolic link " + dataDirectory +
+            " to " + target + ": " + strerror(errno));
+    }
+    cout << dataDirectory << " is now a symbolic link to " << target << "." << endl;
+}
+
+
+
+vector<BinaryDataSnapshot::File> BinaryDataSnapshot::readManifest(
+    const string& snapshotDirectory)
+{
+    const string path = snapshotDirectory + "/" + manifestFileName;
+    ifstream manifest(path);
+    if(not manifest) {
+        throw runtime_error("Missing " + path +
+            ". The snapshot in " + snapshotDirectory + " is incomplete.");
+    }
+
+    vector<File> files;
+    string line;
+    std::getline(manifest, line);   // Header.
+    while(std::getline(manifest, line)) {
+        if(line.empty()) {
+            continue;
+        }
+        std::istringstream s(line);
+        File file;
+        string size, compression, manifestChunkSize, checksum;
+        if(not (
+            std::getline(s, file.name, ',') and
+            std::getline(s, size, ',') and
+            std::getline(s, compression, ',') and
+            std::getline(s, manifestChunkSize, ',') and
+            std::getline(s, checksum))) {
+            throw runtime_error("Invalid line in " + path + ": " + line);
+        }
+        file.size = std::stoull(size);
+        file.isCompressed = (compression == "zlib");
+        file.checksum = std::stoull(checksum, 0, 16);
+        if(std::stoull(manifestChunkSize) != chunkSize) {
+            throw runtime_error("Snapshot " + snapshotDirectory +
+                " uses chunk size " + manifestChunkSize +
+                ", but this build of Shasta uses chunk size " + to_string(chunkSize) + ".");
+        }
+        files.push_back(file);
+    }
+    return files;
+}
+
+
+
+void BinaryDataSnapshot::writeManifest(
+    const string& snapshotDirectory,
+    const vector<File>& files)
+{
+    const string path = snapshotDirectory + "/" + manifestFileName;
+    const string temporaryPath = path + ".tmp";
+    {
+        ofstream manifest(temporaryPath);
+        manifest << "Name,Size,Compression,ChunkSize,Checksum\n";
+        for(const File& file: files) {
+            manifest << file.name << "," << file.size << "," <<
+                (file.isCompressed ? "zlib" : "none") << "," << chunkSize << "," <<
+                std::hex << std::setw(16) << std::setfill('0') << file.checksum <<
+                std::dec << "\n";
+        }
+        if(not manifest) {
+            throw runtime_error("Error writing " + temporaryPath);
+        }
+    }
+    if(::rename(temporaryPath.c_str(), path.c_str()) != 0) {
+        throw runtime_error("Error renaming " + temporaryPath + " to " + path);
+    }
+}
+
+
+
+uint64_t BinaryDataSnapshot::chunkChecksum(const char* begin, uint64_t size)
+{
+    SHASTA_ASSERT(size <= chunkSize);
+    return MurmurHash64A(begin, int(size), 0);
+}
+
+
+
+uint64_t BinaryDataSnapshot::fileChecksum(const vector<uint64_t>& chunkChecksums)
+{
+    return MurmurHash64A(chunkChecksums.data(), int(chunkChecksums.size() * sizeof(uint64_t)), 0);
+}
+
+
+
+int BinaryDataSnapshot::openFile(const string& path, int flags)
+{
+    const int fileDescriptor = ::open(path.c_str(), flags,
+        S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH);
+    if(fileDescriptor == -1) {
+        throw runtime_error("Error opening " + path + ": " + strerror(errno));
+    }
+    return fileDescriptor;
+}
+
+
+
+// Return 0 for an empty file.
+char* BinaryDataSnapshot::mapFile(
+    const string& path,
+    int fileDescriptor,
+    uint64_t size,
+    bool write)
+{
+    if(size == 0) {
+        return 0;
+    }
+    void* pointer = ::mmap(0, size,
+        write ? (PROT_READ | PROT_WRITE) : PROT_READ,
+        MAP_SHARED, fileDescriptor, 0);
+    if(pointer == reinterpret_cast<void*>(-1LL)) {
+        ::close(fileDescriptor);
+        throw runtime_error("Error mapping " + path + " to memory: " + strerror(errno));
+    }
+    return static_cast<char*>(pointer);
+}
+
+
+
+void BinaryDataSnapshot::unmapFile(const string& path, char* data, uint64_t size)
+{
+    if(data and ::munmap(data, size) == -1) {
+        throw runtime_error("Error unmapping " + path + " from memory: " + strerror(errno));
+    }
+}
+
+
+
+void BinaryDataSnapshot::readAt(
+    int fileDescriptor,
+    char* buffer,
+    uint64_t size,
+    uint64_t offset,
+    const string& path)
+{
+    while(size > 0) {
+        const ssize_t n = ::pread(fileDescriptor, buffer, size, off_t(offset));
+        if(n == -1 and errno == EINTR) {
+            continue;
+        }
+        if(n <= 0) {
+            throw runtime_error("Error reading " + path + ": " +
+                (n == 0 ? string("unexpected end of file") : string(strerror(errno))));
+        }
+        buffer += n;
+        size -= uint64_t(n);
+        offset += uint64_t(n);
+    }
+}
+
+
+
+void BinaryDataSnapshot::writeAt(
+    int fileDescriptor,
+    const char* buffer,
+    uint64_t size,
+    uint64_t offset,
+    const string& path)
+{
+    while(size > 0) {
+        const ssize_t n = ::pwrite(fileDescriptor, buffer, size, off_t(offset));
+        if(n == -1 and errno == EINTR) {
+            continue;
+        }
+        if(n <= 0) {
+            throw runtime_error("Error writing " + path + ": " + strerror(errno));
+        }
+        buffer += n;
+        size -= uint64_t(n);
+        offset += uint64_t(n);
+    }
+}
+
+
+
+void BinaryDataSnapshot::writeThroughput(
+    uint64_t byteCount,
+    std::chrono::steady_clock::time_point tBegin)
+{
+    const auto tEnd = std::chrono::steady_clock::now();
+    const double tTotal = 1.e-9 * double((std::chrono::duration_cast<std::chrono::nanoseconds>(tEnd - tBegin)).count());
+    cout << timestamp << "Processed " << byteCount << " bytes in " << tTotal << " s, " <<
+        double(byteCount)/tTotal << " bytes/s." << endl;
+}
+
+
+
+// Test the sequence used by the Shasta executable:
+// --command saveBinaryData, --command cleanupBinaryData,
+// then --command restoreBinaryData, with or without --lazyRestore.
+// Runs in a temporary directory, which is removed at the end.
+void shasta::testBinaryDataSnapshot()
+{
+    using namespace BinaryDataSnapshot;
+
+    char directoryTemplate[] = "/tmp/testBinaryDataSnapshot-XXXXXX";
+    if(::mkdtemp(directoryTemplate) == 0) {
+        throw runtime_error(string("Error creating temporary directory: ") + strerror(errno));
+    }
+    const string directory = directoryTemplate;
+    const string dataDirectory = directory + "/Data";
+    const string snapshotDirectory = directory + "/DataOnDisk";
+
+    // The binary data files used for the test.
+    vector< pair<string, string> > contents;
+    contents.push_back(make_pair("Empty", string()));
+    contents.push_back(make_pair("Small", string("ACGT")));
+    string large;
+    for(uint64_t i=0; i<1000000; i++) {
+        large.push_back(char(i * 7 + i / 1000));
+    }
+    contents.push_back(make_pair("Large", large));
+
+    const auto check = [&]() {
+        for(const auto& p: contents) {
+            ifstream file(dataDirectory + "/" + p.first, std::ios::binary);
+            const string content((std::istreambuf_iterator<char>(file)), std::istreambuf_iterator<char>());
+            SHASTA_ASSERT(content == p.second);
+        }
+    };
+
+    for(const string compression: {"none", "zlib"}) {
+        const bool compress = (compression == "zlib");
+
+        // Create the binary data and save it.
+        filesystem::createDirectory(dataDirectory);
+        for(const auto& p: contents) {
+            ofstream file(dataDirectory + "/" + p.first, std::ios::binary);
+            file << p.second;
+        }
+        save(dataDirectory, snapshotDirectory, compression, 2);
+
+        // Cleanup: remove the binary data, then link it to the snapshot
+        // only if the snapshot is uncompressed.
+        SHASTA_ASSERT(::system(("rm -rf " + dataDirectory).c_str()) == 0);
+        SHASTA_ASSERT(linkIfUncompressed(snapshotDirectory, dataDirectory) == not compress);
+        SHASTA_ASSERT(filesystem::exists(dataDirectory) == not compress);
+        if(not compress) {
+            check();
+        }
+
+        // Restore, after removing the link created during cleanup.
+        SHASTA_ASSERT(removeLink(snapshotDirectory, dataDirectory) == not compress);
+        SHASTA_ASSERT(not filesystem::exists(dataDirectory));
+        filesystem::createDirectory(dataDirectory);
+        restore(snapshotDirectory, dataDirectory, 2);
+        check();
+
+        // A restored directory is not a link and must not be removed.
+        SHASTA_ASSERT(not removeLink(snapshotDirectory, dataDirectory));
+
+        // Cleanup again, then restore lazily.
+        SHASTA_ASSERT(::system(("rm -rf " + dataDirectory).c_str()) == 0);
+        linkIfUncompressed(snapshotDirectory, dataDirectory);
+        removeLink(snapshotDirectory, dataDirectory);
+        if(compress) {
+            bool threw = false;
+            try {
+                link(snapshotDirectory, dataDirectory);
+            } catch(const runtime_error&) {
+                threw = true;
+            }
+            SHASTA_ASSERT(threw);
+            SHASTA_ASSERT(not filesystem::exists(dataDirectory));
+        } else {
+            link(snapshotDirectory, dataDirectory);
+            check();
+        }
+
+        SHASTA_ASSERT(::system(("rm -rf " + dataDirectory + " " + snapshotDirectory).c_str()) == 0);
+    }
+
+    SHASTA_ASSERT(::system(("rm -rf " + directory).c_str()) == 0);
+    cout << "testBinaryDataSnapshot passed." << endl;
+}
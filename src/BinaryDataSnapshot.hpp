@@ -0,0 +1,93 @@
+#ifndef SHASTA_BINARY_DATA_SNAPSHOT_HPP
+#define SHASTA_BINARY_DATA_SNAPSHOT_HPP
+
+/*******************************************************************************
+
+Fast parallel snapshot and restore of the binary data
+of a run (the files in the Data directory).
+
+The binary data can be hundreds of GB. Copying them with cp
+or shutil.copytree uses a single thread and, for binary data on the
+hugetlbfs filesystem, does not work in the restore direction.
+Here, each file is divided into chunks of mappedCopyChunkSize bytes,
+and all chunks of all files are copied in parallel.
+Binary data files are always accessed via mmap,
+so this works with all memory backings, including hugetlbfs.
+Uncompressed snapshots are copied using mappedCopyFiles,
+which is also used by the Python API to copy binary data.
+
+Optionally, each chunk is compressed independently
+with zlib at its fastest level, so compression and decompression
+are also done in parallel. A compressed snapshot file contains the compressed
+chunks, followed by the compressed size of each chunk (uint64_t).
+
+A snapshot directory contains one file for each binary data file,
+with the same name, plus file Manifest.csv, which contains,
+for each file, its name, its size (uncompressed), compression type,
+chunk size, and a checksum of its content (uncompressed).
+The manifest is written last, so a snapshot without a manifest
+is incomplete. The checksums are verified when restoring.
+
+An uncompressed snapshot can also be used without copying it
+(lazy restore): the Data directory is created as a symbolic link
+to the snapshot directory, so binary data files are mapped
+directly from the snapshot, and pages are read from disk on demand.
+In this case, any changes to the binary data
+(for example, using the Python API) are made directly in the snapshot.
+
+*******************************************************************************/
+
+// Standard library.
+#include "cstdint.hpp"
+#include "string.hpp"
+
+namespace shasta {
+    namespace BinaryDataSnapshot {
+
+        // Save all files in dataDirectory to snapshotDirectory,
+        // which must not exist and is created.
+        // Compression can be "none" or "zlib".
+        void save(
+            const string& dataDirectory,
+            const string& snapshotDirectory,
+            const string& compression,
+            uint64_t threadCount);
+
+        // Restore a snapshot to dataDirectory, which must exist and be empty.
+        // For binary data on the hugetlbfs filesystem, dataDirectory must
+        // be a hugetlbfs mount point with the same page size used
+        // by the run that created the binary data.
+        void restore(
+            const string& snapshotDirectory,
+            const string& dataDirectory,
+            uint64_t threadCount);
+
+        // Lazy restore: create dataDirectory, which must not exist, as
+        // a symbolic link to an uncompressed snapshot.
+        void link(
+            const string& snapshotDirectory,
+            const string& dataDirectory);
+
+        // Used by --command cleanupBinaryData after removing dataDirectory.
+        // If the snapshot can be used without restoring it, make dataDirectory
+        // a symbolic link to it, and return true.
+        // A compressed snapshot is not linked, and false is returned.
+        // A snapshot directory without a manifest is a plain copy
+        // (for example, created by SaveRun.py) and is linked.
+        bool linkIfUncompressed(
+            const string& snapshotDirectory,
+            const string& dataDirectory);
+
+        // If dataDirectory is a symbolic link to snapshotDirectory,
+        // remove it and return true. Otherwise, do nothing and return false.
+        bool removeLink(
+            const string& snapshotDirectory,
+            const string& dataDirectory);
+
+        // The name of the manifest file in the snapshot directory.
+        extern const string manifestFileName;
+    }
+    void testBinaryDataSnapshot();
+}
+
+#endif
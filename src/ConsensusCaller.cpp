@@ -1,7 +1,13 @@
 #include "ConsensusCaller.hpp"
 #include "Coverage.hpp"
+#include "MedianConsensusCaller.hpp"
+#include "SimpleBayesianConsensusCaller.hpp"
+#include "SimpleConsensusCaller.hpp"
 using namespace shasta;
 
+#include <random>
+#include "stdexcept.hpp"
+
 
 
 // Given a vector of Coverage objects,
@@ -27,3 +33,92 @@ std::set<size_t> ConsensusCaller::findRepeatCounts(
     return repeatCounts;
 
 }
+
+
+
+// Compute consensus for all the columns of a CoverageBatch.
+// The default implementation calls operator() for each column.
+void ConsensusCaller::computeConsensus(
+    const CoverageBatch& coverageBatch,
+    vector<Consensus>& consensus) const
+{
+    const uint64_t columnCount = coverageBatch.columnCount();
+    consensus.resize(columnCount);
+    Coverage coverage;
+    for(uint64_t column=0; column<columnCount; column++) {
+        coverageBatch.getCoverage(column, coverage);
+        consensus[column] = (*this)(coverage);
+    }
+}
+
+
+
+// Check that ConsensusCaller::computeConsensus gives the same results
+// as ConsensusCaller::operator() for all consensus callers,
+// using random coverage columns.
+void shasta::testConsensusCallerBatch(
+    uint64_t columnCount,
+    uint64_t maxCoverage,
+    uint32_t seed)
+{
+    SHASTA_ASSERT(maxCoverage > 0);
+
+    // Generate the columns.
+    // Most reads agree on the base and have a repeat count close to
+    // a true repeat count. Some reads have a different base or a gap.
+    std::mt19937 randomSource(seed);
+    std::uniform_int_distribution<uint64_t> coverageDistribution(1, maxCoverage);
+    std::uniform_int_distribution<int> percentDistribution(0, 99);
+    std::uniform_int_distribution<int> baseDistribution(0, 3);
+    std::uniform_int_distribution<int> strandDistribution(0, 1);
+    std::uniform_int_distribution<int> repeatCountDistribution(1, 8);
+    CoverageBatch coverageBatch;
+    for(uint64_t column=0; column<columnCount; column++) {
+        coverageBatch.addColumn();
+        const int trueBase = baseDistribution(randomSource);
+        const int trueRepeatCount = repeatCountDistribution(randomSource);
+        const uint64_t coverage = coverageDistribution(randomSource);
+        for(uint64_t i=0; i<coverage; i++) {
+            const Strand strand = Strand(strandDistribution(randomSource));
+            const int percent = percentDistribution(randomSource);
+            if(percent < 20) {
+                coverageBatch.addRead(AlignedBase::gap(), strand, 0);
+            } else if(percent < 30) {
+                coverageBatch.addRead(AlignedBase::fromInteger(uint8_t(baseDistribution(randomSource))),
+                    strand, uint8_t(repeatCountDistribution(randomSource)));
+            } else if(percent < 60) {
+                coverageBatch.addRead(AlignedBase::fromInteger(uint8_t(trueBase)),
+                    strand, uint8_t(repeatCountDistribution(randomSource)));
+            } else {
+                coverageBatch.addRead(AlignedBase::fromInteger(uint8_t(trueBase)),
+                    strand, uint8_t(trueRepeatCount));
+            }
+        }
+    }
+
+    // The consensus callers to be tested.
+    vector< pair<string, shared_ptr<ConsensusCaller> > > consensusCallers;
+    consensusCallers.push_back(make_pair("Simple", make_shared<SimpleConsensusCaller>()));
+    consensusCallers.push_back(make_pair("Median", make_shared<MedianConsensusCaller>()));
+    consensusCallers.push_back(make_pair("Bayesian:guppy-3.0.5-a",
+        make_shared<SimpleBayesianConsensusCaller>("guppy-3.0.5-a")));
+
+    // Compare computeConsensus with operator().
+    vector<Consensus> batchConsensus;
+    Coverage coverage;
+    for(const auto& p: consensusCallers) {
+        const ConsensusCaller& consensusCaller = *p.second;
+        consensusCaller.computeConsensus(coverageBatch, batchConsensus);
+        SHASTA_ASSERT(batchConsensus.size() == columnCount);
+        for(uint64_t column=0; column<columnCount; column++) {
+            coverageBatch.getCoverage(column, coverage);
+            const Consensus consensus = consensusCaller(coverage);
+            if(consensus.base.value != batchConsensus[column].base.value or
+                consensus.repeatCount != batchConsensus[column].repeatCount) {
+                throw runtime_error("Batch consensus differs from single column consensus "
+                    "for consensus caller " + p.first + " at column " + to_string(column) + ".");
+            }
+        }
+        cout << "Batch consensus test passed for consensus caller " << p.first << endl;
+    }
+}
@@ -22,14 +22,24 @@ the "best" base and repeat count.
 #include "Base.hpp"
 
 // Standard libraries.
+#include "iostream.hpp"
 #include <set>
 #include "utility.hpp"
 #include "vector.hpp"
 
 namespace shasta {
     class Coverage;
+    class CoverageBatch;
     class ConsensusCaller;
     class Consensus;
+
+    // Check that ConsensusCaller::computeConsensus gives the same results
+    // as ConsensusCaller::operator() for all consensus callers,
+    // using random coverage columns.
+    void testConsensusCallerBatch(
+        uint64_t columnCount,
+        uint64_t maxCoverage,
+        uint32_t seed);
 }
 
 
@@ -57,9 +67,20 @@ public:
     // It must be implemented by all derived classes.
     virtual Consensus operator()(const Coverage&) const = 0;
 
+    // Compute consensus for all the columns of a CoverageBatch.
+    // This must give the same results as calling operator()
+    // for each column.
+    // The default implementation does just that.
+    // Derived classes can override it to avoid constructing
+    // a Coverage object for each column.
+    virtual void computeConsensus(const CoverageBatch&, vector<Consensus>&) const;
+
     // Virtual destructor, to ensure destruction of derived classes.
     virtual ~ConsensusCaller() {}
 
+    // Write statistics collected by the consensus caller, if any.
+    virtual void writeStatistics(ostream&) const {}
+
     // Given a vector of ConsensusInfo objects,
     // find the repeat counts that have non-zero coverage on the called base
     // at any position.
@@ -252,3 +252,128 @@ void Coverage::count(vector<CompressedCoverageData>& compressedCoverageData) con
 
 
 
+// Create a Coverage object for a given column of a CoverageBatch.
+void CoverageBatch::getCoverage(uint64_t column, Coverage& coverage) const
+{
+    coverage = Coverage();
+    for(uint64_t i=columnBegin(column); i!=columnEnd(column); i++) {
+        coverage.addRead(AlignedBase::fromInteger(bases[i]), strands[i], repeatCounts[i]);
+    }
+}
+
+
+
+// Return the base with the most coverage in a given column of a CoverageBatch.
+AlignedBase CoverageBatch::mostFrequentBase(uint64_t column) const
+{
+    // Count the bases. This loop is simple enough to be vectorized.
+    array<uint64_t, 5> baseCoverage = {0, 0, 0, 0, 0};
+    const uint64_t begin = columnBegin(column);
+    const uint64_t end = columnEnd(column);
+    const uint8_t* b = bases.data();
+    for(uint64_t i=begin; i!=end; i++) {
+        ++baseCoverage[b[i]];
+    }
+
+    // Same tie breaking as Coverage::mostFrequentBase.
+    uint8_t bestBaseValue = 4;
+    uint64_t bestBaseCoverage = 0;
+    for(uint8_t baseValue=0; baseValue<5; baseValue++) {
+        if(baseCoverage[baseValue] > bestBaseCoverage) {
+            bestBaseValue = baseValue;
+            bestBaseCoverage = baseCoverage[baseValue];
+        }
+    }
+    return AlignedBase::fromInteger(bestBaseValue);
+}
+
+
+
+// Fill in coverage for each repeat count of a given base
+// in a given column of a CoverageBatch, summing over both strands.
+uint64_t CoverageBatch::repeatCountCoverage(
+    uint64_t column,
+    AlignedBase base,
+    array<uint64_t, 256>& coverage) const
+{
+    std::fill(coverage.begin(), coverage.end(), 0);
+    uint64_t repeatCountEnd = 0;
+    const uint64_t begin = columnBegin(column);
+    const uint64_t end = columnEnd(column);
+    for(uint64_t i=begin; i!=end; i++) {
+        if(bases[i] == base.value) {
+            const uint8_t repeatCount = repeatCounts[i];
+            ++coverage[repeatCount];
+            repeatCountEnd = max(repeatCountEnd, uint64_t(repeatCount) + 1);
+        }
+    }
+    return repeatCountEnd;
+}
+
+
+
+// Get a vector of CompressedCoverageData for a given column of a CoverageBatch.
+// This gives the same results as Coverage::count.
+void CoverageBatch::count(
+    uint64_t column,
+    vector<CompressedCoverageData>& compressedCoverageData) const
+{
+    // Encode each read as base, strand, repeat count, in this order of significance,
+    // then sort and count.
+    vector<uint32_t> keys;
+    for(uint64_t i=columnBegin(column); i!=columnEnd(column); i++) {
+        keys.push_back((uint32_t(bases[i]) << 9) | (uint32_t(strands[i]) << 8) | uint32_t(repeatCounts[i]));
+    }
+    sort(keys.begin(), keys.end());
+
+    compressedCoverageData.clear();
+    for(uint64_t i=0; i<keys.size(); ) {
+        uint64_t j = i;
+        while(j<keys.size() and keys[j]==keys[i]) {
+            ++j;
+        }
+        const uint64_t frequency = j - i;
+        CompressedCoverageData c;
+        c.base = uint8_t(keys[i] >> 9) & 7;
+        c.strand = uint8_t(keys[i] >> 8) & 1;
+        c.repeatCount = uint8_t(keys[i] & 255);
+        c.frequency = uint8_t(min(uint64_t(255), frequency));
+        compressedCoverageData.push_back(c);
+        i = j;
+    }
+}
+
+
+
+// Reverse complement coverage data stored as
+// pairs(position, CompressedCoverageData) for a sequence of given length.
+void shasta::reverseComplementCoverageData(
+    vector< pair<uint32_t, CompressedCoverageData> >& coverageData,
+    uint32_t length)
+{
+    for(pair<uint32_t, CompressedCoverageData>& p: coverageData) {
+        SHASTA_ASSERT(p.first < length);
+        p.first = length - 1 - p.first;
+        CompressedCoverageData& c = p.second;
+        c.base = AlignedBase::fromInteger(c.base).complement().value & 7;
+        c.strand = (1 - c.strand) & 1;
+    }
+
+    // Restore the order generated by Coverage::count at each position,
+    // which is by base, then strand, then repeat count.
+    // The repeat counts are already in increasing order
+    // for each base and strand, and the stable sort preserves that.
+    stable_sort(coverageData.begin(), coverageData.end(),
+        [](
+            const pair<uint32_t, CompressedCoverageData>& x,
+            const pair<uint32_t, CompressedCoverageData>& y)
+        {
+            if(x.first != y.first) {
+                return x.first < y.first;
+            }
+            if(x.second.base != y.second.base) {
+                return x.second.base < y.second.base;
+            }
+            return x.second.strand < y.second.strand;
+        });
+}
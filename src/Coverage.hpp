@@ -9,6 +9,7 @@
 // Standard library.
 #include "algorithm.hpp"
 #include "array.hpp"
+#include "utility.hpp"
 #include "vector.hpp"
 
 
@@ -21,14 +22,30 @@ read at a single position of a multiple sequence alignment.
 Class Coverage stores coverage information for all reads at a single
 position of a multiple sequence alignment.
 
+Class CoverageBatch stores coverage information for all reads
+at a block of consecutive positions of a multiple sequence alignment
+(columns), in structure-of-arrays form. It is used to compute
+consensus for many columns with a single call to the ConsensusCaller,
+without allocating memory for each column.
+
 *******************************************************************************/
 
 
 
 namespace shasta {
     class Coverage;
+    class CoverageBatch;
     class CoverageData;
     class CompressedCoverageData;
+
+    // Reverse complement coverage data stored as
+    // pairs(position, CompressedCoverageData) for a sequence of given length,
+    // as stored in MarkerGraph::vertexCoverageData and MarkerGraph::edgeCoverageData.
+    // The result is the same that would be obtained by computing
+    // coverage data for the reverse complemented sequence.
+    void reverseComplementCoverageData(
+        vector< pair<uint32_t, CompressedCoverageData> >&,
+        uint32_t length);
 }
 
 
@@ -169,5 +186,84 @@ private:
 
 
 
-#endif
+// Class CoverageBatch stores coverage information for all reads
+// at a block of columns of a multiple sequence alignment,
+// in structure-of-arrays form.
+// Repeat counts are stored as uint8_t, like in the reads.
+class shasta::CoverageBatch {
+public:
+
+    // Remove all columns. This does not free memory.
+    void clear()
+    {
+        columnBegins.clear();
+        bases.clear();
+        strands.clear();
+        repeatCounts.clear();
+    }
+
+    // Start a new column. Subsequent calls to addRead add to this column.
+    void addColumn()
+    {
+        columnBegins.push_back(bases.size());
+    }
+
+    // Add information about a supporting read to the last column.
+    // The same rules as for Coverage::addRead apply.
+    void addRead(AlignedBase base, Strand strand, uint8_t repeatCount)
+    {
+        SHASTA_ASSERT(base.value < 5);
+        SHASTA_ASSERT(strand < 2);
+        SHASTA_ASSERT(base.isGap() == (repeatCount == 0));
+        SHASTA_ASSERT(not columnBegins.empty());
+        bases.push_back(base.value);
+        strands.push_back(uint8_t(strand));
+        repeatCounts.push_back(repeatCount);
+    }
+
+    uint64_t columnCount() const
+    {
+        return columnBegins.size();
+    }
 
+    // The range of read indexes for a given column.
+    uint64_t columnBegin(uint64_t column) const
+    {
+        return columnBegins[column];
+    }
+    uint64_t columnEnd(uint64_t column) const
+    {
+        return (column + 1 < columnBegins.size()) ? columnBegins[column + 1] : bases.size();
+    }
+
+    // Create a Coverage object for a given column.
+    void getCoverage(uint64_t column, Coverage&) const;
+
+    // Return the base with the most coverage in a given column.
+    // This gives the same results as Coverage::mostFrequentBase.
+    AlignedBase mostFrequentBase(uint64_t column) const;
+
+    // Fill in coverage for each repeat count of a given base
+    // in a given column, summing over both strands.
+    // Returns the first repeat count for which coverage becomes
+    // permanently zero, with the same definition used by
+    // Coverage::repeatCountEnd.
+    uint64_t repeatCountCoverage(uint64_t column, AlignedBase, array<uint64_t, 256>&) const;
+
+    // Get a vector of CompressedCoverageData for a given column.
+    // This gives the same results as Coverage::count.
+    void count(uint64_t column, vector<CompressedCoverageData>&) const;
+
+    // The index of the first read of each column.
+    vector<uint64_t> columnBegins;
+
+    // The base (AlignedBase::value), strand, and repeat count for each read
+    // of all columns.
+    vector<uint8_t> bases;
+    vector<uint8_t> strands;
+    vector<uint8_t> repeatCounts;
+};
+
+
+
+#endif
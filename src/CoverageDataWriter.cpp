@@ -0,0 +1,198 @@
+// Shasta.
+#include "CoverageDataWriter.hpp"
+#include "AssembledSegment.hpp"
+#include "SHASTA_ASSERT.hpp"
+using namespace shasta;
+
+// Zlib.
+#include <zlib.h>
+
+// Linux.
+#include <fcntl.h>
+#include <unistd.h>
+
+// Standard library.
+#include "algorithm.hpp"
+#include <cstring>
+#include "fstream.hpp"
+#include "stdexcept.hpp"
+
+
+
+CoverageDataWriter::CoverageDataWriter(
+    const string& directoryName,
+    uint64_t chunkSize) :
+    directoryName(directoryName),
+    chunkSize(chunkSize)
+{
+    SHASTA_ASSERT(chunkSize > 0);
+
+    const string fileName = directoryName + "/CoverageData.bin";
+    fileDescriptor = ::open(fileName.c_str(), O_CREAT | O_TRUNC | O_WRONLY, S_IRUSR | S_IWUSR);
+    if(fileDescriptor == -1) {
+        throw runtime_error("Error opening " + fileName);
+    }
+}
+
+
+
+CoverageDataWriter::~CoverageDataWriter()
+{
+    if(fileDescriptor != -1) {
+        ::close(fileDescriptor);
+        fileDescriptor = -1;
+    }
+}
+
+
+
+void CoverageDataWriter::write(const AssembledSegment& assembledSegment)
+{
+    const uint64_t positionCount = assembledSegment.runLengthSequence.size();
+    SHASTA_ASSERT(assembledSegment.repeatCounts.size() == positionCount);
+    SHASTA_ASSERT(assembledSegment.assembledCoverageData.size() == positionCount);
+    const uint64_t chunkCount = (positionCount + chunkSize - 1) / chunkSize;
+
+    // Construct and compress the chunks without holding the mutex.
+    vector<ChunkIndexEntry> segmentChunks(chunkCount);
+    vector< vector<Bytef> > compressedChunks(chunkCount);
+    vector<uint8_t> buffer;
+    for(uint64_t chunk=0; chunk<chunkCount; chunk++) {
+        const uint64_t begin = chunk * chunkSize;
+        const uint64_t end = min(begin + chunkSize, positionCount);
+        const uint64_t n = end - begin;
+        uint64_t m = 0;
+        for(uint64_t position=begin; position!=end; position++) {
+            m += assembledSegment.assembledCoverageData[position].size();
+        }
+
+        // Fill the uncompressed chunk.
+        buffer.resize(n * (2 + sizeof(uint32_t)) + 4 * m);
+        uint8_t* consensusBase = buffer.data();
+        uint8_t* consensusRepeatCount = consensusBase + n;
+        uint8_t* entryCount = consensusRepeatCount + n;
+        uint8_t* base = entryCount + n * sizeof(uint32_t);
+        uint8_t* strand = base + m;
+        uint8_t* repeatCount = strand + m;
+        uint8_t* frequency = repeatCount + m;
+        uint64_t j = 0;
+        for(uint64_t i=0; i<n; i++) {
+            const uint64_t position = begin + i;
+            consensusBase[i] = assembledSegment.runLengthSequence[position].value;
+            consensusRepeatCount[i] = uint8_t(min(assembledSegment.repeatCounts[position], 255U));
+            const vector<CompressedCoverageData>& coverageData =
+                assembledSegment.assembledCoverageData[position];
+            const uint32_t count = uint32_t(coverageData.size());
+            std::memcpy(entryCount + i * sizeof(uint32_t), &count, sizeof(uint32_t));
+            for(const CompressedCoverageData& c: coverageData) {
+                base[j] = c.base;
+                strand[j] = c.strand;
+                repeatCount[j] = c.repeatCount;
+                frequency[j] = c.frequency;
+                ++j;
+            }
+        }
+        SHASTA_ASSERT(j == m);
+
+        // Compress it.
+        vector<Bytef>& compressedChunk = compressedChunks[chunk];
+        uLongf compressedSize = compressBound(uLong(buffer.size()));
+        compressedChunk.resize(compressedSize);
+        const int status = compress2(
+            compressedChunk.data(), &compressedSize,
+            buffer.data(), uLong(buffer.size()),
+            Z_BEST_SPEED);
+        if(status != Z_OK) {
+            throw runtime_error("Error compressing coverage data for assembly graph edge " +
+                to_string(assembledSegment.assemblyGraphEdgeId));
+        }
+        compressedChunk.resize(compressedSize);
+
+        ChunkIndexEntry& chunkIndexEntry = segmentChunks[chunk];
+        chunkIndexEntry.compressedSize = compressedSize;
+        chunkIndexEntry.firstPosition = begin;
+        chunkIndexEntry.positionCount = n;
+        chunkIndexEntry.entryCount = m;
+    }
+
+
+
+    // Reserve space in the data file and store the index entries.
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        SegmentIndexEntry segmentIndexEntry;
+        segmentIndexEntry.segmentId = assembledSegment.assemblyGraphEdgeId;
+        segmentIndexEntry.positionCount = positionCount;
+        segmentIndexEntry.firstChunk = chunks.size();
+        segmentIndexEntry.chunkCount = chunkCount;
+        segments.push_back(segmentIndexEntry);
+        for(ChunkIndexEntry& chunkIndexEntry: segmentChunks) {
+            chunkIndexEntry.offset = fileSize;
+            fileSize += chunkIndexEntry.compressedSize;
+            chunks.push_back(chunkIndexEntry);
+        }
+    }
+
+
+
+    // Write the chunks without holding the mutex.
+    for(uint64_t chunk=0; chunk<chunkCount; chunk++) {
+        const vector<Bytef>& compressedChunk = compressedChunks[chunk];
+        const uint8_t* p = compressedChunk.data();
+        uint64_t offset = segmentChunks[chunk].offset;
+        uint64_t bytesToWrite = compressedChunk.size();
+        while(bytesToWrite > 0) {
+            const ssize_t bytesWritten = ::pwrite(fileDescriptor, p, bytesToWrite, off_t(offset));
+            if(bytesWritten <= 0) {
+                throw runtime_error("Error writing coverage data to " +
+                    directoryName + "/CoverageData.bin");
+            }
+            p += bytesWritten;
+            offset += uint64_t(bytesWritten);
+            bytesToWrite -= uint64_t(bytesWritten);
+        }
+    }
+}
+
+
+
+void CoverageDataWriter::close()
+{
+    SHASTA_ASSERT(fileDescriptor != -1);
+    ::close(fileDescriptor);
+    fileDescriptor = -1;
+
+    // Sort the segments by id. The chunks of each segment
+    // are renumbered so they remain contiguous and in segment order.
+    sort(segments.begin(), segments.end(),
+        [](const SegmentIndexEntry& x, const SegmentIndexEntry& y)
+        {
+            return x.segmentId < y.segmentId;
+        });
+    vector<ChunkIndexEntry> sortedChunks;
+    sortedChunks.reserve(chunks.size());
+    for(SegmentIndexEntry& segment: segments) {
+        const uint64_t firstChunk = sortedChunks.size();
+        for(uint64_t i=0; i<segment.chunkCount; i++) {
+            sortedChunks.push_back(chunks[segment.firstChunk + i]);
+        }
+        segment.firstChunk = firstChunk;
+    }
+    chunks.swap(sortedChunks);
+
+    // Write the index.
+    const string fileName = directoryName + "/CoverageData.index";
+    ofstream index(fileName, std::ios::binary);
+    if(!index) {
+        throw runtime_error("Error opening " + fileName);
+    }
+    const uint64_t header[4] = {magicNumber, version, segments.size(), chunks.size()};
+    index.write(reinterpret_cast<const char*>(header), sizeof(header));
+    index.write(reinterpret_cast<const char*>(segments.data()),
+        std::streamsize(segments.size() * sizeof(SegmentIndexEntry)));
+    index.write(reinterpret_cast<const char*>(chunks.data()),
+        std::streamsize(chunks.size() * sizeof(ChunkIndexEntry)));
+    if(!index) {
+        throw runtime_error("Error writing " + fileName);
+    }
+}
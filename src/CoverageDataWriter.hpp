@@ -0,0 +1,111 @@
+#ifndef SHASTA_COVERAGE_DATA_WRITER_HPP
+#define SHASTA_COVERAGE_DATA_WRITER_HPP
+
+/*******************************************************************************
+
+Class CoverageDataWriter writes coverage data for assembled segments
+in a compact, chunked, compressed binary format.
+This is used instead of csv output when Assembly.storeCoverageDataFormat
+is binary.
+
+Two files are created in the output directory:
+
+- CoverageData.bin contains the compressed chunks, in no particular order.
+  Each chunk covers up to chunkSize consecutive run-length positions
+  of one segment. Each chunk is compressed independently using zlib.
+  A decompressed chunk containing n positions and m coverage entries
+  contains the following arrays, in this order and without padding:
+  * uint8_t  consensusBase[n]         (AlignedBase::value: 0=A, 1=C, 2=G, 3=T)
+  * uint8_t  consensusRepeatCount[n]  (clipped at 255)
+  * uint32_t entryCount[n]            (number of coverage entries at each position)
+  * uint8_t  base[m]                  (AlignedBase::value, 4 = gap)
+  * uint8_t  strand[m]
+  * uint8_t  repeatCount[m]           (clipped at 255)
+  * uint8_t  frequency[m]             (clipped at 255)
+  The coverage entries for each position are the CompressedCoverageData
+  stored in AssembledSegment::assembledCoverageData for that position.
+
+- CoverageData.index contains, in this order:
+  * A header of 4 uint64_t: magic number, version, segment count, chunk count.
+  * A SegmentIndexEntry for each segment, sorted by segment id
+    (the assembly graph edge id).
+  * A ChunkIndexEntry for each chunk. The chunks of each segment
+    are contiguous and in position order.
+  All integers are little endian.
+
+Because each segment is divided into independently compressed chunks,
+a range of positions of a segment can be read by only decompressing
+the chunks that overlap the range.
+See scripts/ShastaCoverageData.py for a Python reader.
+
+Function write is thread safe, and it can be called by multiple
+threads at the same time. Each thread compresses its chunks
+without holding a lock, then reserves space in the data file
+and writes the chunks using pwrite.
+
+*******************************************************************************/
+
+// Standard library.
+#include "cstdint.hpp"
+#include <mutex>
+#include "string.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    class AssembledSegment;
+    class CoverageDataWriter;
+}
+
+
+
+class shasta::CoverageDataWriter {
+public:
+
+    // Create the data file in the given directory.
+    // The directory must already exist.
+    CoverageDataWriter(
+        const string& directoryName,
+        uint64_t chunkSize = 65536);
+
+    // Close the data file, without writing the index if close() was not called.
+    ~CoverageDataWriter();
+
+    // Write coverage data for an assembled segment.
+    // This is thread safe.
+    void write(const AssembledSegment&);
+
+    // Write the index and close the data file.
+    void close();
+
+    static const uint64_t magicNumber = 0x5643415453414853ULL; // "SHASTACV"
+    static const uint64_t version = 1;
+
+    class SegmentIndexEntry {
+    public:
+        uint64_t segmentId;
+        uint64_t positionCount;
+        uint64_t firstChunk;
+        uint64_t chunkCount;
+    };
+    class ChunkIndexEntry {
+    public:
+        uint64_t offset;            // In the data file.
+        uint64_t compressedSize;
+        uint64_t firstPosition;     // In the segment.
+        uint64_t positionCount;
+        uint64_t entryCount;
+    };
+
+private:
+    string directoryName;
+    uint64_t chunkSize;
+    int fileDescriptor = -1;
+
+    // Protects fileSize, segments, and chunks.
+    std::mutex mutex;
+    uint64_t fileSize = 0;
+    vector<SegmentIndexEntry> segments;
+    vector<ChunkIndexEntry> chunks;
+};
+
+#endif
@@ -85,16 +85,8 @@ int LocalAssemblyGraph::baseCount(edge_descriptor e) const
     }
     SHASTA_ASSERT(globalAssemblyGraph.isAssembledEdge(edgeId));
 
-    // Get the repeat counts for this edge.
-    const span<uint8_t> repeatCounts = globalAssemblyGraph.repeatCounts[edgeId];
-
-
-    // Add them up.
-    int count = 0;
-    for(const uint8_t repeatCount: repeatCounts) {
-        count += repeatCount;
-    }
-    return count;
+    // The sum of the repeat counts for this edge is stored.
+    return int(globalAssemblyGraph.repeatCounts.totalSize(edgeId));
 }
 
 
@@ -255,6 +255,13 @@ public:
     void close();
     void unreserve();
 
+    // Call f for each of the memory mapped vectors containing the data.
+    template<class F> void forEachMemoryMappedVector(const F& f) const
+    {
+        f(baseCount);
+        f(data);
+    }
+
     bool isOpen() const
     {
         return baseCount.isOpen && data.isOpen();
@@ -2,6 +2,8 @@
 #include "LowHash1.hpp"
 #include "AlignmentCandidates.hpp"
 #include "Marker.hpp"
+#include "PerformanceProfile.hpp"
+#include "Tracing.hpp"
 using namespace shasta;
 
 // Standad library.
@@ -81,6 +83,8 @@ LowHash1::LowHash1(
     // Create vectors containing only the k-mer ids of all markers.
     // This is used to speed up the computation of hash functions.
     cout << timestamp << "Creating kmer ids for oriented reads." << endl;
+    PerformanceProfile& performanceProfile = PerformanceProfile::instance();
+    performanceProfile.begin("LowHash1: creating k-mer ids");
     createKmerIds();
 
     // Compute the threshold for a hash value to be considered low.
@@ -95,7 +99,6 @@ LowHash1::LowHash1(
     buckets.createNew(
             largeDataFileNamePrefix.empty() ? "" : (largeDataFileNamePrefix + "tmp-LowHash-Buckets"),
             largeDataPageSize);
-    lowHashes.resize(orientedReadCount);
     threadCommonFeatures.resize(threadCount);
     for(size_t threadId=0; threadId!=threadCount; threadId++) {
         threadCommonFeatures[threadId] = make_shared<MemoryMapped::Vector<CommonFeature> >();
@@ -109,22 +112,21 @@ LowHash1::LowHash1(
     histogramCsv << "Iteration,BucketSize,BucketCount,FeatureCount\n";
 
     // LowHash iteration loop.
+    performanceProfile.next("LowHash1: iterations");
     for(iteration=0; iteration<minHashIterationCount; iteration++) {
         cout << timestamp << "LowHash iteration " << iteration << " begins." << endl;
 
         // Compute the low hashes for each oriented read
-        // and count the number of low hash features in each bucket.
-        buckets.clear();
-        buckets.beginPass1(bucketCount);
+        // and fill the buckets.
+        // The hashes are computed only once, and the
+        // bucket entries are gathered by VectorOfVectorsBuilder.
         size_t batchSize = 10000;
+        bucketsBuilder = make_shared< MemoryMapped::VectorOfVectorsBuilder<BucketEntry, uint64_t> >
+            (bucketCount, threadCount);
         setupLoadBalancing(readCount, batchSize);
         runThreads(&LowHash1::computeHashesThreadFunction, threadCount);
-
-        // Fill the buckets.
-        buckets.beginPass2();
-        setupLoadBalancing(readCount, batchSize);
-        runThreads(&LowHash1::fillBucketsThreadFunction, threadCount);
-        buckets.endPass2(false, false);
+        bucketsBuilder->write(buckets, threadCount, false);
+        bucketsBuilder = 0;
         cout << "Load factor at this iteration " <<
             double(buckets.totalSize()) / double(buckets.size()) << endl;
         computeBucketHistogram();
@@ -142,6 +144,7 @@ LowHash1::LowHash1(
 
     // Gather together all the common features found by all threads.
     cout << timestamp << "Gathering common features found by all threads." << endl;
+    performanceProfile.next("LowHash1: gathering common features");
     gatherCommonFeatures();
     cout << timestamp << "Total number of common features including duplicates is " <<
         commonFeatures.totalSize() << endl;
@@ -159,12 +162,13 @@ LowHash1::LowHash1(
     // We then find groups of at least minFrequency common features involving the
     // same pair(orientedReadId0, orientedReadId1)
     cout << timestamp << "Processing the common features we found." << endl;
+    performanceProfile.next("LowHash1: processing common features");
     processCommonFeatures();
+    performanceProfile.end();
 
     // Clean up.
     buckets.remove();
     kmerIds.remove();
-    lowHashes.clear();
     commonFeatures.remove();
 
     // Done.
@@ -227,11 +231,12 @@ void LowHash1::createKmerIds(size_t threadId)
 
 
 // Thread function to compute the low hashes for each oriented read
-// and count the number of entries in each bucket.
+// and store the corresponding bucket entries.
 void LowHash1::computeHashesThreadFunction(size_t threadId)
 {
     const int featureByteCount = int(m * sizeof(KmerId));
     const uint64_t seed = iteration * 37;
+    MemoryMapped::VectorOfVectorsBuilder<BucketEntry, uint64_t>& builder = *bucketsBuilder;
 
     // Loop over batches assigned to this thread.
     uint64_t begin, end;
@@ -244,9 +249,6 @@ void LowHash1::computeHashesThreadFunction(size_t threadId)
             }
             for(Strand strand=0; strand<2; strand++) {
                 const OrientedReadId orientedReadId(readId, strand);
-
-                vector< pair<uint64_t, uint32_t> >& orientedReadLowHashes = lowHashes[orientedReadId.getValue()];
-                orientedReadLowHashes.clear();
                 const size_t markerCount = kmerIds.size(orientedReadId.getValue());
 
                 // Handle the pathological case where there are fewer than m markers.
@@ -264,9 +266,8 @@ void LowHash1::computeHashesThreadFunction(size_t threadId)
                 for(size_t j=0; j<featureCount; j++, kmerIdsPointer++) {
                     const uint64_t hash = MurmurHash64A(kmerIdsPointer, featureByteCount, seed);
                     if(hash < hashThreshold) {
-                        orientedReadLowHashes.push_back(make_pair(hash, j));
                         const uint64_t bucketId = hash & mask;
-                        buckets.incrementCountMultithreaded(bucketId);
+                        builder.append(threadId, bucketId, BucketEntry(orientedReadId, uint32_t(j)));
                     }
                 }
             }
@@ -277,36 +278,6 @@ void LowHash1::computeHashesThreadFunction(size_t threadId)
 
 
 
-// Thread function to fill the buckets.
-void LowHash1::fillBucketsThreadFunction(size_t threadId)
-{
-
-    // Loop over batches assigned to this thread.
-    uint64_t begin, end;
-    while(getNextBatch(begin, end)) {
-
-        // Loop over oriented reads assigned to this batch.
-        for(ReadId readId=ReadId(begin); readId!=ReadId(end); readId++) {
-            if(reads.getFlags(readId).isPalindromic) {
-                continue;
-            }
-            for(Strand strand=0; strand<2; strand++) {
-                const OrientedReadId orientedReadId(readId, strand);
-                const vector< pair<uint64_t, uint32_t> > & orientedReadLowHashes = lowHashes[orientedReadId.getValue()];
-
-                for(const auto& p: orientedReadLowHashes) {
-                    const uint64_t hash = p.first;
-                    const uint64_t bucketId = hash & mask;
-                    const uint32_t ordinal = p.second;
-                    buckets.storeMultithreaded(bucketId, BucketEntry(orientedReadId, ordinal));
-                }
-            }
-        }
-    }
-}
-
-
-
 void LowHash1::computeBucketHistogram()
 {
     threadBucketHistogram.clear();
@@ -370,6 +341,7 @@ void LowHash1::scanBucketsThreadFunction(size_t threadId)
     // Loop over batches assigned to this thread.
     uint64_t begin, end;
     while(getNextBatch(begin, end)) {
+        SHASTA_TRACE_SPAN("LowHash1 scan buckets batch");
 
         // Loop over buckets in this batch.
         for(uint64_t bucketId=begin; bucketId!=end; bucketId++) {
@@ -377,11 +349,15 @@ void LowHash1::scanBucketsThreadFunction(size_t threadId)
             // Access this bucket.
             const span<BucketEntry> bucket = buckets[bucketId];
             if(bucket.size() < max(size_t(2), minBucketSize)) {
+                SHASTA_TRACE_COUNT(lowHashBucketsSkippedTooSmall, 1);
                 continue;
             }
             if(bucket.size() > maxBucketSize) {
+                SHASTA_TRACE_COUNT(lowHashBucketsSkippedTooLarge, 1);
                 continue;
             }
+            SHASTA_TRACE_COUNT(lowHashBucketsUsed, 1);
+            SHASTA_TRACE_COUNT(lowHashBucketEntries, bucket.size());
 
             // Loop over pairs of bucket entries.
             for(const BucketEntry& feature0: bucket) {
@@ -410,8 +386,10 @@ void LowHash1::scanBucketsThreadFunction(size_t threadId)
 
                     // If the k-mers are not the same, this is a collision. Discard.
                     if(not std::equal(featureKmerIds0, featureKmerIds0+mLocal, featureKmerIds1)) {
+                        SHASTA_TRACE_COUNT(lowHashCollisions, 1);
                         continue;
                     }
+                    SHASTA_TRACE_COUNT(lowHashCommonFeatures, 1);
 
                     // We found a common feature. Store it.
                     // If read0 is on strand 1, we have to reverse the ordinals.
@@ -4,6 +4,7 @@
 // Shasta
 #include "Kmer.hpp"
 #include "MemoryMappedVectorOfVectors.hpp"
+#include "MemoryMappedVectorOfVectorsBuilder.hpp"
 #include "MultithreadedObject.hpp"
 #include "OrientedReadPair.hpp"
 #include "Reads.hpp"
@@ -80,13 +81,6 @@ private:
     // at each iteration.
     size_t iteration;
 
-    // The low hashes of each oriented read and the ordinals at
-    // which the corresponding feature occurs.
-    // This is recomputed at each iteration.
-    // Indexed by OrientedReadId::getValue().
-    vector< vector< pair<uint64_t, uint32_t> > > lowHashes;
-    void computeLowHashes(size_t threadId);
-
     // Each bucket entry describes a low hash feature.
     // It consists of an oriented read id and
     // the ordinal where the low hash feature appears.
@@ -103,6 +97,11 @@ private:
     };
     MemoryMapped::VectorOfVectors<BucketEntry, uint64_t> buckets;
 
+    // Used to fill the buckets in a single pass
+    // while computing the low hashes.
+    // This is recreated at each iteration.
+    shared_ptr< MemoryMapped::VectorOfVectorsBuilder<BucketEntry, uint64_t> > bucketsBuilder;
+
 
     // Compute a histogram of the number of entries in each histogram.
     void computeBucketHistogram();
@@ -208,12 +207,9 @@ private:
     // Thread functions.
 
     // Thread function to compute the low hashes for each oriented read
-    // and count the number of entries in each bucket.
+    // and store the corresponding bucket entries.
     void computeHashesThreadFunction(size_t threadId);
 
-    // Thread function to fill the buckets.
-    void fillBucketsThreadFunction(size_t threadId);
-
     // Thread function to scan the buckets to find common features.
     void scanBucketsThreadFunction(size_t threadId);
 };
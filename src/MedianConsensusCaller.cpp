@@ -57,6 +57,51 @@ Consensus MedianConsensusCaller::operator()(
 }
 
 
+
+// Same as above, for all the columns of a CoverageBatch.
+// This uses the same logic as predict_runlength.
+void MedianConsensusCaller::computeConsensus(
+    const CoverageBatch& coverageBatch,
+    vector<Consensus>& consensus) const
+{
+    const uint64_t columnCount = coverageBatch.columnCount();
+    consensus.resize(columnCount);
+    array<uint64_t, 256> repeatCountCoverage;
+    for(uint64_t column=0; column<columnCount; column++) {
+        const AlignedBase base = coverageBatch.mostFrequentBase(column);
+        const uint64_t max_observed_repeat =
+            coverageBatch.repeatCountCoverage(column, base, repeatCountCoverage);
+        uint64_t n_total_coverage = 0;
+        for(uint64_t length=0; length<max_observed_repeat; length++) {
+            n_total_coverage += repeatCountCoverage[length];
+        }
+        const double midpoint = double(n_total_coverage)/2;
+
+        size_t sum = 0;
+        size_t median = 0;
+        size_t prev_length = 0;
+        for (size_t length=0; length<=max_observed_repeat; length++){
+            const size_t n_coverage = (length < max_observed_repeat) ? repeatCountCoverage[length] : 0;
+            sum += n_coverage;
+
+            if (double(sum) > midpoint){
+                if (n_coverage > 1){
+                    median = length;
+                }else{
+                    median = size_t(ceil(double(prev_length+length)/2));
+                }
+                break;
+            }
+
+            if (n_coverage > 0){
+                prev_length = length;
+            }
+        }
+        consensus[column] = Consensus(base, median);
+    }
+}
+
+
 void testMedianConsensusCaller(){
     MedianConsensusCaller classifier;
     Coverage coverage;
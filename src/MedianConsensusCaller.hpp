@@ -33,6 +33,7 @@ public:
 
     size_t predict_runlength(const Coverage &coverage, AlignedBase consensus_base) const;
     virtual Consensus operator()(const Coverage&) const;
+    virtual void computeConsensus(const CoverageBatch&, vector<Consensus>&) const;
 };
 
 void testMedianConsensusCaller();
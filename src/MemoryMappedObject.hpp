@@ -6,6 +6,7 @@
 // Shasta.
 #include "SHASTA_ASSERT.hpp"
 #include "filesystem.hpp"
+#include "MemoryMappedVector.hpp"
 #include "touchMemory.hpp"
 
 // Standard libraries.
@@ -345,15 +346,7 @@ template<class T> inline void shasta::MemoryMapped::Object<T>::createNewAnonymou
         const size_t fileSize = headerOnStack.fileSize;
 
         // Map it in memory.
-        int flags = MAP_PRIVATE | MAP_ANONYMOUS;
-#ifdef __linux__
-        if(pageSize == 2*1024*1024) {
-            flags |= MAP_HUGETLB | MAP_HUGE_2MB;
-        }
-#endif
-        void* pointer = ::mmap(0, fileSize,
-            PROT_READ | PROT_WRITE, flags,
-            -1, 0);
+        void* pointer = mapAnonymous(fileSize, pageSize);
         if(pointer == reinterpret_cast<void*>(-1LL)) {
             throw runtime_error("Error " + to_string(errno)
                 + " during mmap call for MemoryMapped::Vector: " + string(strerror(errno)));
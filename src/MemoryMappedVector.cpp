@@ -1,5 +1,6 @@
 #include "MemoryMappedObject.hpp"
 #include "MemoryMappedVector.hpp"
+using namespace shasta;
 
 namespace shasta {
     class MemoryMappedObjectTest {
@@ -33,3 +34,168 @@ void shasta::testMemoryMappedVector()
     SHASTA_ASSERT(x->b == 3);
 #endif
 }
+
+
+
+// Give the kernel a hint about how a range of mapped memory
+// will be accessed. The range is extended to page boundaries.
+bool shasta::MemoryMapped::advise(const void* begin, const void* end, Advice advice)
+{
+    const uint64_t pageSize = 4096;
+    const uint64_t alignedBegin = reinterpret_cast<uint64_t>(begin) & ~(pageSize - 1ULL);
+    const uint64_t alignedEnd = (reinterpret_cast<uint64_t>(end) + pageSize - 1ULL) & ~(pageSize - 1ULL);
+    if(alignedEnd <= alignedBegin) {
+        return true;
+    }
+
+    int madviseAdvice = MADV_NORMAL;
+    switch(advice) {
+    case Advice::Normal:
+        madviseAdvice = MADV_NORMAL;
+        break;
+    case Advice::Sequential:
+        madviseAdvice = MADV_SEQUENTIAL;
+        break;
+    case Advice::Random:
+        madviseAdvice = MADV_RANDOM;
+        break;
+    case Advice::WillNeed:
+        madviseAdvice = MADV_WILLNEED;
+        break;
+    case Advice::DontNeed:
+        // MADV_DONTNEED discards the content of private anonymous mappings,
+        // so use MADV_COLD when available. It only makes the pages
+        // more likely to be reclaimed.
+#ifdef MADV_COLD
+        madviseAdvice = MADV_COLD;
+#else
+        return false;
+#endif
+        break;
+    case Advice::HugePage:
+#ifdef MADV_HUGEPAGE
+        madviseAdvice = MADV_HUGEPAGE;
+#else
+        return false;
+#endif
+        break;
+    case Advice::NoHugePage:
+#ifdef MADV_NOHUGEPAGE
+        madviseAdvice = MADV_NOHUGEPAGE;
+#else
+        return false;
+#endif
+        break;
+    }
+
+    return ::madvise(
+        reinterpret_cast<void*>(alignedBegin),
+        alignedEnd - alignedBegin,
+        madviseAdvice) == 0;
+}
+
+
+
+const char* shasta::MemoryMapped::adviceName(Advice advice)
+{
+    switch(advice) {
+    case Advice::Normal:        return "normal";
+    case Advice::Sequential:    return "sequential";
+    case Advice::Random:        return "random";
+    case Advice::WillNeed:      return "willneed";
+    case Advice::DontNeed:      return "dontneed";
+    case Advice::HugePage:      return "hugepage";
+    case Advice::NoHugePage:    return "nohugepage";
+    }
+    return "unknown";
+}
+
+
+
+// Transparent huge page mode, used for "--memoryBacking THP".
+namespace shasta {
+    namespace MemoryMapped {
+        bool transparentHugePages = false;
+    }
+}
+void shasta::MemoryMapped::setTransparentHugePages(bool value)
+{
+    transparentHugePages = value;
+}
+bool shasta::MemoryMapped::getTransparentHugePages()
+{
+    return transparentHugePages;
+}
+
+
+
+// Create an anonymous mapping of the given size.
+void* shasta::MemoryMapped::mapAnonymous(size_t size, size_t pageSize)
+{
+    const size_t hugePageSize = 2 * 1024 * 1024;
+
+    // 4 KB pages.
+    if(pageSize != hugePageSize) {
+        return ::mmap(0, size, PROT_READ | PROT_WRITE, MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    }
+
+    // 2 MB pages using MAP_HUGETLB.
+    // This requires huge pages to be reserved in advance (see setupHugePages).
+    if(not transparentHugePages) {
+        int flags = MAP_PRIVATE | MAP_ANONYMOUS;
+#ifdef __linux__
+        flags |= MAP_HUGETLB | MAP_HUGE_2MB;
+#endif
+        return ::mmap(0, size, PROT_READ | PROT_WRITE, flags, -1, 0);
+    }
+
+    // 2 MB pages using transparent huge pages.
+    // Map an extra huge page, then unmap what is needed
+    // to make the mapping start at a 2 MB boundary.
+    // The size is a multiple of 2 MB (Header rounds it up),
+    // so this way every page of the mapping can be a huge page.
+    void* pointer = ::mmap(0, size + hugePageSize, PROT_READ | PROT_WRITE,
+        MAP_PRIVATE | MAP_ANONYMOUS, -1, 0);
+    if(pointer == MAP_FAILED) {
+        return pointer;
+    }
+    char* begin = static_cast<char*>(pointer);
+    char* alignedBegin = reinterpret_cast<char*>(
+        (reinterpret_cast<uint64_t>(begin) + hugePageSize - 1ULL) & ~(hugePageSize - 1ULL));
+    char* end = begin + size + hugePageSize;
+    char* alignedEnd = alignedBegin + size;
+    if(alignedBegin != begin) {
+        ::munmap(begin, size_t(alignedBegin - begin));
+    }
+    if(end != alignedEnd) {
+        ::munmap(alignedEnd, size_t(end - alignedEnd));
+    }
+    advise(alignedBegin, alignedEnd, Advice::HugePage);
+    return alignedBegin;
+}
+
+
+
+bool shasta::MemoryMapped::canRemapAnonymous(size_t pageSize)
+{
+    return (pageSize != 2 * 1024 * 1024) or transparentHugePages;
+}
+
+
+
+// In transparent huge page mode, fault in a range of an anonymous mapping
+// ahead of use. This does not change the content of the memory.
+void shasta::MemoryMapped::prefaultAnonymous(const void* begin, const void* end)
+{
+#ifdef MADV_POPULATE_WRITE
+    if(transparentHugePages and (end > begin)) {
+        const uint64_t pageSize = 4096;
+        const uint64_t alignedBegin = reinterpret_cast<uint64_t>(begin) & ~(pageSize - 1ULL);
+        const uint64_t alignedEnd = (reinterpret_cast<uint64_t>(end) + pageSize - 1ULL) & ~(pageSize - 1ULL);
+
+        // This fails on kernels older than 5.14. The memory
+        // then gets faulted in on first use as usual.
+        ::madvise(reinterpret_cast<void*>(alignedBegin), alignedEnd - alignedBegin, MADV_POPULATE_WRITE);
+    }
+#endif
+}
@@ -37,6 +37,48 @@
 namespace shasta {
     namespace MemoryMapped {
         template<class T> class Vector;
+
+        // Access pattern hints, passed to madvise.
+        // See advise below.
+        enum class Advice {
+            Normal,         // MADV_NORMAL
+            Sequential,     // MADV_SEQUENTIAL
+            Random,         // MADV_RANDOM
+            WillNeed,       // MADV_WILLNEED: start reading ahead now.
+            DontNeed,       // MADV_DONTNEED, or MADV_COLD when available.
+            HugePage,       // MADV_HUGEPAGE: use transparent huge pages.
+            NoHugePage      // MADV_NOHUGEPAGE
+        };
+
+        // Give the kernel a hint about how a range of mapped memory
+        // will be accessed. The range is extended to page boundaries.
+        // These are only hints, so failures are not fatal.
+        // Return true if the hint was accepted.
+        bool advise(const void* begin, const void* end, Advice);
+        const char* adviceName(Advice);
+
+        // Transparent huge page mode, used for "--memoryBacking THP".
+        // When this is set, anonymous mappings with a 2 MB page size
+        // use ordinary memory aligned at 2 MB boundaries and marked with
+        // MADV_HUGEPAGE, instead of MAP_HUGETLB. This way the
+        // kernel backs them with transparent huge pages when possible,
+        // without requiring pages to be reserved in advance by root.
+        void setTransparentHugePages(bool);
+        bool getTransparentHugePages();
+
+        // Create an anonymous mapping of the given size,
+        // using the given page size (see above for 2 MB pages).
+        // Returns MAP_FAILED and sets errno on failure, like mmap.
+        void* mapAnonymous(size_t size, size_t pageSize);
+
+        // Return true if an anonymous mapping with the given
+        // page size can be resized using mremap.
+        bool canRemapAnonymous(size_t pageSize);
+
+        // In transparent huge page mode, fault in a range of an anonymous mapping
+        // ahead of use, without changing its content, so it gets
+        // backed by huge pages right away. Otherwise, do nothing.
+        void prefaultAnonymous(const void* begin, const void* end);
     }
     void testMemoryMappedVector();
 }
@@ -117,6 +159,18 @@ public:
         return shasta::touchMemory(begin(), end());
     }
 
+    // Give the kernel a hint about how the vector will be accessed.
+    // This applies to the entire mapping, including unused capacity.
+    // Return true if the hint was accepted.
+    bool advise(Advice advice) const
+    {
+        if(not isOpen) {
+            return false;
+        }
+        const char* p = reinterpret_cast<const char*>(header);
+        return MemoryMapped::advise(p, p + header->fileSize, advice);
+    }
+
 
     void reserve();
     void reserve(size_t capacity);
@@ -551,15 +605,7 @@ template<class T> inline void shasta::MemoryMapped::Vector<T>::createNewAnonymou
         const size_t fileSize = headerOnStack.fileSize;
 
         // Map it in memory.
-        int flags = MAP_PRIVATE | MAP_ANONYMOUS;
-#ifdef __linux__
-        if(pageSize == 2*1024*1024) {
-            flags |= MAP_HUGETLB | MAP_HUGE_2MB;
-        }
-#endif
-        void* pointer = ::mmap(0, fileSize,
-            PROT_READ | PROT_WRITE, flags,
-            -1, 0);
+        void* pointer = mapAnonymous(fileSize, pageSize);
         if(pointer == reinterpret_cast<void*>(-1LL)) {
             if(errno == ENOMEM) {
                 throw runtime_error("Memory allocation failure "
@@ -578,6 +624,7 @@ template<class T> inline void shasta::MemoryMapped::Vector<T>::createNewAnonymou
 
         // Store the header.
         *header = headerOnStack;
+        prefaultAnonymous(data, data + n);
 
         // Call the default constructor on the data.
         for(size_t i=0; i<n; i++) {
@@ -896,11 +943,11 @@ template<class T> inline void
 
 
             // Remap it.
-            // We can only use remap for Linux, and for 4K pages.
+            // We can only use remap for Linux, and not for MAP_HUGETLB pages.
             bool useMremap = false;
             void* pointer = 0;
 #ifdef __linux__
-            useMremap = (pageSize == 4096);
+            useMremap = canRemapAnonymous(pageSize);
 #endif
             if(useMremap) {
 #ifdef __linux__
@@ -921,15 +968,7 @@ template<class T> inline void
 
                 // We cannot use mremap. We have to create a new mapping
                 // and copy the data.
-                int flags = MAP_PRIVATE | MAP_ANONYMOUS;
-#ifdef __linux__
-                if(pageSize == 2*1024*1024) {
-                    flags |= MAP_HUGETLB | MAP_HUGE_2MB;
-                }
-#endif
-                void* newPointer = ::mmap(0, headerOnStack.fileSize,
-                    PROT_READ | PROT_WRITE, flags,
-                    -1, 0);
+                void* newPointer = mapAnonymous(headerOnStack.fileSize, pageSize);
                 if(newPointer == reinterpret_cast<void*>(-1LL)) {
                     if(errno == ENOMEM) {
                         throw runtime_error("Memory allocation failure "
@@ -964,6 +1003,7 @@ template<class T> inline void
             fileName = "";
 
             // Call the constructor on the elements we added.
+            prefaultAnonymous(data + oldSize, data + newSize);
             for(size_t i=oldSize; i<newSize; i++) {
                 new(data+i) T();
             }
@@ -1040,10 +1080,10 @@ template<class T> inline
 
 
     // Remap it.
-    // We can only use remap for Linux, and for 4K pages.
+    // We can only use remap for Linux, and not for MAP_HUGETLB pages.
     bool useMremap = false;
 #ifdef __linux__
-    useMremap = (pageSize == 4096);
+    useMremap = canRemapAnonymous(pageSize);
 #endif
     void* pointer = 0;
     if(useMremap) {
@@ -1065,15 +1105,7 @@ template<class T> inline
 
         // We cannot use mremap. We have to create a new mapping
         // and copy the data.
-        int flags = MAP_PRIVATE | MAP_ANONYMOUS;
-#ifdef __linux__
-        if(pageSize == 2*1024*1024) {
-            flags |= MAP_HUGETLB | MAP_HUGE_2MB;
-        }
-#endif
-        void* newPointer = ::mmap(0, headerOnStack.fileSize,
-            PROT_READ | PROT_WRITE, flags,
-            -1, 0);
+        void* newPointer = mapAnonymous(headerOnStack.fileSize, pageSize);
         if(newPointer == reinterpret_cast<void*>(-1LL)) {
             if(errno == ENOMEM) {
                 throw runtime_error("Memory allocation failure "
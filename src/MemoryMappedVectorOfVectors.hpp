@@ -17,6 +17,7 @@
 namespace shasta {
     namespace MemoryMapped {
         template<class T, class Int> class VectorOfVectors;
+        template<class T, class Int> class VectorOfVectorsBuilder;
     }
 }
 
@@ -270,6 +271,15 @@ public:
         return toc.touchMemory() + data.touchMemory();
     }
 
+    // Give the kernel a hint about how the toc and data will be accessed.
+    // See MemoryMapped::Vector::advise.
+    bool advise(Advice advice) const
+    {
+        const bool tocAdvised = toc.advise(advice);
+        const bool dataAdvised = data.advise(advice);
+        return tocAdvised and dataAdvised;
+    }
+
     bool isOpen() const
     {
         return toc.isOpen && data.isOpen;
@@ -307,6 +317,9 @@ private:
     Vector<T> data;
     string name;
     size_t pageSize;
+
+    // VectorOfVectorsBuilder fills in the toc and count directly.
+    friend class VectorOfVectorsBuilder<T, Int>;
 };
 
 
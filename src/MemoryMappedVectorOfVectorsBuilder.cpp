@@ -0,0 +1,148 @@
+// Shasta.
+#include "MemoryMappedVectorOfVectorsBuilder.hpp"
+using namespace shasta;
+using namespace MemoryMapped;
+
+// Standard library.
+#include "iostream.hpp"
+#include <random>
+#include <thread>
+
+
+
+// Test VectorOfVectorsBuilder by comparing the VectorOfVectors
+// it creates with the one created by the two pass construction
+// from the same data. Entries added with append are in no
+// particular order, so the entries of each vector are compared after sorting.
+// When only storeVector is used, the order of the entries
+// in each vector is also checked.
+void shasta::testMemoryMappedVectorOfVectorsBuilder()
+{
+    const size_t threadCount = 4;
+    std::mt19937 randomSource(231);
+
+    // The sizes are chosen so the table of contents contains
+    // zero, one, or more chunks of the parallel prefix sum,
+    // ending exactly at or just past a chunk boundary.
+    const vector<uint64_t> nValues = {0, 1, 1023, 1024, 1025, 5000, 100000};
+
+    // Mode 0: storeVector only.
+    // Mode 1: append only.
+    // Mode 2: storeVector and append, also for the same index.
+    for(uint64_t mode=0; mode<3; mode++) {
+        for(const uint64_t n: nValues) {
+
+            // Create random data for each thread.
+            // Entire vectors of random length, many of them empty,
+            // and single entries at random indexes.
+            // Some vectors get many entries, so counts span chunk boundaries
+            // of the data as well.
+            class ThreadData {
+            public:
+                vector< pair<uint64_t, vector<uint64_t> > > vectors;
+                vector< pair<uint64_t, uint64_t> > entries;
+            };
+            vector<ThreadData> threadData(threadCount);
+            uint64_t value = 0;
+            if(n > 0) {
+                if(mode != 1) {
+                    for(uint64_t i=0; i<n; i++) {
+                        if(randomSource() % 4 == 0) {
+                            continue;   // Never stored.
+                        }
+                        vector<uint64_t> v(
+                            (randomSource() % 1000 == 0) ? 5000 : randomSource() % 5);
+                        for(uint64_t& x: v) {
+                            x = value++;
+                        }
+                        threadData[randomSource() % threadCount].vectors.push_back(make_pair(i, v));
+                    }
+                }
+                if(mode != 0) {
+                    const uint64_t entryCount = 2 * n;
+                    for(uint64_t k=0; k<entryCount; k++) {
+                        const uint64_t i = (randomSource() % 100 == 0) ? 0 : randomSource() % n;
+                        threadData[randomSource() % threadCount].entries.push_back(make_pair(i, value++));
+                    }
+                }
+            }
+
+            // Create the VectorOfVectors using the builder,
+            // with all threads adding data concurrently.
+            VectorOfVectorsBuilder<uint64_t, uint64_t> builder(n, threadCount);
+            vector<std::thread> threads;
+            for(size_t threadId=0; threadId<threadCount; threadId++) {
+                threads.push_back(std::thread([&builder, &threadData, threadId]()
+                {
+                    const ThreadData& data = threadData[threadId];
+                    for(const auto& p: data.vectors) {
+                        builder.storeVector(threadId, p.first, p.second);
+                    }
+                    for(const auto& p: data.entries) {
+                        builder.append(threadId, p.first, p.second);
+                    }
+                }));
+            }
+            for(std::thread& thread: threads) {
+                thread.join();
+            }
+            VectorOfVectors<uint64_t, uint64_t> x;
+            x.createNew("", 4096);
+            builder.write(x, threadCount);
+
+            // Create the same VectorOfVectors using the two pass construction.
+            VectorOfVectors<uint64_t, uint64_t> y;
+            y.createNew("", 4096);
+            y.beginPass1(n);
+            for(const ThreadData& data: threadData) {
+                for(const auto& p: data.vectors) {
+                    y.incrementCount(p.first, p.second.size());
+                }
+                for(const auto& p: data.entries) {
+                    y.incrementCount(p.first);
+                }
+            }
+            y.beginPass2();
+            for(const ThreadData& data: threadData) {
+                for(const auto& p: data.vectors) {
+                    for(const uint64_t x: p.second) {
+                        y.store(p.first, x);
+                    }
+                }
+                for(const auto& p: data.entries) {
+                    y.store(p.first, p.second);
+                }
+            }
+            y.endPass2();
+
+            // Compare them.
+            SHASTA_ASSERT(x.size() == n);
+            SHASTA_ASSERT(y.size() == n);
+            SHASTA_ASSERT(x.totalSize() == y.totalSize());
+            vector<uint64_t> xv;
+            vector<uint64_t> yv;
+            for(uint64_t i=0; i<n; i++) {
+                xv.assign(x.begin(i), x.end(i));
+                yv.assign(y.begin(i), y.end(i));
+                sort(xv.begin(), xv.end());
+                sort(yv.begin(), yv.end());
+                SHASTA_ASSERT(xv == yv);
+            }
+
+            // With storeVector only, each vector must be
+            // in the order in which it was stored.
+            if(mode == 0) {
+                for(const ThreadData& data: threadData) {
+                    for(const auto& p: data.vectors) {
+                        SHASTA_ASSERT(x.size(p.first) == p.second.size());
+                        SHASTA_ASSERT(std::equal(p.second.begin(), p.second.end(), x.begin(p.first)));
+                    }
+                }
+            }
+
+            x.remove();
+            y.remove();
+        }
+    }
+    cout << "VectorOfVectorsBuilder test passed." << endl;
+}
@@ -0,0 +1,313 @@
+#ifndef SHASTA_MEMORY_MAPPED_VECTOR_OF_VECTORS_BUILDER_HPP
+#define SHASTA_MEMORY_MAPPED_VECTOR_OF_VECTORS_BUILDER_HPP
+
+/*******************************************************************************
+
+Class VectorOfVectorsBuilder is used to construct a
+MemoryMapped::VectorOfVectors in a single pass over the
+data, using multiple threads.
+
+The two pass construction of a VectorOfVectors (beginPass1,
+incrementCount, beginPass2, store, endPass2) requires the
+producer of the data to run twice, once to count and
+once to store. When the producer is expensive
+(for example, it has to follow marker graph paths or compute hashes)
+this doubles the work.
+
+With VectorOfVectorsBuilder, the producer runs once.
+Each thread appends what it finds to a log owned by that thread,
+so no synchronization is needed. Two ways to add data are provided:
+
+- storeVector stores the entire vector for an index.
+  This is the "compute once, write once" path, for producers
+  that generate all the entries of a vector together.
+  The entries of each vector keep the order in which they were passed.
+
+- append adds a single entry to the vector for an index.
+  This is for producers that generate entries in arbitrary order,
+  like the store function of the two pass construction.
+  As with storeMultithreaded, the order of the
+  entries in each vector is not defined.
+
+The two can be mixed, also for the same index.
+Indexes that never receive any data end up as empty vectors.
+
+When all threads are done, write creates the VectorOfVectors
+using multiple threads. It counts the entries
+of each vector from the thread logs, computes the table of contents
+with a parallel prefix sum, then scatters the thread logs
+to their final positions.
+
+The price is that the data are temporarily stored twice,
+in the thread logs and in the final VectorOfVectors.
+Each thread log is freed as soon as it was scattered.
+
+Usage pattern:
+
+VectorOfVectorsBuilder<T, Int> builder(n, threadCount);
+// In each thread:
+    builder.storeVector(threadId, i, v.begin(), v.end());
+    builder.append(threadId, i, t);
+// When all threads are done:
+builder.write(vectorOfVectors, threadCount);
+
+*******************************************************************************/
+
+// Shasta.
+#include "MemoryMappedVectorOfVectors.hpp"
+#include "MultithreadedObject.hpp"
+#include "SHASTA_ASSERT.hpp"
+
+// Standard library.
+#include "algorithm.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    namespace MemoryMapped {
+        template<class T, class Int> class VectorOfVectorsBuilder;
+    }
+    void testMemoryMappedVectorOfVectorsBuilder();
+}
+
+
+
+template<class T, class Int> class shasta::MemoryMapped::VectorOfVectorsBuilder :
+    public MultithreadedObject< VectorOfVectorsBuilder<T, Int> > {
+public:
+
+    // n is the number of vectors in the VectorOfVectors to be created.
+    // threadCount is the number of threads that will add data,
+    // with thread ids in [0, threadCount).
+    VectorOfVectorsBuilder(Int n, size_t threadCount) :
+        MultithreadedObject< VectorOfVectorsBuilder<T, Int> >(*this),
+        n(n),
+        threadLogs(threadCount)
+    {
+    }
+
+    // Store the entire vector with index i.
+    // This can be called concurrently by different threads,
+    // as long as each thread uses its own thread id.
+    template<class Iterator> void storeVector(
+        size_t threadId,
+        Int i,
+        Iterator begin,
+        Iterator end)
+    {
+        SHASTA_ASSERT(threadId < threadLogs.size());
+        SHASTA_ASSERT(i < n);
+        ThreadLog& threadLog = threadLogs[threadId];
+        threadLog.indexes.push_back(i);
+        threadLog.data.insert(threadLog.data.end(), begin, end);
+        threadLog.ends.push_back(Int(threadLog.data.size()));
+    }
+    void storeVector(size_t threadId, Int i, const vector<T>& v)
+    {
+        storeVector(threadId, i, v.begin(), v.end());
+    }
+
+    // Add an entry to the vector with index i.
+    // This can be called concurrently by different threads,
+    // as long as each thread uses its own thread id.
+    void append(size_t threadId, Int i, const T& t)
+    {
+        SHASTA_ASSERT(threadId < threadLogs.size());
+        SHASTA_ASSERT(i < n);
+        ThreadLog& threadLog = threadLogs[threadId];
+        threadLog.entryIndexes.push_back(i);
+        threadLog.entries.push_back(t);
+    }
+
+    // Create the VectorOfVectors using the stored data.
+    // The VectorOfVectors must already be open and is overwritten.
+    // The thread logs are freed, so this can only be called once.
+    // If freeCount is false, the memory used to count entries
+    // is left allocated, which is faster if the VectorOfVectors is
+    // reused (see VectorOfVectors::endPass2).
+    void write(
+        VectorOfVectors<T, Int>&,
+        size_t threadCount,
+        bool freeCount = true);
+
+private:
+    Int n;
+
+    // The data stored by each thread.
+    class ThreadLog {
+    public:
+
+        // Entire vectors stored with storeVector.
+        // The vector for indexes[k] is stored in data
+        // in positions [ends[k-1], ends[k]), with ends[-1]=0.
+        vector<Int> indexes;
+        vector<Int> ends;
+        vector<T> data;
+
+        // Single entries stored with append.
+        vector<Int> entryIndexes;
+        vector<T> entries;
+    };
+    vector<ThreadLog> threadLogs;
+
+    // Used by write.
+    VectorOfVectors<T, Int>* vectorOfVectors = 0;
+    Int chunkSize = 0;
+    vector<Int> chunkSums;
+    void countThreadFunction(size_t threadId);
+    void sumThreadFunction(size_t threadId);
+    void tocThreadFunction(size_t threadId);
+    void scatterThreadFunction(size_t threadId);
+};
+
+
+
+template<class T, class Int> inline void
+    shasta::MemoryMapped::VectorOfVectorsBuilder<T, Int>::write(
+    VectorOfVectors<T, Int>& vectorOfVectorsArgument,
+    size_t threadCount,
+    bool freeCount)
+{
+    vectorOfVectors = &vectorOfVectorsArgument;
+    VectorOfVectors<T, Int>& v = *vectorOfVectors;
+    v.clear();
+
+    // Count the entries of each vector.
+    v.beginPass1(n);
+    this->setupLoadBalancing(threadLogs.size(), 1);
+    this->runThreads(&VectorOfVectorsBuilder<T, Int>::countThreadFunction, threadCount);
+
+    // Compute the table of contents with a parallel prefix sum.
+    // Each chunk of counts is first summed independently.
+    // After a sequential prefix sum of the chunk sums,
+    // the toc entries of each chunk are filled independently.
+    chunkSize = std::max(Int(1024), Int(n / (4 * threadCount) + 1));
+    const Int chunkCount = (n + chunkSize - 1) / chunkSize;
+    chunkSums.resize(chunkCount);
+    this->setupLoadBalancing(chunkCount, 1);
+    this->runThreads(&VectorOfVectorsBuilder<T, Int>::sumThreadFunction, threadCount);
+    Int sum = 0;
+    for(Int& chunkSum: chunkSums) {
+        const Int chunkBegin = sum;
+        sum += chunkSum;
+        chunkSum = chunkBegin;
+    }
+    v.toc.reserveAndResize(n + 1);
+    v.toc[0] = 0;
+    this->setupLoadBalancing(chunkCount, 1);
+    this->runThreads(&VectorOfVectorsBuilder<T, Int>::tocThreadFunction, threadCount);
+    SHASTA_ASSERT(v.toc[n] == sum);
+    v.data.reserveAndResize(sum);
+
+    // Scatter the thread logs to their final positions.
+    this->setupLoadBalancing(threadLogs.size(), 1);
+    this->runThreads(&VectorOfVectorsBuilder<T, Int>::scatterThreadFunction, threadCount);
+
+    // The scatter decremented all counts back to zero.
+    v.endPass2(true, freeCount);
+    chunkSums.clear();
+    vectorOfVectors = 0;
+}
+
+
+
+template<class T, class Int> inline void
+    shasta::MemoryMapped::VectorOfVectorsBuilder<T, Int>::countThreadFunction(size_t)
+{
+    VectorOfVectors<T, Int>& v = *vectorOfVectors;
+
+    uint64_t begin, end;
+    while(this->getNextBatch(begin, end)) {
+        for(uint64_t threadId=begin; threadId!=end; threadId++) {
+            const ThreadLog& threadLog = threadLogs[threadId];
+            Int dataBegin = 0;
+            for(uint64_t k=0; k<threadLog.indexes.size(); k++) {
+                const Int dataEnd = threadLog.ends[k];
+                v.incrementCountMultithreaded(threadLog.indexes[k], dataEnd - dataBegin);
+                dataBegin = dataEnd;
+            }
+            for(const Int i: threadLog.entryIndexes) {
+                v.incrementCountMultithreaded(i);
+            }
+        }
+    }
+}
+
+
+
+template<class T, class Int> inline void
+    shasta::MemoryMapped::VectorOfVectorsBuilder<T, Int>::sumThreadFunction(size_t)
+{
+    const VectorOfVectors<T, Int>& v = *vectorOfVectors;
+
+    uint64_t begin, end;
+    while(this->getNextBatch(begin, end)) {
+        for(uint64_t chunk=begin; chunk!=end; chunk++) {
+            const Int iBegin = Int(chunk) * chunkSize;
+            const Int iEnd = std::min(n, iBegin + chunkSize);
+            Int sum = 0;
+            for(Int i=iBegin; i!=iEnd; i++) {
+                sum += v.count[i];
+            }
+            chunkSums[chunk] = sum;
+        }
+    }
+}
+
+
+
+template<class T, class Int> inline void
+    shasta::MemoryMapped::VectorOfVectorsBuilder<T, Int>::tocThreadFunction(size_t)
+{
+    VectorOfVectors<T, Int>& v = *vectorOfVectors;
+
+    uint64_t begin, end;
+    while(this->getNextBatch(begin, end)) {
+        for(uint64_t chunk=begin; chunk!=end; chunk++) {
+            const Int iBegin = Int(chunk) * chunkSize;
+            const Int iEnd = std::min(n, iBegin + chunkSize);
+            Int sum = chunkSums[chunk];
+            for(Int i=iBegin; i!=iEnd; i++) {
+                sum += v.count[i];
+                v.toc[i + 1] = sum;
+            }
+        }
+    }
+}
+
+
+
+template<class T, class Int> inline void
+    shasta::MemoryMapped::VectorOfVectorsBuilder<T, Int>::scatterThreadFunction(size_t)
+{
+    VectorOfVectors<T, Int>& v = *vectorOfVectors;
+
+    uint64_t begin, end;
+    while(this->getNextBatch(begin, end)) {
+        for(uint64_t threadId=begin; threadId!=end; threadId++) {
+            ThreadLog& threadLog = threadLogs[threadId];
+
+            // Entire vectors.
+            Int dataBegin = 0;
+            for(uint64_t k=0; k<threadLog.indexes.size(); k++) {
+                const Int i = threadLog.indexes[k];
+                const Int dataEnd = threadLog.ends[k];
+                const Int position = __sync_sub_and_fetch(&v.count[i], dataEnd - dataBegin);
+                std::copy(
+                    threadLog.data.begin() + dataBegin,
+                    threadLog.data.begin() + dataEnd,
+                    v.begin(i) + position);
+                dataBegin = dataEnd;
+            }
+
+            // Single entries.
+            for(uint64_t k=0; k<threadLog.entryIndexes.size(); k++) {
+                v.storeMultithreaded(threadLog.entryIndexes[k], threadLog.entries[k]);
+            }
+
+            // Free the memory of this thread log.
+            threadLog = ThreadLog();
+        }
+    }
+}
+
+#endif
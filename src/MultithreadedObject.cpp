@@ -38,6 +38,13 @@ public:
             }
         }
     }
+    void fail(size_t threadId)
+    {
+        if(threadId == 1) {
+            throw runtime_error("Test exception.");
+        }
+        compute(threadId);
+    }
     void check() const
     {
         for(uint64_t i=0; i<x.size(); i++) {
@@ -73,5 +80,21 @@ void shasta::testMultithreadedObject()
         cout << t01 << endl;
     }
     x.check();
+
+    // An exception in a thread must be propagated to the caller.
+    x.setupLoadBalancing(n, batchSize);
+    bool exceptionWasPropagated = false;
+    try {
+        x.runThreads(&MultithreadedObjectTestClass::fail, threadCount, "threadLogs-");
+    } catch(const runtime_error& e) {
+        exceptionWasPropagated = (string(e.what()) == "Test exception.");
+    }
+    SHASTA_ASSERT(exceptionWasPropagated);
+
+    // The object is still usable after that.
+    x.setupLoadBalancing(n, batchSize);
+    x.runThreads(&MultithreadedObjectTestClass::compute, threadCount, "threadLogs-");
+    x.check();
+    cout << "MultithreadedObject test passed." << endl;
 }
 
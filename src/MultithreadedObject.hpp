@@ -5,6 +5,11 @@
 
 // Template class MultithreadedObject can be used as a base class
 // to provide basic multithreading functionality.
+// The threads are persistent workers taken from the
+// process-wide ThreadPool, so runThreads can be called
+// many times without the cost of creating new threads.
+// If a thread function throws, the exception is
+// rethrown to the caller of runThreads or waitForThreads.
 
 // Usage pattern:
 // class A : public MultithreadedObject<A> {
@@ -14,14 +19,14 @@
 // };
 
 // Shasta.
+#include "Numa.hpp"
 #include "SHASTA_ASSERT.hpp"
+#include "ThreadPool.hpp"
 #include "timestamp.hpp"
 
-// Linux.
-#include <pthread.h>
-
 // Standard libraries.
 #include "algorithm.hpp"
+#include <atomic>
 #include "cstddef.hpp"
 #include "fstream.hpp"
 #include "iostream.hpp"
@@ -63,12 +68,20 @@ public:
         const string& logFileNamePrefix = "");
 
     // Wait for the running threads to complete.
+    // If any thread threw an exception, the first one is rethrown here.
     void waitForThreads();
 
     // Dynamic load balancing.
+    // If the NUMA policy is firstTouch (see Numa.hpp), [0, n) is divided
+    // into one block per node, and each thread first gets batches
+    // from the block of the node it is pinned to.
+    // Batches are then no longer handed out in approximately increasing order,
+    // so numaAware must be false if the thread function relies on that,
+    // for example when passing its results to an OrderedOutputFile.
     void setupLoadBalancing(
         uint64_t n,
-        uint64_t batchSize);
+        uint64_t batchSize,
+        bool numaAware = true);
 
 protected:
 
@@ -101,78 +114,46 @@ private:
 
 
     // The function run by each thread.
-    // Note if an exception happens in a thread,
-    // we don't want to wait for all remaining threads to finish.
-    // Therefore, the catch block calls exit.
-    // A slightly cleaner termination may be possible
-    // via pthread_cancel, but even that would result in
-    // lack of destruction of objects created by the other threads.
-    // There is also the possibility of using std::exception_ptr
-    // to propagate the exception, but even that way a completely
-    // clean termination is not possible without waiting
-    // for all threads to finish.
-    static void runThreadFunction(T& t, ThreadFunction f, size_t threadId)
+    // If an exception happens in a thread, the other threads
+    // stop getting new batches from getNextBatch,
+    // and the exception is propagated to the caller by waitForThreads
+    // after all threads finish.
+    static void runThreadFunction(T& t, ThreadFunction f, size_t threadId, size_t threadCount)
     {
         try {
+            Numa::pinThread(threadId, threadCount);
             (t.*f)(threadId);
-        } catch(const runtime_error& e) {
-            t.exceptionsOccurred = true;
-            std::lock_guard<std::mutex> lock(t.mutex);
-            cout << timestamp << "A runtime error occurred in thread " << threadId << ":\n";
-            cout << e.what() << endl;
-            t.killAllThreadsExceptMe(threadId);
-            ::exit(1);
-        } catch(const std::bad_alloc& e) {
-            t.exceptionsOccurred = true;
-            std::lock_guard<std::mutex> lock(t.mutex);
-            cout << timestamp << e.what() << endl;
-            cout << "A memory allocation failure occurred in thread " << threadId << ":\n";
-            cout << "This assembly requires more memory than available." << endl;
-            cout << "Rerun on a larger machine." << endl;
-            t.killAllThreadsExceptMe(threadId);
-            ::exit(1);
-        } catch(const exception& e) {
-            t.exceptionsOccurred = true;
-            std::lock_guard<std::mutex> lock(t.mutex);
-            cout << "A standard exception occurred in thread " << threadId << ":\n";
-            cout << e.what() << endl;
-            t.killAllThreadsExceptMe(threadId);
-            ::exit(1);
         } catch(...) {
             t.exceptionsOccurred = true;
             std::lock_guard<std::mutex> lock(t.mutex);
-            cout << "A non-standard exception occurred in thread " << threadId << "." << endl;
-            t.killAllThreadsExceptMe(threadId);
-            ::exit(1);
+            cout << timestamp << "An exception occurred in thread " << threadId << "." << endl;
+            throw;
         }
     }
 
 
 
-    vector< std::shared_ptr<std::thread> > threads;
-
-    void killAllThreadsExceptMe(size_t me)
-    {
-        for(size_t threadId=0; threadId<threads.size(); threadId++) {
-            if(threadId == me) {
-                continue;
-            }
-            const std::shared_ptr<std::thread> thread = threads[threadId];
-            const auto h = thread->native_handle();
-            if(h) {
-                ::pthread_cancel(h);
-            }
-        }
-    }
+    // The running job of the ThreadPool, if any.
+    shared_ptr<ThreadPool::Job> job;
 
     vector<ofstream> threadLogs;
 
-    bool exceptionsOccurred= false;
+    std::atomic<bool> exceptionsOccurred {false};
 
     // Load balancing.
     uint64_t n = 0;
     uint64_t batchSize = 0;
     uint64_t nextBatch = 0;
+
+    // Load balancing by NUMA node, used when the NUMA policy is firstTouch.
+    // The padding keeps the blocks of different nodes in different cache lines.
+    class NodeBlock {
+    public:
+        uint64_t nextBatch;
+        uint64_t end;
+        uint64_t padding[6];
+    };
+    vector<NodeBlock> nodeBlocks;
 };
 
 
@@ -200,7 +181,7 @@ template<class T> inline void shasta::MultithreadedObject<T>::startThreads(
     size_t threadCount,
     const string& logFileNamePrefix)
 {
-    if(!threads.empty()) {
+    if(job) {
         throw runtime_error("Unsupported attempt to start new threads while other threads have not been joined.");
     }
     SHASTA_ASSERT(threadLogs.empty());
@@ -218,22 +199,19 @@ template<class T> inline void shasta::MultithreadedObject<T>::startThreads(
             }
             log.exceptions(ofstream::failbit | ofstream::badbit );
         }
+    }
 
-        try {
-            threads.push_back(std::make_shared<std::thread>(
-                std::thread(
-                &MultithreadedObject::runThreadFunction,
-                std::ref(t),
-                f,
-                threadId)));
-        } catch(const std::exception& e) {
-            throw runtime_error(
-                "The following error occurred while attempting to start thread " +
-                to_string(threadId) + ":\n" + e.what() + "\n" +
-                "You may have hit a limit imposed by your system on the maximum number of threads "
-                "allowed. Rerunning with \"--threads " + to_string(threadId) + "\" may fix this problem "
-                "at a cost in performance.");
-        }
+    T* tPointer = &t;
+    try {
+        job = ThreadPool::instance().start(
+            [tPointer, f, threadCount](uint64_t threadId)
+            {
+                runThreadFunction(*tPointer, f, threadId, threadCount);
+            },
+            threadCount);
+    } catch(...) {
+        threadLogs.clear();
+        throw;
     }
 }
 
@@ -241,32 +219,67 @@ template<class T> inline void shasta::MultithreadedObject<T>::startThreads(
 
 template<class T> inline void shasta::MultithreadedObject<T>::waitForThreads()
 {
-    for(std::shared_ptr<std::thread> thread: threads) {
-        thread->join();
+    if(not job) {
+        return;
     }
-    threads.clear();
-    threadLogs.clear();
-    if(exceptionsOccurred) {
-        throw runtime_error("Exceptions occurred in at least one thread.");
+    const shared_ptr<ThreadPool::Job> runningJob = job;
+    job = 0;
+
+    // This rethrows the first exception that occurred in a thread, if any.
+    try {
+        runningJob->wait();
+    } catch(...) {
+        threadLogs.clear();
+        throw;
     }
-    exceptionsOccurred = false;
-    // __sync_synchronize (); A full memory barrier is probably not needed here.
+    threadLogs.clear();
 }
 
 
 
 template<class T> inline void shasta::MultithreadedObject<T>::setupLoadBalancing(
     uint64_t nArgument,
-    uint64_t batchSizeArgument)
+    uint64_t batchSizeArgument,
+    bool numaAware)
 {
     n = nArgument;
     batchSize = batchSizeArgument;
     nextBatch = 0;
+
+    nodeBlocks.clear();
+    if(numaAware and Numa::isPartitioned()) {
+        nodeBlocks.resize(Numa::nodeCount());
+        for(uint64_t i=0; i<nodeBlocks.size(); i++) {
+            nodeBlocks[i].nextBatch = Numa::blockBegin(n, i);
+            nodeBlocks[i].end = Numa::blockBegin(n, i + 1);
+        }
+    }
 }
 template<class T> inline bool shasta::MultithreadedObject<T>:: getNextBatch(
     uint64_t& begin,
     uint64_t& end)
 {
+    // If an exception occurred in another thread, stop early.
+    if(exceptionsOccurred) {
+        return false;
+    }
+
+
+    // Get a batch from the block of the node of this thread.
+    // If that is exhausted, try the blocks of the other nodes.
+    if(not nodeBlocks.empty()) {
+        const uint64_t node = Numa::threadNode();
+        for(uint64_t i=0; i<nodeBlocks.size(); i++) {
+            NodeBlock& nodeBlock = nodeBlocks[(node + i) % nodeBlocks.size()];
+            begin = __sync_fetch_and_add(&nodeBlock.nextBatch, batchSize);
+            if(begin < nodeBlock.end) {
+                end = min(nodeBlock.end, begin + batchSize);
+                return true;
+            }
+        }
+        return false;
+    }
+
     begin = __sync_fetch_and_add(&nextBatch, batchSize);
     if(begin < n) {
         end = min(n, begin + batchSize);
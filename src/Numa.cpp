@@ -0,0 +1,437 @@
+// Shasta.
+#include "Numa.hpp"
+#include "SHASTA_ASSERT.hpp"
+#include "timestamp.hpp"
+using namespace shasta;
+
+// Boost libraries.
+#include <boost/algorithm/string.hpp>
+
+// Linux.
+#ifdef __linux__
+#include <linux/mempolicy.h>
+#include <linux/perf_event.h>
+#include <pthread.h>
+#include <sched.h>
+#include <sys/syscall.h>
+#include <unistd.h>
+#endif
+
+// Standard library.
+#include "algorithm.hpp"
+#include "fstream.hpp"
+#include "iostream.hpp"
+#include <iomanip>
+#include "stdexcept.hpp"
+
+
+
+namespace shasta {
+    namespace Numa {
+
+        Policy policy = Policy::none;
+
+        // The index of the node the calling thread was pinned to.
+        thread_local uint64_t pinnedNode = 0;
+
+        // The processors of each NUMA node that are available to this process.
+        // Nodes without available processors are not included.
+        class Node {
+        public:
+            uint64_t id;
+            vector<int> cpus;
+        };
+        const vector<Node>& getNodes();
+        vector<Node> findNodes();
+        vector<int> parseCpuList(const string&);
+
+#ifdef __linux__
+        long mbind(const void* begin, uint64_t size, int mode,
+            const vector<unsigned long>& nodeMask, unsigned int flags);
+        vector<unsigned long> nodeMask(const vector<uint64_t>& nodeIds);
+#endif
+    }
+}
+
+
+
+Numa::Policy Numa::policyFromString(const string& s)
+{
+    if(s == "none") {
+        return Policy::none;
+    } else if(s == "pin") {
+        return Policy::pin;
+    } else if(s == "interleave") {
+        return Policy::interleave;
+    } else if(s == "firstTouch") {
+        return Policy::firstTouch;
+    } else {
+        throw runtime_error("Invalid NUMA policy " + s +
+            ". Valid values are none, pin, interleave, firstTouch.");
+    }
+}
+
+
+
+const char* Numa::policyName(Policy p)
+{
+    switch(p) {
+    case Policy::none: return "none";
+    case Policy::pin: return "pin";
+    case Policy::interleave: return "interleave";
+    case Policy::firstTouch: return "firstTouch";
+    }
+    return "unknown";
+}
+
+
+
+void Numa::setPolicy(Policy p)
+{
+    policy = p;
+    if(policy == Policy::none) {
+        return;
+    }
+
+    const vector<Node>& nodes = getNodes();
+    cout << "NUMA policy " << policyName(policy) << " with " << nodes.size() << " nodes." << endl;
+    for(const Node& node: nodes) {
+        cout << "NUMA node " << node.id << " has " << node.cpus.size() << " available processors." << endl;
+    }
+    if(nodes.size() < 2) {
+        return;
+    }
+
+#ifdef __linux__
+    // For interleave, set the policy for the whole process.
+    // Threads created after this inherit it.
+    if(policy == Policy::interleave) {
+        vector<uint64_t> nodeIds;
+        for(const Node& node: nodes) {
+            nodeIds.push_back(node.id);
+        }
+        const vector<unsigned long> mask = nodeMask(nodeIds);
+        if(::syscall(SYS_set_mempolicy, MPOL_INTERLEAVE, mask.data(),
+            mask.size() * 8 * sizeof(unsigned long)) != 0) {
+            cout << "Unable to set the interleave memory policy. "
+                "Memory will be allocated using the default policy." << endl;
+        }
+    }
+#endif
+}
+
+
+
+Numa::Policy Numa::getPolicy()
+{
+    return policy;
+}
+
+
+
+uint64_t Numa::nodeCount()
+{
+    return getNodes().size();
+}
+
+
+
+bool Numa::isPartitioned()
+{
+    return policy == Policy::firstTouch and nodeCount() > 1;
+}
+
+
+
+const vector<Numa::Node>& Numa::getNodes()
+{
+    // Initialized once, in a thread safe way.
+    static const vector<Node> nodes = findNodes();
+    return nodes;
+}
+
+
+
+vector<Numa::Node> Numa::findNodes()
+{
+    vector<Node> nodes;
+
+#ifdef __linux__
+    // The processors this process is allowed to run on.
+    cpu_set_t allowedCpus;
+    CPU_ZERO(&allowedCpus);
+    if(::sched_getaffinity(0, sizeof(allowedCpus), &allowedCpus) != 0) {
+        return nodes;
+    }
+
+    ifstream onlineFile("/sys/devices/system/node/online");
+    string onlineNodes;
+    if(not (onlineFile >> onlineNodes)) {
+        return nodes;
+    }
+    for(const int nodeId: parseCpuList(onlineNodes)) {
+        ifstream cpuListFile("/sys/devices/system/node/node" + to_string(nodeId) + "/cpulist");
+        string cpuList;
+        if(not (cpuListFile >> cpuList)) {
+            continue;
+        }
+        Node node;
+        node.id = uint64_t(nodeId);
+        for(const int cpu: parseCpuList(cpuList)) {
+            if(cpu < CPU_SETSIZE and CPU_ISSET(cpu, &allowedCpus)) {
+                node.cpus.push_back(cpu);
+            }
+        }
+        if(not node.cpus.empty()) {
+            nodes.push_back(node);
+        }
+    }
+#endif
+
+    return nodes;
+}
+
+
+
+// Parse a list of the form used in /sys/devices/system/node,
+// for example "0-23,48-71".
+vector<int> Numa::parseCpuList(const string& s)
+{
+    vector<int> v;
+    vector<string> tokens;
+    boost::algorithm::split(tokens, s, boost::algorithm::is_any_of(","));
+    for(const string& token: tokens) {
+        if(token.empty()) {
+            continue;
+        }
+        const size_t dashPosition = token.find('-');
+        if(dashPosition == string::npos) {
+            v.push_back(std::stoi(token));
+        } else {
+            const int begin = std::stoi(token.substr(0, dashPosition));
+            const int end = std::stoi(token.substr(dashPosition + 1));
+            for(int i=begin; i<=end; i++) {
+                v.push_back(i);
+            }
+        }
+    }
+    return v;
+}
+
+
+
+void Numa::pinThread(uint64_t threadId, uint64_t threadCount)
+{
+    if(policy == Policy::none) {
+        return;
+    }
+    const vector<Node>& nodes = getNodes();
+    if(nodes.size() < 2) {
+        return;
+    }
+    SHASTA_ASSERT(threadId < threadCount);
+
+#ifdef __linux__
+    pinnedNode = (threadId * nodes.size()) / threadCount;
+    const Node& node = nodes[pinnedNode];
+    cpu_set_t cpus;
+    CPU_ZERO(&cpus);
+    for(const int cpu: node.cpus) {
+        CPU_SET(cpu, &cpus);
+    }
+
+    // If this fails the thread just runs unpinned.
+    ::pthread_setaffinity_np(::pthread_self(), sizeof(cpus), &cpus);
+#endif
+}
+
+
+
+uint64_t Numa::threadNode()
+{
+    return pinnedNode;
+}
+
+
+
+void Numa::distribute(const void* begin, const void* end)
+{
+    if(not isPartitioned()) {
+        return;
+    }
+    const uint64_t n = uint64_t(static_cast<const char*>(end) - static_cast<const char*>(begin));
+    for(uint64_t i=0; i<nodeCount(); i++) {
+        distributeToNode(
+            static_cast<const char*>(begin) + blockBegin(n, i),
+            static_cast<const char*>(begin) + blockBegin(n, i + 1), i);
+    }
+}
+
+
+
+void Numa::distributeToNode(const void* begin, const void* end, uint64_t nodeIndex)
+{
+    if(not isPartitioned()) {
+        return;
+    }
+    const vector<Node>& nodes = getNodes();
+    SHASTA_ASSERT(nodeIndex < nodes.size());
+
+#ifdef __linux__
+    // Work in units of 2 MB, so this also works for memory backed by
+    // huge pages. Partial units at the two ends are left alone.
+    const uint64_t pageSize = 2 * 1024 * 1024;
+    const uint64_t alignedBegin = (reinterpret_cast<uint64_t>(begin) + pageSize - 1ULL) & ~(pageSize - 1ULL);
+    const uint64_t alignedEnd = reinterpret_cast<uint64_t>(end) & ~(pageSize - 1ULL);
+    if(alignedEnd <= alignedBegin) {
+        return;
+    }
+
+    // Use the preferred policy rather than binding,
+    // so allocation can still fall back to another node
+    // if a node runs out of memory.
+    // Pages that are already allocated on the wrong node are moved.
+    // This can fail for huge pages that cannot be moved,
+    // or for memory mapped to a file on disk. This only affects performance.
+    mbind(reinterpret_cast<const void*>(alignedBegin), alignedEnd - alignedBegin,
+        MPOL_PREFERRED, nodeMask({nodes[nodeIndex].id}), MPOL_MF_MOVE);
+#endif
+}
+
+
+
+#ifdef __linux__
+long Numa::mbind(
+    const void* begin,
+    uint64_t size,
+    int mode,
+    const vector<unsigned long>& mask,
+    unsigned int flags)
+{
+    return ::syscall(SYS_mbind, begin, size, mode,
+        mask.data(), mask.size() * 8 * sizeof(unsigned long), flags);
+}
+
+
+
+vector<unsigned long> Numa::nodeMask(const vector<uint64_t>& nodeIds)
+{
+    const uint64_t bitsPerWord = 8 * sizeof(unsigned long);
+    uint64_t maxNodeId = 0;
+    for(const uint64_t nodeId: nodeIds) {
+        maxNodeId = max(maxNodeId, nodeId);
+    }
+
+    // The kernel ignores the last bit of the mask, so leave room for it.
+    vector<unsigned long> mask((maxNodeId + 1) / bitsPerWord + 1, 0UL);
+    for(const uint64_t nodeId: nodeIds) {
+        mask[nodeId / bitsPerWord] |= (1UL << (nodeId % bitsPerWord));
+    }
+    return mask;
+}
+#endif
+
+
+
+Numa::AccessCounters::AccessCounters()
+{
+#ifdef __linux__
+    // Remote accesses are only possible with more than one node.
+    if(nodeCount() < 2) {
+        return;
+    }
+
+    // Count loads that went to memory (node-loads and node-load-misses in perf).
+    // A node miss is an access to memory on a remote node.
+    // The counters are inherited by threads created later,
+    // and their counts are added back when they exit.
+    const auto openCounter = [](uint64_t result)
+    {
+        perf_event_attr attributes;
+        std::fill(
+            reinterpret_cast<char*>(&attributes),
+            reinterpret_cast<char*>(&attributes) + sizeof(attributes), 0);
+        attributes.type = PERF_TYPE_HW_CACHE;
+        attributes.size = sizeof(attributes);
+        attributes.config =
+            PERF_COUNT_HW_CACHE_NODE |
+            (PERF_COUNT_HW_CACHE_OP_READ << 8) |
+            (result << 16);
+        attributes.inherit = 1;
+        attributes.exclude_kernel = 1;
+        attributes.exclude_hv = 1;
+        return int(::syscall(SYS_perf_event_open, &attributes, 0, -1, -1, 0));
+    };
+    const int accessFd = openCounter(PERF_COUNT_HW_CACHE_RESULT_ACCESS);
+    const int missFd = openCounter(PERF_COUNT_HW_CACHE_RESULT_MISS);
+    if(accessFd >= 0 and missFd >= 0) {
+        localFd = accessFd;
+        remoteFd = missFd;
+    } else {
+        if(accessFd >= 0) {
+            ::close(accessFd);
+        }
+        if(missFd >= 0) {
+            ::close(missFd);
+        }
+    }
+#endif
+}
+
+
+
+Numa::AccessCounters::~AccessCounters()
+{
+#ifdef __linux__
+    if(localFd >= 0) {
+        ::close(localFd);
+    }
+    if(remoteFd >= 0) {
+        ::close(remoteFd);
+    }
+#endif
+}
+
+
+
+void Numa::AccessCounters::read(uint64_t& local, uint64_t& remote) const
+{
+    local = 0;
+    remote = 0;
+#ifdef __linux__
+    uint64_t access = 0;
+    uint64_t miss = 0;
+    if(::read(localFd, &access, sizeof(access)) != sizeof(access) or
+       ::read(remoteFd, &miss, sizeof(miss)) != sizeof(miss)) {
+        return;
+    }
+    remote = miss;
+    local = (access > miss) ? (access - miss) : 0;
+#endif
+}
+
+
+
+void Numa::AccessCounters::writePhase(const string& phaseName)
+{
+    if(not isAvailable()) {
+        return;
+    }
+    uint64_t local, remote;
+    read(local, remote);
+    const uint64_t phaseLocal = local - localCount;
+    const uint64_t phaseRemote = remote - remoteCount;
+    localCount = local;
+    remoteCount = remote;
+
+    const uint64_t total = phaseLocal + phaseRemote;
+    cout << timestamp << "NUMA memory accesses for " << phaseName <<
+        ": local " << phaseLocal << ", remote " << phaseRemote;
+    if(total > 0) {
+        cout << " (" << std::fixed << std::setprecision(1) <<
+            100. * double(phaseRemote) / double(total) << "% remote)";
+        cout.unsetf(std::ios_base::floatfield);
+        cout << std::setprecision(6);
+    }
+    cout << endl;
+}
@@ -0,0 +1,163 @@
+#ifndef SHASTA_NUMA_HPP
+#define SHASTA_NUMA_HPP
+
+/*******************************************************************************
+
+Optional NUMA (non-uniform memory access) policy.
+
+On machines with more than one NUMA node (typically one node per socket),
+memory accesses from a processor to memory attached to another node
+are slower than local accesses, and cross-node traffic can limit
+scaling at high thread counts.
+By default, worker threads are not pinned and memory is allocated
+on the node of the thread that first touches it, which often
+is the main thread for the large memory mapped data structures.
+
+The following policies are supported (option --numaPolicy):
+
+- none (the default): nothing is done.
+
+- pin: worker threads started by MultithreadedObject are pinned
+  to NUMA nodes, with thread ids assigned to nodes in contiguous blocks.
+  Memory placement is left to the default (first touch) policy.
+
+- interleave: worker threads are pinned as above, and all memory
+  allocated by the process is interleaved page by page across all nodes.
+  This makes memory access uniform, at a cost in locality.
+
+- firstTouch: worker threads are pinned as above, and the large
+  data structures (reads, markers, marker graph), which are indexed by
+  read id or vertex/edge id and processed by threads in batches, are
+  partitioned by index in contiguous blocks, one per node.
+  Dynamic load balancing in MultithreadedObject divides its range
+  of indexes in the same way, and threads first take batches
+  from the block of their own node, then from the other blocks
+  when that is exhausted. So most accesses to the partitioned data
+  are local, like they would be if each block were first touched
+  by threads running on its node.
+  All other memory uses the default first touch policy.
+
+This does not use libnuma. Nodes are discovered from
+/sys/devices/system/node and the memory policy
+is set using the mbind and set_mempolicy system calls.
+On machines with a single NUMA node, and on platforms other than Linux,
+all of these policies do nothing.
+
+Class AccessCounters uses hardware performance counters
+to count local and remote memory accesses for the entire process,
+so the effect of a policy can be measured one phase at a time.
+The counters are only available if the kernel and processor
+support them and perf_event_paranoid allows it.
+
+*******************************************************************************/
+
+// Shasta.
+#include "MemoryMappedVectorOfVectors.hpp"
+
+// Standard library.
+#include "cstdint.hpp"
+#include "string.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    namespace Numa {
+
+        enum class Policy {none, pin, interleave, firstTouch};
+        Policy policyFromString(const string&);
+        const char* policyName(Policy);
+
+        // Set the policy. This must be called before any threads are
+        // started and before any large memory allocations.
+        void setPolicy(Policy);
+        Policy getPolicy();
+
+        // The number of NUMA nodes with processors
+        // available to this process.
+        uint64_t nodeCount();
+
+        // Return true if the policy is firstTouch and there is more than one node.
+        // In that case data and load balancing are partitioned across nodes.
+        bool isPartitioned();
+
+        // When partitioning n items, the first item of the block
+        // assigned to the node with index i in [0, nodeCount()).
+        // Used by distribute and by MultithreadedObject, so they agree.
+        inline uint64_t blockBegin(uint64_t n, uint64_t i)
+        {
+            return (n * i) / nodeCount();
+        }
+
+        // Pin the calling thread to a NUMA node.
+        // Called by MultithreadedObject for each worker thread.
+        // Thread ids in [0, threadCount) are assigned to nodes in contiguous blocks.
+        // This does nothing if the policy is none or there is only one node.
+        void pinThread(uint64_t threadId, uint64_t threadCount);
+
+        // The index in [0, nodeCount()) of the node the calling thread
+        // was pinned to by pinThread, or 0 if it was not pinned.
+        uint64_t threadNode();
+
+        // Move the pages of a memory range to the node with index
+        // nodeIndex in [0, nodeCount()). Partial pages at the two ends are left alone.
+        // This does nothing unless isPartitioned() returns true.
+        void distributeToNode(const void* begin, const void* end, uint64_t nodeIndex);
+
+        // Distribute the pages of a memory range according to the policy.
+        // With policy firstTouch, the range is divided into
+        // contiguous blocks, one per node, and pages are moved if necessary.
+        // A VectorOfVectors is divided at the vector boundaries given by blockBegin.
+        // This does nothing for other policies.
+        void distribute(const void* begin, const void* end);
+        template<class T> void distribute(const MemoryMapped::Vector<T>& v)
+        {
+            if(v.isOpen and not v.empty()) {
+                distribute(v.begin(), v.end());
+            }
+        }
+        template<class T, class Int> void distribute(const MemoryMapped::VectorOfVectors<T, Int>& v)
+        {
+            if(v.isOpen() and isPartitioned()) {
+                const uint64_t n = v.size();
+                for(uint64_t i=0; i<nodeCount(); i++) {
+                    distributeToNode(
+                        v.begin(Int(blockBegin(n, i))),
+                        v.begin(Int(blockBegin(n, i + 1))), i);
+                }
+            }
+        }
+
+        class AccessCounters;
+    }
+}
+
+
+
+// Counts of local and remote memory accesses (loads that
+// missed the cache) for this process and all threads started
+// after the counters were created.
+// The counters are only opened on machines with more than one NUMA node.
+class shasta::Numa::AccessCounters {
+public:
+
+    AccessCounters();
+    ~AccessCounters();
+
+    // Return true if the counters could be opened.
+    bool isAvailable() const
+    {
+        return localFd >= 0 and remoteFd >= 0;
+    }
+
+    // Write to cout the local and remote accesses since the
+    // previous call, or since construction.
+    void writePhase(const string& phaseName);
+
+private:
+    int localFd = -1;
+    int remoteFd = -1;
+    uint64_t localCount = 0;
+    uint64_t remoteCount = 0;
+    void read(uint64_t& local, uint64_t& remote) const;
+};
+
+#endif
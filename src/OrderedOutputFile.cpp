@@ -0,0 +1,321 @@
+// Shasta.
+#include "OrderedOutputFile.hpp"
+#include "SHASTA_ASSERT.hpp"
+using namespace shasta;
+
+// Zlib.
+#include <zlib.h>
+
+// Linux.
+#include <fcntl.h>
+#include <unistd.h>
+
+// Standard library.
+#include "algorithm.hpp"
+#include "fstream.hpp"
+#include "stdexcept.hpp"
+
+
+
+// The empty block that must terminate a bgzip file.
+const string OrderedOutputFile::bgzipEofBlock(
+    "\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00\x42\x43\x02\x00"
+    "\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00", 28);
+
+
+
+OrderedOutputFile::OrderedOutputFile(
+    const string& fileName,
+    bool writeFastaIndex,
+    uint64_t maxPendingBytes) :
+    fileName(fileName),
+    writeFastaIndex(writeFastaIndex),
+    maxPendingBytes(maxPendingBytes)
+{
+    compress =
+        (fileName.size() > 3) and
+        (fileName.substr(fileName.size() - 3) == ".gz");
+
+    fileDescriptor = ::open(fileName.c_str(), O_CREAT | O_TRUNC | O_WRONLY, S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH);
+    if(fileDescriptor == -1) {
+        throw runtime_error("Error opening " + fileName);
+    }
+}
+
+
+
+OrderedOutputFile::~OrderedOutputFile()
+{
+    if(fileDescriptor != -1) {
+        ::close(fileDescriptor);
+        fileDescriptor = -1;
+    }
+}
+
+
+
+void OrderedOutputFile::write(
+    uint64_t begin,
+    uint64_t end,
+    string& buffer,
+    const vector<FastaIndexEntry>& fastaIndexEntries)
+{
+    SHASTA_ASSERT(end > begin);
+
+    // Prepare the data to be written, without holding the mutex.
+    PendingBuffer pendingBuffer;
+    pendingBuffer.end = end;
+    if(compress) {
+        bgzip(buffer, pendingBuffer.data, pendingBuffer.blockSizes);
+        buffer.clear();
+    } else {
+        pendingBuffer.data.swap(buffer);
+    }
+    if(writeFastaIndex) {
+        pendingBuffer.fastaIndexEntries = fastaIndexEntries;
+    }
+
+    std::unique_lock<std::mutex> lock(mutex);
+
+    // If too much data is waiting to be written, wait,
+    // unless this is the next buffer to be written.
+    if(maxPendingBytes > 0) {
+        pendingCondition.wait(lock, [&]()
+            {
+                return isCancelled or (begin == nextItem) or (pendingBytes < maxPendingBytes);
+            });
+    }
+    if(isCancelled) {
+        throw runtime_error("Writing to " + fileName + " was cancelled.");
+    }
+
+    pendingBytes += pendingBuffer.data.size();
+    pendingBuffers.insert(make_pair(begin, std::move(pendingBuffer)));
+
+    // If another thread is writing, it will also take care of this buffer
+    // when its turn comes.
+    if(isWriting) {
+        return;
+    }
+
+    // Write all the buffers that are ready.
+    // While isWriting is set, only this thread accesses the
+    // offsets and indexes, so the mutex can be released during I/O.
+    // If writing fails, the guard resets isWriting and cancels the file,
+    // so other threads don't keep waiting for the data that were lost.
+    class WritingGuard {
+    public:
+        OrderedOutputFile& file;
+        std::unique_lock<std::mutex>& lock;
+        bool succeeded = false;
+        WritingGuard(OrderedOutputFile& file, std::unique_lock<std::mutex>& lock) :
+            file(file), lock(lock)
+        {
+            file.isWriting = true;
+        }
+        ~WritingGuard()
+        {
+            if(not lock.owns_lock()) {
+                lock.lock();
+            }
+            file.isWriting = false;
+            if(not succeeded) {
+                file.isCancelled = true;
+                file.pendingCondition.notify_all();
+            }
+        }
+    };
+    WritingGuard writingGuard(*this, lock);
+    while(true) {
+        const auto it = pendingBuffers.find(nextItem);
+        if(it == pendingBuffers.end()) {
+            break;
+        }
+        PendingBuffer readyBuffer = std::move(it->second);
+        pendingBuffers.erase(it);
+        pendingBytes -= readyBuffer.data.size();
+        nextItem = readyBuffer.end;
+        lock.unlock();
+        if(maxPendingBytes > 0) {
+            pendingCondition.notify_all();
+        }
+
+        for(FastaIndexEntry& fastaIndexEntry: readyBuffer.fastaIndexEntries) {
+            fastaIndexEntry.offset += uncompressedOffset;
+            fastaIndex.push_back(fastaIndexEntry);
+        }
+        writeBytes(readyBuffer.data);
+        if(compress) {
+            for(const auto& blockSize: readyBuffer.blockSizes) {
+                if(compressedOffset != 0) {
+                    gziEntries.push_back(make_pair(compressedOffset, uncompressedOffset));
+                }
+                compressedOffset += blockSize.first;
+                uncompressedOffset += blockSize.second;
+            }
+        } else {
+            compressedOffset += readyBuffer.data.size();
+            uncompressedOffset += readyBuffer.data.size();
+        }
+
+        lock.lock();
+    }
+    writingGuard.succeeded = true;
+}
+
+
+
+void OrderedOutputFile::cancel()
+{
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        isCancelled = true;
+    }
+    pendingCondition.notify_all();
+}
+
+
+
+void OrderedOutputFile::writeBytes(const string& data)
+{
+    const char* p = data.data();
+    uint64_t bytesToWrite = data.size();
+    while(bytesToWrite > 0) {
+        const ssize_t bytesWritten = ::write(fileDescriptor, p, bytesToWrite);
+        if(bytesWritten <= 0) {
+            throw runtime_error("Error writing " + fileName);
+        }
+        p += bytesWritten;
+        bytesToWrite -= uint64_t(bytesWritten);
+    }
+}
+
+
+
+void OrderedOutputFile::close()
+{
+    SHASTA_ASSERT(fileDescriptor != -1);
+    if(isCancelled) {
+        throw runtime_error("Writing to " + fileName + " was cancelled.");
+    }
+    SHASTA_ASSERT(not isWriting);
+    if(not pendingBuffers.empty()) {
+        throw runtime_error("Missing data when closing " + fileName);
+    }
+
+    if(compress) {
+        writeBytes(bgzipEofBlock);
+    }
+    ::close(fileDescriptor);
+    fileDescriptor = -1;
+
+    writeIndexes();
+}
+
+
+
+void OrderedOutputFile::writeIndexes()
+{
+    // The .gzi index is a binary file containing the number of entries
+    // followed by the (compressed offset, uncompressed offset)
+    // of each block except the first.
+    if(compress) {
+        ofstream gzi(fileName + ".gzi", std::ios::binary);
+        const uint64_t n = gziEntries.size();
+        gzi.write(reinterpret_cast<const char*>(&n), sizeof(n));
+        for(const auto& p: gziEntries) {
+            gzi.write(reinterpret_cast<const char*>(&p.first), sizeof(p.first));
+            gzi.write(reinterpret_cast<const char*>(&p.second), sizeof(p.second));
+        }
+        if(not gzi) {
+            throw runtime_error("Error writing " + fileName + ".gzi");
+        }
+    }
+
+    // The .fai index contains one line per sequence.
+    // Since each sequence is written on a single line,
+    // the line length is the sequence length.
+    if(writeFastaIndex) {
+        ofstream fai(fileName + ".fai");
+        for(const FastaIndexEntry& entry: fastaIndex) {
+            fai <<
+                entry.name << "\t" <<
+                entry.length << "\t" <<
+                entry.offset << "\t" <<
+                entry.length << "\t" <<
+                entry.length + 1 << "\n";
+        }
+        if(not fai) {
+            throw runtime_error("Error writing " + fileName + ".fai");
+        }
+    }
+}
+
+
+
+// Compress a buffer in bgzip format.
+void OrderedOutputFile::bgzip(
+    const string& buffer,
+    string& compressedBuffer,
+    vector< pair<uint64_t, uint64_t> >& blockSizes)
+{
+    // Maximum uncompressed size of a block. This guarantees that
+    // the compressed block, including header and footer,
+    // does not exceed 64 KB.
+    const uint64_t maxBlockSize = 0xff00;
+    const uint64_t headerSize = 18;
+    const uint64_t footerSize = 8;
+
+    z_stream z;
+    z.zalloc = Z_NULL;
+    z.zfree = Z_NULL;
+    z.opaque = Z_NULL;
+    if(deflateInit2(&z, Z_DEFAULT_COMPRESSION, Z_DEFLATED, -15, 8, Z_DEFAULT_STRATEGY) != Z_OK) {
+        throw runtime_error("Error initializing zlib.");
+    }
+
+    for(uint64_t begin=0; begin<buffer.size(); begin+=maxBlockSize) {
+        const uint64_t end = min(uint64_t(buffer.size()), begin + maxBlockSize);
+        const uint64_t n = end - begin;
+        Bytef* uncompressed = reinterpret_cast<Bytef*>(const_cast<char*>(buffer.data() + begin));
+
+        // Compress directly into the output buffer, after space for the header.
+        const uint64_t blockBegin = compressedBuffer.size();
+        const uint64_t bound = deflateBound(&z, uLong(n));
+        compressedBuffer.resize(blockBegin + headerSize + bound + footerSize);
+        deflateReset(&z);
+        z.next_in = uncompressed;
+        z.avail_in = uInt(n);
+        z.next_out = reinterpret_cast<Bytef*>(&compressedBuffer[blockBegin + headerSize]);
+        z.avail_out = uInt(bound);
+        if(deflate(&z, Z_FINISH) != Z_STREAM_END) {
+            deflateEnd(&z);
+            throw runtime_error("Error during bgzip compression.");
+        }
+        const uint64_t compressedSize = bound - z.avail_out;
+        const uint64_t blockSize = headerSize + compressedSize + footerSize;
+        SHASTA_ASSERT(blockSize <= 65536);
+        compressedBuffer.resize(blockBegin + blockSize);
+
+        // Header: gzip header with the BC extra subfield containing the block size - 1.
+        char* header = &compressedBuffer[blockBegin];
+        const char fixedHeader[16] = {
+            '\x1f', '\x8b', '\x08', '\x04', 0, 0, 0, 0, 0, '\xff', 6, 0, 'B', 'C', 2, 0};
+        std::copy(fixedHeader, fixedHeader + 16, header);
+        header[16] = char((blockSize - 1) & 0xff);
+        header[17] = char((blockSize - 1) >> 8);
+
+        // Footer: crc32 and uncompressed size, little endian.
+        const uint32_t crc = uint32_t(crc32(crc32(0L, Z_NULL, 0), uncompressed, uInt(n)));
+        const uint32_t isize = uint32_t(n);
+        char* footer = &compressedBuffer[blockBegin + headerSize + compressedSize];
+        for(int i=0; i<4; i++) {
+            footer[i] = char((crc >> (8*i)) & 0xff);
+            footer[4+i] = char((isize >> (8*i)) & 0xff);
+        }
+
+        blockSizes.push_back(make_pair(blockSize, n));
+    }
+
+    deflateEnd(&z);
+}
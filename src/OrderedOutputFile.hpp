@@ -0,0 +1,160 @@
+#ifndef SHASTA_ORDERED_OUTPUT_FILE_HPP
+#define SHASTA_ORDERED_OUTPUT_FILE_HPP
+
+/*******************************************************************************
+
+Class OrderedOutputFile is used to write a text file
+(GFA, FASTA) whose content is formatted in parallel by multiple threads.
+
+The content of the file is divided into consecutive ranges of "items"
+(for example, assembly graph edges) numbered 0, 1, 2, ...
+Each thread formats the text for a range [begin, end) of items
+into its own buffer and passes it to write(begin, end, buffer).
+Buffers can be passed in any order, but they are written to the file
+in order of item number, using large sequential writes.
+Buffers that arrive out of order are kept in memory until all
+preceding ranges have been written. If maxPendingBytes is not zero,
+this memory is bounded: a thread passing a buffer that cannot be
+written yet waits while the buffers already waiting use more than
+maxPendingBytes. The thread passing the next buffer to be
+written never waits, so this cannot deadlock as long as
+every range is eventually passed. If a thread fails,
+it should call cancel to release the threads that are waiting.
+The thread that passes the buffer that fills a gap
+writes all buffers that became ready, while the other threads
+continue formatting. This way, formatting and I/O overlap.
+
+If the file name ends in ".gz", the file is written in bgzip
+format (a series of independent gzip blocks of at most 64 KB each, see
+https://samtools.github.io/hts-specs/SAMv1.pdf, section 4.1),
+which can be read by any gzip reader and by htslib.
+Compression is done by the thread that passes the buffer,
+before acquiring the lock, so it is also done in parallel.
+A .gzi index of the blocks is also written.
+
+For FASTA output, the caller can also pass, for each buffer,
+the name, length, and position of each sequence in the buffer.
+These are used to write a .fai index of the (uncompressed) file.
+Each sequence must be written on a single line.
+
+*******************************************************************************/
+
+// Standard library.
+#include <condition_variable>
+#include "cstdint.hpp"
+#include <map>
+#include <mutex>
+#include "string.hpp"
+#include "utility.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    class OrderedOutputFile;
+}
+
+
+
+class shasta::OrderedOutputFile {
+public:
+
+    // Information about a sequence contained in a buffer.
+    // Used to create the .fai index.
+    class FastaIndexEntry {
+    public:
+        string name;
+        uint64_t length;
+
+        // The position of the first base of the sequence,
+        // relative to the beginning of the buffer.
+        uint64_t offset;
+    };
+
+    // If writeFastaIndex is true, a .fai index is written when close is called.
+    OrderedOutputFile(
+        const string& fileName,
+        bool writeFastaIndex = false,
+        uint64_t maxPendingBytes = 0);
+    ~OrderedOutputFile();
+
+    // Pass the text for items [begin, end).
+    // The ranges passed by all calls must be non-overlapping
+    // and cover all items from 0 to the last one without gaps.
+    // The buffer is cleared, but its capacity can be reused by the caller.
+    // If writing to the file fails, the exception is thrown
+    // and the file is cancelled (see cancel).
+    // This is thread safe.
+    void write(
+        uint64_t begin,
+        uint64_t end,
+        string& buffer,
+        const vector<FastaIndexEntry>& fastaIndexEntries = vector<FastaIndexEntry>());
+
+    // Write any remaining data and indexes, then close the file.
+    // This throws if the file was cancelled.
+    void close();
+
+    // Used when a thread fails and will not pass its buffers.
+    // Threads waiting in write, or calling it later, throw.
+    void cancel();
+
+    // Compress a buffer in bgzip format, appending
+    // the compressed blocks to the compressed buffer.
+    // Also store the compressed and uncompressed size of each block.
+    static void bgzip(
+        const string& buffer,
+        string& compressedBuffer,
+        vector< pair<uint64_t, uint64_t> >& blockSizes);
+
+    // The empty block that must terminate a bgzip file.
+    static const string bgzipEofBlock;
+
+private:
+    string fileName;
+    int fileDescriptor = -1;
+    bool compress;
+    bool writeFastaIndex;
+    uint64_t maxPendingBytes;
+
+    // A buffer ready to be written, but waiting for preceding buffers.
+    class PendingBuffer {
+    public:
+        uint64_t end;
+        string data;
+        vector< pair<uint64_t, uint64_t> > blockSizes;
+        vector<FastaIndexEntry> fastaIndexEntries;
+    };
+
+    // Everything below is protected by the mutex.
+    std::mutex mutex;
+    std::map<uint64_t, PendingBuffer> pendingBuffers;
+    uint64_t pendingBytes = 0;
+
+    // Used to wait when too much data is pending.
+    std::condition_variable pendingCondition;
+
+    // The beginning of the next range to be written.
+    uint64_t nextItem = 0;
+
+    // Set when a thread is busy writing.
+    bool isWriting = false;
+
+    // Set by cancel.
+    bool isCancelled = false;
+
+    // The number of bytes written so far, and the corresponding
+    // number of bytes of uncompressed data.
+    uint64_t compressedOffset = 0;
+    uint64_t uncompressedOffset = 0;
+
+    // For the .gzi index: the compressed and uncompressed offset
+    // of the beginning of each bgzip block except the first.
+    vector< pair<uint64_t, uint64_t> > gziEntries;
+
+    // For the .fai index.
+    vector<FastaIndexEntry> fastaIndex;
+
+    void writeBytes(const string&);
+    void writeIndexes();
+};
+
+#endif
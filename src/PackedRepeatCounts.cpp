@@ -0,0 +1,168 @@
+#include "PackedRepeatCounts.hpp"
+using namespace shasta;
+
+#include "iostream.hpp"
+#include <random>
+
+
+
+void PackedRepeatCounts::createNew(
+    const string& name,
+    size_t pageSize)
+{
+    if(name.empty()) {
+        repeatCountCount.createNew("", pageSize);
+        totalRepeatCount.createNew("", pageSize);
+        nibbles.createNew("", pageSize);
+        escapes.createNew("", pageSize);
+    } else {
+        repeatCountCount.createNew(name + "-Count", pageSize);
+        totalRepeatCount.createNew(name + "-Total", pageSize);
+        nibbles.createNew(name + "-Nibbles", pageSize);
+        escapes.createNew(name + "-Escapes", pageSize);
+    }
+}
+
+
+
+void PackedRepeatCounts::accessExistingReadOnly(const string& name)
+{
+    repeatCountCount.accessExistingReadOnly(name + "-Count");
+    totalRepeatCount.accessExistingReadOnly(name + "-Total");
+    nibbles.accessExistingReadOnly(name + "-Nibbles");
+    escapes.accessExistingReadOnly(name + "-Escapes");
+    SHASTA_ASSERT(totalRepeatCount.size() == repeatCountCount.size());
+    SHASTA_ASSERT(nibbles.size() == repeatCountCount.size());
+    SHASTA_ASSERT(escapes.size() == repeatCountCount.size());
+}
+
+
+
+void PackedRepeatCounts::remove()
+{
+    repeatCountCount.remove();
+    totalRepeatCount.remove();
+    nibbles.remove();
+    escapes.remove();
+}
+void PackedRepeatCounts::close()
+{
+    repeatCountCount.close();
+    totalRepeatCount.close();
+    nibbles.close();
+    escapes.close();
+}
+void PackedRepeatCounts::unreserve()
+{
+    repeatCountCount.unreserve();
+    totalRepeatCount.unreserve();
+    nibbles.unreserve();
+    escapes.unreserve();
+}
+
+
+
+uint64_t PackedRepeatCounts::byteCount() const
+{
+    return
+        repeatCountCount.size() * sizeof(uint64_t) +
+        totalRepeatCount.size() * sizeof(uint64_t) +
+        nibbles.totalSize() * sizeof(uint8_t) +
+        (nibbles.size() + 1) * sizeof(uint64_t) +
+        escapes.totalSize() * sizeof(Escape) +
+        (escapes.size() + 1) * sizeof(uint64_t);
+}
+
+
+
+// Return the first escape of sequence i at or after position j.
+const PackedRepeatCounts::Escape* PackedRepeatCounts::findEscape(uint64_t i, uint64_t j) const
+{
+    return std::lower_bound(escapes.begin(i), escapes.end(i), j,
+        [](const Escape& escape, uint64_t position)
+        {
+            return escape.position < position;
+        });
+}
+
+
+
+// Look up an escaped repeat count.
+uint8_t PackedRepeatCounts::getEscaped(uint64_t i, uint64_t j) const
+{
+    const Escape* it = findEscape(i, j);
+    SHASTA_ASSERT(it != escapes.end(i));
+    SHASTA_ASSERT(it->position == j);
+    return it->repeatCount;
+}
+
+
+
+// Decode repeat counts [begin, end) of sequence i.
+void PackedRepeatCounts::get(
+    uint64_t i,
+    uint64_t begin,
+    uint64_t end,
+    vector<uint8_t>& v) const
+{
+    SHASTA_ASSERT(begin <= end);
+    SHASTA_ASSERT(end <= size(i));
+    v.resize(end - begin);
+
+    const uint8_t* p = nibbles.begin(i);
+    for(uint64_t j=begin; j!=end; j++) {
+        v[j - begin] = uint8_t((p[j >> 1ULL] >> ((j & 1ULL) << 2ULL)) & 15);
+    }
+
+    // Fill in the escaped values, walking the escapes in the range.
+    const Escape* escapesEnd = escapes.end(i);
+    for(const Escape* it = findEscape(i, begin); it!=escapesEnd and it->position<end; ++it) {
+        v[it->position - begin] = it->repeatCount;
+    }
+}
+
+
+
+void shasta::testPackedRepeatCounts()
+{
+    std::mt19937 randomSource(231);
+    vector< vector<uint8_t> > sequences(100);
+    for(vector<uint8_t>& sequence: sequences) {
+        sequence.resize(randomSource() % 10000);
+        for(uint8_t& r: sequence) {
+            // Mostly small values, with occasional large ones.
+            r = uint8_t((randomSource() % 100 == 0) ? (randomSource() % 256) : (1 + randomSource() % 4));
+        }
+    }
+
+    PackedRepeatCounts packedRepeatCounts;
+    packedRepeatCounts.createNew("", 4096);
+    for(const vector<uint8_t>& sequence: sequences) {
+        packedRepeatCounts.append(sequence);
+    }
+
+    SHASTA_ASSERT(packedRepeatCounts.size() == sequences.size());
+    vector<uint8_t> v;
+    uint64_t unpackedByteCount = 0;
+    for(uint64_t i=0; i<sequences.size(); i++) {
+        const vector<uint8_t>& sequence = sequences[i];
+        unpackedByteCount += sequence.size();
+        SHASTA_ASSERT(packedRepeatCounts.size(i) == sequence.size());
+        uint64_t sum = 0;
+        for(uint64_t j=0; j<sequence.size(); j++) {
+            SHASTA_ASSERT(packedRepeatCounts.get(i, j) == sequence[j]);
+            sum += sequence[j];
+        }
+        SHASTA_ASSERT(packedRepeatCounts.totalSize(i) == sum);
+        packedRepeatCounts.get(i, v);
+        SHASTA_ASSERT(v == sequence);
+        if(sequence.size() > 10) {
+            packedRepeatCounts.get(i, 3, sequence.size() - 5, v);
+            SHASTA_ASSERT(std::equal(v.begin(), v.end(), sequence.begin() + 3));
+        }
+    }
+    cout << "PackedRepeatCounts test passed. Packed size " << packedRepeatCounts.byteCount() <<
+        " bytes, unpacked size " << unpackedByteCount << " bytes." << endl;
+
+    packedRepeatCounts.remove();
+}
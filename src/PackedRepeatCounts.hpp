@@ -0,0 +1,161 @@
+#ifndef SHASTA_PACKED_REPEAT_COUNTS_HPP
+#define SHASTA_PACKED_REPEAT_COUNTS_HPP
+
+// shasta.
+#include "MemoryMappedVectorOfVectors.hpp"
+
+// Standard library.
+#include "algorithm.hpp"
+#include <limits>
+#include "string.hpp"
+#include "utility.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    class PackedRepeatCounts;
+    void testPackedRepeatCounts();
+}
+
+
+
+// Many sequences of repeat counts stored in memory mapped files
+// using 4 bits per repeat count.
+// This is used to store the repeat counts of assembled segments,
+// for which almost all repeat counts are small.
+// Repeat counts 0-14 are stored directly in a nibble.
+// The nibble value 15 is an escape. For those positions the
+// repeat count (up to 255) is stored in a separate table
+// for each sequence, sorted by position.
+// The even positions of each sequence are stored in the
+// low nibble of each byte, and the odd positions in the high nibble.
+// The total repeat count (raw sequence length) of each
+// sequence is also stored, so it is available without decoding.
+class shasta::PackedRepeatCounts {
+public:
+
+    void createNew(const string& name, size_t pageSize);
+    void accessExistingReadOnly(const string& name);
+    void remove();
+    void close();
+    void unreserve();
+
+    bool isOpen() const
+    {
+        return
+            repeatCountCount.isOpen and
+            totalRepeatCount.isOpen and
+            nibbles.isOpen() and
+            escapes.isOpen();
+    }
+
+    // Return the number of sequences stored.
+    uint64_t size() const
+    {
+        return repeatCountCount.size();
+    }
+
+    // Return the number of repeat counts stored for sequence i.
+    uint64_t size(uint64_t i) const
+    {
+        return repeatCountCount[i];
+    }
+
+    // Return the sum of the repeat counts of sequence i.
+    uint64_t totalSize(uint64_t i) const
+    {
+        return totalRepeatCount[i];
+    }
+
+    // Return repeat count j of sequence i.
+    uint8_t get(uint64_t i, uint64_t j) const
+    {
+        const uint8_t nibble = uint8_t((nibbles.begin(i)[j >> 1ULL] >> ((j & 1ULL) << 2ULL)) & 15);
+        if(nibble != escape) {
+            return nibble;
+        } else {
+            return getEscaped(i, j);
+        }
+    }
+
+    // Decode repeat counts [begin, end) of sequence i.
+    void get(uint64_t i, uint64_t begin, uint64_t end, vector<uint8_t>&) const;
+
+    // Decode all the repeat counts of sequence i.
+    void get(uint64_t i, vector<uint8_t>& v) const
+    {
+        get(i, 0, size(i), v);
+    }
+
+    // Append a new sequence at the end.
+    template<class Iterator> void append(Iterator begin, Iterator end);
+    void append(const vector<uint8_t>& v)
+    {
+        append(v.begin(), v.end());
+    }
+
+    // Return the total number of bytes used by the stored data.
+    uint64_t byteCount() const;
+
+    static const uint8_t escape = 15;
+
+private:
+
+    // The number of repeat counts in each sequence.
+    MemoryMapped::Vector<uint64_t> repeatCountCount;
+
+    // The sum of the repeat counts in each sequence.
+    MemoryMapped::Vector<uint64_t> totalRepeatCount;
+
+    // The nibbles for each sequence, two per byte.
+    MemoryMapped::VectorOfVectors<uint8_t, uint64_t> nibbles;
+
+    // For each sequence, the positions with an escaped repeat count,
+    // with their repeat count, sorted by position.
+    // The position is packed, so each escape uses 5 bytes instead of 8.
+    class Escape {
+    public:
+        uint32_t position __attribute__ ((packed));
+        uint8_t repeatCount;
+        Escape(uint32_t position, uint8_t repeatCount) :
+            position(position), repeatCount(repeatCount) {}
+        Escape() {}
+    };
+    static_assert(sizeof(Escape) == 5, "Unexpected size of PackedRepeatCounts::Escape.");
+    MemoryMapped::VectorOfVectors<Escape, uint64_t> escapes;
+
+    // Return the first escape of sequence i at or after position j.
+    const Escape* findEscape(uint64_t i, uint64_t j) const;
+
+    uint8_t getEscaped(uint64_t i, uint64_t j) const;
+};
+
+
+
+template<class Iterator> inline void shasta::PackedRepeatCounts::append(
+    Iterator begin,
+    Iterator end)
+{
+    const uint64_t n = uint64_t(end - begin);
+    SHASTA_ASSERT(n <= std::numeric_limits<uint32_t>::max());
+    repeatCountCount.push_back(n);
+
+    uint64_t sum = 0;
+    nibbles.appendVector((n + 1ULL) >> 1ULL);
+    uint8_t* p = nibbles.begin(nibbles.size() - 1);
+    std::fill(p, p + ((n + 1ULL) >> 1ULL), uint8_t(0));
+    escapes.appendVector();
+    uint64_t j = 0;
+    for(Iterator it=begin; it!=end; ++it, ++j) {
+        const uint8_t r = uint8_t(*it);
+        sum += r;
+        uint8_t nibble = r;
+        if(r >= escape) {
+            nibble = escape;
+            escapes.append(Escape(uint32_t(j), r));
+        }
+        p[j >> 1ULL] = uint8_t(p[j >> 1ULL] | (nibble << ((j & 1ULL) << 2ULL)));
+    }
+    totalRepeatCount.push_back(sum);
+}
+
+#endif
@@ -0,0 +1,322 @@
+// Shasta.
+#include "PerformanceProfile.hpp"
+#include "SHASTA_ASSERT.hpp"
+using namespace shasta;
+
+// Linux.
+#include <sys/resource.h>
+#include <sys/time.h>
+
+// Standard library.
+#include "algorithm.hpp"
+#include "fstream.hpp"
+#include <iomanip>
+#include <sstream>
+#include <thread>
+
+
+
+// Return the value of a field of a /proc file, or 0 if not available.
+// The multiplier is used to convert kB to bytes.
+uint64_t PerformanceProfile::readProcField(
+    const char* fileName,
+    const string& field,
+    uint64_t multiplier)
+{
+#ifdef __linux__
+    ifstream file(fileName);
+    string line;
+    while(std::getline(file, line)) {
+        if(line.compare(0, field.size(), field) == 0) {
+            std::istringstream s(line.substr(field.size()));
+            uint64_t value = 0;
+            s >> value;
+            return value * multiplier;
+        }
+    }
+#endif
+    return 0;
+}
+
+
+
+// Reset the peak resident memory of the process (VmHWM)
+// to the current resident memory. Return false if not possible.
+bool PerformanceProfile::resetPeakResidentBytes()
+{
+#ifdef __linux__
+    ofstream file("/proc/self/clear_refs");
+    file << "5" << std::flush;
+    return bool(file);
+#else
+    return false;
+#endif
+}
+
+
+
+// Return the peak resident memory of the process,
+// since the last reset, if any.
+uint64_t PerformanceProfile::getPeakResidentBytes()
+{
+#ifdef __linux__
+    return readProcField("/proc/self/status", "VmHWM:", 1024);
+#else
+    // On macOS ru_maxrss is in bytes.
+    ::rusage usage;
+    ::getrusage(RUSAGE_SELF, &usage);
+    return uint64_t(usage.ru_maxrss);
+#endif
+}
+
+
+
+// Return the memory in hugetlbfs pages currently mapped by the process.
+// These are not included in the resident memory.
+uint64_t PerformanceProfile::getHugePageBytes()
+{
+    return readProcField("/proc/self/status", "HugetlbPages:", 1024);
+}
+
+
+
+PerformanceProfile& PerformanceProfile::instance()
+{
+    static PerformanceProfile* profile = new PerformanceProfile();
+    return *profile;
+}
+
+
+
+PerformanceProfile::PerformanceProfile()
+{
+    canResetPeakResidentBytes = resetPeakResidentBytes();
+}
+
+
+
+PerformanceProfile::Sample PerformanceProfile::Sample::get()
+{
+    Sample sample;
+    sample.time = std::chrono::steady_clock::now();
+
+    ::rusage usage;
+    ::getrusage(RUSAGE_SELF, &usage);
+    sample.userTime = double(usage.ru_utime.tv_sec) + 1.e-6 * double(usage.ru_utime.tv_usec);
+    sample.systemTime = double(usage.ru_stime.tv_sec) + 1.e-6 * double(usage.ru_stime.tv_usec);
+    sample.minorFaults = uint64_t(usage.ru_minflt);
+    sample.majorFaults = uint64_t(usage.ru_majflt);
+
+    sample.readBytes = readProcField("/proc/self/io", "read_bytes:", 1);
+    sample.writeBytes = readProcField("/proc/self/io", "write_bytes:", 1);
+    sample.mappedBytes = readProcField("/proc/self/status", "VmSize:", 1024);
+
+    return sample;
+}
+
+
+
+void PerformanceProfile::begin(const string& name)
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    beginNoLock(name);
+}
+
+
+
+void PerformanceProfile::end()
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    endNoLock();
+}
+
+
+
+void PerformanceProfile::next(const string& name)
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    endNoLock();
+    beginNoLock(name);
+}
+
+
+
+void PerformanceProfile::beginNoLock(const string& name)
+{
+    updatePeakResidentBytes();
+
+    Step step;
+    step.name = name;
+    step.depth = openSteps.size();
+    step.begin = Sample::get();
+    openSteps.push_back(steps.size());
+    steps.push_back(step);
+}
+
+
+
+void PerformanceProfile::endNoLock()
+{
+    SHASTA_ASSERT(not openSteps.empty());
+    updatePeakResidentBytes();
+
+    Step& step = steps[openSteps.back()];
+    step.end = Sample::get();
+    step.isComplete = true;
+    openSteps.pop_back();
+}
+
+
+
+void PerformanceProfile::updatePeakResidentBytes()
+{
+    const uint64_t peakResidentBytes = getPeakResidentBytes();
+    const uint64_t hugePageBytes = getHugePageBytes();
+    for(const uint64_t stepIndex: openSteps) {
+        Step& step = steps[stepIndex];
+        step.peakResidentBytes = max(step.peakResidentBytes, peakResidentBytes);
+        step.peakHugePageBytes = max(step.peakHugePageBytes, hugePageBytes);
+    }
+    if(canResetPeakResidentBytes) {
+        resetPeakResidentBytes();
+    }
+}
+
+
+
+void PerformanceProfile::writeHtml(ostream& html) const
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    if(steps.empty()) {
+        return;
+    }
+    const double processorCount = double(std::thread::hardware_concurrency());
+
+    html <<
+        "<h4>Performance of each assembly step</h4>"
+        "<table>"
+        "<tr><th>Step"
+        "<th>Elapsed time (seconds)"
+        "<th>User CPU time (seconds)"
+        "<th>System CPU time (seconds)"
+        "<th>Average CPU utilization"
+        "<th>Peak resident memory (bytes)"
+        "<th>Peak huge page memory (bytes)"
+        "<th>Peak memory including huge pages (bytes)"
+        "<th>Mapped bytes at end"
+        "<th>Minor page faults"
+        "<th>Major page faults"
+        "<th>Bytes read"
+        "<th>Bytes written";
+
+    for(const Step& step: steps) {
+        if(not step.isComplete) {
+            continue;
+        }
+        const double elapsedTime = 1.e-9 * double(std::chrono::duration_cast<std::chrono::nanoseconds>(
+            step.end.time - step.begin.time).count());
+        const double userTime = step.end.userTime - step.begin.userTime;
+        const double systemTime = step.end.systemTime - step.begin.systemTime;
+        html << "<tr><td>";
+        for(uint64_t i=0; i<step.depth; i++) {
+            html << "&nbsp;&nbsp;&nbsp;&nbsp;";
+        }
+        html << step.name <<
+            "<td class=right>" << elapsedTime <<
+            "<td class=right>" << userTime <<
+            "<td class=right>" << systemTime <<
+            "<td class=right>" <<
+            (elapsedTime > 0. ? (userTime + systemTime) / (processorCount * elapsedTime) : 0.) <<
+            "<td class=right>" << step.peakResidentBytes <<
+            "<td class=right>" << step.peakHugePageBytes <<
+            "<td class=right>" << step.peakResidentBytes + step.peakHugePageBytes <<
+            "<td class=right>" << step.end.mappedBytes <<
+            "<td class=right>" << step.end.minorFaults - step.begin.minorFaults <<
+            "<td class=right>" << step.end.majorFaults - step.begin.majorFaults <<
+            "<td class=right>" << step.end.readBytes - step.begin.readBytes <<
+            "<td class=right>" << step.end.writeBytes - step.begin.writeBytes;
+    }
+
+    html <<
+        "</table>"
+        "<ul>"
+        "<li>Nested steps are indented. The time and resources of a step include those of its nested steps."
+        "<li>CPU times, page faults, and I/O bytes are for the entire process (all threads)."
+        "<li>Average CPU utilization is relative to all virtual processors."
+        "<li>Peak resident memory does not include huge pages (hugetlbfs), "
+        "used with --memoryBacking 2M. Huge page memory is sampled "
+        "at step boundaries."
+        "</ul>";
+}
+
+
+
+void PerformanceProfile::writeJson(ostream& json, const string& indent) const
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    json << "[\n";
+    uint64_t stepIndex = 0;
+    while(stepIndex < steps.size()) {
+        if(stepIndex != 0) {
+            json << ",\n";
+        }
+        stepIndex = writeJson(json, indent + "  ", stepIndex);
+    }
+    json << "\n" << indent << "]";
+}
+
+
+
+uint64_t PerformanceProfile::writeJson(
+    ostream& json,
+    const string& indent,
+    uint64_t stepIndex) const
+{
+    const Step& step = steps[stepIndex];
+    const double processorCount = double(std::thread::hardware_concurrency());
+    const double elapsedTime = step.isComplete ?
+        1.e-9 * double(std::chrono::duration_cast<std::chrono::nanoseconds>(
+        step.end.time - step.begin.time).count()) : 0.;
+    const double userTime = step.isComplete ? step.end.userTime - step.begin.userTime : 0.;
+    const double systemTime = step.isComplete ? step.end.systemTime - step.begin.systemTime : 0.;
+
+    json <<
+        indent << "{\n" <<
+        indent << "  \"Step\": \"" << step.name << "\",\n" <<
+        indent << "  \"Elapsed time (seconds)\": " << elapsedTime << ",\n" <<
+        indent << "  \"User CPU time (seconds)\": " << userTime << ",\n" <<
+        indent << "  \"System CPU time (seconds)\": " << systemTime << ",\n" <<
+        indent << "  \"Average CPU utilization\": " <<
+        (elapsedTime > 0. ? (userTime + systemTime) / (processorCount * elapsedTime) : 0.) << ",\n" <<
+        indent << "  \"Peak resident memory (bytes)\": " << step.peakResidentBytes << ",\n" <<
+        indent << "  \"Peak huge page memory (bytes)\": " << step.peakHugePageBytes << ",\n" <<
+        indent << "  \"Peak memory including huge pages (bytes)\": " <<
+        step.peakResidentBytes + step.peakHugePageBytes << ",\n" <<
+        indent << "  \"Mapped bytes at end\": " << step.end.mappedBytes << ",\n" <<
+        indent << "  \"Minor page faults\": " <<
+        (step.isComplete ? step.end.minorFaults - step.begin.minorFaults : 0) << ",\n" <<
+        indent << "  \"Major page faults\": " <<
+        (step.isComplete ? step.end.majorFaults - step.begin.majorFaults : 0) << ",\n" <<
+        indent << "  \"Bytes read\": " <<
+        (step.isComplete ? step.end.readBytes - step.begin.readBytes : 0) << ",\n" <<
+        indent << "  \"Bytes written\": " <<
+        (step.isComplete ? step.end.writeBytes - step.begin.writeBytes : 0);
+
+    // Nested steps.
+    ++stepIndex;
+    if(stepIndex < steps.size() and steps[stepIndex].depth > step.depth) {
+        json << ",\n" << indent << "  \"Steps\": [\n";
+        bool isFirst = true;
+        while(stepIndex < steps.size() and steps[stepIndex].depth > step.depth) {
+            if(not isFirst) {
+                json << ",\n";
+            }
+            isFirst = false;
+            stepIndex = writeJson(json, indent + "    ", stepIndex);
+        }
+        json << "\n" << indent << "  ]";
+    }
+
+    json << "\n" << indent << "}";
+    return stepIndex;
+}
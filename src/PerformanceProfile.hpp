@@ -0,0 +1,149 @@
+#ifndef SHASTA_PERFORMANCE_PROFILE_HPP
+#define SHASTA_PERFORMANCE_PROFILE_HPP
+
+/*******************************************************************************
+
+Class PerformanceProfile records resource usage for each
+step of an assembly, so performance regressions can be tracked
+across versions and inputs.
+
+Steps are the assembly phases in main.cpp, and the major sub-steps of
+some expensive functions (LowHash1, computeAlignments,
+createMarkerGraphVertices), which are recorded as nested steps.
+Steps must be begun and ended from a single thread,
+typically the main thread, in nested order.
+
+For each step, the following are recorded:
+- Elapsed (wall) time.
+- User and system CPU time for the entire process (all threads).
+- Peak resident memory during the step.
+- Peak memory in huge pages (hugetlbfs) during the step, and the sum
+  of the two, the peak memory including huge pages.
+- Mapped bytes (virtual memory size of the process) at the end of the step.
+- Minor and major page faults.
+- Bytes read from and written to storage.
+
+On Linux, the peak resident memory of each step is obtained by resetting
+the peak resident memory of the process (via /proc/self/clear_refs)
+at each step boundary. If that is not possible, the peak resident memory
+of the process up to the end of the step is recorded instead.
+Mapped bytes and I/O bytes are read from /proc and are
+only available on Linux.
+
+The peak resident memory (VmHWM) does not include pages in hugetlbfs
+mappings, which are used for binary data with --memoryBacking 2M,
+and with --memoryMode filesystem on a hugetlbfs filesystem.
+For those, the memory in huge pages (HugetlbPages in /proc/self/status)
+is sampled at each step boundary, including the boundaries of nested steps.
+Huge pages are allocated when binary data are created or resized
+and are never swapped, so this captures most of their usage,
+but huge pages freed before the next step boundary are not included.
+
+The profile is written to the "Performance" section
+of AssemblySummary.html and AssemblySummary.json.
+
+*******************************************************************************/
+
+// Standard library.
+#include <chrono>
+#include "cstdint.hpp"
+#include "iostream.hpp"
+#include <mutex>
+#include "string.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    class PerformanceProfile;
+}
+
+
+
+class shasta::PerformanceProfile {
+public:
+
+    // Return the process-wide profile.
+    static PerformanceProfile& instance();
+
+    // Begin a step, nested in the current step, if any.
+    void begin(const string& name);
+
+    // End the current step.
+    void end();
+
+    // End the current step and begin another one at the same level.
+    void next(const string& name);
+
+    // Write the recorded steps as an html table, or as a json array
+    // in which each step contains its nested steps.
+    // writeHtml writes nothing if no steps were recorded.
+    void writeHtml(ostream&) const;
+    void writeJson(ostream&, const string& indent) const;
+
+    bool empty() const
+    {
+        std::lock_guard<std::mutex> lock(mutex);
+        return steps.empty();
+    }
+
+private:
+
+    // Use instance() instead.
+    PerformanceProfile();
+
+    // Process resource usage at a point in time.
+    class Sample {
+    public:
+        std::chrono::steady_clock::time_point time;
+        double userTime = 0.;
+        double systemTime = 0.;
+        uint64_t minorFaults = 0;
+        uint64_t majorFaults = 0;
+        uint64_t readBytes = 0;
+        uint64_t writeBytes = 0;
+        uint64_t mappedBytes = 0;
+        static Sample get();
+    };
+
+    class Step {
+    public:
+        string name;
+        uint64_t depth;
+        Sample begin;
+        Sample end;
+        uint64_t peakResidentBytes = 0;
+        uint64_t peakHugePageBytes = 0;
+        bool isComplete = false;
+    };
+
+    // The steps, in the order in which they began.
+    vector<Step> steps;
+
+    // Indexes in the steps vector of the steps that have not yet ended,
+    // outermost first.
+    vector<uint64_t> openSteps;
+
+    // True if the peak resident memory can be reset at each step boundary.
+    bool canResetPeakResidentBytes;
+
+    mutable std::mutex mutex;
+
+    // Low level access to process resource usage.
+    static uint64_t readProcField(const char* fileName, const string& field, uint64_t multiplier);
+    static bool resetPeakResidentBytes();
+    static uint64_t getPeakResidentBytes();
+    static uint64_t getHugePageBytes();
+
+    // Update the peak resident memory and peak huge page memory
+    // of all open steps, then reset the peak resident memory
+    // of the process, if possible.
+    void updatePeakResidentBytes();
+
+    void beginNoLock(const string& name);
+    void endNoLock();
+
+    // Write the step with the given index and its nested steps,
+    // and return the index of the next step at the same level.
+    uint64_t writeJson(ostream&, const string& indent, uint64_t stepIndex) const;
+};
+
+#endif
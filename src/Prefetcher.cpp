@@ -0,0 +1,84 @@
+// Shasta.
+#include "Prefetcher.hpp"
+#include "touchMemory.hpp"
+using namespace shasta;
+
+
+
+Prefetcher::~Prefetcher()
+{
+    cancel();
+}
+
+
+
+void Prefetcher::add(const void* begin, const void* end)
+{
+    SHASTA_ASSERT(not thread.joinable());
+    if(end > begin) {
+        ranges.push_back(make_pair(
+            static_cast<const char*>(begin),
+            static_cast<const char*>(end)));
+    }
+}
+
+
+
+uint64_t Prefetcher::totalByteCount() const
+{
+    uint64_t n = 0;
+    for(const auto& range: ranges) {
+        n += uint64_t(range.second - range.first);
+    }
+    return n;
+}
+
+
+
+void Prefetcher::start()
+{
+    SHASTA_ASSERT(not thread.joinable());
+    isCancelled = false;
+    byteCount = 0;
+    thread = std::thread(&Prefetcher::threadFunction, this);
+}
+
+
+
+void Prefetcher::wait()
+{
+    if(thread.joinable()) {
+        thread.join();
+    }
+}
+
+
+
+void Prefetcher::cancel()
+{
+    isCancelled = true;
+    wait();
+}
+
+
+
+void Prefetcher::threadFunction()
+{
+    // Start asynchronous read ahead for all the ranges.
+    for(const auto& range: ranges) {
+        MemoryMapped::advise(range.first, range.second, MemoryMapped::Advice::WillNeed);
+    }
+
+    // Touch the pages, in chunks so we can react quickly to cancellation.
+    const uint64_t chunkSize = 16 * 1024 * 1024;
+    for(const auto& range: ranges) {
+        for(const char* p=range.first; p<range.second; p+=chunkSize) {
+            if(isCancelled) {
+                return;
+            }
+            const char* end = (uint64_t(range.second - p) > chunkSize) ? (p + chunkSize) : range.second;
+            touchMemory(p, end);
+            byteCount += uint64_t(end - p);
+        }
+    }
+}
@@ -0,0 +1,95 @@
+#ifndef SHASTA_PREFETCHER_HPP
+#define SHASTA_PREFETCHER_HPP
+
+/*******************************************************************************
+
+Class Prefetcher loads memory mapped data into memory using
+a background thread, so a later phase of the computation
+does not have to fault in pages one at a time.
+This is useful when the data are backed by disk
+(--memoryBacking disk, or data accessed again after an assembly
+completed), where each page fault requires a disk read.
+
+Usage pattern:
+
+Prefetcher prefetcher;
+prefetcher.add(someVector);
+prefetcher.add(someVectorOfVectors);
+prefetcher.start();
+// Do other work here.
+prefetcher.wait();   // Or cancel() if the data are no longer needed.
+
+For each range, the prefetcher first calls madvise with MADV_WILLNEED,
+which starts asynchronous read ahead, then reads one byte
+of every page, in order. It checks frequently for cancellation.
+
+The data added must stay mapped at the same address
+until the prefetcher is done (wait, cancel, or destructor).
+Therefore only data that are not being resized should be added.
+
+*******************************************************************************/
+
+// Shasta.
+#include "MemoryMappedVectorOfVectors.hpp"
+
+// Standard library.
+#include <atomic>
+#include "string.hpp"
+#include <thread>
+#include "utility.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    class Prefetcher;
+}
+
+
+
+class shasta::Prefetcher {
+public:
+
+    ~Prefetcher();
+
+    // Add memory ranges to be prefetched.
+    // This can only be called before start.
+    void add(const void* begin, const void* end);
+    template<class T> void add(const MemoryMapped::Vector<T>& v)
+    {
+        if(v.isOpen and not v.empty()) {
+            add(v.begin(), v.end());
+        }
+    }
+    template<class T, class Int> void add(const MemoryMapped::VectorOfVectors<T, Int>& v)
+    {
+        if(v.isOpen()) {
+            add(v.begin(), v.end());
+        }
+    }
+
+    // Start prefetching in a background thread.
+    void start();
+
+    // Wait for prefetching to complete.
+    void wait();
+
+    // Stop prefetching as soon as possible, then wait.
+    void cancel();
+
+    // The number of bytes prefetched so far.
+    uint64_t prefetchedByteCount() const
+    {
+        return byteCount;
+    }
+
+    // The total number of bytes to be prefetched.
+    uint64_t totalByteCount() const;
+
+private:
+    vector< pair<const char*, const char*> > ranges;
+    std::thread thread;
+    std::atomic<bool> isCancelled {false};
+    std::atomic<uint64_t> byteCount {0};
+    void threadFunction();
+};
+
+#endif
@@ -2,14 +2,18 @@
 
 // Shasta.
 #include "Assembler.hpp"
+#include "AssemblyCheckpoints.hpp"
 #include "Base.hpp"
+#include "BinaryDataSnapshot.hpp"
 #include "CompactUndirectedGraph.hpp"
 #include "compressAlignment.hpp"
 #include "deduplicate.hpp"
 #include "dset64Test.hpp"
 #include "LongBaseSequence.hpp"
 #include "mappedCopy.hpp"
+#include "MemoryMappedVectorOfVectorsBuilder.hpp"
 #include "MultithreadedObject.hpp"
+#include "PackedRepeatCounts.hpp"
 #include "ShortBaseSequence.hpp"
 #include "splitRange.hpp"
 #include "testSpoa.hpp"
@@ -429,27 +433,33 @@ PYBIND11_MODULE(shasta, module)
             arg("lowCoverageThreshold"),
             arg("highCoverageThreshold"),
             arg("maxDistance"),
-            arg("edgeMarkerSkipThreshold"))
+            arg("edgeMarkerSkipThreshold"),
+            arg("threadCount") = 0)
         .def("reverseTransitiveReduction",
             &Assembler::reverseTransitiveReduction,
             arg("lowCoverageThreshold"),
             arg("highCoverageThreshold"),
-            arg("maxDistance"))
+            arg("maxDistance"),
+            arg("threadCount") = 0)
         .def("pruneMarkerGraphStrongSubgraph",
             &Assembler::pruneMarkerGraphStrongSubgraph,
-            arg("iterationCount"))
+            arg("iterationCount"),
+            arg("threadCount") = 0)
         .def("simplifyMarkerGraph",
             &Assembler::simplifyMarkerGraph,
             arg("maxLength"),
-            arg("debug") = false)
+            arg("debug") = false,
+            arg("threadCount") = 0)
         .def("assembleMarkerGraphVertices",
             &Assembler::assembleMarkerGraphVertices,
-            arg("threadCount") = 0)
+            arg("threadCount") = 0,
+            arg("strandSymmetric") = false)
         .def("accessMarkerGraphVertexRepeatCounts",
             &Assembler::accessMarkerGraphVertexRepeatCounts)
         .def("computeMarkerGraphVerticesCoverageData",
             &Assembler::computeMarkerGraphVerticesCoverageData,
-            arg("threadCount") = 0)
+            arg("threadCount") = 0,
+            arg("strandSymmetric") = false)
         .def("assembleMarkerGraphEdges",
             &Assembler::assembleMarkerGraphEdges,
             arg("threadCount") = 0,
@@ -482,20 +492,27 @@ PYBIND11_MODULE(shasta, module)
         .def("assemble",
             &Assembler::assemble,
             arg("threadCount") = 0,
-            arg("storeCoverageDataCsvLengthThreshold") = 0)
+            arg("markerGraphEdgeLengthThresholdForConsensus") = 1000,
+            arg("storeCoverageDataCsvLengthThreshold") = 0,
+            arg("storeCoverageDataFormat") = "csv",
+            arg("streamGfaFileName") = "",
+            arg("streamFastaFileName") = "")
         .def("accessAssemblyGraphSequences",
             &Assembler::accessAssemblyGraphSequences)
         .def("computeAssemblyStatistics",
             &Assembler::computeAssemblyStatistics)
         .def("writeGfa1",
             &Assembler::writeGfa1,
-            arg("fileName"))
+            arg("fileName"),
+            arg("threadCount") = 0)
         .def("writeGfa1BothStrands",
             &Assembler::writeGfa1BothStrands,
-            arg("fileName"))
+            arg("fileName"),
+            arg("threadCount") = 0)
         .def("writeFasta",
             &Assembler::writeFasta,
-            arg("fileName"))
+            arg("fileName"),
+            arg("threadCount") = 0)
         .def("colorGfaWithTwoReads",
             &Assembler::colorGfaWithTwoReads,
             arg("readId0"),
@@ -523,11 +540,12 @@ PYBIND11_MODULE(shasta, module)
         .def("assembleAssemblyGraphEdge",
             (
                 AssembledSegment (Assembler::*)
-                (AssemblyGraph::EdgeId, bool)
+                (AssemblyGraph::EdgeId, bool, uint32_t)
             )
             &Assembler::assembleAssemblyGraphEdge,
             arg("edgeId"),
-            arg("storeCoverageData") = true)
+            arg("storeCoverageData") = true,
+            arg("markerGraphEdgeLengthThresholdForConsensus") = 1000)
         .def("gatherOrientedReadsByAssemblyGraphEdge",
             &Assembler::gatherOrientedReadsByAssemblyGraphEdge,
             arg("threadCount") = 0)
@@ -556,6 +574,15 @@ PYBIND11_MODULE(shasta, module)
             &Assembler::colorCompressedAssemblyGraph,
             arg("gfaId"))
 
+        // Background prefetching of memory mapped data.
+        .def("startPrefetching",
+            &Assembler::startPrefetching,
+            arg("dataNames") = "all")
+        .def("waitForPrefetching",
+            &Assembler::waitForPrefetching)
+        .def("cancelPrefetching",
+            &Assembler::cancelPrefetching)
+
 
         .def("test", &Assembler::test)
 
@@ -598,6 +625,9 @@ PYBIND11_MODULE(shasta, module)
     module.def("testMemoryMappedVector",
         testMemoryMappedVector
         );
+    module.def("testMemoryMappedVectorOfVectorsBuilder",
+        testMemoryMappedVectorOfVectorsBuilder
+        );
     module.def("testBase",
         testBase
         );
@@ -607,6 +637,15 @@ PYBIND11_MODULE(shasta, module)
     module.def("testLongBaseSequence",
         testLongBaseSequence
         );
+    module.def("testPackedRepeatCounts",
+        testPackedRepeatCounts
+        );
+    module.def("testAssemblyCheckpoints",
+        testAssemblyCheckpoints
+        );
+    module.def("testBinaryDataSnapshot",
+        testBinaryDataSnapshot
+        );
     module.def("testSplitRange",
         testSplitRange
         );
@@ -622,6 +661,18 @@ PYBIND11_MODULE(shasta, module)
     module.def("testSimpleBayesianConsensusCaller",
         testSimpleBayesianConsensusCaller
         );
+    module.def("testConsensusCallerBatch",
+        testConsensusCallerBatch,
+        arg("columnCount") = 100000,
+        arg("maxCoverage") = 60,
+        arg("seed") = 231
+        );
+    module.def("testSimpleBayesianConsensusCallerMemoization",
+        testSimpleBayesianConsensusCallerMemoization,
+        arg("columnCount") = 100000,
+        arg("maxCoverage") = 60,
+        arg("seed") = 231
+        );
     module.def("testMedianConsensusCaller",
         testMedianConsensusCaller
         );
@@ -639,6 +690,13 @@ PYBIND11_MODULE(shasta, module)
     module.def("mappedCopy",
         mappedCopy
         );
+    module.def("mappedCopyDirectory",
+        mappedCopyDirectory,
+        arg("inputDirectory"),
+        arg("outputDirectory"),
+        arg("threadCount") = 0,
+        call_guard<gil_scoped_release>()
+        );
     module.def("testAlignmentCompression",
         testAlignmentCompression
         );
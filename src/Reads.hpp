@@ -258,6 +258,14 @@ public:
 
     void remove();
 
+    // Call f for each memory mapped vector containing
+    // the reads and their repeat counts.
+    template<class F> void forEachMemoryMappedVector(const F& f) const
+    {
+        reads.forEachMemoryMappedVector(f);
+        f(readRepeatCounts);
+    }
+
 private:
     LongBaseSequences reads;
     MemoryMapped::VectorOfVectors<uint8_t, uint64_t> readRepeatCounts;
@@ -11,7 +11,9 @@
 #include <cstdio>
 #include <array>
 #include <cmath>
+#include <cstring>
 #include <map>
+#include <random>
 #include "SimpleBayesianConsensusCaller.hpp"
 #include "Coverage.hpp"
 #include "ConsensusCaller.hpp"
@@ -126,6 +128,10 @@ void SimpleBayesianConsensusCaller::validateMatrixDimensions(string configPath){
 
 SimpleBayesianConsensusCaller::SimpleBayesianConsensusCaller(
     const string& constructorString){
+    instanceId = nextInstanceId++;
+    runlengthMemoCounters = make_shared< array<std::atomic<uint64_t>, 2> >();
+    (*runlengthMemoCounters)[0] = 0;
+    (*runlengthMemoCounters)[1] = 0;
     ignoreNonConsensusBaseRepeats = true;
     predictGapRunlengths = false;
     countGapsAsZeros = false;
@@ -321,46 +327,164 @@ void SimpleBayesianConsensusCaller::normalizeLikelihoods(vector<double>& x, doub
 }
 
 
-void SimpleBayesianConsensusCaller::factorRepeats(
-    array<std::map<uint16_t,uint16_t>,2>& factoredRepeats,
-    const Coverage& coverage) const{
+SimpleBayesianConsensusCaller::RunlengthMemo& SimpleBayesianConsensusCaller::getRunlengthMemo() const{
+    RunlengthMemo& memo = runlengthMemo;
+    if (memo.instanceId != instanceId){
+        memo.reset(instanceId, runlengthMemoCounters);
+    }
+    return memo;
+}
+
+
+void SimpleBayesianConsensusCaller::addObservation(
+    RunlengthMemo& memo,
+    AlignedBase base,
+    Strand strand,
+    uint16_t repeatCount,
+    AlignedBase consensusBase) const{
+
+    // Ignore non consensus repeat values, if requested.
+    if (ignoreNonConsensusBaseRepeats and base.value != consensusBase.value){
+        return;
+    }
 
-    // Store counts for each unique observation
+    // If NOT a gap, always increment
+    uint16_t x;
+    if (not base.isGap()) {
+        x = repeatCount;
+    // If IS a gap only increment if "countGapsAsZeros" is true
+    }else if (countGapsAsZeros){
+        x = 0;
+    }else{
+        return;
+    }
+
+    vector<uint16_t>& histogram = memo.histogram[strand];
+    if (histogram.size() <= x){
+        histogram.resize(size_t(x) + 1, 0);
+    }
+    histogram[x]++;
+    memo.histogramEnd[strand] = max(memo.histogramEnd[strand], uint16_t(x + 1));
+}
+
+
+// Move the histogram to factoredRepeats, leaving the histogram all zero.
+void SimpleBayesianConsensusCaller::factorRepeats(RunlengthMemo& memo) const{
+    for (size_t strand=0; strand<2; strand++){
+        vector< pair<uint16_t, uint16_t> >& strandRepeats = memo.factoredRepeats[strand];
+        strandRepeats.clear();
+        vector<uint16_t>& histogram = memo.histogram[strand];
+        for (uint16_t x=0; x<memo.histogramEnd[strand]; x++){
+            if (histogram[x] > 0){
+                strandRepeats.push_back(make_pair(x, histogram[x]));
+                histogram[x] = 0;
+            }
+        }
+        memo.histogramEnd[strand] = 0;
+    }
+}
+
+
+uint16_t SimpleBayesianConsensusCaller::predictRunlength(const Coverage &coverage, AlignedBase consensusBase, vector<double>& logLikelihoodY) const{
+    RunlengthMemo& memo = getRunlengthMemo();
+
+    // Count the number of times each unique repeat was observed, to reduce redundancy in calculating log likelihoods
+    for (const CoverageData& observation: coverage.getReadCoverageData()){
+        addObservation(memo, observation.base, observation.strand, uint16_t(observation.repeatCount), consensusBase);
+    }
+    factorRepeats(memo);
+
+    return predictRunlength(memo, consensusBase, logLikelihoodY);
+}
+
+
+uint16_t SimpleBayesianConsensusCaller::predictRunlength(
+    RunlengthMemo& memo,
+    AlignedBase consensusBase,
+    vector<double>& logLikelihoodY) const{
+
+    // Construct the key: the consensus base, followed by
+    // the number of distinct repeats and the (repeat, count) pairs for each strand.
+    string& key = memo.key;
+    key.clear();
+    key.push_back(char(consensusBase.value));
+    for (const auto& strandRepeats: memo.factoredRepeats){
+        const uint16_t n = uint16_t(strandRepeats.size());
+        key.append(reinterpret_cast<const char*>(&n), sizeof(n));
+        for (const auto& item: strandRepeats){
+            key.append(reinterpret_cast<const char*>(&item.first), sizeof(item.first));
+            key.append(reinterpret_cast<const char*>(&item.second), sizeof(item.second));
+        }
+    }
+
+    // Look it up.
+    const auto it = memo.table.find(key);
+    if (it != memo.table.end()){
+        ++memo.hitCount;
+        memo.entries.splice(memo.entries.begin(), memo.entries, it->second);
+        const RunlengthMemoEntry& entry = it->second->second;
+        logLikelihoodY = entry.logLikelihoodY;
+        return entry.yMax;
+    }
+    ++memo.missCount;
+
+    // Not found. Compute it and store it, evicting the least recently used entry if necessary.
+    const uint16_t yMax = computeRunlength(memo.factoredRepeats, consensusBase, logLikelihoodY);
+    if (memo.entries.size() >= runlengthMemoCapacity){
+        memo.table.erase(memo.entries.back().first);
+        memo.entries.pop_back();
+    }
+    memo.entries.push_front(make_pair(key, RunlengthMemoEntry()));
+    RunlengthMemoEntry& entry = memo.entries.front().second;
+    entry.yMax = yMax;
+    entry.logLikelihoodY = logLikelihoodY;
+    memo.table.insert(make_pair(key, memo.entries.begin()));
+
+    // Periodically make the counts visible to writeStatistics.
+    if (((memo.hitCount + memo.missCount) % 4096) == 0){
+        memo.flushCounters();
+    }
+
+    return yMax;
+}
+
+
+
+uint16_t SimpleBayesianConsensusCaller::predictRunlengthUncached(const Coverage &coverage, AlignedBase consensusBase, vector<double>& logLikelihoodY) const{
+
+    // This uses a separate std::map based factoring, to check the memoized code path
+    // against an independent implementation.
+    array <std::map <uint16_t,uint16_t>, 2> factoredRepeatsMap;    // Repeats grouped by strand and length
     for (auto& observation: coverage.getReadCoverageData() ){
+        // Ignore non consensus repeat values, if requested.
+        if (ignoreNonConsensusBaseRepeats and observation.base.value != consensusBase.value){
+            continue;
+        }
         // If NOT a gap, always increment
         if (not observation.base.isGap()) {
-            factoredRepeats[uint16_t(observation.strand)][uint16_t(observation.repeatCount)]++;
+            factoredRepeatsMap[uint16_t(observation.strand)][uint16_t(observation.repeatCount)]++;
         // If IS a gap only increment if "countGapsAsZeros" is true
         }else if (countGapsAsZeros){
-            factoredRepeats[uint16_t(observation.strand)][0]++;
+            factoredRepeatsMap[uint16_t(observation.strand)][0]++;
         }
     }
-}
 
-
-void SimpleBayesianConsensusCaller::factorRepeats(
-    array<std::map<uint16_t,uint16_t>,2>& factoredRepeats,
-    const Coverage& coverage,
-    AlignedBase consensusBase) const{
-
-    // Store counts for each unique observation
-    for (auto& observation: coverage.getReadCoverageData() ){
-        // Ignore non consensus repeat values
-        if (observation.base.value == consensusBase.value){
-            // If NOT a gap, always increment
-            if (not observation.base.isGap()) {
-                factoredRepeats[uint16_t(observation.strand)][uint16_t(observation.repeatCount)]++;
-            // If IS a gap only increment if "countGapsAsZeros" is true
-            }else if (countGapsAsZeros){
-                factoredRepeats[uint16_t(observation.strand)][0]++;
-            }
+    FactoredRepeats factoredRepeats;
+    for (size_t strand=0; strand<2; strand++){
+        for (const auto& item: factoredRepeatsMap[strand]){
+            factoredRepeats[strand].push_back(item);
         }
     }
+
+    return computeRunlength(factoredRepeats, consensusBase, logLikelihoodY);
 }
 
 
-uint16_t SimpleBayesianConsensusCaller::predictRunlength(const Coverage &coverage, AlignedBase consensusBase, vector<double>& logLikelihoodY) const{
-    array <std::map <uint16_t,uint16_t>, 2> factoredRepeats;    // Repeats grouped by strand and length
+
+uint16_t SimpleBayesianConsensusCaller::computeRunlength(
+    const FactoredRepeats& factoredRepeats,
+    AlignedBase consensusBase,
+    vector<double>& logLikelihoodY) const{
 
     size_t priorIndex = -1;   // Used to determine which prior probability vector to access (AT=0 or GC=1)
     uint16_t x;               // Element of X = {x_0, x_1, ..., x_i} observed repeats
@@ -379,15 +503,6 @@ uint16_t SimpleBayesianConsensusCaller::predictRunlength(const Coverage &coverag
         priorIndex = 1;
     }
 
-    // Count the number of times each unique repeat was observed, to reduce redundancy in calculating log likelihoods/
-    // Depending on class boolean "ignoreNonConsensusBaseRepeats" filter out observations
-    if (ignoreNonConsensusBaseRepeats) {
-        factorRepeats(factoredRepeats, coverage, consensusBase);
-    }
-    else {
-        factorRepeats(factoredRepeats, coverage);
-    }
-
     // Iterate all possible Y from 0 to j to calculate p(Y_j|X) where X is all observations 0 to i,
     // assuming i and j are less than maxRunlength
     for (y = 0; y <= maxOutputRunlength; y++){
@@ -424,6 +539,62 @@ uint16_t SimpleBayesianConsensusCaller::predictRunlength(const Coverage &coverag
 }
 
 
+
+std::atomic<uint64_t> SimpleBayesianConsensusCaller::nextInstanceId(0);
+thread_local SimpleBayesianConsensusCaller::RunlengthMemo SimpleBayesianConsensusCaller::runlengthMemo;
+const uint64_t SimpleBayesianConsensusCaller::runlengthMemoCapacity;
+
+
+
+void SimpleBayesianConsensusCaller::RunlengthMemo::flushCounters(){
+    if (counters){
+        (*counters)[0] += hitCount;
+        (*counters)[1] += missCount;
+    }
+    hitCount = 0;
+    missCount = 0;
+}
+
+
+
+void SimpleBayesianConsensusCaller::RunlengthMemo::reset(
+    uint64_t newInstanceId,
+    const shared_ptr< array<std::atomic<uint64_t>, 2> >& newCounters){
+    flushCounters();
+    instanceId = newInstanceId;
+    counters = newCounters;
+    entries.clear();
+    table.clear();
+}
+
+
+
+SimpleBayesianConsensusCaller::RunlengthMemo::~RunlengthMemo(){
+    flushCounters();
+}
+
+
+
+void SimpleBayesianConsensusCaller::writeStatistics(ostream& s) const{
+
+    // Include the counts not yet flushed by the calling thread.
+    uint64_t hitCount = (*runlengthMemoCounters)[0];
+    uint64_t missCount = (*runlengthMemoCounters)[1];
+    if (runlengthMemo.instanceId == instanceId){
+        hitCount += runlengthMemo.hitCount;
+        missCount += runlengthMemo.missCount;
+    }
+
+    const uint64_t totalCount = hitCount + missCount;
+    s << "Bayesian consensus caller run length memoization: " <<
+        hitCount << " hits, " << missCount << " misses";
+    if (totalCount > 0){
+        s << ", hit rate " << double(hitCount) / double(totalCount);
+    }
+    s << endl;
+}
+
+
 AlignedBase SimpleBayesianConsensusCaller::predictConsensusBase(const Coverage& coverage) const{
     const vector<CoverageData>& coverageDataVector = coverage.getReadCoverageData();
     vector<uint32_t> baseCounts(5,0);
@@ -482,6 +653,43 @@ Consensus SimpleBayesianConsensusCaller::operator()(const Coverage& coverage) co
 }
 
 
+
+// Same as above, for all the columns of a CoverageBatch.
+void SimpleBayesianConsensusCaller::computeConsensus(
+    const CoverageBatch& coverageBatch,
+    vector<Consensus>& consensus) const{
+
+    RunlengthMemo& memo = getRunlengthMemo();
+    vector<double>& logLikelihoods = memo.logLikelihoodY;
+
+    const uint64_t columnCount = coverageBatch.columnCount();
+    consensus.resize(columnCount);
+    for (uint64_t column=0; column<columnCount; column++){
+
+        // predictConsensusBase uses the same tie breaking as Coverage::mostFrequentBase.
+        const AlignedBase consensusBase = coverageBatch.mostFrequentBase(column);
+
+        uint16_t consensusRepeat = 0;
+        if (predictGapRunlengths or not consensusBase.isGap()){
+            const uint64_t begin = coverageBatch.columnBegin(column);
+            const uint64_t end = coverageBatch.columnEnd(column);
+            for (uint64_t i=begin; i!=end; i++){
+                addObservation(memo,
+                    AlignedBase::fromInteger(coverageBatch.bases[i]),
+                    coverageBatch.strands[i],
+                    coverageBatch.repeatCounts[i],
+                    consensusBase);
+            }
+            factorRepeats(memo);
+            logLikelihoods.assign(size_t(maxOutputRunlength) + 1, -INF);
+            consensusRepeat = predictRunlength(memo, consensusBase, logLikelihoods);
+        }
+
+        consensus[column] = Consensus(consensusBase, consensusRepeat);
+    }
+}
+
+
 // The test program expects as input two csv files:
 // - SimpleBayesianConsensusCaller.csv:
 //       The configuration file to create the caller.
@@ -530,3 +738,97 @@ void shasta::testSimpleBayesianConsensusCaller(
     // Write it out.
     cout << "Consensus: " << consensus.base << " " << consensus.repeatCount << '\n';
 }
+
+
+
+// Regression test for the memoization of predictRunlength.
+// For each of the built-in configurations, this generates random coverage columns
+// and checks that the memoized predictRunlength gives results that are
+// bit-exact with the uncached computation.
+// Each column is processed twice, so both cache misses and cache hits are checked.
+// Throws an exception if a difference is found.
+void shasta::testSimpleBayesianConsensusCallerMemoization(
+    uint64_t columnCount,
+    uint64_t maxCoverage,
+    uint32_t seed)
+{
+    // This needs to be kept in sync with isBuiltIn().
+    const vector<string> builtinNames = {
+        "guppy-2.3.1-a",
+        "guppy-2.3.5-a",
+        "guppy-3.0.5-a",
+        "guppy-3.4.4-a",
+        "guppy-3.6.0-a",
+        "r10-guppy-3.4.8-a"};
+    SHASTA_ASSERT(maxCoverage > 0);
+
+    for(const string& builtinName: builtinNames) {
+        SimpleBayesianConsensusCaller caller(builtinName);
+        const size_t likelihoodSize = size_t(caller.maxOutputRunlength) + 1;
+
+        // Use a fixed seed for each configuration, so the test is reproducible.
+        std::mt19937 randomSource(seed);
+        std::uniform_int_distribution<uint64_t> coverageDistribution(1, maxCoverage);
+        std::uniform_int_distribution<int> percentDistribution(0, 99);
+        std::uniform_int_distribution<int> baseDistribution(0, 3);
+        std::uniform_int_distribution<int> strandDistribution(0, 1);
+        std::geometric_distribution<int> errorDistribution(0.5);
+        std::uniform_int_distribution<int> trueRepeatCountDistribution(1, 8);
+
+        for(uint64_t column=0; column<columnCount; column++) {
+
+            // Generate a column. Most reads agree on the base and
+            // have a repeat count close to the true repeat count.
+            // Some reads have a different base or a gap.
+            // Occasionally, very long repeat counts are generated to
+            // exercise the capping at maxInputRunlength.
+            const int trueBase = baseDistribution(randomSource);
+            const int trueRepeatCount = trueRepeatCountDistribution(randomSource);
+            const uint64_t coverageValue = coverageDistribution(randomSource);
+            Coverage coverage;
+            for(uint64_t i=0; i<coverageValue; i++) {
+                const Strand strand = Strand(strandDistribution(randomSource));
+                const int percent = percentDistribution(randomSource);
+                if(percent < 5) {
+                    coverage.addRead(AlignedBase::gap(), strand, 0);
+                    continue;
+                }
+                const int base = (percent < 10) ? baseDistribution(randomSource) : trueBase;
+                int repeatCount = trueRepeatCount;
+                if(percentDistribution(randomSource) < 30) {
+                    const int error = 1 + errorDistribution(randomSource);
+                    repeatCount += (strandDistribution(randomSource) == 0) ? error : -error;
+                }
+                if(percentDistribution(randomSource) == 0) {
+                    repeatCount += 100;
+                }
+                repeatCount = max(1, repeatCount);
+                coverage.addRead(AlignedBase::fromInteger(uint8_t(base)), strand, size_t(repeatCount));
+            }
+
+            // Compute the run length without memoization and with memoization, twice.
+            const AlignedBase consensusBase = caller.predictConsensusBase(coverage);
+            if(consensusBase.isGap()) {
+                continue;
+            }
+            vector<double> expectedLogLikelihoods(likelihoodSize, -INF);
+            const uint16_t expectedRunlength =
+                caller.predictRunlengthUncached(coverage, consensusBase, expectedLogLikelihoods);
+            for(int pass=0; pass<2; pass++) {
+                vector<double> logLikelihoods(likelihoodSize, -INF);
+                const uint16_t runlength =
+                    caller.predictRunlength(coverage, consensusBase, logLikelihoods);
+                if(runlength != expectedRunlength or
+                    std::memcmp(logLikelihoods.data(), expectedLogLikelihoods.data(),
+                        likelihoodSize * sizeof(double)) != 0) {
+                    throw runtime_error("Memoized run length prediction differs from uncached prediction "
+                        "for Bayesian consensus caller " + builtinName +
+                        " at column " + to_string(column) + ".");
+                }
+            }
+        }
+
+        caller.writeStatistics(cout);
+        cout << "Memoization test passed for " << builtinName << endl;
+    }
+}
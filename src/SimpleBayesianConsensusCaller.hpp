@@ -28,17 +28,26 @@ must take into account which strand each read is on.
 
 // Shasta.
 #include "ConsensusCaller.hpp"
+#include "ReadId.hpp"
 
 // Standard library.
+#include <atomic>
 #include "fstream.hpp"
+#include <list>
 #include <map>
 #include <limits>
+#include "memory.hpp"
 #include "string.hpp"
+#include <unordered_map>
 
 namespace shasta {
     class SimpleBayesianConsensusCaller;
     void testSimpleBayesianConsensusCaller(
         const string& configurationFileName);
+    void testSimpleBayesianConsensusCallerMemoization(
+        uint64_t columnCount,
+        uint64_t maxCoverage,
+        uint32_t seed);
 }
 
 
@@ -57,16 +66,31 @@ public:
 
     // Given a coverage object, return the most likely run length, and the normalized log likelihood vector for all run
     // lengths as a pair
+    // The results are memoized in a per-thread LRU cache keyed by the consensus base
+    // and the observed repeat count histogram on each strand, because the same
+    // histograms recur many times during an assembly.
     uint16_t predictRunlength(const Coverage &coverage, AlignedBase consensusBase, vector<double>& logLikelihoodY) const;
 
+    // Same as predictRunlength, but without memoization.
+    // Used to check that memoization does not change the results.
+    uint16_t predictRunlengthUncached(const Coverage &coverage, AlignedBase consensusBase, vector<double>& logLikelihoodY) const;
+
+    // Write hit/miss statistics for the memoization of predictRunlength.
+    virtual void writeStatistics(ostream&) const;
+
     AlignedBase predictConsensusBase(const Coverage& coverage) const;
 
     // This is the primary function of this class. Given a coverage object and consensus base, predict the true
     // run length of the aligned bases at a position
     virtual Consensus operator()(const Coverage&) const;
 
+    // Same as above, for a batch of columns.
+    virtual void computeConsensus(const CoverageBatch&, vector<Consensus>&) const;
+
     static bool isBuiltIn(const string&);
 
+    friend void shasta::testSimpleBayesianConsensusCallerMemoization(uint64_t, uint64_t, uint32_t);
+
 private:
 
     /// ---- Attributes ---- ///
@@ -115,9 +139,81 @@ private:
     // For a given vector of likelihoods over each Y value, normalize by the maximum
     void normalizeLikelihoods(vector<double>& x, double xMax) const;
 
-    // Count the number of times each unique repeat was observed, to reduce redundancy in calculating log likelihoods
-    void factorRepeats(array<std::map<uint16_t, uint16_t>, 2>& factoredRepeats, const Coverage& coverage) const;
-    void factorRepeats(array<std::map<uint16_t, uint16_t>, 2>& factoredRepeats, const Coverage& coverage, AlignedBase consensusBase) const;
+    // Repeats grouped by strand and length.
+    // For each strand, pairs (observed repeat count, number of times it was observed),
+    // sorted by observed repeat count.
+    using FactoredRepeats = array<vector< pair<uint16_t, uint16_t> >, 2>;
+
+    // Compute the most likely run length and the log likelihood vector
+    // given the factored repeats.
+    uint16_t computeRunlength(
+        const FactoredRepeats& factoredRepeats,
+        AlignedBase consensusBase,
+        vector<double>& logLikelihoodY) const;
+
+    // Per-thread LRU cache used to memoize predictRunlength.
+    // It is keyed by a string that encodes the consensus base
+    // and the factored repeats on each strand.
+    // Because the same histograms give the same floating point operations
+    // in the same order, memoization gives bit-exact results.
+    // It also contains work areas used to factor repeats
+    // without allocating memory for each column.
+    class RunlengthMemoEntry {
+    public:
+        uint16_t yMax;
+        vector<double> logLikelihoodY;
+    };
+    class RunlengthMemo {
+    public:
+        // The SimpleBayesianConsensusCaller this cache is currently used for.
+        uint64_t instanceId = std::numeric_limits<uint64_t>::max();
+
+        // The most recently used entries are at the front.
+        std::list< pair<string, RunlengthMemoEntry> > entries;
+        std::unordered_map<string, std::list< pair<string, RunlengthMemoEntry> >::iterator> table;
+
+        // Hit and miss counts not yet added to the instance counters.
+        uint64_t hitCount = 0;
+        uint64_t missCount = 0;
+        shared_ptr< array<std::atomic<uint64_t>, 2> > counters;
+
+        // Work areas.
+        // The histogram is indexed by [strand][observed repeat count]
+        // and is all zero between uses.
+        array<vector<uint16_t>, 2> histogram;
+        array<uint16_t, 2> histogramEnd = {0, 0};
+        FactoredRepeats factoredRepeats;
+        string key;
+        vector<double> logLikelihoodY;
+
+        void flushCounters();
+        void reset(uint64_t instanceId, const shared_ptr< array<std::atomic<uint64_t>, 2> >&);
+        ~RunlengthMemo();
+    };
+    static thread_local RunlengthMemo runlengthMemo;
+    static const uint64_t runlengthMemoCapacity = 4096;
+
+    // Used to give each instance a unique id, so a thread
+    // can detect that its cache belongs to a different instance.
+    uint64_t instanceId;
+    static std::atomic<uint64_t> nextInstanceId;
+
+    // Memoization hit and miss counts for this instance,
+    // updated periodically by each thread.
+    shared_ptr< array<std::atomic<uint64_t>, 2> > runlengthMemoCounters;
+
+    // Access the RunlengthMemo for this thread, making sure it belongs to this instance.
+    RunlengthMemo& getRunlengthMemo() const;
+
+    // Count the number of times each unique repeat was observed, to reduce redundancy in calculating log likelihoods.
+    // Observations are added to the histogram in the RunlengthMemo one at a time,
+    // then factorRepeats moves them to RunlengthMemo::factoredRepeats.
+    // Depending on class boolean "ignoreNonConsensusBaseRepeats" filter out observations
+    void addObservation(RunlengthMemo&, AlignedBase, Strand, uint16_t repeatCount, AlignedBase consensusBase) const;
+    void factorRepeats(RunlengthMemo&) const;
+
+    // Memoized computation of the run length given RunlengthMemo::factoredRepeats.
+    uint16_t predictRunlength(RunlengthMemo&, AlignedBase consensusBase, vector<double>& logLikelihoodY) const;
 
     // For debugging or exporting
     void printPriors(char separator);
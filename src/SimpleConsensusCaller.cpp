@@ -11,3 +11,30 @@ Consensus SimpleConsensusCaller::operator()(
     return Consensus(base, repeatCount);
 }
 
+
+
+// Same as above, for all the columns of a CoverageBatch.
+void SimpleConsensusCaller::computeConsensus(
+    const CoverageBatch& coverageBatch,
+    vector<Consensus>& consensus) const
+{
+    const uint64_t columnCount = coverageBatch.columnCount();
+    consensus.resize(columnCount);
+    array<uint64_t, 256> repeatCountCoverage;
+    for(uint64_t column=0; column<columnCount; column++) {
+        const AlignedBase base = coverageBatch.mostFrequentBase(column);
+        const uint64_t repeatCountEnd =
+            coverageBatch.repeatCountCoverage(column, base, repeatCountCoverage);
+
+        // Same tie breaking as Coverage::mostFrequentRepeatCount.
+        size_t bestCount = 0;
+        uint64_t bestCountCoverage = 0;
+        for(uint64_t repeatCount=0; repeatCount<repeatCountEnd; repeatCount++) {
+            if(repeatCountCoverage[repeatCount] >= bestCountCoverage) {
+                bestCount = repeatCount;
+                bestCountCoverage = repeatCountCoverage[repeatCount];
+            }
+        }
+        consensus[column] = Consensus(base, bestCount);
+    }
+}
@@ -32,6 +32,7 @@ class shasta::SimpleConsensusCaller :
 public:
 
     virtual Consensus operator()(const Coverage&) const;
+    virtual void computeConsensus(const CoverageBatch&, vector<Consensus>&) const;
 
 };
 
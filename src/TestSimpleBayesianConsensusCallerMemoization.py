@@ -0,0 +1,11 @@
+#!/usr/bin/python3
+
+from shasta import testSimpleBayesianConsensusCallerMemoization
+
+
+def main():
+    testSimpleBayesianConsensusCallerMemoization()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+// Shasta.
+#include "ThreadPool.hpp"
+using namespace shasta;
+
+// Standard library.
+#include "stdexcept.hpp"
+#include "string.hpp"
+#include <thread>
+
+
+
+ThreadPool& ThreadPool::instance()
+{
+    // The pool is never destroyed. This way workers
+    // never see a destroyed pool, even if the process
+    // exits while some of them are still running.
+    static ThreadPool* pool = new ThreadPool();
+    return *pool;
+}
+
+
+
+shared_ptr<ThreadPool::Job> ThreadPool::start(
+    const std::function<void(uint64_t)>& f,
+    uint64_t taskCount)
+{
+    const shared_ptr<Job> job = make_shared<Job>();
+    job->pool = this;
+    job->f = f;
+    job->taskCount = taskCount;
+    job->unfinishedTaskCount = taskCount;
+    if(taskCount == 0) {
+        return job;
+    }
+
+    std::lock_guard<std::mutex> lock(mutex);
+
+    // Make sure there is an idle worker for each unclaimed task,
+    // so all tasks of all pending jobs can run concurrently.
+    // Workers are created before the job is queued,
+    // so a failure leaves the pool in a consistent state.
+    while(idleWorkerCount < unclaimedTaskCount + taskCount) {
+        try {
+            std::thread(&ThreadPool::workerFunction, this).detach();
+        } catch(const std::exception& e) {
+            throw runtime_error(
+                "The following error occurred while attempting to start thread " +
+                to_string(workerCount) + ":\n" + e.what() + "\n" +
+                "You may have hit a limit imposed by your system on the maximum number of threads "
+                "allowed. Rerunning with \"--threads " + to_string(workerCount) + "\" may fix this problem "
+                "at a cost in performance.");
+        }
+        ++workerCount;
+        ++idleWorkerCount;
+    }
+
+    jobs.push_back(job);
+    unclaimedTaskCount += taskCount;
+    workAvailable.notify_all();
+    return job;
+}
+
+
+
+void ThreadPool::workerFunction()
+{
+    std::unique_lock<std::mutex> lock(mutex);
+    while(true) {
+
+        // Claim the next task of the oldest job.
+        workAvailable.wait(lock, [this]{return not jobs.empty();});
+        const shared_ptr<Job> job = jobs.front();
+        const uint64_t taskId = job->nextTask++;
+        if(job->nextTask == job->taskCount) {
+            jobs.pop_front();
+        }
+        --unclaimedTaskCount;
+        --idleWorkerCount;
+
+        // Run it without holding the mutex.
+        lock.unlock();
+        std::exception_ptr exception;
+        try {
+            job->f(taskId);
+        } catch(...) {
+            exception = std::current_exception();
+        }
+        lock.lock();
+
+        ++idleWorkerCount;
+        if(exception and not job->exception) {
+            job->exception = exception;
+        }
+        if(--job->unfinishedTaskCount == 0) {
+            jobFinished.notify_all();
+        }
+    }
+}
+
+
+
+void ThreadPool::Job::wait()
+{
+    if(taskCount == 0) {
+        return;
+    }
+    {
+        std::unique_lock<std::mutex> lock(pool->mutex);
+        pool->jobFinished.wait(lock, [this]{return unfinishedTaskCount == 0;});
+        f = nullptr;
+    }
+    if(exception) {
+        std::rethrow_exception(exception);
+    }
+}
+
+
+
+bool ThreadPool::Job::failed() const
+{
+    if(taskCount == 0) {
+        return false;
+    }
+    std::lock_guard<std::mutex> lock(pool->mutex);
+    return bool(exception);
+}
+
+
+
+uint64_t ThreadPool::threadCount() const
+{
+    std::lock_guard<std::mutex> lock(mutex);
+    return workerCount;
+}
@@ -0,0 +1,111 @@
+#ifndef SHASTA_THREAD_POOL_HPP
+#define SHASTA_THREAD_POOL_HPP
+
+/*******************************************************************************
+
+Class ThreadPool is a process-wide pool of persistent worker threads.
+It is used by MultithreadedObject::runThreads and startThreads,
+so each call no longer has to create and join its own std::threads.
+This matters for phases that call runThreads many times,
+possibly in a loop, with little work per call.
+
+Work is submitted as a job consisting of taskCount tasks, each
+of which calls the same function with a task id in [0, taskCount).
+For MultithreadedObject the task id is the thread id,
+and each task typically loops over batches obtained with getNextBatch,
+so load balancing within a job is already dynamic.
+Idle workers take the next unclaimed task from the oldest pending job.
+
+All the tasks of a job are guaranteed to run concurrently:
+when a job is started the pool grows if necessary, so there is
+an idle worker for every task not yet claimed.
+This way tasks can wait for each other, and a task can itself
+start a job (nested parallelism) without risk of deadlock.
+Workers are never destroyed, so the pool size is the
+largest number of tasks that ever needed to run at the same time.
+
+If a task throws, the exception is stored in the job.
+The first exception is rethrown by wait, in the thread that
+started the job, after all the tasks of the job have completed.
+
+*******************************************************************************/
+
+// Standard library.
+#include <condition_variable>
+#include "cstdint.hpp"
+#include <deque>
+#include <exception>
+#include <functional>
+#include "memory.hpp"
+#include <mutex>
+
+namespace shasta {
+    class ThreadPool;
+}
+
+
+
+class shasta::ThreadPool {
+public:
+
+    // Return the process-wide pool, creating it on first use.
+    static ThreadPool& instance();
+
+    class Job {
+    public:
+
+        // Wait for all tasks of this job to complete, then
+        // rethrow the first exception thrown by a task, if any.
+        void wait();
+
+        // Return true if a task of this job threw an exception.
+        bool failed() const;
+
+    private:
+        friend class ThreadPool;
+        ThreadPool* pool = 0;
+        std::function<void(uint64_t)> f;
+        uint64_t taskCount = 0;
+        uint64_t nextTask = 0;
+        uint64_t unfinishedTaskCount = 0;
+        std::exception_ptr exception;
+    };
+
+    // Start a job that calls f(taskId) for taskId in [0, taskCount)
+    // and return without waiting for it to complete.
+    shared_ptr<Job> start(const std::function<void(uint64_t)>& f, uint64_t taskCount);
+
+    // Start a job and wait for it to complete.
+    void run(const std::function<void(uint64_t)>& f, uint64_t taskCount)
+    {
+        start(f, taskCount)->wait();
+    }
+
+    // The number of worker threads currently in the pool.
+    uint64_t threadCount() const;
+
+private:
+
+    // Use instance() instead.
+    ThreadPool() {}
+
+    // All fields below are protected by the mutex.
+    mutable std::mutex mutex;
+
+    // Signaled when a new job is available.
+    std::condition_variable workAvailable;
+
+    // Signaled when a job completes.
+    std::condition_variable jobFinished;
+
+    // Jobs that still have unclaimed tasks, oldest first.
+    std::deque< shared_ptr<Job> > jobs;
+
+    uint64_t workerCount = 0;
+    uint64_t idleWorkerCount = 0;
+    uint64_t unclaimedTaskCount = 0;
+
+    void workerFunction();
+};
+
+#endif
@@ -0,0 +1,166 @@
+// Shasta.
+#include "Tracing.hpp"
+using namespace shasta;
+using namespace Tracing;
+
+// Standard library.
+#include "fstream.hpp"
+#include "iostream.hpp"
+#include <iomanip>
+#include <memory>
+#include <mutex>
+#include "stdexcept.hpp"
+
+
+
+namespace shasta {
+    namespace Tracing {
+
+        // Must be in the same order as enum class Counter.
+        const char* counterNames[] = {
+            "alignmentCandidates",
+            "alignmentsRejectedError",
+            "alignmentsRejectedMinAlignedMarkerCount",
+            "alignmentsRejectedMinAlignedFraction",
+            "alignmentsRejectedMaxTrim",
+            "alignmentsRejectedMaxSkip",
+            "alignmentsRejectedMaxDrift",
+            "alignmentsRejectedContainment",
+            "alignmentsGood",
+            "lowHashBucketsUsed",
+            "lowHashBucketsSkippedTooSmall",
+            "lowHashBucketsSkippedTooLarge",
+            "lowHashBucketEntries",
+            "lowHashCollisions",
+            "lowHashCommonFeatures",
+            "edgeConsensusEdges",
+            "edgeConsensusMarkerIntervals",
+            "edgeConsensusSpoaCalls",
+            "edgeConsensusSpoaSequences",
+            "transitiveReductionBfsCount",
+            "transitiveReductionBfsVertexVisits",
+            "transitiveReductionBfsFound",
+        };
+        static_assert(sizeof(counterNames) / sizeof(counterNames[0]) == counterCount,
+            "Counter names are not in sync with enum class Counter.");
+
+        // The ThreadData of all threads that recorded anything.
+        // They are never destroyed, so they remain available
+        // after their thread exits.
+        class Registry {
+        public:
+            std::mutex mutex;
+            vector< std::unique_ptr<ThreadData> > threads;
+            const std::chrono::steady_clock::time_point startTime =
+                std::chrono::steady_clock::now();
+        };
+        Registry& registry();
+    }
+}
+
+thread_local ThreadData* shasta::Tracing::threadData = nullptr;
+
+
+
+Registry& shasta::Tracing::registry()
+{
+    static Registry* r = new Registry();
+    return *r;
+}
+
+
+
+ThreadData& shasta::Tracing::registerThread()
+{
+    Registry& r = registry();
+    std::lock_guard<std::mutex> lock(r.mutex);
+    r.threads.push_back(std::make_unique<ThreadData>());
+    threadData = r.threads.back().get();
+    threadData->threadId = r.threads.size() - 1;
+    return *threadData;
+}
+
+
+
+uint64_t shasta::Tracing::now()
+{
+    return uint64_t(std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now() - registry().startTime).count());
+}
+
+
+
+Tracing::Span::~Span()
+{
+    const uint64_t end = now();
+    ThreadData& data = getThreadData();
+    if(data.events.size() < maxEventCount) {
+        data.events.push_back({name, begin, end - begin});
+    } else {
+        ++data.droppedEventCount;
+    }
+}
+
+
+
+void shasta::Tracing::write()
+{
+    Registry& r = registry();
+    std::lock_guard<std::mutex> lock(r.mutex);
+
+    // Write the counters.
+    {
+        ofstream csv("Tracing.csv");
+        csv << "Counter,Total,";
+        for(const auto& thread: r.threads) {
+            csv << "Thread" << thread->threadId << ",";
+        }
+        csv << "\n";
+        for(uint64_t i=0; i<counterCount; i++) {
+            uint64_t total = 0;
+            for(const auto& thread: r.threads) {
+                total += thread->counters[i];
+            }
+            csv << counterNames[i] << "," << total << ",";
+            for(const auto& thread: r.threads) {
+                csv << thread->counters[i] << ",";
+            }
+            csv << "\n";
+        }
+        if(not csv) {
+            throw runtime_error("Error writing Tracing.csv");
+        }
+    }
+
+
+
+    // Write the spans in Chrome trace format.
+    // Times are in microseconds.
+    {
+        ofstream json("Tracing.json");
+        json << std::fixed << std::setprecision(3);
+        json << "{\n\"displayTimeUnit\": \"ms\",\n\"traceEvents\": [\n";
+        bool isFirst = true;
+        uint64_t droppedEventCount = 0;
+        for(const auto& thread: r.threads) {
+            droppedEventCount += thread->droppedEventCount;
+            for(const Event& event: thread->events) {
+                if(not isFirst) {
+                    json << ",\n";
+                }
+                isFirst = false;
+                json <<
+                    "{\"name\": \"" << event.name << "\", \"ph\": \"X\", \"pid\": 0, "
+                    "\"tid\": " << thread->threadId << ", "
+                    "\"ts\": " << double(event.begin) * 1.e-3 << ", "
+                    "\"dur\": " << double(event.duration) * 1.e-3 << "}";
+            }
+        }
+        json << "\n],\n\"otherData\": {\"droppedEventCount\": " << droppedEventCount << "}\n}\n";
+        if(not json) {
+            throw runtime_error("Error writing Tracing.json");
+        }
+    }
+
+    cout << "Wrote Tracing.csv and Tracing.json." << endl;
+}
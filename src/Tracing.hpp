@@ -0,0 +1,162 @@
+#ifndef SHASTA_TRACING_HPP
+#define SHASTA_TRACING_HPP
+
+/*******************************************************************************
+
+Low overhead counters and trace spans for the hot loops
+of the assembly, enabled at compile time.
+
+Tracing is only compiled in when SHASTA_TRACING is defined
+(Cmake option BUILD_WITH_TRACING, off by default).
+Otherwise, the SHASTA_TRACE_COUNT and SHASTA_TRACE_SPAN macros
+expand to nothing, and there is no run time cost.
+
+When tracing is compiled in:
+
+- SHASTA_TRACE_COUNT(counter, n) increments one of the counters
+  listed in Tracing::Counter by n. Each thread increments its own copy
+  of the counters, so no locking or atomic operations are needed.
+
+- SHASTA_TRACE_SPAN(name) records the begin and end time of the
+  enclosing scope, for the calling thread. The name must be a
+  string literal. To limit the memory used, at most maxEventCount
+  spans are recorded for each thread, and any additional
+  spans are counted but not recorded.
+
+At the end of an assembly, Tracing::write creates two files
+in the assembly directory:
+
+- Tracing.csv contains, for each counter,
+  its total and its value for each thread.
+- Tracing.json contains the spans, in Chrome trace format.
+  It can be viewed with chrome://tracing or https://ui.perfetto.dev.
+
+Tracing::write must only be called when no other threads are running.
+
+*******************************************************************************/
+
+// Standard library.
+#include <chrono>
+#include "cstdint.hpp"
+#include "string.hpp"
+#include "vector.hpp"
+
+namespace shasta {
+    namespace Tracing {
+
+        // The counters. Names are in Tracing.cpp and
+        // must be kept in sync.
+        enum class Counter {
+
+            // Assembler::computeAlignmentsThreadFunction.
+            alignmentCandidates,
+            alignmentsRejectedError,
+            alignmentsRejectedMinAlignedMarkerCount,
+            alignmentsRejectedMinAlignedFraction,
+            alignmentsRejectedMaxTrim,
+            alignmentsRejectedMaxSkip,
+            alignmentsRejectedMaxDrift,
+            alignmentsRejectedContainment,
+            alignmentsGood,
+
+            // LowHash1::scanBucketsThreadFunction.
+            lowHashBucketsUsed,
+            lowHashBucketsSkippedTooSmall,
+            lowHashBucketsSkippedTooLarge,
+            lowHashBucketEntries,
+            lowHashCollisions,
+            lowHashCommonFeatures,
+
+            // Assembler::computeMarkerGraphEdgeConsensusSequenceUsingSpoa.
+            edgeConsensusEdges,
+            edgeConsensusMarkerIntervals,
+            edgeConsensusSpoaCalls,
+            edgeConsensusSpoaSequences,
+
+            // Assembler::transitiveReductionBfs.
+            transitiveReductionBfsCount,
+            transitiveReductionBfsVertexVisits,
+            transitiveReductionBfsFound,
+
+            // Must be last.
+            count
+        };
+        const uint64_t counterCount = uint64_t(Counter::count);
+
+        // The maximum number of spans recorded for each thread.
+        const uint64_t maxEventCount = 1024 * 1024;
+
+        // A recorded span.
+        class Event {
+        public:
+            const char* name;
+            uint64_t begin; // Nanoseconds since the start of tracing.
+            uint64_t duration; // Nanoseconds.
+        };
+
+        // The data recorded by each thread.
+        class ThreadData {
+        public:
+            uint64_t threadId;
+            uint64_t counters[counterCount] = {};
+            vector<Event> events;
+            uint64_t droppedEventCount = 0;
+        };
+
+        // The ThreadData of the calling thread,
+        // or nullptr if the calling thread did not record anything yet.
+        extern thread_local ThreadData* threadData;
+
+        // Create and register the ThreadData of the calling thread.
+        ThreadData& registerThread();
+
+        inline ThreadData& getThreadData()
+        {
+            return threadData ? *threadData : registerThread();
+        }
+
+        inline void count(Counter counter, uint64_t n)
+        {
+            getThreadData().counters[uint64_t(counter)] += n;
+        }
+
+        // Nanoseconds since the start of tracing.
+        uint64_t now();
+
+        // Record the enclosing scope as a span.
+        class Span {
+        public:
+            Span(const char* name) : name(name), begin(now()) {}
+            ~Span();
+            Span(const Span&) = delete;
+            Span& operator=(const Span&) = delete;
+        private:
+            const char* name;
+            uint64_t begin;
+        };
+
+        // Write Tracing.csv and Tracing.json in the current directory.
+        void write();
+    }
+}
+
+
+
+#ifdef SHASTA_TRACING
+
+#define SHASTA_TRACE_COUNT(counter, n) \
+    shasta::Tracing::count(shasta::Tracing::Counter::counter, uint64_t(n))
+
+#define SHASTA_TRACE_SPAN_NAME_(line) shastaTraceSpan ## line
+#define SHASTA_TRACE_SPAN_NAME(line) SHASTA_TRACE_SPAN_NAME_(line)
+#define SHASTA_TRACE_SPAN(name) \
+    const shasta::Tracing::Span SHASTA_TRACE_SPAN_NAME(__LINE__)(name)
+
+#else
+
+#define SHASTA_TRACE_COUNT(counter, n)
+#define SHASTA_TRACE_SPAN(name)
+
+#endif
+
+#endif
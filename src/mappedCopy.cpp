@@ -1,13 +1,20 @@
 
 // shasta.
 #include "mappedCopy.hpp"
+#include "filesystem.hpp"
+#include "ThreadPool.hpp"
 #include "timestamp.hpp"
 
 // Standard library.
 #include "algorithm.hpp"
+#include <atomic>
 #include <chrono>
 #include "iostream.hpp"
+#include <mutex>
 #include "stdexcept.hpp"
+#include <thread>
+#include "utility.hpp"
+#include "vector.hpp"
 
 // Linux.
 #include <errno.h>
@@ -16,6 +23,7 @@
 #include <sys/mman.h>
 #include <sys/types.h>
 #include <sys/stat.h>
+#include <unistd.h>
 
 // This can be used to copy a file to the huge page filesystem.
 // The regular cp command does not work (but it works to copy
@@ -30,7 +38,7 @@ void shasta::mappedCopy(
     // Open the input file.
     const int inputFileDescriptor = ::open(inputPath.c_str(), O_RDONLY);
     if(inputFileDescriptor == -1) {
-        throw runtime_error("Error opening " + inputPath);
+        throw runtime_error("Error opening " + inputPath + ": " + strerror(errno));
     }
 
     // Let the system know that we will be accessing this file sequentially.
@@ -44,8 +52,9 @@ void shasta::mappedCopy(
         O_CREAT | O_TRUNC | O_RDWR,
         S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH);
     if(outputFileDescriptor == -1) {
+        const string message = "Error opening " + outputPath + ": " + strerror(errno);
         ::close(inputFileDescriptor);
-        throw runtime_error("Error opening " + outputPath);
+        throw runtime_error(message);
     }
 
     // Get the size of the input file.
@@ -103,3 +112,215 @@ void shasta::mappedCopy(
     const double tTotal = 1.e-9 * double((std::chrono::duration_cast<std::chrono::nanoseconds>(tEnd - tBegin)).count());
     cout << timestamp << "Copied " << n << " bytes in " << tTotal << " s, " << double(n)/tTotal << " bytes/s." << endl;
 }
+
+
+
+// Copy all regular files in a directory to another directory.
+void shasta::mappedCopyDirectory(
+    const string& inputDirectory,
+    const string& outputDirectory,
+    uint64_t threadCount)
+{
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
+    const auto tBegin = std::chrono::steady_clock::now();
+
+    vector<string> fileNames;
+    uint64_t totalSize = 0;
+    for(const string& path: filesystem::directoryContents(inputDirectory)) {
+        if(filesystem::isRegularFile(path)) {
+            fileNames.push_back(path.substr(path.find_last_of('/') + 1));
+            totalSize += filesystem::fileSize(path);
+        }
+    }
+    cout << timestamp << "Copying " << fileNames.size() << " files (" << totalSize <<
+        " bytes) from " << inputDirectory << " to " << outputDirectory <<
+        " using " << threadCount << " threads." << endl;
+
+    mappedCopyFiles(inputDirectory, outputDirectory, fileNames, threadCount);
+
+    const auto tEnd = std::chrono::steady_clock::now();
+    const double tTotal = 1.e-9 * double((std::chrono::duration_cast<std::chrono::nanoseconds>(tEnd - tBegin)).count());
+    cout << timestamp << "Copied " << totalSize << " bytes in " << tTotal << " s, " <<
+        double(totalSize)/tTotal << " bytes/s." << endl;
+}
+
+
+
+void shasta::mappedCopyFiles(
+    const string& inputDirectory,
+    const string& outputDirectory,
+    const vector<string>& fileNames,
+    uint64_t threadCount,
+    const MappedCopyChunkFunction& chunkFunction)
+{
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
+
+    // The input and output mappings of a file.
+    // They are unmapped by the destructor, so they
+    // are also released if an exception occurs.
+    class File {
+    public:
+        string inputPath;
+        string outputPath;
+        uint64_t size = 0;
+        const char* input = 0;
+        char* output = 0;
+
+        File() {}
+        File(const File&) = delete;
+        File& operator=(const File&) = delete;
+        ~File()
+        {
+            if(input) {
+                ::munmap(const_cast<char*>(input), size);
+            }
+            if(output) {
+                ::munmap(output, size);
+            }
+        }
+    };
+    vector<File> files(fileNames.size());
+    uint64_t totalSize = 0;
+
+
+
+    // Memory map all input and output files.
+    // The output files are created with their final size,
+    // which must be a multiple of page size on the target filesystem.
+    for(uint64_t fileId=0; fileId<files.size(); fileId++) {
+        File& file = files[fileId];
+        file.inputPath = inputDirectory + "/" + fileNames[fileId];
+        file.outputPath = outputDirectory + "/" + fileNames[fileId];
+
+        const int inputFileDescriptor = ::open(file.inputPath.c_str(), O_RDONLY);
+        if(inputFileDescriptor == -1) {
+            throw runtime_error("Error opening " + file.inputPath + ": " + strerror(errno));
+        }
+        struct ::stat inputInfo;
+        if(::fstat(inputFileDescriptor, &inputInfo) == -1) {
+            const string message = "Error getting the size of " + file.inputPath + ": " + strerror(errno);
+            ::close(inputFileDescriptor);
+            throw runtime_error(message);
+        }
+        file.size = uint64_t(inputInfo.st_size);
+        totalSize += file.size;
+
+        const int outputFileDescriptor = ::open(file.outputPath.c_str(),
+            O_CREAT | O_TRUNC | O_RDWR,
+            S_IRUSR | S_IWUSR | S_IRGRP | S_IROTH);
+        if(outputFileDescriptor == -1) {
+            const string message = "Error opening " + file.outputPath + ": " + strerror(errno);
+            ::close(inputFileDescriptor);
+            throw runtime_error(message);
+        }
+        if(::ftruncate(outputFileDescriptor, off_t(file.size)) == -1) {
+            ::close(inputFileDescriptor);
+            ::close(outputFileDescriptor);
+            throw runtime_error("Error setting file size for " + file.outputPath +
+                ". Must be a multiple of page size on the target filesystem.");
+        }
+        if(file.size == 0) {
+            ::close(inputFileDescriptor);
+            ::close(outputFileDescriptor);
+            continue;
+        }
+
+#ifdef __linux__
+        posix_fadvise(inputFileDescriptor, 0, 0, POSIX_FADV_SEQUENTIAL);
+#endif
+        void* inputPointer = ::mmap(0, file.size, PROT_READ, MAP_SHARED, inputFileDescriptor, 0);
+        ::close(inputFileDescriptor);
+        if(inputPointer == reinterpret_cast<void*>(-1LL)) {
+            const string message = "Error mapping " + file.inputPath + " to memory: " + strerror(errno);
+            ::close(outputFileDescriptor);
+            throw runtime_error(message);
+        }
+        file.input = static_cast<const char*>(inputPointer);
+
+        void* outputPointer = ::mmap(0, file.size, PROT_READ | PROT_WRITE, MAP_SHARED, outputFileDescriptor, 0);
+        ::close(outputFileDescriptor);
+        if(outputPointer == reinterpret_cast<void*>(-1LL)) {
+            throw runtime_error("Error mapping " + file.outputPath + " to memory: " +
+                strerror(errno));
+        }
+        file.output = static_cast<char*>(outputPointer);
+    }
+
+
+
+    // Divide the files into page-aligned chunks.
+    // Largest files first, so their chunks are spread over all threads
+    // and the small files fill in at the end.
+    vector< pair<uint64_t, uint64_t> > chunks;    // (fileId, chunkId)
+    vector<uint64_t> fileIds(files.size());
+    for(uint64_t fileId=0; fileId<files.size(); fileId++) {
+        fileIds[fileId] = fileId;
+    }
+    sort(fileIds.begin(), fileIds.end(),
+        [&files](uint64_t x, uint64_t y) {return files[x].size > files[y].size;});
+    for(const uint64_t fileId: fileIds) {
+        const uint64_t chunkCount = (files[fileId].size + mappedCopyChunkSize - 1) / mappedCopyChunkSize;
+        for(uint64_t chunkId=0; chunkId<chunkCount; chunkId++) {
+            chunks.push_back(make_pair(fileId, chunkId));
+        }
+    }
+
+
+
+    // Copy the chunks in parallel, writing progress
+    // each time another 10% of the bytes have been copied.
+    std::atomic<uint64_t> nextChunk(0);
+    std::atomic<uint64_t> copiedSize(0);
+    std::mutex progressMutex;
+    ThreadPool::instance().run([&](uint64_t) {
+        while(true) {
+            const uint64_t i = nextChunk++;
+            if(i >= chunks.size()) {
+                break;
+            }
+            const uint64_t fileId = chunks[i].first;
+            const uint64_t chunkId = chunks[i].second;
+            const File& file = files[fileId];
+            const uint64_t begin = chunkId * mappedCopyChunkSize;
+            const uint64_t end = min(file.size, begin + mappedCopyChunkSize);
+            copy(file.input + begin, file.input + end, file.output + begin);
+            if(chunkFunction) {
+                chunkFunction(fileId, chunkId, file.output + begin, end - begin);
+            }
+
+            const uint64_t oldCopiedSize = copiedSize.fetch_add(end - begin);
+            const uint64_t newCopiedSize = oldCopiedSize + (end - begin);
+            if((10 * newCopiedSize) / totalSize != (10 * oldCopiedSize) / totalSize) {
+                std::lock_guard<std::mutex> lock(progressMutex);
+                cout << timestamp << "Copied " << newCopiedSize << " of " <<
+                    totalSize << " bytes." << endl;
+            }
+        }
+    }, threadCount);
+
+
+
+    // Unmap, checking for errors.
+    for(File& file: files) {
+        if(file.input) {
+            const char* input = file.input;
+            file.input = 0;
+            if(::munmap(const_cast<char*>(input), file.size) == -1) {
+                throw runtime_error("Error unmapping " + file.inputPath +
+                    " from memory: " + strerror(errno));
+            }
+        }
+        if(file.output) {
+            char* output = file.output;
+            file.output = 0;
+            if(::munmap(output, file.size) == -1) {
+                throw runtime_error("Error unmapping " + file.outputPath +
+                    " from memory: " + strerror(errno));
+            }
+        }
+    }
+}
@@ -1,7 +1,10 @@
 #ifndef SHASTA_MAPPED_COPY_HPP
 #define SHASTA_MAPPED_COPY_HPP
 
+#include "cstdint.hpp"
+#include <functional>
 #include "string.hpp"
+#include "vector.hpp"
 
 namespace shasta {
 
@@ -11,6 +14,39 @@ namespace shasta {
     void mappedCopy(
         const string& inputPath,
         const string& outputPath);
+
+    // Copy all regular files in a directory to another directory
+    // (typically on the huge page filesystem), which must exist.
+    // This uses mappedCopyFiles.
+    // If threadCount is 0, one thread per virtual processor is used.
+    void mappedCopyDirectory(
+        const string& inputDirectory,
+        const string& outputDirectory,
+        uint64_t threadCount);
+
+    // Copy the named files from a directory to another directory, which must exist.
+    // Input and output files are memory mapped, so this works
+    // in both directions for the huge page filesystem.
+    // Files are copied concurrently, and large files are divided into
+    // page-aligned chunks of mappedCopyChunkSize bytes, which are also
+    // copied concurrently, largest files first. Progress is written to cout.
+    // If chunkFunction is not empty, it is called for each chunk after it is copied,
+    // with the index of the file in fileNames, the index of the chunk in the file,
+    // and the copied bytes. It is called concurrently from multiple threads.
+    // If threadCount is 0, one thread per virtual processor is used.
+    using MappedCopyChunkFunction =
+        std::function<void(uint64_t fileId, uint64_t chunkId, const char* begin, uint64_t size)>;
+    void mappedCopyFiles(
+        const string& inputDirectory,
+        const string& outputDirectory,
+        const vector<string>& fileNames,
+        uint64_t threadCount,
+        const MappedCopyChunkFunction& chunkFunction = MappedCopyChunkFunction());
+
+    // The size of the chunks copied by each thread,
+    // also used by BinaryDataSnapshot.
+    // A multiple of all supported page sizes.
+    const uint64_t mappedCopyChunkSize = 64 * 1024 * 1024;
 }
 
 #endif
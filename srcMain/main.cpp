@@ -7,9 +7,15 @@
 // Shasta.
 #include "Assembler.hpp"
 #include "AssemblerOptions.hpp"
+#include "AssemblyCheckpoints.hpp"
+#include "AssemblyPlan.hpp"
+#include "BinaryDataSnapshot.hpp"
 #include "buildId.hpp"
 #include "filesystem.hpp"
+#include "Numa.hpp"
+#include "PerformanceProfile.hpp"
 #include "timestamp.hpp"
+#include "Tracing.hpp"
 #include "platformDependent.hpp"
 
 namespace shasta {
@@ -20,7 +26,8 @@ namespace shasta {
         void assemble(
             Assembler&,
             const AssemblerOptions&,
-            vector<string> inputNames);
+            vector<string> inputNames,
+            AssemblyCheckpoints&);
 
         void createMarkerGraphVertices(
             Assembler&,
@@ -35,11 +42,14 @@ namespace shasta {
             );
 
         void setupHugePages();
+        void checkTransparentHugePages();
         void segmentFaultHandler(int);
 
         // Functions that implement --command keywords
         void assemble(const AssemblerOptions&);
+        void plan(const AssemblerOptions&);
         void saveBinaryData(const AssemblerOptions&);
+        void restoreBinaryData(const AssemblerOptions&);
         void cleanupBinaryData(const AssemblerOptions&);
         void createBashCompletionScript(const AssemblerOptions&);
 
@@ -127,12 +137,18 @@ void shasta::main::main(int argumentCount, const char** arguments)
     if(assemblerOptions.commandLineOnlyOptions.command == "assemble") {
         assemble(assemblerOptions);
         return;
+    } else if(assemblerOptions.commandLineOnlyOptions.command == "plan") {
+        plan(assemblerOptions);
+        return;
     } else if(assemblerOptions.commandLineOnlyOptions.command == "cleanupBinaryData") {
         cleanupBinaryData(assemblerOptions);
         return;
     } else if(assemblerOptions.commandLineOnlyOptions.command == "saveBinaryData") {
         saveBinaryData(assemblerOptions);
         return;
+    } else if(assemblerOptions.commandLineOnlyOptions.command == "restoreBinaryData") {
+        restoreBinaryData(assemblerOptions);
+        return;
     } else if(assemblerOptions.commandLineOnlyOptions.command == "explore") {
 #ifdef SHASTA_HTTP_SERVER
         explore(assemblerOptions);
@@ -147,7 +163,7 @@ void shasta::main::main(int argumentCount, const char** arguments)
 
     // If getting here, the requested command is invalid.
     throw runtime_error("Invalid command " + assemblerOptions.commandLineOnlyOptions.command +
-        ". Valid commands are: assemble, saveBinaryData, cleanupBinaryData, createBashCompletionScript.");
+        ". Valid commands are: assemble, plan, saveBinaryData, restoreBinaryData, cleanupBinaryData, createBashCompletionScript.");
 
 }
 
@@ -235,41 +251,85 @@ void shasta::main::assemble(
 
 
 
-    // Create the run output directory. If it exists and is not empty then stop.
-    bool exists = filesystem::exists(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
-    bool isDir = filesystem::isDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
-    if (exists) {
-        if (!isDir) {
-            throw runtime_error(
-                assemblerOptions.commandLineOnlyOptions.assemblyDirectory +
-                " already exists and is not a directory.\n"
-                "Use --assemblyDirectory to specify a different assembly directory."
-            );
-        }
-        bool isEmpty = filesystem::directoryContents(assemblerOptions.commandLineOnlyOptions.assemblyDirectory).empty();
-        if (!isEmpty) {
-            throw runtime_error(
-                "Assembly directory " +
-                assemblerOptions.commandLineOnlyOptions.assemblyDirectory +
-                " exists and is not empty.\n"
-                "Empty it for reuse or use --assemblyDirectory to specify a different assembly directory.");
+    // With --resume, check if there is an assembly to resume.
+    // This requires the binary data of the previous run,
+    // so only --memoryMode filesystem is allowed.
+    const bool resume = assemblerOptions.commandLineOnlyOptions.resume;
+    if(resume and assemblerOptions.commandLineOnlyOptions.memoryMode != "filesystem") {
+        throw runtime_error("--resume requires --memoryMode filesystem.");
+    }
+    const bool resumeExisting = resume and
+        filesystem::isDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory) and
+        filesystem::exists(assemblerOptions.commandLineOnlyOptions.assemblyDirectory + "/Data/Info");
+    if(resume and not resumeExisting) {
+        cout << "There is no assembly to resume in " <<
+            assemblerOptions.commandLineOnlyOptions.assemblyDirectory <<
+            ", starting a new assembly." << endl;
+    }
+
+    size_t pageSize = 0;
+    string dataDirectory;
+    if(resumeExisting) {
+
+        // Reuse the run directory and its Data directory as they are.
+        // With --memoryBacking 4K or 2M, the Data directory
+        // is still mounted, otherwise Data/Info would not exist.
+        filesystem::changeDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
+        dataDirectory = "Data/";
+        if(assemblerOptions.commandLineOnlyOptions.memoryBacking == "2M") {
+            setupHugePages();
+            pageSize = 2 * 1024 * 1024;
+        } else {
+            pageSize = 4096;
         }
+
     } else {
-        filesystem::createDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
-    }
-    // Make the output directory current.
-    filesystem::changeDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
+
+        // Create the run output directory. If it exists and is not empty then stop.
+        bool exists = filesystem::exists(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
+        bool isDir = filesystem::isDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
+        if (exists) {
+            if (!isDir) {
+                throw runtime_error(
+                    assemblerOptions.commandLineOnlyOptions.assemblyDirectory +
+                    " already exists and is not a directory.\n"
+                    "Use --assemblyDirectory to specify a different assembly directory."
+                );
+            }
+            bool isEmpty = filesystem::directoryContents(assemblerOptions.commandLineOnlyOptions.assemblyDirectory).empty();
+            if (!isEmpty) {
+                throw runtime_error(
+                    "Assembly directory " +
+                    assemblerOptions.commandLineOnlyOptions.assemblyDirectory +
+                    " exists and is not empty.\n"
+                    "Empty it for reuse or use --assemblyDirectory to specify a different assembly directory.");
+            }
+        } else {
+            filesystem::createDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
+        }
+        // Make the output directory current.
+        filesystem::changeDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
 
 
 
-    // Set up the run directory as required by the memoryMode and memoryBacking options.
-    size_t pageSize = 0;
-    string dataDirectory;
-    setupRunDirectory(
-        assemblerOptions.commandLineOnlyOptions.memoryMode,
-        assemblerOptions.commandLineOnlyOptions.memoryBacking,
-        pageSize,
-        dataDirectory);
+        // Set up the run directory as required by the memoryMode and memoryBacking options.
+        setupRunDirectory(
+            assemblerOptions.commandLineOnlyOptions.memoryMode,
+            assemblerOptions.commandLineOnlyOptions.memoryBacking,
+            pageSize,
+            dataDirectory);
+    }
+
+    // Find out which assembly phases must run.
+    AssemblyCheckpoints checkpoints(assemblerOptions, inputFileAbsolutePaths, resumeExisting);
+    if(checkpoints.allPhasesCompleted()) {
+        cout << "Nothing done." << endl;
+        return;
+    }
+
+    // Set the NUMA policy before any threads are started
+    // or any large memory allocations take place.
+    Numa::setPolicy(Numa::policyFromString(assemblerOptions.commandLineOnlyOptions.numaPolicy));
 
 
 
@@ -287,6 +347,7 @@ void shasta::main::assemble(
 #ifdef __linux__
     cout << "memoryMode = " << assemblerOptions.commandLineOnlyOptions.memoryMode << endl;
     cout << "memoryBacking = " << assemblerOptions.commandLineOnlyOptions.memoryBacking << endl;
+    cout << "numaPolicy = " << assemblerOptions.commandLineOnlyOptions.numaPolicy << endl;
     cout << "threadCount = " << assemblerOptions.commandLineOnlyOptions.threadCount << endl;
 #endif
     cout << endl;
@@ -301,12 +362,14 @@ void shasta::main::assemble(
     // Initial disclaimer message.
 #ifdef __linux
     if(assemblerOptions.commandLineOnlyOptions.memoryBacking != "2M" &&
+        assemblerOptions.commandLineOnlyOptions.memoryBacking != "THP" &&
         assemblerOptions.commandLineOnlyOptions.memoryMode != "filesystem") {
         cout << "This run uses options \"--memoryBacking " << assemblerOptions.commandLineOnlyOptions.memoryBacking <<
             " --memoryMode " << assemblerOptions.commandLineOnlyOptions.memoryMode << "\".\n"
             "This could result in performance degradation.\n"
             "For full performance, use \"--memoryBacking 2M --memoryMode filesystem\"\n"
-            "(root privilege via sudo required).\n"
+            "(root privilege via sudo required), or, if root privilege is not available,\n"
+            "\"--memoryBacking THP --memoryMode anonymous\".\n"
             "Therefore the results of this run should not be used\n"
             "for benchmarking purposes." << endl;
     }
@@ -318,20 +381,23 @@ void shasta::main::assemble(
 #endif
 
     // Create the Assembler.
-    Assembler assembler(dataDirectory, true, pageSize);
+    // If the reads phase does not have to run, access the existing reads.
+    Assembler assembler(dataDirectory, checkpoints.mustRun("reads"), pageSize);
 
     // Run the assembly.
-    assemble(assembler, assemblerOptions, inputFileAbsolutePaths);
+    assemble(assembler, assemblerOptions, inputFileAbsolutePaths, checkpoints);
 
     // Final disclaimer message.
 #ifdef __linux
     if(assemblerOptions.commandLineOnlyOptions.memoryBacking != "2M" &&
+        assemblerOptions.commandLineOnlyOptions.memoryBacking != "THP" &&
         assemblerOptions.commandLineOnlyOptions.memoryMode != "filesystem") {
         cout << "This run used options \"--memoryBacking " << assemblerOptions.commandLineOnlyOptions.memoryBacking <<
             " --memoryMode " << assemblerOptions.commandLineOnlyOptions.memoryMode << "\".\n"
             "This could have resulted in performance degradation.\n"
             "For full performance, use \"--memoryBacking 2M --memoryMode filesystem\"\n"
-            "(root privilege via sudo required).\n"
+            "(root privilege via sudo required), or, if root privilege is not available,\n"
+            "\"--memoryBacking THP --memoryMode anonymous\".\n"
             "Therefore the results of this run should not be used\n"
             "for benchmarking purposes." << endl;
     }
@@ -384,9 +450,22 @@ void shasta::main::setupRunDirectory(
             setupHugePages();
             pageSize = 2 * 1024 * 1024;
 
+        } else if(memoryBacking == "THP") {
+
+            // Anonymous memory aligned at 2MB boundaries and marked
+            // with MADV_HUGEPAGE, so the kernel can back it with transparent huge pages.
+            // This does not require root privilege, but depends on
+            // the transparent huge page setting of the system
+            // (/sys/kernel/mm/transparent_hugepage/enabled must be
+            // "always" or "madvise").
+            MemoryMapped::setTransparentHugePages(true);
+            dataDirectory = "";
+            pageSize = 2 * 1024 * 1024;
+            checkTransparentHugePages();
+
         } else {
             throw runtime_error("Invalid value specified for --memoryBacking: " + memoryBacking +
-                "\nValid values are: disk, 4K, 2M.");
+                "\nValid values are: disk, 4K, 2M, THP.");
         }
 
     } else if(memoryMode == "filesystem") {
@@ -437,9 +516,15 @@ void shasta::main::setupRunDirectory(
                     " running command: " + command);
             }
 
+        } else if(memoryBacking == "THP") {
+
+            // Transparent huge pages cannot be used for files.
+            throw runtime_error("\"--memoryMode filesystem\" is not allowed in combination "
+                "with \"--memoryBacking THP\". Use \"--memoryMode anonymous --memoryBacking THP\".");
+
         } else {
             throw runtime_error("Invalid value specified for --memoryBacking: " + memoryBacking +
-                "\nValid values are: disk, 4K, 2M.");
+                "\nValid values are: disk, 4K, 2M, THP.");
         }
 
     } else {
@@ -458,7 +543,8 @@ void shasta::main::setupRunDirectory(
 void shasta::main::assemble(
     Assembler& assembler,
     const AssemblerOptions& assemblerOptions,
-    vector<string> inputFileNames)
+    vector<string> inputFileNames,
+    AssemblyCheckpoints& checkpoints)
 {
     const auto steadyClock0 = std::chrono::steady_clock::now();
     const auto userClock0 = boost::chrono::process_user_cpu_clock::now();
@@ -471,6 +557,14 @@ void shasta::main::assemble(
     }
     cout << "This assembly will use " << threadCount << " threads." << endl;
 
+    // On machines with more than one NUMA node, count local and remote
+    // memory accesses for each phase, if the hardware counters are available.
+    Numa::AccessCounters numaAccessCounters;
+
+    // Record resource usage for each assembly step.
+    // This is written to AssemblySummary.html and AssemblySummary.json.
+    PerformanceProfile& performanceProfile = PerformanceProfile::instance();
+
     // Set up the consensus caller.
     cout << "Setting up consensus caller " <<
         assemblerOptions.assemblyOptions.consensusCaller << endl;
@@ -478,339 +572,387 @@ void shasta::main::assemble(
 
 
 
-    // Add reads from the specified input files.
-    cout << timestamp << "Begin loading reads from " << inputFileNames.size() << " files." << endl;
-    const auto t0 = steady_clock::now();
-    for(const string& inputFileName: inputFileNames) {
-        assembler.addReads(
-            inputFileName,
-            assemblerOptions.readsOptions.minReadLength,
-            assemblerOptions.readsOptions.noCache,
-            threadCount);
-    }
+    // Phase reads.
+    if(checkpoints.mustRun("reads")) {
+        performanceProfile.begin("loading reads");
 
-    if (assembler.getReads().readCount() == 0) {
-        throw runtime_error("There are no input reads.");
-    }
+        // Add reads from the specified input files.
+        cout << timestamp << "Begin loading reads from " << inputFileNames.size() << " files." << endl;
+        const auto t0 = steady_clock::now();
+        for(const string& inputFileName: inputFileNames) {
+            assembler.addReads(
+                inputFileName,
+                assemblerOptions.readsOptions.minReadLength,
+                assemblerOptions.readsOptions.noCache,
+                threadCount);
+        }
+
+        if (assembler.getReads().readCount() == 0) {
+            throw runtime_error("There are no input reads.");
+        }
     
 
 
-    // If requested, increase the read length cutoff
-    // to reduce coverage to the specified amount.
-    if (assemblerOptions.readsOptions.desiredCoverage > 0) {
-        // Write out the read length histogram using provided minReadLength.
-        assembler.histogramReadLength("ExtendedReadLengthHistogram.csv");
+        // If requested, increase the read length cutoff
+        // to reduce coverage to the specified amount.
+        if (assemblerOptions.readsOptions.desiredCoverage > 0) {
+            // Write out the read length histogram using provided minReadLength.
+            assembler.histogramReadLength("ExtendedReadLengthHistogram.csv");
 
-        const auto newMinReadLength = assembler.adjustCoverageAndGetNewMinReadLength(
-            assemblerOptions.readsOptions.desiredCoverage);
+            const auto newMinReadLength = assembler.adjustCoverageAndGetNewMinReadLength(
+                assemblerOptions.readsOptions.desiredCoverage);
 
-        const auto oldMinReadLength = uint64_t(assemblerOptions.readsOptions.minReadLength);
+            const auto oldMinReadLength = uint64_t(assemblerOptions.readsOptions.minReadLength);
 
-        if (newMinReadLength == 0ULL) {
-            throw runtime_error(
-                "With Reads.minReadLength " +
-                to_string(assemblerOptions.readsOptions.minReadLength) +
-                ", total available coverage is " +
-                to_string(assembler.getReads().getTotalBaseCount()) +
-                ", less than desired coverage " +
-                to_string(assemblerOptions.readsOptions.desiredCoverage) +
-                ". Try reducing Reads.minReadLength if appropriate or get more coverage."
-            ); 
-        }
+            if (newMinReadLength == 0ULL) {
+                throw runtime_error(
+                    "With Reads.minReadLength " +
+                    to_string(assemblerOptions.readsOptions.minReadLength) +
+                    ", total available coverage is " +
+                    to_string(assembler.getReads().getTotalBaseCount()) +
+                    ", less than desired coverage " +
+                    to_string(assemblerOptions.readsOptions.desiredCoverage) +
+                    ". Try reducing Reads.minReadLength if appropriate or get more coverage."
+                ); 
+            }
 
-        // Adjusting coverage should only ever reduce coverage if necessary.
-        SHASTA_ASSERT(newMinReadLength >= oldMinReadLength);
-    }
-    
-    assembler.histogramReadLength("ReadLengthHistogram.csv");
-
-    const auto t1 = steady_clock::now();
-    cout << timestamp << "Done loading reads from " << inputFileNames.size() << " files." << endl;
-    cout << "Read loading took " << seconds(t1-t0) << "s." << endl;
-
-
-
-    // Select the k-mers that will be used as markers.
-    switch(assemblerOptions.kmersOptions.generationMethod) {
-    case 0:
-        assembler.randomlySelectKmers(
-            assemblerOptions.kmersOptions.k,
-            assemblerOptions.kmersOptions.probability, 231);
-        break;
-
-    case 1:
-        // Randomly select the k-mers to be used as markers, but
-        // excluding those that are globally overenriched in the input reads,
-        // as measured by total frequency in all reads.
-        assembler.selectKmersBasedOnFrequency(
-            assemblerOptions.kmersOptions.k,
-            assemblerOptions.kmersOptions.probability, 231,
-            assemblerOptions.kmersOptions.enrichmentThreshold, threadCount);
-        break;
-
-    case 2:
-        // Randomly select the k-mers to be used as markers, but
-        // excluding those that are overenriched even in a single oriented read.
-        assembler.selectKmers2(
-            assemblerOptions.kmersOptions.k,
-            assemblerOptions.kmersOptions.probability, 231,
-            assemblerOptions.kmersOptions.enrichmentThreshold, threadCount);
-        break;
-
-    case 3:
-        // Read the k-mers to be used as markers from a file.
-        if(assemblerOptions.kmersOptions.file.empty() or
-            assemblerOptions.kmersOptions.file[0] != '/') {
-            throw runtime_error("Option --Kmers.file must specify an absolute path. "
-                "A relative path is not accepted.");
+            // Adjusting coverage should only ever reduce coverage if necessary.
+            SHASTA_ASSERT(newMinReadLength >= oldMinReadLength);
         }
-        assembler.readKmersFromFile(
-            assemblerOptions.kmersOptions.k,
-            assemblerOptions.kmersOptions.file);
-        break;
-
-    default:
-        throw runtime_error("Invalid --Kmers generationMethod. "
-            "Specify a value between 0 and 3, inclusive.");
+    
+        assembler.histogramReadLength("ReadLengthHistogram.csv");
+
+        const auto t1 = steady_clock::now();
+        cout << timestamp << "Done loading reads from " << inputFileNames.size() << " files." << endl;
+        cout << "Read loading took " << seconds(t1-t0) << "s." << endl;
+        assembler.distributeNumaMemory("reads");
+        numaAccessCounters.writePhase("loading reads");
+        performanceProfile.end();
+        checkpoints.markComplete("reads");
+    } else {
+        // The reads were accessed when creating the Assembler.
+        // Recompute the read statistics.
+        assembler.histogramReadLength("ReadLengthHistogram.csv");
     }
 
-#if 0
-    if(not assemblerOptions.kmersOptions.file.empty() or
-        assemblerOptions.kmersOptions.file[0] != '/') {
 
-        // A file name was specified. Read the k-mers to be used as markers from there.
 
-        // This must be an absolute path.
-        if(assemblerOptions.kmersOptions.file[0] != '/') {
-            throw runtime_error("Option --Kmers.file must specify an absolute path. "
-                "A relative path is not accepted.");
+    // Phase markers.
+    if(checkpoints.mustRun("markers")) {
+        performanceProfile.begin("finding markers");
+
+        // Select the k-mers that will be used as markers.
+        switch(assemblerOptions.kmersOptions.generationMethod) {
+        case 0:
+            assembler.randomlySelectKmers(
+                assemblerOptions.kmersOptions.k,
+                assemblerOptions.kmersOptions.probability, 231);
+            break;
+
+        case 1:
+            // Randomly select the k-mers to be used as markers, but
+            // excluding those that are globally overenriched in the input reads,
+            // as measured by total frequency in all reads.
+            assembler.selectKmersBasedOnFrequency(
+                assemblerOptions.kmersOptions.k,
+                assemblerOptions.kmersOptions.probability, 231,
+                assemblerOptions.kmersOptions.enrichmentThreshold, threadCount);
+            break;
+
+        case 2:
+            // Randomly select the k-mers to be used as markers, but
+            // excluding those that are overenriched even in a single oriented read.
+            assembler.selectKmers2(
+                assemblerOptions.kmersOptions.k,
+                assemblerOptions.kmersOptions.probability, 231,
+                assemblerOptions.kmersOptions.enrichmentThreshold, threadCount);
+            break;
+
+        case 3:
+            // Read the k-mers to be used as markers from a file.
+            if(assemblerOptions.kmersOptions.file.empty() or
+                assemblerOptions.kmersOptions.file[0] != '/') {
+                throw runtime_error("Option --Kmers.file must specify an absolute path. "
+                    "A relative path is not accepted.");
+            }
+            assembler.readKmersFromFile(
+                assemblerOptions.kmersOptions.k,
+                assemblerOptions.kmersOptions.file);
+            break;
+
+        default:
+            throw runtime_error("Invalid --Kmers generationMethod. "
+                "Specify a value between 0 and 3, inclusive.");
         }
 
-        // Read the k-mers.
-        assembler.readKmersFromFile(
-            assemblerOptions.kmersOptions.k,
-            assemblerOptions.kmersOptions.file);
-
+    #if 0
+        if(not assemblerOptions.kmersOptions.file.empty() or
+            assemblerOptions.kmersOptions.file[0] != '/') {
 
-    } else if(assemblerOptions.kmersOptions.suppressHighFrequencyMarkers) {
+            // A file name was specified. Read the k-mers to be used as markers from there.
 
-        // Randomly select the k-mers to be used as markers, but
-        // excluding those that are highly frequent in the input reads.
-        assembler.selectKmersBasedOnFrequency(
-            assemblerOptions.kmersOptions.k,
-            assemblerOptions.kmersOptions.probability, 231,
-            assemblerOptions.kmersOptions.enrichmentThreshold, threadCount);
-    } else {
+            // This must be an absolute path.
+            if(assemblerOptions.kmersOptions.file[0] != '/') {
+                throw runtime_error("Option --Kmers.file must specify an absolute path. "
+                    "A relative path is not accepted.");
+            }
 
-        // Randomly select the k-mers to be used as markers.
-        assembler.randomlySelectKmers(
-            assemblerOptions.kmersOptions.k,
-            assemblerOptions.kmersOptions.probability, 231);
-    }
-#endif
+            // Read the k-mers.
+            assembler.readKmersFromFile(
+                assemblerOptions.kmersOptions.k,
+                assemblerOptions.kmersOptions.file);
 
 
-    // Find the markers in the reads.
-    assembler.findMarkers(0);
-
-    if(!assemblerOptions.readsOptions.palindromicReads.skipFlagging) {
-        // Flag palindromic reads.
-        // These will be excluded from further processing.
-        assembler.flagPalindromicReads(
-            assemblerOptions.readsOptions.palindromicReads.maxSkip,
-            assemblerOptions.readsOptions.palindromicReads.maxDrift,
-            assemblerOptions.readsOptions.palindromicReads.maxMarkerFrequency,
-            assemblerOptions.readsOptions.palindromicReads.alignedFractionThreshold,
-            assemblerOptions.readsOptions.palindromicReads.nearDiagonalFractionThreshold,
-            assemblerOptions.readsOptions.palindromicReads.deltaThreshold,
-            threadCount);
-    }
+        } else if(assemblerOptions.kmersOptions.suppressHighFrequencyMarkers) {
 
+            // Randomly select the k-mers to be used as markers, but
+            // excluding those that are highly frequent in the input reads.
+            assembler.selectKmersBasedOnFrequency(
+                assemblerOptions.kmersOptions.k,
+                assemblerOptions.kmersOptions.probability, 231,
+                assemblerOptions.kmersOptions.enrichmentThreshold, threadCount);
+        } else {
 
-    // Find alignment candidates.
-    if(assemblerOptions.minHashOptions.allPairs) {
-        assembler.markAlignmentCandidatesAllPairs();
-    } else if(assemblerOptions.minHashOptions.version == 0) {
-        assembler.findAlignmentCandidatesLowHash0(
-            assemblerOptions.minHashOptions.m,
-            assemblerOptions.minHashOptions.hashFraction,
-            assemblerOptions.minHashOptions.minHashIterationCount,
-            assemblerOptions.minHashOptions.alignmentCandidatesPerRead,
-            0,
-            assemblerOptions.minHashOptions.minBucketSize,
-            assemblerOptions.minHashOptions.maxBucketSize,
-            assemblerOptions.minHashOptions.minFrequency,
-            threadCount);
+            // Randomly select the k-mers to be used as markers.
+            assembler.randomlySelectKmers(
+                assemblerOptions.kmersOptions.k,
+                assemblerOptions.kmersOptions.probability, 231);
+        }
+    #endif
+
+
+        // Find the markers in the reads.
+        assembler.findMarkers(0);
+
+        if(!assemblerOptions.readsOptions.palindromicReads.skipFlagging) {
+            // Flag palindromic reads.
+            // These will be excluded from further processing.
+            assembler.flagPalindromicReads(
+                assemblerOptions.readsOptions.palindromicReads.maxSkip,
+                assemblerOptions.readsOptions.palindromicReads.maxDrift,
+                assemblerOptions.readsOptions.palindromicReads.maxMarkerFrequency,
+                assemblerOptions.readsOptions.palindromicReads.alignedFractionThreshold,
+                assemblerOptions.readsOptions.palindromicReads.nearDiagonalFractionThreshold,
+                assemblerOptions.readsOptions.palindromicReads.deltaThreshold,
+                threadCount);
+        }
+        assembler.distributeNumaMemory("markers");
+        numaAccessCounters.writePhase("finding markers");
+        performanceProfile.end();
+        checkpoints.markComplete("markers");
     } else {
-        SHASTA_ASSERT(assemblerOptions.minHashOptions.version == 1);    // Already checked for that.
-        assembler.findAlignmentCandidatesLowHash1(
-            assemblerOptions.minHashOptions.m,
-            assemblerOptions.minHashOptions.hashFraction,
-            assemblerOptions.minHashOptions.minHashIterationCount,
-            0,
-            assemblerOptions.minHashOptions.minBucketSize,
-            assemblerOptions.minHashOptions.maxBucketSize,
-            assemblerOptions.minHashOptions.minFrequency,
-            threadCount);
+        assembler.accessKmers();
+        assembler.accessMarkers();
     }
 
 
+    // Phase alignments.
+    if(checkpoints.mustRun("alignments")) {
+        performanceProfile.begin("finding alignment candidates");
 
-    // Suppress alignment candidates where reads are close on the same channel.
-    if(assemblerOptions.alignOptions.sameChannelReadAlignmentSuppressDeltaThreshold > 0) {
-        assembler.suppressAlignmentCandidates(
-            assemblerOptions.alignOptions.sameChannelReadAlignmentSuppressDeltaThreshold,
-            threadCount);
-    }
+        // When the binary data are backed by disk, the markers
+        // may no longer be resident in memory when computing alignments.
+        // Load them in the background while finding alignment candidates.
+        // The markers don't change after this point.
+        if(assemblerOptions.commandLineOnlyOptions.memoryBacking == "disk") {
+            assembler.startPrefetching("markers");
+        }
 
+        // Find alignment candidates.
+        if(assemblerOptions.minHashOptions.allPairs) {
+            assembler.markAlignmentCandidatesAllPairs();
+        } else if(assemblerOptions.minHashOptions.version == 0) {
+            assembler.findAlignmentCandidatesLowHash0(
+                assemblerOptions.minHashOptions.m,
+                assemblerOptions.minHashOptions.hashFraction,
+                assemblerOptions.minHashOptions.minHashIterationCount,
+                assemblerOptions.minHashOptions.alignmentCandidatesPerRead,
+                0,
+                assemblerOptions.minHashOptions.minBucketSize,
+                assemblerOptions.minHashOptions.maxBucketSize,
+                assemblerOptions.minHashOptions.minFrequency,
+                threadCount);
+        } else {
+            SHASTA_ASSERT(assemblerOptions.minHashOptions.version == 1);    // Already checked for that.
+            assembler.findAlignmentCandidatesLowHash1(
+                assemblerOptions.minHashOptions.m,
+                assemblerOptions.minHashOptions.hashFraction,
+                assemblerOptions.minHashOptions.minHashIterationCount,
+                0,
+                assemblerOptions.minHashOptions.minBucketSize,
+                assemblerOptions.minHashOptions.maxBucketSize,
+                assemblerOptions.minHashOptions.minFrequency,
+                threadCount);
+        }
 
 
-    // Compute alignments.
-	assembler.computeAlignments(
-        assemblerOptions.alignOptions.alignMethod,
-        assemblerOptions.alignOptions.maxMarkerFrequency,
-        assemblerOptions.alignOptions.maxSkip,
-        assemblerOptions.alignOptions.maxDrift,
-        assemblerOptions.alignOptions.minAlignedMarkerCount,
-        assemblerOptions.alignOptions.minAlignedFraction,
-        assemblerOptions.alignOptions.maxTrim,
-        assemblerOptions.alignOptions.matchScore,
-        assemblerOptions.alignOptions.mismatchScore,
-        assemblerOptions.alignOptions.gapScore,
-        assemblerOptions.alignOptions.downsamplingFactor,
-        assemblerOptions.alignOptions.bandExtend,
-        assemblerOptions.alignOptions.maxBand,
-        assemblerOptions.alignOptions.suppressContainments,
-        true, // Store good alignments in a compressed format.
-        threadCount);
 
+        // Suppress alignment candidates where reads are close on the same channel.
+        if(assemblerOptions.alignOptions.sameChannelReadAlignmentSuppressDeltaThreshold > 0) {
+            assembler.suppressAlignmentCandidates(
+                assemblerOptions.alignOptions.sameChannelReadAlignmentSuppressDeltaThreshold,
+                threadCount);
+        }
 
+        // The markers are needed next, so finish loading them.
+        assembler.waitForPrefetching();
+        numaAccessCounters.writePhase("finding alignment candidates");
+        performanceProfile.next("computing alignments");
+
+        // Alignments access the markers of pairs of reads in no particular order,
+        // so when they are backed by disk, read ahead would mostly
+        // read pages that are not needed.
+        const bool adviseMarkers =
+            (assemblerOptions.commandLineOnlyOptions.memoryBacking == "disk");
+        if(adviseMarkers) {
+            assembler.adviseMemoryMappedData("markers", MemoryMapped::Advice::Random);
+        }
 
-    // Create the read graph.
-    if(assemblerOptions.readGraphOptions.creationMethod == 0) {
-        assembler.createReadGraph(
-            assemblerOptions.readGraphOptions.maxAlignmentCount,
-            assemblerOptions.alignOptions.maxTrim);
 
-        // Flag read graph edges that cross strands.
-        assembler.flagCrossStrandReadGraphEdges(
-            assemblerOptions.readGraphOptions.crossStrandMaxDistance,
-            threadCount);
 
-        // Flag chimeric reads.
-        assembler.flagChimericReads(assemblerOptions.readGraphOptions.maxChimericReadDistance, threadCount);
-        assembler.computeReadGraphConnectedComponents(assemblerOptions.readGraphOptions.minComponentSize);
-    } else if(assemblerOptions.readGraphOptions.creationMethod == 2) {
-        assembler.createReadGraph2(
-            assemblerOptions.readGraphOptions.maxAlignmentCount,
-            assemblerOptions.readGraphOptions.markerCountPercentile,
-            assemblerOptions.readGraphOptions.alignedFractionPercentile,
-            assemblerOptions.readGraphOptions.maxSkipPercentile,
-            assemblerOptions.readGraphOptions.maxDriftPercentile,
-            assemblerOptions.readGraphOptions.maxTrimPercentile);
-
-        // Flag read graph edges that cross strands.
-        assembler.flagCrossStrandReadGraphEdges(
-            assemblerOptions.readGraphOptions.crossStrandMaxDistance,
+        // Compute alignments.
+    	assembler.computeAlignments(
+            assemblerOptions.alignOptions.alignMethod,
+            assemblerOptions.alignOptions.maxMarkerFrequency,
+            assemblerOptions.alignOptions.maxSkip,
+            assemblerOptions.alignOptions.maxDrift,
+            assemblerOptions.alignOptions.minAlignedMarkerCount,
+            assemblerOptions.alignOptions.minAlignedFraction,
+            assemblerOptions.alignOptions.maxTrim,
+            assemblerOptions.alignOptions.matchScore,
+            assemblerOptions.alignOptions.mismatchScore,
+            assemblerOptions.alignOptions.gapScore,
+            assemblerOptions.alignOptions.downsamplingFactor,
+            assemblerOptions.alignOptions.bandExtend,
+            assemblerOptions.alignOptions.maxBand,
+            assemblerOptions.alignOptions.suppressContainments,
+            true, // Store good alignments in a compressed format.
             threadCount);
-
-        // Flag chimeric reads.
-        assembler.flagChimericReads(assemblerOptions.readGraphOptions.maxChimericReadDistance, threadCount);
-        assembler.computeReadGraphConnectedComponents(assemblerOptions.readGraphOptions.minComponentSize);
+        if(adviseMarkers) {
+            assembler.adviseMemoryMappedData("markers", MemoryMapped::Advice::Normal);
+        }
+        numaAccessCounters.writePhase("computing alignments");
+        performanceProfile.end();
+        checkpoints.markComplete("alignments");
     } else {
-        throw runtime_error("Invalid value for --ReadGraph.creationMethod.");
+        assembler.accessAlignmentCandidates();
+        assembler.accessAlignmentData();
+        assembler.accessCompressedAlignments();
     }
 
 
 
-    // Iterative assembly, if requested (experimental).
-    if(assemblerOptions.assemblyOptions.iterative) {
-        for(uint64_t iteration=0;
-            iteration<assemblerOptions.assemblyOptions.iterativeIterationCount;
-            iteration++) {
-            cout << timestamp << "Iterative assembly iteration " << iteration << " begins." << endl;
+    // Phase readGraph.
+    if(checkpoints.mustRun("readGraph")) {
+        performanceProfile.begin("creating the read graph");
 
-            // Do an assembly with the current read graph, without marker graph
-            // simplification or detangling.
-            createMarkerGraphVertices(assembler, assemblerOptions, threadCount);
-            assembler.findMarkerGraphReverseComplementVertices(threadCount);
-            assembler.createMarkerGraphEdges(threadCount);
-            assembler.findMarkerGraphReverseComplementEdges(threadCount);
-            assembler.transitiveReduction(
-                assemblerOptions.markerGraphOptions.lowCoverageThreshold,
-                assemblerOptions.markerGraphOptions.highCoverageThreshold,
-                assemblerOptions.markerGraphOptions.maxDistance,
-                assemblerOptions.markerGraphOptions.edgeMarkerSkipThreshold);
-            assembler.pruneMarkerGraphStrongSubgraph(
-                assemblerOptions.markerGraphOptions.pruneIterationCount);
-            assembler.createAssemblyGraphEdges();
-            assembler.createAssemblyGraphVertices();
+        // Create the read graph.
+        if(assemblerOptions.readGraphOptions.creationMethod == 0) {
+            assembler.createReadGraph(
+                assemblerOptions.readGraphOptions.maxAlignmentCount,
+                assemblerOptions.alignOptions.maxTrim);
 
-            // Recreate the read graph using pseudo-paths from this assembly.
-            assembler.createReadGraphUsingPseudoPaths(
-                assemblerOptions.assemblyOptions.iterativePseudoPathAlignMatchScore,
-                assemblerOptions.assemblyOptions.iterativePseudoPathAlignMismatchScore,
-                assemblerOptions.assemblyOptions.iterativePseudoPathAlignGapScore,
-                assemblerOptions.assemblyOptions.iterativeMismatchSquareFactor,
-                assemblerOptions.assemblyOptions.iterativeMinScore,
-                assemblerOptions.assemblyOptions.iterativeMaxAlignmentCount,
+            // Flag read graph edges that cross strands.
+            assembler.flagCrossStrandReadGraphEdges(
+                assemblerOptions.readGraphOptions.crossStrandMaxDistance,
                 threadCount);
-            for(uint64_t bridgeRemovalIteration=0;
-                bridgeRemovalIteration<assemblerOptions.assemblyOptions.iterativeBridgeRemovalIterationCount;
-                bridgeRemovalIteration++) {
-                assembler.removeReadGraphBridges(
-                    assemblerOptions.assemblyOptions.iterativeBridgeRemovalMaxDistance);
-            }
 
-            // Remove the marker graph and assembly graph we created in the process.
-            assembler.markerGraph.remove();
-            assembler.assemblyGraphPointer.reset();
+            // Flag chimeric reads.
+            assembler.flagChimericReads(assemblerOptions.readGraphOptions.maxChimericReadDistance, threadCount);
+            assembler.computeReadGraphConnectedComponents(assemblerOptions.readGraphOptions.minComponentSize);
+        } else if(assemblerOptions.readGraphOptions.creationMethod == 2) {
+            assembler.createReadGraph2(
+                assemblerOptions.readGraphOptions.maxAlignmentCount,
+                assemblerOptions.readGraphOptions.markerCountPercentile,
+                assemblerOptions.readGraphOptions.alignedFractionPercentile,
+                assemblerOptions.readGraphOptions.maxSkipPercentile,
+                assemblerOptions.readGraphOptions.maxDriftPercentile,
+                assemblerOptions.readGraphOptions.maxTrimPercentile);
+
+            // Flag read graph edges that cross strands.
+            assembler.flagCrossStrandReadGraphEdges(
+                assemblerOptions.readGraphOptions.crossStrandMaxDistance,
+                threadCount);
 
+            // Flag chimeric reads.
+            assembler.flagChimericReads(assemblerOptions.readGraphOptions.maxChimericReadDistance, threadCount);
+            assembler.computeReadGraphConnectedComponents(assemblerOptions.readGraphOptions.minComponentSize);
+        } else {
+            throw runtime_error("Invalid value for --ReadGraph.creationMethod.");
         }
+        numaAccessCounters.writePhase("creating the read graph");
+        performanceProfile.end();
+
+
+
+        // Iterative assembly, if requested (experimental).
+        if(assemblerOptions.assemblyOptions.iterative) {
+            performanceProfile.begin("iterative assembly");
+            for(uint64_t iteration=0;
+                iteration<assemblerOptions.assemblyOptions.iterativeIterationCount;
+                iteration++) {
+                cout << timestamp << "Iterative assembly iteration " << iteration << " begins." << endl;
+
+                // Do an assembly with the current read graph, without marker graph
+                // simplification or detangling.
+                createMarkerGraphVertices(assembler, assemblerOptions, threadCount);
+                assembler.findMarkerGraphReverseComplementVertices(threadCount);
+                assembler.createMarkerGraphEdges(threadCount);
+                assembler.findMarkerGraphReverseComplementEdges(threadCount);
+                assembler.transitiveReduction(
+                    assemblerOptions.markerGraphOptions.lowCoverageThreshold,
+                    assemblerOptions.markerGraphOptions.highCoverageThreshold,
+                    assemblerOptions.markerGraphOptions.maxDistance,
+                    assemblerOptions.markerGraphOptions.edgeMarkerSkipThreshold,
+                    threadCount);
+                assembler.pruneMarkerGraphStrongSubgraph(
+                    assemblerOptions.markerGraphOptions.pruneIterationCount,
+                    threadCount);
+                assembler.createAssemblyGraphEdges();
+                assembler.createAssemblyGraphVertices();
+
+                // Recreate the read graph using pseudo-paths from this assembly.
+                assembler.createReadGraphUsingPseudoPaths(
+                    assemblerOptions.assemblyOptions.iterativePseudoPathAlignMatchScore,
+                    assemblerOptions.assemblyOptions.iterativePseudoPathAlignMismatchScore,
+                    assemblerOptions.assemblyOptions.iterativePseudoPathAlignGapScore,
+                    assemblerOptions.assemblyOptions.iterativeMismatchSquareFactor,
+                    assemblerOptions.assemblyOptions.iterativeMinScore,
+                    assemblerOptions.assemblyOptions.iterativeMaxAlignmentCount,
+                    threadCount);
+                for(uint64_t bridgeRemovalIteration=0;
+                    bridgeRemovalIteration<assemblerOptions.assemblyOptions.iterativeBridgeRemovalIterationCount;
+                    bridgeRemovalIteration++) {
+                    assembler.removeReadGraphBridges(
+                        assemblerOptions.assemblyOptions.iterativeBridgeRemovalMaxDistance);
+                }
+
+                // Remove the marker graph and assembly graph we created in the process.
+                assembler.markerGraph.remove();
+                assembler.assemblyGraphPointer.reset();
 
-        // Now we have a new read graph with some amount of separation
-        // between copies of long repeats and/or haplotypes.
-        // The rest of the assembly continues normally.
-    }
-
-
-
-    // Create marker graph vertices.
-    // This uses a disjoint sets data structure to merge markers
-    // that are aligned based on an alignment present in the read graph.
-    createMarkerGraphVertices(assembler, assemblerOptions, threadCount);
-
-    // Find the reverse complement of each marker graph vertex.
-    assembler.findMarkerGraphReverseComplementVertices(threadCount);
-
-    // Create edges of the marker graph.
-    assembler.createMarkerGraphEdges(threadCount);
-    assembler.findMarkerGraphReverseComplementEdges(threadCount);
+            }
 
-    // Approximate transitive reduction.
-    assembler.transitiveReduction(
-        assemblerOptions.markerGraphOptions.lowCoverageThreshold,
-        assemblerOptions.markerGraphOptions.highCoverageThreshold,
-        assemblerOptions.markerGraphOptions.maxDistance,
-        assemblerOptions.markerGraphOptions.edgeMarkerSkipThreshold);
-    if(assemblerOptions.markerGraphOptions.reverseTransitiveReduction) {
-        assembler.reverseTransitiveReduction(
-            assemblerOptions.markerGraphOptions.lowCoverageThreshold,
-            assemblerOptions.markerGraphOptions.highCoverageThreshold,
-            assemblerOptions.markerGraphOptions.maxDistance);
+            // Now we have a new read graph with some amount of separation
+            // between copies of long repeats and/or haplotypes.
+            // The rest of the assembly continues normally.
+            performanceProfile.end();
+        }
+        checkpoints.markComplete("readGraph");
+    } else {
+        assembler.accessReadGraphReadWrite();
     }
 
 
 
-    // If marker graph refinement was requested, do it now, then regenerate
-    // marker graph edges.
-    if(assemblerOptions.markerGraphOptions.refineThreshold > 0) {
-        assembler.refineMarkerGraph(
-            assemblerOptions.markerGraphOptions.refineThreshold,
-            threadCount);
+    // Phase markerGraph.
+    if(checkpoints.mustRun("markerGraph")) {
+        performanceProfile.begin("creating the marker graph");
 
-        // This destroyed everything except the vertices.
-        // Recreate the edges and redo all of the above steps.
+        // Create marker graph vertices.
+        // This uses a disjoint sets data structure to merge markers
+        // that are aligned based on an alignment present in the read graph.
+        createMarkerGraphVertices(assembler, assemblerOptions, threadCount);
 
         // Find the reverse complement of each marker graph vertex.
         assembler.findMarkerGraphReverseComplementVertices(threadCount);
@@ -824,67 +966,125 @@ void shasta::main::assemble(
             assemblerOptions.markerGraphOptions.lowCoverageThreshold,
             assemblerOptions.markerGraphOptions.highCoverageThreshold,
             assemblerOptions.markerGraphOptions.maxDistance,
-            assemblerOptions.markerGraphOptions.edgeMarkerSkipThreshold);
+            assemblerOptions.markerGraphOptions.edgeMarkerSkipThreshold,
+            threadCount);
         if(assemblerOptions.markerGraphOptions.reverseTransitiveReduction) {
             assembler.reverseTransitiveReduction(
                 assemblerOptions.markerGraphOptions.lowCoverageThreshold,
                 assemblerOptions.markerGraphOptions.highCoverageThreshold,
-                assemblerOptions.markerGraphOptions.maxDistance);
+                assemblerOptions.markerGraphOptions.maxDistance,
+                threadCount);
         }
-    }
 
 
 
-    // Prune the marker graph.
-    assembler.pruneMarkerGraphStrongSubgraph(
-        assemblerOptions.markerGraphOptions.pruneIterationCount);
+        // If marker graph refinement was requested, do it now, then regenerate
+        // marker graph edges.
+        if(assemblerOptions.markerGraphOptions.refineThreshold > 0) {
+            assembler.refineMarkerGraph(
+                assemblerOptions.markerGraphOptions.refineThreshold,
+                threadCount);
 
-    // Compute marker graph coverage histogram.
-    assembler.computeMarkerGraphCoverageHistogram();
+            // This destroyed everything except the vertices.
+            // Recreate the edges and redo all of the above steps.
 
-    // Simplify the marker graph to remove bubbles and superbubbles.
-    // The maxLength parameter controls the maximum number of markers
-    // for a branch to be collapsed during each iteration.
-    assembler.simplifyMarkerGraph(assemblerOptions.markerGraphOptions.simplifyMaxLengthVector, false);
+            // Find the reverse complement of each marker graph vertex.
+            assembler.findMarkerGraphReverseComplementVertices(threadCount);
 
-    // Create the assembly graph.
-    assembler.createAssemblyGraphEdges();
-    assembler.createAssemblyGraphVertices();
+            // Create edges of the marker graph.
+            assembler.createMarkerGraphEdges(threadCount);
+            assembler.findMarkerGraphReverseComplementEdges(threadCount);
 
-    // Remove low-coverage cross-edges from the assembly graph and
-    // the corresponding marker graph edges.
-    if(assemblerOptions.markerGraphOptions.crossEdgeCoverageThreshold > 0.) {
-        assembler.removeLowCoverageCrossEdges(
-            uint32_t(assemblerOptions.markerGraphOptions.crossEdgeCoverageThreshold));
-        assembler.assemblyGraphPointer->remove();
+            // Approximate transitive reduction.
+            assembler.transitiveReduction(
+                assemblerOptions.markerGraphOptions.lowCoverageThreshold,
+                assemblerOptions.markerGraphOptions.highCoverageThreshold,
+                assemblerOptions.markerGraphOptions.maxDistance,
+                assemblerOptions.markerGraphOptions.edgeMarkerSkipThreshold,
+                threadCount);
+            if(assemblerOptions.markerGraphOptions.reverseTransitiveReduction) {
+                assembler.reverseTransitiveReduction(
+                    assemblerOptions.markerGraphOptions.lowCoverageThreshold,
+                    assemblerOptions.markerGraphOptions.highCoverageThreshold,
+                    assemblerOptions.markerGraphOptions.maxDistance,
+                    threadCount);
+            }
+        }
+        assembler.distributeNumaMemory("markerGraph");
+        numaAccessCounters.writePhase("creating the marker graph");
+        performanceProfile.next("simplifying the marker graph and creating the assembly graph");
+
+
+
+        // Prune the marker graph.
+        assembler.pruneMarkerGraphStrongSubgraph(
+            assemblerOptions.markerGraphOptions.pruneIterationCount,
+            threadCount);
+
+        // Compute marker graph coverage histogram.
+        assembler.computeMarkerGraphCoverageHistogram();
+
+        // Simplify the marker graph to remove bubbles and superbubbles.
+        // The maxLength parameter controls the maximum number of markers
+        // for a branch to be collapsed during each iteration.
+        assembler.simplifyMarkerGraph(assemblerOptions.markerGraphOptions.simplifyMaxLengthVector, false, threadCount);
+
+        // Create the assembly graph.
         assembler.createAssemblyGraphEdges();
         assembler.createAssemblyGraphVertices();
-    }
 
-    // Prune the assembly graph, if requested.
-    if(assemblerOptions.assemblyOptions.pruneLength > 0) {
-        assembler.pruneAssemblyGraph(assemblerOptions.assemblyOptions.pruneLength);
-    }
+        // Remove low-coverage cross-edges from the assembly graph and
+        // the corresponding marker graph edges.
+        if(assemblerOptions.markerGraphOptions.crossEdgeCoverageThreshold > 0.) {
+            assembler.removeLowCoverageCrossEdges(
+                uint32_t(assemblerOptions.markerGraphOptions.crossEdgeCoverageThreshold));
+            assembler.assemblyGraphPointer->remove();
+            assembler.createAssemblyGraphEdges();
+            assembler.createAssemblyGraphVertices();
+        }
 
-    // Detangle, if requested.
-    if(assemblerOptions.assemblyOptions.detangleMethod == 1) {
-        assembler.detangle();
-    } else if(assemblerOptions.assemblyOptions.detangleMethod == 2) {
-        assembler.detangle2(
-            assemblerOptions.assemblyOptions.detangleDiagonalReadCountMin,
-            assemblerOptions.assemblyOptions.detangleOffDiagonalReadCountMax,
-            assemblerOptions.assemblyOptions.detangleOffDiagonalRatio
-            );
+        // Prune the assembly graph, if requested.
+        if(assemblerOptions.assemblyOptions.pruneLength > 0) {
+            assembler.pruneAssemblyGraph(assemblerOptions.assemblyOptions.pruneLength);
+        }
+
+        // Detangle, if requested.
+        if(assemblerOptions.assemblyOptions.detangleMethod == 1) {
+            assembler.detangle();
+        } else if(assemblerOptions.assemblyOptions.detangleMethod == 2) {
+            assembler.detangle2(
+                assemblerOptions.assemblyOptions.detangleDiagonalReadCountMin,
+                assemblerOptions.assemblyOptions.detangleOffDiagonalReadCountMax,
+                assemblerOptions.assemblyOptions.detangleOffDiagonalRatio
+                );
+        }
+        assembler.writeAssemblyGraph("AssemblyGraph-Final.dot");
+        numaAccessCounters.writePhase("simplifying the marker graph and creating the assembly graph");
+        performanceProfile.end();
+        checkpoints.markComplete("markerGraph");
+    } else {
+        assembler.accessMarkerGraphVertices(true);
+        assembler.accessMarkerGraphReverseComplementVertex();
+        assembler.accessMarkerGraphEdges(true);
+        assembler.accessMarkerGraphReverseComplementEdge();
+        assembler.accessAssemblyGraphVertices();
+        assembler.accessAssemblyGraphEdges();
+        assembler.accessAssemblyGraphEdgeLists();
     }
-    assembler.writeAssemblyGraph("AssemblyGraph-Final.dot");
+
+    // Phase assembly.
+    // This is the last phase, so it always runs.
+    performanceProfile.begin("sequence assembly");
 
     // Compute optimal repeat counts for each vertex of the marker graph.
-    assembler.assembleMarkerGraphVertices(threadCount);
+    assembler.assembleMarkerGraphVertices(threadCount,
+        assemblerOptions.assemblyOptions.strandSymmetric);
 
     // If coverage data was requested, compute and store coverage data for the vertices.
     if(assemblerOptions.assemblyOptions.storeCoverageData or
         assemblerOptions.assemblyOptions.storeCoverageDataCsvLengthThreshold>0) {
-        assembler.computeMarkerGraphVerticesCoverageData(threadCount);
+        assembler.computeMarkerGraphVerticesCoverageData(threadCount,
+            assemblerOptions.assemblyOptions.strandSymmetric);
     }
 
     // Compute consensus sequence for marker graph edges to be used for assembly.
@@ -896,14 +1096,30 @@ void shasta::main::assemble(
         );
 
     // Use the assembly graph for global assembly.
+    // If requested, Assembly.gfa and Assembly.fasta are
+    // written while assembly is in progress.
+    const string outputSuffix =
+        assemblerOptions.assemblyOptions.bgzipOutput ? ".gz" : "";
+    const bool streamOutput = assemblerOptions.assemblyOptions.streamOutput;
     assembler.assemble(
         threadCount,
-        assemblerOptions.assemblyOptions.storeCoverageDataCsvLengthThreshold);
+        assemblerOptions.assemblyOptions.markerGraphEdgeLengthThresholdForConsensus,
+        assemblerOptions.assemblyOptions.storeCoverageDataCsvLengthThreshold,
+        assemblerOptions.assemblyOptions.storeCoverageDataFormat,
+        streamOutput ? "Assembly.gfa" + outputSuffix : "",
+        streamOutput ? "Assembly.fasta" + outputSuffix : "");
     // assembler.findAssemblyGraphBubbles();
     assembler.computeAssemblyStatistics();
-    assembler.writeGfa1("Assembly.gfa");
-    assembler.writeGfa1BothStrands("Assembly-BothStrands.gfa");
-    assembler.writeFasta("Assembly.fasta");
+    if(not streamOutput) {
+        assembler.writeGfa1("Assembly.gfa" + outputSuffix, threadCount);
+    }
+    assembler.writeGfa1BothStrands("Assembly-BothStrands.gfa" + outputSuffix, threadCount);
+    if(not streamOutput) {
+        assembler.writeFasta("Assembly.fasta" + outputSuffix, threadCount);
+    }
+
+    numaAccessCounters.writePhase("sequence assembly");
+    performanceProfile.end();
 
     // Store elapsed time for assembly.
     const auto steadyClock1 = std::chrono::steady_clock::now();
@@ -941,6 +1157,13 @@ void shasta::main::assemble(
     // Also write a summary of read information.
     assembler.writeReadsSummary();
 
+#ifdef SHASTA_TRACING
+    // Write the hot-path counters and trace spans.
+    Tracing::write();
+#endif
+
+    checkpoints.markComplete("assembly");
+
     cout << timestamp << endl;
     cout << "Assembly time statistics:\n"
         "    Elapsed seconds: " << elapsedTime << "\n"
@@ -1031,6 +1254,65 @@ void shasta::main::setupHugePages()
 
 
 
+// For "--memoryBacking THP", check that transparent huge pages
+// are enabled. This does not change any settings, so it never requires
+// root access. If they are not enabled, the assembly still runs,
+// but using 4K pages.
+void shasta::main::checkTransparentHugePages()
+{
+    const string fileName = "/sys/kernel/mm/transparent_hugepage/enabled";
+    ifstream file(fileName);
+    string line;
+    if(file) {
+        getline(file, line);
+    }
+    if(line.find("[always]") == string::npos and line.find("[madvise]") == string::npos) {
+        cout << "Transparent huge pages are not enabled on this system (" <<
+            fileName << ": " << line << ").\n"
+            "\"--memoryBacking THP\" will use 4K pages, and this could result in "
+            "performance degradation." << endl;
+    }
+}
+
+
+
+// Implementation of --command plan.
+// This forecasts the peak memory and elapsed time of each
+// assembly phase, without running the assembly.
+void shasta::main::plan(
+    const AssemblerOptions& assemblerOptions)
+{
+    SHASTA_ASSERT(assemblerOptions.commandLineOnlyOptions.command == "plan");
+
+    // Check that we have at least one input file.
+    if(assemblerOptions.commandLineOnlyOptions.inputFileNames.empty()) {
+        throw runtime_error("Specify at least one input file "
+            "using command line option \"--input\".");
+    }
+    for(const string& inputFileName: assemblerOptions.commandLineOnlyOptions.inputFileNames) {
+        if(!filesystem::exists(inputFileName)) {
+            throw runtime_error("Input file not found: " + inputFileName);
+        }
+        if(!filesystem::isRegularFile(inputFileName)) {
+            throw runtime_error("Input file is not a regular file: " + inputFileName);
+        }
+    }
+
+    uint32_t threadCount = assemblerOptions.commandLineOnlyOptions.threadCount;
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
+
+    const AssemblyPlan assemblyPlan(
+        assemblerOptions,
+        assemblerOptions.commandLineOnlyOptions.inputFileNames,
+        threadCount,
+        assemblerOptions.commandLineOnlyOptions.planCalibration);
+    assemblyPlan.write(cout);
+}
+
+
+
 // Implementation of --command saveBinaryData.
 // This copies Data to DataOnDisk.
 void shasta::main::saveBinaryData(
@@ -1054,18 +1336,82 @@ void shasta::main::saveBinaryData(
         return;
     }
 
-    // Copy Data to DataOnDisk.
-    const string command = "cp -rp " + dataDirectory + " " + dataOnDiskDirectory;
-    const int errorCode = ::system(command.c_str());
-    if(errorCode != 0) {
-        throw runtime_error("Error " + to_string(errorCode) + ": " + strerror(errorCode) +
-            " running command:\n" + command);
+    // Copy Data to DataOnDisk, in parallel.
+    uint32_t threadCount = assemblerOptions.commandLineOnlyOptions.threadCount;
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
     }
+    BinaryDataSnapshot::save(
+        dataDirectory,
+        dataOnDiskDirectory,
+        assemblerOptions.commandLineOnlyOptions.binaryDataCompression,
+        threadCount);
     cout << "Binary data successfully saved." << endl;
 }
 
 
 
+// Implementation of --command restoreBinaryData.
+// This restores to the Data directory the binary data
+// saved in DataOnDisk by --command saveBinaryData.
+void shasta::main::restoreBinaryData(
+    const AssemblerOptions& assemblerOptions)
+{
+    SHASTA_ASSERT(assemblerOptions.commandLineOnlyOptions.command == "restoreBinaryData");
+
+    // Check that the DataOnDisk directory exists.
+    if(!filesystem::isDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory)) {
+        throw runtime_error(assemblerOptions.commandLineOnlyOptions.assemblyDirectory +
+            " does not exist or is not a directory.");
+    }
+    filesystem::changeDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
+    if(!filesystem::exists("DataOnDisk")) {
+        throw runtime_error("DataOnDisk does not exist in " +
+            assemblerOptions.commandLineOnlyOptions.assemblyDirectory + ", nothing done.");
+    }
+
+    // If Data is a symbolic link to DataOnDisk, as left
+    // by --command cleanupBinaryData, remove it.
+    BinaryDataSnapshot::removeLink("DataOnDisk", "Data");
+
+    // Lazy restore: just make Data a symbolic link to DataOnDisk.
+    if(assemblerOptions.commandLineOnlyOptions.lazyRestore) {
+        BinaryDataSnapshot::link("DataOnDisk", "Data");
+        cout << "Binary data successfully restored." << endl;
+        return;
+    }
+
+    // If the Data directory does not exist, set it up as required
+    // by the memoryMode and memoryBacking options.
+    // Otherwise, it must be empty.
+    if(filesystem::exists("Data")) {
+        if(!filesystem::directoryContents("Data").empty()) {
+            throw runtime_error("Data is not empty, nothing done.");
+        }
+    } else {
+        if(assemblerOptions.commandLineOnlyOptions.memoryMode != "filesystem") {
+            throw runtime_error("--command restoreBinaryData requires --memoryMode filesystem.");
+        }
+        size_t pageSize = 0;
+        string dataDirectory;
+        setupRunDirectory(
+            assemblerOptions.commandLineOnlyOptions.memoryMode,
+            assemblerOptions.commandLineOnlyOptions.memoryBacking,
+            pageSize,
+            dataDirectory);
+    }
+
+    // Copy DataOnDisk to Data, in parallel.
+    uint32_t threadCount = assemblerOptions.commandLineOnlyOptions.threadCount;
+    if(threadCount == 0) {
+        threadCount = std::thread::hardware_concurrency();
+    }
+    BinaryDataSnapshot::restore("DataOnDisk", "Data", threadCount);
+    cout << "Binary data successfully restored." << endl;
+}
+
+
+
 // Implementation of --command cleanupBinaryData.
 void shasta::main::cleanupBinaryData(
     const AssemblerOptions& assemblerOptions)
@@ -1089,14 +1435,12 @@ void shasta::main::cleanupBinaryData(
     }
     cout << "Cleanup of " << dataDirectory << " successful." << endl;
 
-    // If the DataOnDisk directory exists, create a symbolic link
-    // Data->DataOnDisk.
+    // If the DataOnDisk directory exists and can be used without
+    // restoring it, create a symbolic link Data->DataOnDisk.
     const string dataOnDiskDirectory =
         assemblerOptions.commandLineOnlyOptions.assemblyDirectory + "/DataOnDisk";
     if(filesystem::exists(dataOnDiskDirectory)) {
-        filesystem::changeDirectory(assemblerOptions.commandLineOnlyOptions.assemblyDirectory);
-        const string command = "ln -s DataOnDisk Data";
-        ::system(command.c_str());
+        BinaryDataSnapshot::linkIfUncompressed(dataOnDiskDirectory, dataDirectory);
     }
 
 }
@@ -1127,6 +1471,11 @@ void shasta::main::explore(
     
     // Access all available binary data.
     assembler.accessAllSoft();
+
+    // The binary data are typically on disk at this point.
+    // Load them in the background, if they fit in memory,
+    // so the first requests don't fault in pages one at a time.
+    assembler.startPrefetching("all");
     
     // Set up the consensus caller.
     cout << "Setting up consensus caller " <<
@@ -1202,7 +1551,7 @@ void shasta::main::createBashCompletionScript(const AssemblerOptions& assemblerO
     }
 
     // Other keywords. This should be modified to only accept them after the appropriate option.
-    file << "assemble saveBinaryData cleanupBinaryData explore createBashCompletionScript \\\n";
+    file << "assemble plan saveBinaryData restoreBinaryData cleanupBinaryData explore createBashCompletionScript \\\n";
     file << "filesystem anonymous \\\n";
     file << "disk 4K 2M \\\n";
     file << "user local unrestricted \\\n";